@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+import platform
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple
+
+from database import queries
+from database.pagination import page_cache
+from benchmarks.query_plans import Samples, sample_ids
+from benchmarks.synthetic_data import SCALES, Scale, open_database, populate
+
+# Timing of data-layer functions on a synthetic database.
+#
+# Each function in BENCHMARKS is called warmup + iterations times in a row; the page and
+# role caches are reset before each call so that the timing covers SQLite work rather than a
+# cache hit. The result is a latency distribution (ms) per function. It can be saved as the
+# baseline (--save-baseline) and later runs compared with it: a regression is p50 or p90 growing
+# by more than tolerance and by more than min_delta_ms (timer noise on fast queries).
+#
+# Usage: python -m benchmarks.bench_queries [--db path] [--scale production] [--baseline file]
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+METRICS = ('p50', 'p90', 'p99', 'max', 'mean')
+COMPARED_METRICS = ('p50', 'p90')
+
+
+def _benchmarks(s: Samples) -> dict[str, Callable[[], Awaitable]]:
+    """Measured calls: the bot's hot paths, lists (first and a far page) and reports."""
+    now = datetime.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    q = queries
+    return {
+        'get_working_driver_ids': lambda: q.get_working_driver_ids(s.order_id, 50.9077, 34.7981),
+        'get_searching_dispatches': lambda: q.get_searching_dispatches(),
+        'get_upcoming_preorders': lambda: q.get_upcoming_preorders(),
+        'get_pending_dispatch_orders': lambda: q.get_pending_dispatch_orders(),
+        'get_my_preorders_page': lambda: q.get_my_preorders_page(5, 0, s.driver_id),
+        'get_full_order_details': lambda: q.get_full_order_details(s.completed_order_id),
+        'get_driver_cabinet_data': lambda: q.get_driver_cabinet_data(s.driver_id),
+        'is_driver': lambda: q.is_driver(s.driver_id),
+        'get_driver_orders_count': lambda: q.get_driver_orders_count(s.driver_id),
+        'get_driver_orders_page': lambda: q.get_driver_orders_page(5, 0, s.driver_id),
+        'get_driver_orders_page[cursor]': lambda: q.get_driver_orders_page(5, 50, s.driver_id, cursor=f">{s.completed_order_id}"),
+        'get_driver_orders_page[offset]': lambda: q.get_driver_orders_page(5, 500, s.driver_id),
+        'get_driver_reviews_page': lambda: q.get_driver_reviews_page(5, 0, s.driver_id),
+        'get_driver_rejections_page': lambda: q.get_driver_rejections_page(5, 0, s.driver_id),
+        'get_user_orders_count': lambda: q.get_user_orders_count(s.client_id),
+        'get_user_orders_page': lambda: q.get_user_orders_page(5, 0, s.client_id),
+        'get_orders_count_by_status[completed]': lambda: q.get_orders_count_by_status('completed'),
+        'get_orders_page_by_status[completed]': lambda: q.get_orders_page_by_status('completed', 5, 0),
+        'get_orders_page_by_status[offset]': lambda: q.get_orders_page_by_status('completed', 5, 5000),
+        'get_clients_page': lambda: q.get_clients_page(5, 0),
+        'get_clients_page[search]': lambda: q.get_clients_page(5, 0, search_query="Клієнт 10"),
+        'get_drivers_page': lambda: q.get_drivers_page(5, 0, is_working=True),
+        'get_available_preorders_page': lambda: q.get_available_preorders_page(5, 0, now, now + timedelta(days=7)),
+        'get_main_stats': lambda: q.get_main_stats(),
+        'get_kpi_summary[month]': lambda: q.get_kpi_summary(day_start - timedelta(days=29), day_start + timedelta(days=1)),
+        'get_drivers_kpi_page[week]': lambda: q.get_drivers_kpi_page(5, 0, day_start - timedelta(days=6), day_start + timedelta(days=1)),
+    }
+
+
+class Regression(NamedTuple):
+    name: str
+    metric: str
+    baseline_ms: float
+    current_ms: float
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    """Latency distribution in milliseconds (nearest-rank percentiles)."""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+    return {
+        'n': len(ordered),
+        'p50': round(percentile(50) * 1000, 3),
+        'p90': round(percentile(90) * 1000, 3),
+        'p99': round(percentile(99) * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+        'mean': round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+async def run_benchmarks(db_path: Path, iterations: int = 50, warmup: int = 5,
+                         only: set[str] | None = None) -> dict[str, dict[str, float]]:
+    """Times the functions on the open database db_path (the pool must be open on it)."""
+    with sqlite3.connect(db_path) as conn:
+        samples = sample_ids(conn)
+    results = {}
+    for name, call in _benchmarks(samples).items():
+        if only and name not in only:
+            continue
+        latencies = []
+        for iteration in range(warmup + iterations):
+            page_cache.clear()
+            queries.role_cache.clear()
+            started = time.perf_counter()
+            await call()
+            if iteration >= warmup:
+                latencies.append(time.perf_counter() - started)
+        results[name] = summarize(latencies)
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict],
+            tolerance: float = 0.3, min_delta_ms: float = 0.5) -> list[Regression]:
+    """Functions whose p50 or p90 grew by more than tolerance (a fraction) and by more than min_delta_ms."""
+    regressions = []
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = baseline[name][metric], current[metric]
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(Regression(name, metric, before, after))
+    return regressions
+
+
+def format_results(results: dict[str, dict], baseline: dict[str, dict] | None = None) -> str:
+    """Results table; with a baseline run, includes the p50 change in percent."""
+    width = max(len(name) for name in results)
+    header = f"{'функція':<{width}}  " + "  ".join(f"{metric:>9}" for metric in METRICS)
+    if baseline:
+        header += f"  {'Δp50':>7}"
+    lines = [header + "   (мс)"]
+    for name, stats in results.items():
+        line = f"{name:<{width}}  " + "  ".join(f"{stats[metric]:>9.3f}" for metric in METRICS)
+        if baseline and name in baseline and baseline[name]['p50']:
+            line += f"  {(stats['p50'] / baseline[name]['p50'] - 1) * 100:>+6.0f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _environment(scale: Scale | None, seed: int) -> dict:
+    return {
+        'scale': scale._asdict() if scale else None,
+        'seed': seed,
+        'sqlite': sqlite3.sqlite_version,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+async def _main(args: argparse.Namespace) -> int:
+    db_path = Path(args.db)
+    scale = SCALES[args.scale]
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else None
+    async with open_database(db_path):
+        with sqlite3.connect(db_path) as conn:
+            empty = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+        if empty:
+            print(f"Генерація синтетичної бази {db_path} ({args.scale})...")
+            populate(db_path, scale, seed=args.seed)
+        results = await run_benchmarks(db_path, args.iterations, args.warmup, set(args.only) if args.only else None)
+
+    print(format_results(results, baseline['results'] if baseline else None))
+    if args.save_baseline:
+        baseline_path.write_text(
+            json.dumps({'environment': _environment(scale, args.seed), 'results': results}, ensure_ascii=False, indent=2) + "\n",
+            encoding='utf-8'
+        )
+        print(f"\nБазові результати збережено в {baseline_path}")
+        return 0
+    if not baseline:
+        return 0
+    if baseline['environment'].get('scale') != scale._asdict():
+        print(f"\nУвага: базові результати отримані на іншому масштабі: {baseline['environment'].get('scale')}")
+    regressions = compare(results, baseline['results'], args.tolerance, args.min_delta_ms)
+    for r in regressions:
+        print(f"РЕГРЕСІЯ {r.name}: {r.metric} {r.baseline_ms:.3f} -> {r.current_ms:.3f} мс")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Заміри функцій database/queries.py на синтетичній базі")
+    parser.add_argument('--db', default='benchmarks/bench.db', help="база для замірів (порожня заповнюється генератором)")
+    parser.add_argument('--scale', choices=SCALES, default='medium', help="масштаб для генерації бази")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='*', help="заміряти лише ці функції")
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help="файл базових результатів")
+    parser.add_argument('--save-baseline', action='store_true', help="зберегти результати як базові")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="допустиме відносне зростання p50/p90")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help="менше зростання (мс) не вважається регресією")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
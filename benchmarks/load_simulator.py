@@ -0,0 +1,629 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import Update
+from loguru import logger
+
+from config.config import DISPATCH_STRATEGY, DRIVER_ACCEPT_TIMEOUT
+from database import queries as db_queries
+from database.fsm_storage import fsm_storage
+from database.pool import db_pool
+from database.write_queue import write_queue
+from handlers import setup_routers
+from handlers.middlewares.activity_middleware import ActivityMiddleware
+from handlers.middlewares.ban_middleware import BanMiddleware
+from handlers.middlewares.logging_middleware import LoggingMiddleware
+from handlers.user.order_dispatch import dispatch_timers
+from keyboards.common import Navigate
+from utils.callback_factories import DriverRateClientCallback, OrderCallbackData, RatingCallbackData
+from utils.geo_providers import NominatimProvider
+from utils.geocoder import geocoder
+from utils.outbound import outbound_scheduler
+from benchmarks.bench_queries import summarize
+from benchmarks.synthetic_data import CITY_CENTER, CITY_SPREAD, open_database
+
+# Load simulator: the whole bot (routers from handlers.setup_routers(), middleware,
+# FSM storage in the DB, the write queue, dispatch timers) under a stream of orders.
+#
+# Instead of api.telegram.org the bot talks to a local FakeBotAPI: it serves updates via
+# getUpdates, accepts sendMessage/sendPhoto/sendLocation/editMessageText and delivers
+# the bot's replies to the simulated participants. A fake Nominatim (/reverse) answers there too,
+# so geocoding does not go to the network. Clients go through the usual order flow
+# with buttons (pickup geolocation, "tell the driver", phone, no comment), drivers
+# start a shift broadcasting their live location, accept or reject offers,
+# drive the passenger and rate them. Orders arrive as a Poisson stream.
+#
+# Report: throughput, time to driver assignment, update processing latency
+# by flow step, DB pool connection waits, write batching and
+# outgoing message queues (utils/outbound.py).
+# The dispatch strategy and offer timeout come from the configuration
+# (DISPATCH_STRATEGY, DRIVER_ACCEPT_TIMEOUT in .env).
+#
+# Usage: python -m benchmarks.load_simulator --drivers 200 --clients 2000 --rate 5 --duration 120
+
+SIM_CLIENT_ID_BASE = 9_000_000
+SIM_DRIVER_ID_BASE = 9_500_000
+SIM_TOKEN = '123456:SIMULATED-TOKEN'
+LIVE_PERIOD = 8 * 3600
+_MATCHED = re.compile(r"замовлення №\d+ прийнято")
+_UNMATCHED = ('ніхто з водіїв', 'технічна помилка')
+
+
+@dataclass
+class LoadProfile:
+    """Fleet size and demand; all times are in seconds."""
+    drivers: int = 50
+    clients: int = 500
+    rate: float = 1.0               # new orders per second
+    duration: float = 60.0          # how many seconds orders keep arriving
+    client_think: float = 0.3       # client pause between flow steps
+    driver_think: float = 1.0       # driver reaction time to an offer
+    pickup: float = 2.0             # pickup drive
+    ride: float = 5.0               # ride
+    reject_rate: float = 0.1        # share of offers a free driver rejects
+    location_interval: float = 10.0  # period of driver live location updates
+    api_latency: float = 0.0        # Bot API response delay (RTT to Telegram)
+    step_timeout: float = 15.0      # how long a client waits for the bot's reply at a flow step
+    match_timeout: float = 120.0    # how long a client waits for a driver
+    seed: int = 1
+
+
+@dataclass
+class SimulationReport:
+    profile: LoadProfile
+    elapsed: float = 0.0
+    orders_created: int = 0
+    matched: int = 0
+    unmatched: int = 0
+    completed: int = 0
+    failed_steps: Counter = field(default_factory=Counter)
+    time_to_match: list[float] = field(default_factory=list)
+    handler_latency: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    api_calls: Counter = field(default_factory=Counter)
+    db_pool: dict = field(default_factory=dict)
+    write_queue: dict = field(default_factory=dict)
+    outbound: dict = field(default_factory=dict)
+
+
+class _ApiError(Exception):
+    def __init__(self, description: str):
+        super().__init__(description)
+        self.description = description
+
+
+def _text(message: dict) -> str:
+    return message.get('text') or message.get('caption') or ''
+
+
+def _find_button(message: dict, factory: type[CallbackData], **fields) -> str | None:
+    """callback_data of the message's first inline button that the factory parses and whose fields match."""
+    for row in message.get('reply_markup', {}).get('inline_keyboard', []):
+        for button in row:
+            data = button.get('callback_data')
+            if not data:
+                continue
+            try:
+                parsed = factory.unpack(data)
+            except (TypeError, ValueError):
+                continue
+            if all(getattr(parsed, name) == value for name, value in fields.items()):
+                return data
+    return None
+
+
+class FakeBotAPI:
+    """
+    Local Bot API and Nominatim server for the simulation.
+
+    Participants' updates are queued and served to the bot via getUpdates (long polling).
+    The bot's messages get a message_id, are remembered for editMessageText and are delivered
+    to the participant handler registered for the chat.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.url = ''
+        self.calls = Counter()
+        self._latency = latency
+        self._updates: asyncio.Queue[dict] = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._messages: dict[tuple[int, int], dict] = {}
+        self._chats: dict[int, Callable[[dict, bool], None]] = {}
+        self._runner: web.AppRunner | None = None
+        self._bot_user = {'id': int(SIM_TOKEN.split(':')[0]), 'is_bot': True, 'first_name': 'Toptaxi', 'username': 'toptaxi_sim_bot'}
+        self._methods: dict[str, Callable[[dict], Awaitable[Any]]] = {
+            'getMe': self._get_me,
+            'getUpdates': self._get_updates,
+            'sendMessage': self._send_message,
+            'sendPhoto': self._send_photo,
+            'sendLocation': self._send_location,
+            'editMessageText': self._edit_message_text,
+            'editMessageReplyMarkup': self._edit_message_reply_markup,
+            'deleteMessage': self._delete_message,
+        }
+
+    async def start(self, host: str = '127.0.0.1') -> None:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle_bot_api)
+        app.router.add_get('/reverse', self._handle_reverse)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, 0).start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def register_chat(self, chat_id: int, deliver: Callable[[dict, bool], None]) -> None:
+        """deliver(message, edited) is called for every new or edited bot message in the chat."""
+        self._chats[chat_id] = deliver
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def push_update(self, update: dict) -> int:
+        update_id = next(self._update_ids)
+        self._updates.put_nowait({'update_id': update_id, **update})
+        return update_id
+
+    async def _handle_bot_api(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        # Bot API accepts both urlencoded and multipart (photo upload); the simulation needs no files
+        params = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+        if self._latency and method != 'getUpdates':
+            await asyncio.sleep(self._latency)
+        handler = self._methods.get(method)
+        try:
+            result = await handler(params) if handler else True
+        except _ApiError as e:
+            return web.json_response({'ok': False, 'error_code': 400, 'description': f"Bad Request: {e.description}"}, status=400)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _handle_reverse(self, request: web.Request) -> web.Response:
+        self.calls['nominatim/reverse'] += 1
+        lat, lon = float(request.query['lat']), float(request.query['lon'])
+        house = int(abs(lat * 10_000 + lon * 10_000)) % 200 + 1
+        return web.json_response({'display_name': f"вулиця Симуляційна, {house}, Суми", 'lat': str(lat), 'lon': str(lon)})
+
+    async def _get_me(self, params: dict) -> dict:
+        return self._bot_user
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        try:
+            first = await asyncio.wait_for(self._updates.get(), float(params.get('timeout') or 0) or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        limit = int(params.get('limit') or 100)
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def _deliver(self, message: dict, edited: bool) -> dict:
+        deliver = self._chats.get(message['chat']['id'])
+        if deliver is not None:
+            deliver(message, edited)
+        return message
+
+    def _new_message(self, params: dict, **content) -> dict:
+        chat_id = int(params['chat_id'])
+        markup = json.loads(params['reply_markup']) if params.get('reply_markup') else {}
+        if 'inline_keyboard' in markup:
+            content['reply_markup'] = markup
+        message = {
+            'message_id': self.next_message_id(), 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': self._bot_user, **content
+        }
+        self._messages[(chat_id, message['message_id'])] = message
+        return self._deliver(message, edited=False)
+
+    async def _send_message(self, params: dict) -> dict:
+        return self._new_message(params, text=params['text'])
+
+    async def _send_photo(self, params: dict) -> dict:
+        return self._new_message(params, caption=params.get('caption', ''), photo=[{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}])
+
+    async def _send_location(self, params: dict) -> dict:
+        return self._new_message(params, location={'latitude': float(params['latitude']), 'longitude': float(params['longitude'])})
+
+    def _edited(self, params: dict, **changes) -> dict:
+        message = self._messages.get((int(params['chat_id']), int(params['message_id'])))
+        if message is None:
+            raise _ApiError("message to edit not found")
+        markup = json.loads(params['reply_markup']) if params.get('reply_markup') else None
+        updated = {key: value for key, value in message.items() if key != 'reply_markup'}
+        updated.update(changes)
+        if markup and 'inline_keyboard' in markup:
+            updated['reply_markup'] = markup
+        if updated == {key: value for key, value in message.items() if key != 'edit_date'}:
+            raise _ApiError("message is not modified")
+        updated['edit_date'] = int(time.time())
+        self._messages[(updated['chat']['id'], updated['message_id'])] = updated
+        return self._deliver(updated, edited=True)
+
+    async def _edit_message_text(self, params: dict) -> dict:
+        message = self._messages.get((int(params['chat_id']), int(params['message_id'])))
+        if message is not None and 'text' not in message:
+            raise _ApiError("there is no text in the message to edit")
+        return self._edited(params, text=params['text'])
+
+    async def _edit_message_reply_markup(self, params: dict) -> dict:
+        return self._edited(params)
+
+    async def _delete_message(self, params: dict) -> bool:
+        self._messages.pop((int(params['chat_id']), int(params['message_id'])), None)
+        return True
+
+
+class _TimingMiddleware(BaseMiddleware):
+    """Outer update middleware: update processing time labelled with the flow step."""
+
+    def __init__(self, labels: dict[int, str], latencies: dict[str, list[float]]):
+        self._labels = labels
+        self._latencies = latencies
+
+    async def __call__(self, handler, event: Update, data: dict) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self._latencies[self._labels.pop(event.update_id, 'other')].append(time.perf_counter() - started)
+
+
+class _Participant:
+    """A Telegram user in the simulation: sends updates and receives the bot's messages."""
+
+    def __init__(self, sim: 'Simulation', user_id: int, first_name: str):
+        self.sim = sim
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': first_name}
+        self.position = sim.random_point()
+        self._events: asyncio.Queue[tuple[dict, bool]] = asyncio.Queue()
+        sim.api.register_chat(user_id, lambda message, edited: self._events.put_nowait((message, edited)))
+
+    @property
+    def id(self) -> int:
+        return self.user['id']
+
+    def _message(self, **content) -> dict:
+        return {
+            'message_id': self.sim.api.next_message_id(), 'date': int(time.time()),
+            'chat': {'id': self.id, 'type': 'private', 'first_name': self.user['first_name']},
+            'from': self.user, **content
+        }
+
+    def send(self, label: str, **content) -> dict:
+        message = self._message(**content)
+        self.sim.labels[self.sim.api.push_update({'message': message})] = label
+        return message
+
+    def edit(self, label: str, message: dict, **content) -> None:
+        edited = {**message, **content, 'edit_date': int(time.time())}
+        self.sim.labels[self.sim.api.push_update({'edited_message': edited})] = label
+
+    def press(self, label: str, message: dict, data: str) -> None:
+        callback = {
+            'id': str(self.sim.api.next_message_id()), 'from': self.user,
+            'chat_instance': str(self.id), 'message': message, 'data': data
+        }
+        self.sim.labels[self.sim.api.push_update({'callback_query': callback})] = label
+
+    async def expect(self, predicate: Callable[[dict], bool], timeout: float) -> dict:
+        """Waits for a bot message (or edit) satisfying predicate; skips the others."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            message, _ = await asyncio.wait_for(self._events.get(), max(0.0, deadline - loop.time()))
+            if predicate(message):
+                return message
+
+
+class SimClient(_Participant):
+    """Client: orders a taxi with buttons, waits for a driver and rates the ride."""
+
+    async def _step(self, label: str, marker: str, **content) -> dict:
+        self.send(label, **content)
+        try:
+            reply = await self.expect(lambda message: marker in _text(message), self.sim.profile.step_timeout)
+        except asyncio.TimeoutError:
+            self.sim.report.failed_steps[label] += 1
+            raise
+        await asyncio.sleep(self.sim.rng.expovariate(1 / self.sim.profile.client_think) if self.sim.profile.client_think else 0)
+        return reply
+
+    async def order_taxi(self) -> None:
+        profile, report = self.sim.profile, self.sim.report
+        lat, lon = self.position
+        try:
+            await self._step('client:/start', 'Привіт', text='/start')
+            await self._step('client:order_button', 'Крок 1', text='🚕 Замовити таксі')
+            await self._step('client:pickup_location', 'Крок 2', location={'latitude': lat, 'longitude': lon})
+            await self._step('client:clarify_destination', 'Ваш контакт', text='📍 Уточнити водієві')
+            await self._step('client:phone', 'Коментар до замовлення', text=f"+380{self.id % 10**9:09d}")
+            await self._step('client:no_comment', 'Підтвердження замовлення', text='Без коментаря')
+
+            self.send('client:confirm', text='Створити замовлення 🏁')
+            report.orders_created += 1
+            started = time.monotonic()
+            reply = await self.expect(
+                lambda message: bool(_MATCHED.search(_text(message))) or any(marker in _text(message) for marker in _UNMATCHED),
+                profile.match_timeout
+            )
+            if not _MATCHED.search(_text(reply)):
+                report.unmatched += 1
+                return
+            report.time_to_match.append(time.monotonic() - started)
+            report.matched += 1
+
+            ride_timeout = profile.driver_think * 3 + profile.pickup + profile.ride + profile.step_timeout * 3
+            rating = await self.expect(lambda message: _find_button(message, RatingCallbackData, score=5) is not None, ride_timeout)
+            self.press('client:rate_driver', rating, _find_button(rating, RatingCallbackData, score=5))
+            comment = await self.expect(lambda message: _find_button(message, Navigate, to='skip_driver_comment') is not None, profile.step_timeout)
+            self.press('client:skip_comment', comment, _find_button(comment, Navigate, to='skip_driver_comment'))
+        except asyncio.TimeoutError:
+            # The client abandons a stuck flow; the next order starts with /start
+            return
+        finally:
+            self.sim.idle_clients.append(self)
+
+
+class SimDriver(_Participant):
+    """Driver: starts a shift, broadcasts the live location, accepts orders and drives clients."""
+
+    def __init__(self, sim: 'Simulation', user_id: int, first_name: str):
+        super().__init__(sim, user_id, first_name)
+        self.state = 'off'
+        self._accepting_message_id: int | None = None
+        self._live_message: dict | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start_shift(self) -> None:
+        lat, lon = self.position
+        self.send('driver:start_shift', text='🚀 Почати зміну')
+        await self.expect(lambda message: 'трансляцію' in _text(message), self.sim.profile.step_timeout)
+        self._live_message = self.send('driver:live_location', location={'latitude': lat, 'longitude': lon, 'live_period': LIVE_PERIOD})
+        await self.expect(lambda message: 'Трансляцію отримано' in _text(message), self.sim.profile.step_timeout)
+        self.state = 'idle'
+
+    async def run(self) -> None:
+        """Reacts to bot messages and periodically updates the live location."""
+        self._spawn(self._stream_location())
+        while True:
+            message, edited = await self._events.get()
+            self._spawn(self._react(message, edited))
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _stream_location(self) -> None:
+        rng = self.sim.rng
+        while True:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * self.sim.profile.location_interval)
+            lat, lon = self.position
+            self.position = (lat + rng.uniform(-0.002, 0.002), lon + rng.uniform(-0.002, 0.002))
+            self.edit('driver:live_location_update', self._live_message,
+                      location={'latitude': self.position[0], 'longitude': self.position[1], 'live_period': LIVE_PERIOD})
+
+    async def _react(self, message: dict, edited: bool) -> None:
+        profile, rng = self.sim.profile, self.sim.rng
+        think = rng.expovariate(1 / profile.driver_think) if profile.driver_think else 0
+
+        offer = None if edited else _find_button(message, OrderCallbackData, action='accept')
+        if offer:
+            order_id = OrderCallbackData.unpack(offer).order_id
+            if self.state == 'idle' and rng.random() >= profile.reject_rate:
+                self.state, self._accepting_message_id = 'accepting', message['message_id']
+                await asyncio.sleep(think)
+                self.press('driver:accept', message, offer)
+            else:
+                await asyncio.sleep(think)
+                self.press('driver:reject', message, OrderCallbackData(action='reject_by_driver', order_id=order_id).pack())
+            return
+
+        if arrived := _find_button(message, OrderCallbackData, action='driver_arrived'):
+            self.state = 'busy'
+            await asyncio.sleep(profile.pickup)
+            self.press('driver:arrived', message, arrived)
+        elif embarked := _find_button(message, OrderCallbackData, action='client_embarked'):
+            await asyncio.sleep(think)
+            self.press('driver:client_embarked', message, embarked)
+        elif finish := _find_button(message, OrderCallbackData, action='finish_by_driver'):
+            await asyncio.sleep(profile.ride)
+            self.press('driver:finish', message, finish)
+        elif skip := _find_button(message, DriverRateClientCallback, score=0):
+            self.press('driver:skip_client_rating', message, skip)
+            self.sim.report.completed += 1
+            self.state = 'idle'
+        elif edited and self.state == 'accepting' and message['message_id'] == self._accepting_message_id:
+            # The offer was edited without ride buttons - the order went to someone else or was cancelled
+            self.state = 'idle'
+
+
+class Simulation:
+    """One run: the bot on FakeBotAPI, a driver fleet and clients with a Poisson stream of orders."""
+
+    def __init__(self, profile: LoadProfile):
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.api = FakeBotAPI(latency=profile.api_latency)
+        self.report = SimulationReport(profile)
+        self.labels: dict[int, str] = {}
+        self.idle_clients: list[SimClient] = []
+
+    def random_point(self) -> tuple[float, float]:
+        lat, lon = CITY_CENTER
+        return lat + self.rng.uniform(-CITY_SPREAD, CITY_SPREAD), lon + self.rng.uniform(-CITY_SPREAD, CITY_SPREAD)
+
+    def _build_dispatcher(self) -> Dispatcher:
+        """A dispatcher as in main.py, with an outer timing middleware on top of the others."""
+        dp = Dispatcher(storage=fsm_storage)
+        main_router, admin_router, errors_router = setup_routers()
+        dp.include_router(admin_router)
+        dp.include_router(main_router)
+        dp.include_router(errors_router)
+        dp.update.outer_middleware(_TimingMiddleware(self.labels, self.report.handler_latency))
+        dp.message.middleware(BanMiddleware())
+        dp.update.outer_middleware(LoggingMiddleware())
+        dp.update.outer_middleware(ActivityMiddleware())
+        dp.callback_query.middleware(BanMiddleware())
+        return dp
+
+    async def _arrivals(self) -> set[asyncio.Task]:
+        """Poisson stream of orders from free clients during profile.duration."""
+        orders = set()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.profile.duration
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.profile.rate))
+            if loop.time() >= deadline:
+                return orders
+            if not self.idle_clients:
+                self.report.failed_steps['client:no_idle_client'] += 1
+                continue
+            client = self.idle_clients.pop(self.rng.randrange(len(self.idle_clients)))
+            orders.add(asyncio.create_task(client.order_taxi()))
+
+    async def run(self, db_path: Path) -> SimulationReport:
+        profile = self.profile
+        await self.api.start()
+        saved_providers = geocoder.providers
+        geocoder.providers = [NominatimProvider(self.api.url, rate=None)]
+        if db_path.exists():
+            # Drivers from a ready database (e.g. from synthetic_data) do not answer offers - take them off shift
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("UPDATE drivers SET isWorking = 0, is_available = 0 WHERE isWorking = 1")
+        try:
+            async with open_database(db_path):
+                drivers = [SimDriver(self, SIM_DRIVER_ID_BASE + i, f"Водій {i}") for i in range(profile.drivers)]
+                self.idle_clients = [SimClient(self, SIM_CLIENT_ID_BASE + i, f"Клієнт {i}") for i in range(profile.clients)]
+                for driver in drivers:
+                    await db_queries.register_driver(driver.id, driver.user['first_name'], None, f"+380{driver.id % 10**9:09d}", f"AA{driver.id % 10_000:04d}BB")
+
+                dp = self._build_dispatcher()
+                await fsm_storage.start()
+                dispatch_timers.start()
+                bot = Bot(SIM_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(self.api.url)),
+                          default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+                bot.session.middleware(outbound_scheduler)
+                polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False))
+                try:
+                    await asyncio.gather(*(driver.start_shift() for driver in drivers))
+                    for driver in drivers:
+                        driver._spawn(driver.run())
+
+                    started = time.monotonic()
+                    orders = await self._arrivals()
+                    if orders:
+                        drain = profile.match_timeout + profile.pickup + profile.ride + profile.step_timeout * 4
+                        await asyncio.wait(orders, timeout=drain)
+                    self.report.elapsed = time.monotonic() - started
+                finally:
+                    for driver in drivers:
+                        driver.stop()
+                    await dp.stop_polling()
+                    await polling
+                    await dispatch_timers.stop()
+                    await fsm_storage.close()
+                    self.report.db_pool = db_pool.stats()
+                    self.report.write_queue = write_queue.stats()
+        finally:
+            geocoder.providers = saved_providers
+            await geocoder.close()
+            await self.api.stop()
+        self.report.api_calls = self.api.calls
+        self.report.outbound = outbound_scheduler.stats()
+        return self.report
+
+
+async def run_simulation(profile: LoadProfile, db_path: Path) -> SimulationReport:
+    """
+    Runs the simulation with the load profile on the database db_path (created if missing).
+
+    The handlers routers attach to a dispatcher once per process, so only one
+    simulation can run in a process.
+    """
+    return await Simulation(profile).run(db_path)
+
+
+def format_report(report: SimulationReport) -> str:
+    profile, elapsed = report.profile, report.elapsed or 1.0
+    lines = [
+        f"Навантаження: {profile.drivers} водіїв, {profile.clients} клієнтів, {profile.rate} замовл./с протягом {profile.duration:.0f} с; "
+        f"стратегія {DISPATCH_STRATEGY}, таймаут пропозиції {DRIVER_ACCEPT_TIMEOUT} с",
+        f"Замовлення: створено {report.orders_created}, призначено {report.matched}, завершено {report.completed}, "
+        f"без водія {report.unmatched} за {report.elapsed:.1f} с",
+        f"Пропускна здатність: {report.orders_created / elapsed:.2f} створених і {report.matched / elapsed:.2f} призначених замовл./с",
+    ]
+    if report.failed_steps:
+        lines.append("Зірвані кроки: " + ", ".join(f"{label} {count}" for label, count in report.failed_steps.most_common()))
+    if report.time_to_match:
+        stats = summarize(report.time_to_match)
+        lines.append("Час до призначення водія (мс): " + ", ".join(f"{metric} {stats[metric]:.0f}" for metric in ('p50', 'p90', 'p99', 'max')))
+
+    lines.append("\nОбробка апдейтів (мс):")
+    width = max((len(label) for label in report.handler_latency), default=10)
+    lines.append(f"  {'крок':<{width}}  {'n':>6}  {'p50':>8}  {'p90':>8}  {'p99':>8}  {'max':>8}")
+    for label, latencies in sorted(report.handler_latency.items()):
+        stats = summarize(latencies)
+        lines.append(f"  {label:<{width}}  {stats['n']:>6}  {stats['p50']:>8.2f}  {stats['p90']:>8.2f}  {stats['p99']:>8.2f}  {stats['max']:>8.2f}")
+
+    lines.append("\nОчікування з'єднань БД:")
+    for kind in ('read', 'write'):
+        stats = report.db_pool.get(kind, {})
+        lines.append(f"  {kind}: отримано {stats.get('acquired', 0)}, чекали {stats.get('waited', 0)}, "
+                     f"середнє {stats.get('avg_wait_ms', 0):.2f} мс, максимум {stats.get('max_wait_ms', 0):.2f} мс")
+    lines.append(f"  черга запису: {report.write_queue}")
+    lines.append("\nВихідні повідомлення (черги пріоритетів, очікування в с):")
+    for priority, stats in report.outbound.get('lanes', {}).items():
+        lines.append(f"  {priority}: надіслано {stats['served']}, середнє {stats['avg_wait']}, максимум {stats['max_wait']}")
+    lines.append(f"  чекали на ліміт чату {report.outbound.get('chat_waits', 0)}, повторів після 429 {report.outbound.get('retry_after', 0)}")
+    lines.append("\nВиклики Bot API: " + ", ".join(f"{method} {count}" for method, count in report.api_calls.most_common()))
+    return "\n".join(lines)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    profile = LoadProfile(**{name: getattr(args, name) for name in LoadProfile.__dataclass_fields__})
+    db_path = Path(args.db)
+    if args.fresh:
+        for path in db_path.parent.glob(db_path.name + '*'):
+            path.unlink()
+    report = await run_simulation(profile, db_path)
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Навантажувальна симуляція бота з локальним Bot API")
+    parser.add_argument('--db', default='benchmarks/load.db', help="база для симуляції (наприклад, згенерована synthetic_data)")
+    parser.add_argument('--fresh', action='store_true', help="видалити базу перед запуском")
+    for name, default in LoadProfile().__dict__.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument('--log-level', default='WARNING', help="рівень логів бота під час симуляції")
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    asyncio.run(_main(args))
@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import inspect
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple
+
+from database import queries
+from database.pool import db_pool
+from benchmarks.synthetic_data import TEST_SCALE, Scale, open_database, populate
+
+# Query plan check for the database/queries.py module.
+#
+# Every public function of queries.py is called on a synthetic database (see _calls()), all
+# statements it runs through the pool are captured by SQL tracing, and EXPLAIN QUERY PLAN
+# is run for each of them. The report lists:
+#   - full table scans (SCAN) and automatic indexes - errors unless the scan
+#     is declared expected in EXPECTED_SCANS;
+#   - partially used indexes: the query compares more columns of the table
+#     that the index lacks - candidates for composite indexes;
+#   - sorts in a temporary B-tree;
+#   - schema indexes that no query uses.
+#
+# Usage: python -m benchmarks.query_plans [--db path] [--orders N ...]
+
+# Functions that do not touch the DB (in-memory state or stubs)
+NO_SQL = frozenset({'is_driver_on_shift', 'get_full_user_info'})
+
+# Expected full scans: (function, table) -> reason. '*' means any table.
+EXPECTED_SCANS = {
+    ('rebuild_driver_state', 'drivers'): "загрузка всех водителей в геоиндекс при старте",
+    ('reconcile_stats_counters', '*'): "эталонные COUNT(*) для сверки счетчиков (раз в час)",
+    ('get_clients_count', 'users'): "подстрочный поиск LIKE '%...%' / количество всех клиентов (кешируется)",
+    ('get_clients_page', 'users'): "подстрочный поиск LIKE '%...%' по имени и телефону",
+    ('get_drivers_count', 'drivers'): "количество всех водителей (кешируется)",
+    ('get_drivers_kpi_page', 'drivers'): "рейтинг всех водителей по агрегатам за период",
+    ('get_newsletter_audience_count', '*'): "количество получателей рассылки (при ее подготовке)",
+}
+# Tables of a few rows (newsletter jobs - dozens), where a scan is cheaper than any index
+SMALL_TABLES = frozenset({'admins', 'stats_counters', 'newsletter_jobs'})
+
+_SKIP_STATEMENT = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|ANALYZE|--)', re.IGNORECASE)
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|SET\b|JOIN\b|LEFT\b|INNER\b|GROUP\b|ORDER\b|LIMIT\b|VALUES\b)(\w+))?', re.IGNORECASE)
+_STEP = re.compile(
+    r'^(?P<op>SCAN|SEARCH) (?P<alias>\S+)(?: USING (?P<kind>(?:AUTOMATIC )?(?:COVERING )?INDEX|INTEGER PRIMARY KEY|PRIMARY KEY)'
+    r'(?: (?P<index>\w+))?)?(?: \((?P<constraints>[^)]*)\))?'
+)
+_CONSTRAINT_COLUMN = re.compile(r'(\w+)\s*(?:=|>|<|>=|<=)')
+# Comparisons an index can serve; the right side is not a column of another table (a JOIN condition)
+_COMPARISON = r'(?:<=|>=|=|<|>|\bBETWEEN\b|\bIN\b)(?!\s*\w+\.\w)'
+
+
+class PlanStep(NamedTuple):
+    function: str
+    table: str
+    detail: str
+    sql: str
+
+
+class Suggestion(NamedTuple):
+    function: str
+    table: str
+    used: str
+    columns: tuple[str, ...]
+    sql: str
+
+
+@dataclass
+class PlanReport:
+    """Check result: what was run and which problems were found."""
+    statements: dict[str, list[str]] = field(default_factory=dict)
+    unexpected_scans: list[PlanStep] = field(default_factory=list)
+    expected_scans: list[PlanStep] = field(default_factory=list)
+    partial_indexes: list[Suggestion] = field(default_factory=list)
+    temp_sorts: list[PlanStep] = field(default_factory=list)
+    used_indexes: set[str] = field(default_factory=set)
+    unused_indexes: list[str] = field(default_factory=list)
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Samples:
+    """IDs from the synthetic database the functions are called with."""
+    client_id: int
+    driver_id: int
+    order_id: int
+    completed_order_id: int
+    rejected_order_id: int
+    spare_id: int
+
+
+def sample_ids(conn: sqlite3.Connection) -> Samples:
+    def one(sql: str) -> int:
+        row = conn.execute(sql).fetchone()
+        return row[0] if row and row[0] is not None else 0
+
+    return Samples(
+        # The most active client and driver - the worst case for their lists
+        client_id=one("SELECT client_id FROM orders GROUP BY client_id ORDER BY COUNT(*) DESC LIMIT 1"),
+        driver_id=one("SELECT driver_id FROM orders WHERE driver_id IS NOT NULL GROUP BY driver_id ORDER BY COUNT(*) DESC LIMIT 1"),
+        order_id=one("SELECT id FROM orders WHERE status = 'searching' LIMIT 1"),
+        completed_order_id=one("SELECT id FROM orders WHERE status = 'completed' ORDER BY id DESC LIMIT 1"),
+        rejected_order_id=one("SELECT order_id FROM driver_rejections LIMIT 1"),
+        spare_id=one("SELECT MAX(user_id) FROM users") + 1000,
+    )
+
+
+def _calls(s: Samples) -> dict[str, list[Callable[[], Awaitable]]]:
+    """Calls of every public function of queries.py (several variants for different SQL branches)."""
+    now = datetime.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    q = queries
+    return {
+        'is_admin': [lambda: q.is_admin(s.client_id)],
+        'is_user_admin': [lambda: q.is_user_admin(s.spare_id + 1)],
+        'is_driver': [lambda: q.is_driver(s.driver_id)],
+        'is_user_banned': [lambda: q.is_user_banned(s.client_id)],
+        'add_or_update_user': [lambda: q.add_or_update_user(s.spare_id, "Новий клієнт", None)],
+        'update_user_activity': [lambda: q.update_user_activity(s.client_id)],
+        'update_users_activity_batch': [lambda: q.update_users_activity_batch([(s.client_id, now)])],
+        'update_client_phone': [lambda: q.update_client_phone(s.spare_id, "+380000000000")],
+        'register_driver': [lambda: q.register_driver(s.spare_id + 1, "Новий водій", None, "+380000000001", "AA0000AA")],
+        'update_driver_details': [lambda: q.update_driver_details(s.spare_id + 1, 'full_name', "Водій")],
+        'delete_driver': [lambda: q.delete_driver(s.spare_id + 2)],
+        'update_driver_location': [lambda: q.update_driver_location(s.driver_id, 50.9, 34.8)],
+        'save_driver_locations_batch': [lambda: q.save_driver_locations_batch([(s.driver_id, 50.9, 34.8, now)])],
+        'get_driver_location': [lambda: q.get_driver_location(s.driver_id)],
+        'start_driver_shift': [lambda: q.start_driver_shift(s.spare_id + 1)],
+        'stop_driver_shift': [lambda: q.stop_driver_shift(s.spare_id + 1)],
+        'set_driver_availability': [lambda: q.set_driver_availability(s.driver_id, True)],
+        'create_order_in_db': [lambda: q.create_order_in_db(s.client_id, {}, 'searching')],
+        'update_order_status': [lambda: q.update_order_status(s.spare_id, 'searching')],
+        'cancel_searching_order': [lambda: q.cancel_searching_order(s.spare_id, 'cancelled_by_user')],
+        'get_order_details': [lambda: q.get_order_details(s.order_id)],
+        'get_full_order_details': [lambda: q.get_full_order_details(s.order_id)],
+        'get_order_client_id': [lambda: q.get_order_client_id(s.order_id)],
+        'get_order_finish_address': [lambda: q.get_order_finish_address(s.order_id, s.client_id)],
+        'get_working_driver_ids': [
+            lambda: q.get_working_driver_ids(s.order_id, 50.9, 34.8),
+            lambda: q.get_working_driver_ids(s.order_id, None, None, excluded_driver_id=s.driver_id),
+        ],
+        'rebuild_driver_state': [lambda: q.rebuild_driver_state()],
+        'start_order_dispatch': [lambda: q.start_order_dispatch(s.spare_id, [s.driver_id], '{}')],
+        'get_dispatch_payload': [lambda: q.get_dispatch_payload(s.order_id)],
+        'get_dispatch_info': [lambda: q.get_dispatch_info(s.order_id)],
+        'increment_dispatch_index': [lambda: q.increment_dispatch_index(s.spare_id)],
+        'mark_dispatch_offer_sent': [lambda: q.mark_dispatch_offer_sent(s.spare_id)],
+        'advance_dispatch_index': [lambda: q.advance_dispatch_index(s.spare_id, 0)],
+        'get_next_dispatch_wave': [lambda: q.get_next_dispatch_wave(s.order_id)],
+        'add_dispatch_offers': [lambda: q.add_dispatch_offers(s.spare_id, 0, [(s.driver_id, 1, None)])],
+        'count_pending_dispatch_offers': [lambda: q.count_pending_dispatch_offers(s.order_id)],
+        'reject_dispatch_offer': [lambda: q.reject_dispatch_offer(s.spare_id, s.driver_id)],
+        'expire_dispatch_offers': [lambda: q.expire_dispatch_offers(s.spare_id, 0)],
+        'settle_dispatch_offers': [lambda: q.settle_dispatch_offers(s.spare_id, s.driver_id)],
+        'get_searching_dispatches': [lambda: q.get_searching_dispatches()],
+        'accept_order': [lambda: q.accept_order(s.spare_id, s.driver_id)],
+        'revert_order_to_searching': [lambda: q.revert_order_to_searching(s.spare_id, s.driver_id)],
+        'finish_order': [lambda: q.finish_order(s.spare_id, s.driver_id)],
+        'get_current_driver_for_order': [lambda: q.get_current_driver_for_order(s.order_id)],
+        'get_upcoming_preorders': [lambda: q.get_upcoming_preorders()],
+        'get_pending_dispatch_orders': [lambda: q.get_pending_dispatch_orders()],
+        'mark_preorder_reminder_sent': [lambda: q.mark_preorder_reminder_sent(s.spare_id)],
+        'get_available_preorders_count': [lambda: q.get_available_preorders_count(now, now + timedelta(days=7))],
+        'get_available_preorders_page': [
+            lambda: q.get_available_preorders_page(5, 0, now, now + timedelta(days=7)),
+            lambda: q.get_available_preorders_page(5, 5, now, now + timedelta(days=7), cursor=f">{s.spare_id}"),
+        ],
+        'accept_preorder': [lambda: q.accept_preorder(s.spare_id, s.driver_id)],
+        'get_my_preorders_count': [lambda: q.get_my_preorders_count(s.driver_id)],
+        'get_my_preorders_page': [lambda: q.get_my_preorders_page(5, 0, s.driver_id)],
+        'cancel_preorder_by_driver': [lambda: q.cancel_preorder_by_driver(s.spare_id, s.driver_id)],
+        'rate_order': [lambda: q.rate_order(s.spare_id, 5, None)],
+        'add_rating_to_driver': [lambda: q.add_rating_to_driver(s.spare_id, 5)],
+        'add_client_review': [lambda: q.add_client_review(s.spare_id, s.client_id, s.driver_id, 5, None)],
+        'add_rating_to_client': [lambda: q.add_rating_to_client(s.spare_id, 5)],
+        'get_order_for_rating': [lambda: q.get_order_for_rating(s.completed_order_id)],
+        'get_client_rating': [lambda: q.get_client_rating(s.client_id)],
+        'get_client_reviews_for_driver': [lambda: q.get_client_reviews_for_driver(s.client_id)],
+        'get_driver_cabinet_data': [lambda: q.get_driver_cabinet_data(s.driver_id)],
+        'get_driver_reviews_count': [lambda: q.get_driver_reviews_count(s.driver_id)],
+        'get_driver_reviews_page': [lambda: q.get_driver_reviews_page(5, 0, s.driver_id)],
+        'record_driver_rejection': [lambda: q.record_driver_rejection(s.spare_id, s.spare_id)],
+        'get_driver_rejections_count': [lambda: q.get_driver_rejections_count(s.driver_id)],
+        'get_driver_rejections_page': [lambda: q.get_driver_rejections_page(5, 0, s.driver_id)],
+        'get_rejected_order_details_for_driver': [
+            lambda: q.get_rejected_order_details_for_driver(s.rejected_order_id, s.driver_id)
+        ],
+        'get_driver_orders_count': [lambda: q.get_driver_orders_count(s.driver_id)],
+        'get_driver_orders_page': [
+            lambda: q.get_driver_orders_page(5, 0, s.driver_id),
+            lambda: q.get_driver_orders_page(5, 5, s.driver_id, cursor=f">{s.completed_order_id}"),
+            lambda: q.get_driver_orders_page(5, 0, s.driver_id, cursor=f"<{s.completed_order_id}"),
+        ],
+        'get_driver_trip_details': [lambda: q.get_driver_trip_details(s.completed_order_id, s.driver_id)],
+        'get_client_stats': [lambda: q.get_client_stats(s.client_id)],
+        'increment_client_finish_count': [lambda: q.increment_client_finish_count(s.spare_id)],
+        'get_user_orders_count': [lambda: q.get_user_orders_count(s.client_id)],
+        'get_user_orders_page': [lambda: q.get_user_orders_page(5, 0, s.client_id)],
+        'get_trip_details': [lambda: q.get_trip_details(s.completed_order_id, s.client_id)],
+        'get_user_fav_addresses': [lambda: q.get_user_fav_addresses(s.client_id)],
+        'get_fav_address_by_name': [lambda: q.get_fav_address_by_name(s.client_id, "Адреса 0")],
+        'add_fav_address': [lambda: q.add_fav_address(s.spare_id, "Дім", "вул. Соборна, 1", None, None)],
+        'delete_fav_address': [lambda: q.delete_fav_address(s.spare_id, s.spare_id)],
+        'get_all_admins': [lambda: q.get_all_admins()],
+        'add_admin': [lambda: q.add_admin(s.spare_id)],
+        'remove_admin': [lambda: q.remove_admin(s.spare_id)],
+        'set_admin_status': [lambda: q.set_admin_status(s.spare_id, False)],
+        'ban_user': [lambda: q.ban_user(s.spare_id)],
+        'unban_user': [lambda: q.unban_user(s.spare_id)],
+        'get_main_stats': [lambda: q.get_main_stats()],
+        'reconcile_stats_counters': [lambda: q.reconcile_stats_counters()],
+        'get_kpi_summary': [
+            lambda: q.get_kpi_summary(day_start - timedelta(days=29), day_start + timedelta(days=1)),
+            lambda: q.get_kpi_summary(now - timedelta(hours=3), now),
+        ],
+        'get_drivers_kpi_page': [lambda: q.get_drivers_kpi_page(5, 0, day_start - timedelta(days=6), day_start + timedelta(days=1))],
+        'get_drivers_count': [lambda: q.get_drivers_count(), lambda: q.get_drivers_count(is_working=True)],
+        'get_drivers_page': [
+            lambda: q.get_drivers_page(5, 0, is_working=True),
+            lambda: q.get_drivers_page(5, 5, is_working=True, cursor=f">{s.driver_id}"),
+        ],
+        'get_driver_details': [lambda: q.get_driver_details(s.driver_id)],
+        'get_clients_count': [lambda: q.get_clients_count(), lambda: q.get_clients_count("Клієнт 1")],
+        'get_clients_page': [
+            lambda: q.get_clients_page(5, 0),
+            lambda: q.get_clients_page(5, 5, cursor=f">{s.client_id}"),
+            lambda: q.get_clients_page(5, 0, search_query="Клієнт 1"),
+        ],
+        'get_client_details': [lambda: q.get_client_details(s.client_id)],
+        'get_client_name': [lambda: q.get_client_name(s.client_id)],
+        'get_orders_count_by_status': [lambda: q.get_orders_count_by_status('searching')],
+        'get_orders_page_by_status': [
+            lambda: q.get_orders_page_by_status('completed', 5, 0),
+            lambda: q.get_orders_page_by_status('completed', 5, 5, cursor=f">{s.completed_order_id}"),
+        ],
+        'get_driver_info_for_client': [lambda: q.get_driver_info_for_client(s.driver_id)],
+        'get_all_orders_count_by_client': [lambda: q.get_all_orders_count_by_client(s.client_id)],
+        'get_all_orders_page_by_client': [lambda: q.get_all_orders_page_by_client(s.client_id, 5, 0)],
+        'get_fsm_records': [lambda: q.get_fsm_records(now.timestamp() - 86400)],
+        'save_fsm_records': [lambda: q.save_fsm_records([("bot:1:1", None, '{}', now.timestamp())], ["bot:2:2"])],
+        'delete_expired_fsm_records': [lambda: q.delete_expired_fsm_records(now.timestamp() - 86400)],
+        'get_geocode_cache_entries': [lambda: q.get_geocode_cache_entries(now.timestamp() - 86400)],
+        'save_geocode_result': [lambda: q.save_geocode_result("вул. соборна, 1", '[]', now.timestamp())],
+        'save_reverse_geocode_result': [lambda: q.save_reverse_geocode_result(50.9, 34.8, "вул. Соборна, 1", 50.9, 34.8, now.timestamp())],
+        'delete_expired_geocode_results': [lambda: q.delete_expired_geocode_results(now.timestamp() - 30 * 86400)],
+        'get_newsletter_audience_count': [lambda: q.get_newsletter_audience_count(audience) for audience in ('all', 'clients', 'drivers')],
+        'create_newsletter_job': [lambda: q.create_newsletter_job('clients', s.client_id, 1, 0)],
+        'get_newsletter_job': [lambda: q.get_newsletter_job(1)],
+        'get_unfinished_newsletter_jobs': [lambda: q.get_unfinished_newsletter_jobs()],
+        'get_newsletter_recipients_page': [
+            lambda: q.get_newsletter_recipients_page(1, audience, s.client_id, 500) for audience in ('all', 'clients', 'drivers')
+        ],
+        'record_newsletter_delivery': [lambda: q.record_newsletter_delivery(1, s.client_id, 'sent')],
+        'save_newsletter_progress': [lambda: q.save_newsletter_progress(1, s.client_id, 1, 0)],
+        'finish_newsletter_job': [lambda: q.finish_newsletter_job(1)],
+    }
+
+
+def query_functions() -> set[str]:
+    """Public coroutines of queries.py - all of them must be in _calls() or NO_SQL."""
+    return {
+        name for name, obj in vars(queries).items()
+        if not name.startswith('_') and inspect.iscoroutinefunction(obj) and obj.__module__ == queries.__name__
+    }
+
+
+def _aliases(sql: str, tables: set[str]) -> dict[str, str]:
+    """Aliases and table names in the query -> table name."""
+    result = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() in tables:
+            result[table.lower()] = table.lower()
+            if alias:
+                result[alias.lower()] = table.lower()
+    return result
+
+
+def _compared_columns(sql: str, alias: str, table: str, columns: set[str], aliases: dict[str, str]) -> list[str]:
+    """Table columns the query compares with anything (alias.col, or bare col if the query has one table)."""
+    unqualified = len(set(aliases.values())) == 1
+    pattern = re.compile(rf'(?:\b(\w+)\.)?\b(\w+)\s*{_COMPARISON}', re.IGNORECASE)
+    found = []
+    for qualifier, column in pattern.findall(sql):
+        column = column.lower()
+        if column not in columns or column in found:
+            continue
+        if (qualifier and qualifier.lower() == alias) or (not qualifier and unqualified):
+            found.append(column)
+    return found
+
+
+class _Explainer:
+    """EXPLAIN QUERY PLAN on a separate sqlite3 connection and parsing of the plan steps."""
+
+    def __init__(self, db_path: Path):
+        self.conn = sqlite3.connect(db_path)
+        self.tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.columns = {
+            table: {row[1].lower() for row in self.conn.execute(f"PRAGMA table_info({table})")} for table in self.tables
+        }
+        self.index_columns = {
+            row[0]: [info[2].lower() if info[2] else None for info in self.conn.execute(f"PRAGMA index_info({row[0]})")]
+            for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+        # Condition columns of partial indexes: rows in the index are already filtered by them
+        self.index_predicates = {
+            name: set(re.findall(r'\w+', re.split(r'\bWHERE\b', sql, maxsplit=1, flags=re.IGNORECASE)[1].lower()))
+            for name, sql in self.conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+            if re.search(r'\bWHERE\b', sql, re.IGNORECASE)
+        }
+
+    def indexes(self) -> list[str]:
+        """Indexes created by the schema (without automatic UNIQUE/PRIMARY KEY indexes)."""
+        return sorted(name for name in self.index_columns if not name.startswith('sqlite_autoindex'))
+
+    def check(self, function: str, sql: str, report: PlanReport) -> None:
+        plan = [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        aliases = _aliases(sql, self.tables)
+        sorted_in_memory = any(detail.startswith('USE TEMP B-TREE FOR ORDER BY') for detail in plan)
+        for detail in plan:
+            if detail.startswith('USE TEMP B-TREE'):
+                report.temp_sorts.append(PlanStep(function, '', detail, sql))
+                continue
+            step = _STEP.match(detail)
+            if not step:
+                continue
+            if step['index']:
+                report.used_indexes.add(step['index'])
+            table = aliases.get(step['alias'].lower())
+            if table is None:
+                continue  # subquery, CTE or CONSTANT ROW
+            plan_step = PlanStep(function, table, detail, sql)
+            if step['op'] == 'SCAN' or (step['kind'] or '').startswith('AUTOMATIC'):
+                if self._scan_is_expected(function, table, step, sql, sorted_in_memory):
+                    report.expected_scans.append(plan_step)
+                else:
+                    report.unexpected_scans.append(plan_step)
+            elif step['kind'] and 'INDEX' in step['kind']:
+                self._check_partial(function, table, step, sql, aliases, report)
+
+    def _scan_is_expected(self, function: str, table: str, step: re.Match, sql: str, sorted_in_memory: bool) -> bool:
+        if table in SMALL_TABLES or (function, table) in EXPECTED_SCANS or (function, '*') in EXPECTED_SCANS:
+            return True
+        # Walking an index in sort order with LIMIT reads only the needed page
+        return (
+            step['kind'] is not None and not step['kind'].startswith('AUTOMATIC') and not sorted_in_memory
+            and re.search(r'\bLIMIT\b', sql, re.IGNORECASE) is not None
+            and re.search(r'\bORDER BY\b', sql, re.IGNORECASE) is not None
+        )
+
+    def _check_partial(self, function: str, table: str, step: re.Match, sql: str,
+                       aliases: dict[str, str], report: PlanReport) -> None:
+        indexed = [column for column in self.index_columns.get(step['index'], []) if column]
+        indexed += self.index_predicates.get(step['index'], ())
+        compared = _compared_columns(sql, step['alias'].lower(), table, self.columns[table], aliases)
+        missing = [column for column in compared if column not in indexed]
+        if missing:
+            used = _CONSTRAINT_COLUMN.findall(step['constraints'] or '')
+            report.partial_indexes.append(
+                Suggestion(function, table, step['index'], tuple(dict.fromkeys([*used, *missing])), sql)
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+async def collect_plans(db_path: Path) -> PlanReport:
+    """
+    Calls every function of queries.py on the open database db_path and checks their query plans.
+
+    The pool must be open on db_path (open_database() or the temp_db fixture).
+    """
+    report = PlanReport()
+    explainer = _Explainer(db_path)
+    samples = sample_ids(explainer.conn)
+    captured: list[str] = []
+    await db_pool.set_trace_callback(captured.append)
+    try:
+        for function, variants in _calls(samples).items():
+            for call in variants:
+                captured.clear()
+                try:
+                    await call()
+                except Exception as e:
+                    report.errors[function] = f"{type(e).__name__}: {e}"
+                statements = report.statements.setdefault(function, [])
+                for sql in dict.fromkeys(captured):
+                    if not _SKIP_STATEMENT.match(sql) and sql not in statements:
+                        statements.append(sql)
+    finally:
+        await db_pool.set_trace_callback(None)
+
+    try:
+        for function, statements in report.statements.items():
+            for sql in statements:
+                explainer.check(function, sql, report)
+        report.unused_indexes = [name for name in explainer.indexes() if name not in report.used_indexes]
+    finally:
+        explainer.close()
+    return report
+
+
+def _short(sql: str, width: int = 160) -> str:
+    text = ' '.join(sql.split())
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def format_report(report: PlanReport) -> str:
+    """Text report on the query plans."""
+    total = sum(len(statements) for statements in report.statements.values())
+    lines = [f"Перевірено функцій: {len(report.statements)}, операторів: {total}"]
+    sections = (
+        ("Неочікувані повні проходи (SCAN)", [
+            f"  {s.function}: {s.detail}\n      {_short(s.sql)}" for s in report.unexpected_scans
+        ]),
+        ("Індекси, що використовуються частково (кандидати в складені індекси)", [
+            f"  {s.function}: {s.table} через {s.used} -> ({', '.join(s.columns)})\n      {_short(s.sql)}"
+            for s in report.partial_indexes
+        ]),
+        ("Сортування у тимчасовому B-дереві", [f"  {s.function}: {s.detail}" for s in report.temp_sorts]),
+        ("Невикористані індекси", [f"  {name}" for name in report.unused_indexes]),
+        ("Очікувані повні проходи", [
+            f"  {s.function}: {s.detail} - "
+            f"{EXPECTED_SCANS.get((s.function, s.table)) or EXPECTED_SCANS.get((s.function, '*')) or 'мала таблиця / сторінка з LIMIT'}"
+            for s in report.expected_scans
+        ]),
+        ("Помилки виклику", [f"  {name}: {error}" for name, error in report.errors.items()]),
+    )
+    for title, items in sections:
+        lines.append(f"\n{title}: {len(items)}")
+        lines.extend(dict.fromkeys(items))
+    return "\n".join(lines)
+
+
+async def _main(args: argparse.Namespace) -> int:
+    db_path = Path(args.db)
+    fresh = not db_path.exists()
+    async with open_database(db_path):
+        if fresh:
+            print(f"Генерація синтетичної бази {db_path}...")
+            populate(db_path, Scale(args.clients, args.drivers, args.orders, args.days), seed=args.seed)
+        report = await collect_plans(db_path)
+    print(format_report(report))
+    return 1 if report.unexpected_scans or report.errors else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Перевірка планів запитів database/queries.py")
+    parser.add_argument('--db', default='benchmarks/query_plans.db', help="база для перевірки (створюється, якщо її немає)")
+    parser.add_argument('--clients', type=int, default=TEST_SCALE.clients)
+    parser.add_argument('--drivers', type=int, default=TEST_SCALE.drivers)
+    parser.add_argument('--orders', type=int, default=TEST_SCALE.orders)
+    parser.add_argument('--days', type=int, default=TEST_SCALE.days)
+    parser.add_argument('--seed', type=int, default=42)
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import random
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import database.db as db_module
+from database.geocode_cache import normalize_query, search_scope
+from database.pool import db_pool
+from database.stats_counters import stats_counters_script
+from database.kpi_rollups import kpi_rollups_script
+from database.timestamps import to_epoch
+from utils.geocoder import SUMY_OBLAST_VIEWBOX
+
+# Generator of a synthetic taxi_bot.db for query plan checks and benchmarks.
+#
+# Data is inserted directly through sqlite3 in batches (without the write queue), with a fixed
+# seed: clients with uneven activity, drivers (some on shift, with a location),
+# orders with a mix of statuses, rejections, ratings, reviews, favourite addresses. Timestamps
+# are written in the same formats the bot writes. Counter and KPI rollup triggers are
+# dropped while filling, then the counters and rollups are rebuilt from the history.
+
+CLIENT_ID_BASE = 1_000_000
+DRIVER_ID_BASE = 5_000_000
+# Centre of the service area (Sumy) and coordinate spread in degrees
+CITY_CENTER = (50.9077, 34.7981)
+CITY_SPREAD = 0.08
+
+# Status shares in the order history
+HISTORY_STATUSES = {
+    'completed': 0.78,
+    'cancelled_by_user': 0.14,
+    'cancelled_no_drivers': 0.06,
+    'cancelled_by_admin': 0.02,
+}
+# Number of orders in active statuses per 1000 history orders
+ACTIVE_PER_THOUSAND = {
+    'searching': 1.0,
+    'accepted': 2.0,
+    'pending_dispatch': 0.5,
+    'scheduled': 3.0,
+    'accepted_preorder': 1.5,
+}
+# Relative order frequency by hour of day and by weekday (Mon = 0)
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 10, 8, 6, 6, 7, 7, 6, 7, 9, 11, 12, 10, 8, 6, 4, 2]
+_HOURLY_CUM_WEIGHTS = list(accumulate(HOURLY_WEIGHTS))
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.2, 1.3, 0.9]
+ADDRESSES = ['вул. Соборна', 'вул. Харківська', 'просп. Шевченка', 'вул. Петропавлівська', 'вул. Кірова', 'вул. Прокоф\'єва']
+BATCH_SIZE = 10_000
+
+
+class Scale(NamedTuple):
+    """Size of the synthetic database: numbers of clients, drivers, orders and history depth in days."""
+    clients: int
+    drivers: int
+    orders: int
+    days: int = 180
+
+
+# A small database for query plan tests
+TEST_SCALE = Scale(clients=3000, drivers=150, orders=30_000, days=60)
+# Ready sizes for the generator and benchmarks (production is the expected size of the live database)
+SCALES = {
+    'test': TEST_SCALE,
+    'medium': Scale(clients=20_000, drivers=500, orders=300_000, days=180),
+    'production': Scale(clients=100_000, drivers=2000, orders=3_000_000, days=365),
+}
+
+
+def _timestamp(moment: datetime) -> int:
+    # Unix seconds, as the bot writes created_at, completed_at, scheduled_at etc. (database/timestamps.py)
+    return to_epoch(moment)
+
+
+def _point(rng: random.Random) -> tuple[float, float]:
+    return (
+        round(CITY_CENTER[0] + rng.uniform(-CITY_SPREAD, CITY_SPREAD), 6),
+        round(CITY_CENTER[1] + rng.uniform(-CITY_SPREAD, CITY_SPREAD), 6),
+    )
+
+
+def _address(rng: random.Random) -> str:
+    return f"{rng.choice(ADDRESSES)}, {rng.randint(1, 120)}"
+
+
+def _batches(rows: Iterator[tuple], size: int = BATCH_SIZE) -> Iterator[list[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Generator:
+    """Table rows for the given scale; all random values come from one rng."""
+
+    def __init__(self, scale: Scale, seed: int, now: datetime):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.now = now
+        self.client_ids = [CLIENT_ID_BASE + i for i in range(scale.clients)]
+        self.driver_ids = [DRIVER_ID_BASE + i for i in range(scale.drivers)]
+        # Uneven activity: a small share of clients and drivers makes most of the orders
+        # (cumulative weights, so the choice does not recompute them for every order)
+        self.client_weights = list(accumulate(self.rng.paretovariate(1.2) for _ in self.client_ids))
+        self.driver_weights = list(accumulate(self.rng.paretovariate(2.0) for _ in self.driver_ids))
+        self.working_ids = sorted(self.rng.sample(self.driver_ids, k=max(1, scale.drivers * 3 // 10)))
+        self.working = set(self.working_ids)
+
+    def _random_moment(self, day: datetime | None = None) -> datetime:
+        if day is None:
+            day = self.now - timedelta(days=self.rng.randrange(self.scale.days))
+        hour = self.rng.choices(range(24), cum_weights=_HOURLY_CUM_WEIGHTS)[0]
+        moment = day.replace(hour=hour, minute=self.rng.randrange(60), second=self.rng.randrange(60),
+                             microsecond=self.rng.randrange(1_000_000))
+        return min(moment, self.now - timedelta(minutes=1))
+
+    def _orders_per_day(self) -> Iterator[tuple[datetime, int]]:
+        """History days from oldest to newest and the number of orders on each (by weekday)."""
+        days = [self.now - timedelta(days=offset) for offset in range(self.scale.days - 1, -1, -1)]
+        weights = [WEEKDAY_WEIGHTS[day.weekday()] for day in days]
+        total_weight = sum(weights)
+        assigned = 0
+        for index, (day, weight) in enumerate(zip(days, weights)):
+            count = self.scale.orders - assigned if index == len(days) - 1 else round(self.scale.orders * weight / total_weight)
+            assigned += count
+            yield day, count
+
+    def users(self) -> Iterator[tuple]:
+        for user_id in self.client_ids:
+            created = self.now - timedelta(days=self.rng.randrange(self.scale.days * 2))
+            active = created + (self.now - created) * self.rng.random()
+            yield (user_id, f"Клієнт {user_id}", f"client{user_id}" if self.rng.random() < 0.7 else None,
+                   f"+380{self.rng.randrange(10**8, 10**9)}", _timestamp(created),
+                   _timestamp(active) if self.rng.random() < 0.95 else None, self.rng.randrange(30), self.rng.randrange(5))
+        for user_id in self.driver_ids:
+            yield (user_id, f"Водій {user_id}", None, f"+380{self.rng.randrange(10**8, 10**9)}",
+                   _timestamp(self.now - timedelta(days=self.scale.days)), _timestamp(self._random_moment()), 0, 0)
+
+    def drivers(self) -> Iterator[tuple]:
+        for user_id in self.driver_ids:
+            working = user_id in self.working
+            lat, lon = _point(self.rng)
+            shift_started = self.now - timedelta(minutes=self.rng.randrange(10, 600)) if working else None
+            yield (user_id, f"Водій {user_id}", f"AA{self.rng.randrange(1000, 9999)}BB", f"+380{self.rng.randrange(10**8, 10**9)}",
+                   1 if working else 0, 1 if working and self.rng.random() < 0.8 else 0,
+                   round(self.rng.uniform(3.5, 5.0), 2), self.rng.randrange(200), self.rng.randrange(20),
+                   lat, lon, _timestamp(self.now - timedelta(seconds=self.rng.randrange(600))),
+                   _timestamp(shift_started) if shift_started else None,
+                   _timestamp(self.now - timedelta(days=self.scale.days)))
+
+    def orders(self) -> Iterator[tuple]:
+        """orders rows: (client_id, driver_id, status, addresses, coordinates, rating, time, dispatch)."""
+        statuses, weights = zip(*HISTORY_STATUSES.items())
+        # History is generated day by day so that order ids grow with created_at, as in the live database
+        for day, count in self._orders_per_day():
+            clients = self.rng.choices(self.client_ids, cum_weights=self.client_weights, k=count)
+            drivers = self.rng.choices(self.driver_ids, cum_weights=self.driver_weights, k=count)
+            moments = sorted(self._random_moment(day) for _ in range(count))
+            history = self.rng.choices(statuses, weights=weights, k=count)
+            yield from (
+                self._history_order(client_id, driver_id, status, created)
+                for client_id, driver_id, status, created in zip(clients, drivers, history, moments)
+            )
+
+        for status, per_thousand in ACTIVE_PER_THOUSAND.items():
+            for _ in range(max(1, round(self.scale.orders * per_thousand / 1000))):
+                client_id = self.rng.choices(self.client_ids, cum_weights=self.client_weights)[0]
+                driver_id = self.rng.choice(self.working_ids)
+                created = self.now - timedelta(minutes=self.rng.randrange(1, 30))
+                scheduled = None
+                if status in ('scheduled', 'accepted_preorder'):
+                    created = self.now - timedelta(hours=self.rng.randrange(1, 72))
+                    scheduled = self.now + timedelta(minutes=self.rng.randrange(15, 7 * 24 * 60))
+                yield self._order(
+                    client_id, driver_id if status in ('accepted', 'accepted_preorder') else None, status, created,
+                    scheduled=scheduled, dispatch=status == 'searching'
+                )
+
+    def _history_order(self, client_id: int, driver_id: int, status: str, created: datetime) -> tuple:
+        completed = driver = score = comment = None
+        if status == 'completed':
+            driver = driver_id
+            completed = created + timedelta(minutes=self.rng.randrange(8, 45))
+            if self.rng.random() < 0.6:
+                score = self.rng.choices((5, 4, 3, 2, 1), weights=(70, 18, 6, 3, 3))[0]
+                comment = self.rng.choice(('Дякую!', 'Все добре', 'Запізнився')) if self.rng.random() < 0.25 else None
+        elif status == 'cancelled_by_user' and self.rng.random() < 0.3:
+            driver = driver_id
+        return self._order(client_id, driver, status, created, completed=completed, score=score, comment=comment)
+
+    def _order(self, client_id: int, driver_id: int | None, status: str, created: datetime, *,
+               completed: datetime | None = None, score: int | None = None, comment: str | None = None,
+               scheduled: datetime | None = None, dispatch: bool = False) -> tuple:
+        lat, lon = _point(self.rng)
+        dispatch_ids = ','.join(map(str, self.rng.sample(self.working_ids, k=min(5, len(self.working_ids))))) if dispatch else None
+        return (
+            client_id, driver_id, status, _address(self.rng), _address(self.rng), f"+380{self.rng.randrange(10**8, 10**9)}",
+            lat, lon, 1 if score else 0, score, comment, _timestamp(created),
+            _timestamp(completed) if completed else None, 'taxi',
+            _timestamp(scheduled) if scheduled else None, 0,
+            dispatch_ids, 0 if dispatch else None, _timestamp(self.now - timedelta(seconds=20)) if dispatch else None,
+        )
+
+
+_INSERTS = {
+    'users': "INSERT INTO users (user_id, full_name, username, phone_number, created_at, last_activity, finish_applic, cancel_applic) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    'drivers': "INSERT INTO drivers (user_id, full_name, avto_num, phone_num, isWorking, is_available, rating, rating_count, "
+               "cancelled_count, latitude, longitude, last_location_update, shift_started_at, created_at) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'orders': "INSERT INTO orders (client_id, driver_id, status, begin_address, finish_address, client_phone, latitude, longitude, "
+              "is_rated, rating_score, rating_comment, created_at, completed_at, order_type, scheduled_at, reminder_sent, "
+              "dispatch_driver_ids, dispatch_current_driver_index, dispatch_offer_sent_at) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+
+def _fill_dependent_tables(conn: sqlite3.Connection, gen: _Generator) -> None:
+    """Rejections, client reviews, favourite addresses, admins, FSM and the geocoding cache."""
+    rng, now = gen.rng, gen.now
+    rejections, reviews = [], []
+    rows = conn.execute("SELECT id, client_id, driver_id, status, created_at FROM orders")
+    for order_id, client_id, driver_id, status, created_at in rows:
+        created = datetime.fromtimestamp(created_at)
+        if rng.random() < 0.25:
+            for rejected_by in rng.sample(gen.driver_ids, k=min(len(gen.driver_ids), rng.randint(1, 3))):
+                if rejected_by != driver_id:
+                    rejections.append((order_id, rejected_by, _timestamp(created + timedelta(seconds=rng.randrange(5, 120)))))
+        if status == 'completed' and rng.random() < 0.3:
+            reviews.append((order_id, client_id, driver_id, rng.randint(3, 5), None, _timestamp(created + timedelta(hours=1))))
+        if len(rejections) >= BATCH_SIZE or len(reviews) >= BATCH_SIZE:
+            _flush_dependent(conn, rejections, reviews)
+    _flush_dependent(conn, rejections, reviews)
+
+    favorites = [
+        (client_id, f"Адреса {n}", _address(rng), *_point(rng))
+        for client_id in gen.client_ids if rng.random() < 0.2 for n in range(rng.randint(1, 3))
+    ]
+    conn.executemany("INSERT INTO favorite_addresses (user_id, name, address, latitude, longitude) VALUES (?, ?, ?, ?, ?)", favorites)
+    admins = gen.client_ids[:3]
+    conn.executemany("INSERT INTO admins (user_id) VALUES (?)", [(user_id,) for user_id in admins])
+    conn.executemany("UPDATE users SET is_admin = 1 WHERE user_id = ?", [(user_id,) for user_id in admins])
+
+    stamp = now.timestamp()
+    conn.executemany(
+        "INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+        [(f"bot:{user_id}:{user_id}", None, '{}', stamp - rng.randrange(3 * 86400))
+         for user_id in rng.sample(gen.client_ids, k=len(gen.client_ids) // 10)]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO geocode_cache (query, results, created_at) VALUES (?, ?, ?)",
+        [(f"{search_scope(SUMY_OBLAST_VIEWBOX, language='uk')}|{normalize_query(_address(rng))}", '[]', stamp - rng.randrange(40 * 86400)) for _ in range(len(gen.client_ids) // 5)]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO reverse_geocode_cache (lat_key, lon_key, address, latitude, longitude, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(round(lat, 4), round(lon, 4), _address(rng), lat, lon, stamp - rng.randrange(40 * 86400))
+         for lat, lon in (_point(rng) for _ in range(len(gen.client_ids) // 5))]
+    )
+
+
+def _flush_dependent(conn: sqlite3.Connection, rejections: list, reviews: list) -> None:
+    conn.executemany("INSERT OR IGNORE INTO driver_rejections (order_id, driver_id, rejected_at) VALUES (?, ?, ?)", rejections)
+    conn.executemany(
+        "INSERT INTO client_reviews (order_id, client_id, driver_id, score, comment, created_at) VALUES (?, ?, ?, ?, ?, ?)", reviews
+    )
+    rejections.clear()
+    reviews.clear()
+
+
+def populate(db_path: str | Path, scale: Scale = TEST_SCALE, seed: int = 42) -> None:
+    """
+    Fills a database with an already created schema (see open_database()) with synthetic data.
+
+    The same scale and seed give the same set of rows (timestamps
+    are counted from the moment of the run).
+    """
+    gen = _Generator(scale, seed, datetime.now())
+    conn = sqlite3.connect(db_path)
+    try:
+        triggers = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        for table, rows in (('users', gen.users()), ('drivers', gen.drivers()), ('orders', gen.orders())):
+            for batch in _batches(rows):
+                conn.executemany(_INSERTS[table], batch)
+            conn.commit()
+        _fill_dependent_tables(conn, gen)
+        conn.commit()
+        # Counters and KPI rollups are refilled from the history, the triggers are recreated
+        conn.executescript(
+            "DELETE FROM stats_counters; DELETE FROM kpi_hourly; DELETE FROM kpi_daily;"
+            + stats_counters_script() + kpi_rollups_script()
+        )
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def open_database(db_path: str | Path):
+    """Creates (or opens) the database at db_path via init_db() and opens the pool and write queue on it."""
+    saved_path, saved_pool_path = db_module.DB_PATH, db_pool._db_path
+    db_module.DB_PATH = db_pool._db_path = Path(db_path)
+    try:
+        await db_module.init_db()
+        try:
+            yield Path(db_path)
+        finally:
+            await db_module.close_db()
+    finally:
+        db_module.DB_PATH, db_pool._db_path = saved_path, saved_pool_path
+
+
+async def _main(args: argparse.Namespace) -> None:
+    db_path = Path(args.db)
+    if db_path.exists():
+        if not args.force:
+            raise SystemExit(f"{db_path} вже існує (--force, щоб перезаписати)")
+        for path in db_path.parent.glob(db_path.name + '*'):
+            path.unlink()
+    scale = SCALES[args.scale]._replace(**{name: value for name in Scale._fields if (value := getattr(args, name)) is not None})
+    async with open_database(db_path):
+        print(f"Генерація {db_path}: {scale._asdict()}, seed={args.seed}")
+        started = datetime.now()
+        populate(db_path, scale, seed=args.seed)
+    print(f"Готово за {(datetime.now() - started).total_seconds():.0f} с, розмір {db_path.stat().st_size / 2**20:.0f} МБ")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Генерація синтетичної бази taxi_bot.db")
+    parser.add_argument('--db', default='benchmarks/bench.db', help="шлях до нової бази")
+    parser.add_argument('--scale', choices=SCALES, default='production')
+    for name in Scale._fields:
+        parser.add_argument(f'--{name}', type=int, help=f"перевизначити {name} обраного масштабу")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="перезаписати існуючу базу")
+    asyncio.run(_main(parser.parse_args()))
@@ -23,15 +23,104 @@ ADMIN_IDS = [int(admin_id.strip()) for admin_id in ADMIN_IDS_STR.split(',') if a
 
 # --- Database ---
 DB_PATH = BASE_DIR / 'database' / 'taxi_bot.db'
+# Кількість з'єднань для читання в пулі (з'єднання для запису завжди одне)
+DB_POOL_READERS = int(os.getenv('DB_POOL_READERS', 4))
+# Профіль сховища SQLite: 'wal' (за замовчуванням), 'wal_durable' або 'legacy' (rollback-журнал)
+DB_STORAGE_PROFILE = os.getenv('DB_STORAGE_PROFILE', 'wal')
+# Необов'язкові перевизначення окремих PRAGMA поверх профілю
+DB_MMAP_SIZE = os.getenv('DB_MMAP_SIZE')
+DB_CACHE_SIZE_KB = os.getenv('DB_CACHE_SIZE_KB')
+DB_BUSY_TIMEOUT_MS = os.getenv('DB_BUSY_TIMEOUT_MS')
+# Максимальна кількість операцій запису, що фіксуються однією транзакцією
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', 50))
+# Кеш перевірок ролей (адмін/водій/бан): час життя запису в секундах і максимальна кількість записів
+ROLE_CACHE_TTL = float(os.getenv('ROLE_CACHE_TTL', 60))
+ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', 10000))
+# Відкладений запис активності користувачів: інтервал скидання буфера (с) і максимальний розмір буфера
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 10))
+ACTIVITY_BUFFER_MAX_ENTRIES = int(os.getenv('ACTIVITY_BUFFER_MAX_ENTRIES', 5000))
+# Живі геолокації водіїв: через скільки секунд без оновлень позиція вважається застарілою
+# та як часто (с) накопичені позиції записуються в БД
+LIVE_LOCATION_STALE_SECONDS = float(os.getenv('LIVE_LOCATION_STALE_SECONDS', 600))
+LOCATION_FLUSH_INTERVAL = float(os.getenv('LOCATION_FLUSH_INTERVAL', 30))
+# FSM-сховище в БД: через скільки годин незавершений діалог вважається покинутим
+# і як часто (с) змінені стани записуються в БД
+FSM_STATE_TTL_HOURS = float(os.getenv('FSM_STATE_TTL_HOURS', 24))
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', 2))
+# Кеш сторінок списків і кількості записів для пагінації: час життя (с) і максимальна кількість записів.
+# Запис у таблицю скидає кеш одразу, TTL обмежує застарілість після змін поза ботом
+PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', 30))
+PAGE_CACHE_SIZE = int(os.getenv('PAGE_CACHE_SIZE', 500))
+# Як часто (хв) лічильники адмін-панелі звіряються з таблицями
+STATS_RECONCILE_INTERVAL_MINUTES = float(os.getenv('STATS_RECONCILE_INTERVAL_MINUTES', 60))
+# Фонове перетворення старих рядкових дат у секунди Unix: рядків за одну транзакцію і пауза між ними (с)
+TIMESTAMP_MIGRATION_BATCH_SIZE = int(os.getenv('TIMESTAMP_MIGRATION_BATCH_SIZE', 500))
+TIMESTAMP_MIGRATION_PAUSE = float(os.getenv('TIMESTAMP_MIGRATION_PAUSE', 0.05))
 
 # Місто або регіон для пріоритезації пошуку адрес
 GEOCODING_CITY_CONTEXT = os.getenv('GEOCODING_CITY_CONTEXT', 'Сумська область')
+# Кеш геокодування: скільки днів зберігати знайдені адреси, поріг нечіткого збігу (0..1)
+# і кількість знаків після коми при округленні координат для зворотного геокодування
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv('GEOCODE_CACHE_TTL_DAYS', 30))
+GEOCODE_FUZZY_THRESHOLD = float(os.getenv('GEOCODE_FUZZY_THRESHOLD', 0.8))
+GEOCODE_REVERSE_PRECISION = int(os.getenv('GEOCODE_REVERSE_PRECISION', 4))
+# Максимальна кількість адрес (і окремо точок) у кеші геокодування в пам'яті; найдавніше використані витісняються
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 20000))
+# Провайдери геокодування в порядку використання (через кому): nominatim, photon.
+# Наступний провайдер запускається, якщо попередній впав або не відповів за GEOCODER_HEDGE_DELAY с
+# (0 - лише при помилці попереднього)
+GEOCODER_PROVIDERS = [name.strip() for name in os.getenv('GEOCODER_PROVIDERS', 'nominatim').split(',') if name.strip()]
+GEOCODER_USER_AGENT = os.getenv('GEOCODER_USER_AGENT', 'nubira_taxi_bot/1.0')
+GEOCODER_TIMEOUT = float(os.getenv('GEOCODER_TIMEOUT', 10))
+GEOCODER_CONCURRENCY = int(os.getenv('GEOCODER_CONCURRENCY', 4))
+GEOCODER_HEDGE_DELAY = float(os.getenv('GEOCODER_HEDGE_DELAY', 2))
+# Nominatim: адреса сервера і ліміт запитів (запитів на секунду і скільки можна зробити поспіль
+# після простою). Публічний Nominatim дозволяє не більше 1 запиту на секунду; для власного сервера - 0 (без ліміту)
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+GEOCODER_RATE_PER_SEC = float(os.getenv('GEOCODER_RATE_PER_SEC', 1 / 1.1))
+GEOCODER_BURST = float(os.getenv('GEOCODER_BURST', 1))
+# Власний сервер Photon (наприклад, http://localhost:2322) і його ліміт запитів (0 - без ліміту)
+PHOTON_URL = os.getenv('PHOTON_URL', '')
+PHOTON_RATE_PER_SEC = float(os.getenv('PHOTON_RATE_PER_SEC', 0))
+# Офлайн-газетир (індекс вулиць і будинків з OSM, див. utils/gazetteer.py) і мінімальна
+# схожість слів назви (0..1), за якої вулиця вважається знайденою
+GAZETTEER_PATH = Path(os.getenv('GAZETTEER_PATH', BASE_DIR / 'database' / 'gazetteer.db'))
+GAZETTEER_NAME_THRESHOLD = float(os.getenv('GAZETTEER_NAME_THRESHOLD', 0.6))
 
 # Основний часовий пояс для операцій бота (наприклад, місто роботи таксі)
 TIMEZONE = ZoneInfo("Europe/Kiev")
 
 # Час в секундах, який дається водію на прийняття замовлення
 DRIVER_ACCEPT_TIMEOUT = int(os.getenv('DRIVER_ACCEPT_TIMEOUT', 60))
+# За скільки хвилин до часу подачі нагадувати водію про прийняте попереднє замовлення
+PREORDER_REMINDER_MINUTES = int(os.getenv('PREORDER_REMINDER_MINUTES', 30))
+# Радіус пошуку водіїв навколо точки подачі (км) та максимальна кількість водіїв у черзі диспетчеризації
+DISPATCH_SEARCH_RADIUS_KM = float(os.getenv('DISPATCH_SEARCH_RADIUS_KM', 30))
+DISPATCH_MAX_DRIVERS = int(os.getenv('DISPATCH_MAX_DRIVERS', 20))
+# Розмір комірки сітки геоіндексу водіїв (км)
+GEO_INDEX_CELL_KM = float(os.getenv('GEO_INDEX_CELL_KM', 1.0))
+# Стратегія диспетчеризації: 'sequential' - по одному водію, 'broadcast' - хвилями одразу кільком водіям
+DISPATCH_STRATEGY = os.getenv('DISPATCH_STRATEGY', 'sequential')
+# Розмір першої хвилі та множник, на який збільшується кожна наступна хвиля (1 - хвилі однакового розміру)
+DISPATCH_WAVE_SIZE = int(os.getenv('DISPATCH_WAVE_SIZE', 5))
+DISPATCH_WAVE_GROWTH = int(os.getenv('DISPATCH_WAVE_GROWTH', 2))
+# Вихідні повідомлення бота (utils/outbound.py): загальний ліміт Telegram (~30 повідомлень/с),
+# ліміт на один чат (~1 повідомлення/с, OUTBOUND_CHAT_BURST поспіль) і скільки разів повторювати
+# надсилання після відповіді 429 (RetryAfter)
+OUTBOUND_RATE_PER_SEC = float(os.getenv('OUTBOUND_RATE_PER_SEC', 25))
+OUTBOUND_BURST = float(os.getenv('OUTBOUND_BURST', 5))
+OUTBOUND_CHAT_RATE_PER_SEC = float(os.getenv('OUTBOUND_CHAT_RATE_PER_SEC', 1))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', 3))
+# Розсилки (utils/batch_sender.py): початкова і водночас найбільша швидкість (повідомлень/с), мінімальна
+# швидкість, до якої її знижують відповіді 429, скільки разів повторювати отримувача після 429 і як часто (с)
+# оновлювати повідомлення з прогресом
+BROADCAST_RATE_PER_SEC = float(os.getenv('BROADCAST_RATE_PER_SEC', OUTBOUND_RATE_PER_SEC))
+BROADCAST_MIN_RATE_PER_SEC = float(os.getenv('BROADCAST_MIN_RATE_PER_SEC', 1))
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', 5))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 5))
+# Скільки отримувачів розсилки читати з бази за раз (utils/newsletter_jobs.py)
+NEWSLETTER_PAGE_SIZE = int(os.getenv('NEWSLETTER_PAGE_SIZE', 500))
 # --- Тарифи ---
 # Завантажуємо тарифи з .env, з значенням за замовчуванням 0.
 # Використовуємо float для можливості вказувати копійки.
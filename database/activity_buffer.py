@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+from loguru import logger
+
+from config.config import ACTIVITY_FLUSH_INTERVAL, ACTIVITY_BUFFER_MAX_ENTRIES
+from database import queries as db_queries
+
+
+class ActivityBuffer:
+    """
+    Buffer for deferred writes of users' last activity time.
+
+    ActivityMiddleware calls record() on every update; only the latest mark per
+    user is kept in memory. Every flush_interval seconds (and when the bot stops)
+    the whole buffer is written with one executemany in one transaction. If the
+    buffer reaches max_entries, a flush starts early.
+
+    max_entries is also a hard bound. While the buffer is full (before start(),
+    after stop(), or while flushes keep failing), marks of users not already in
+    it are dropped and counted in stats()['dropped']; known users are still updated.
+    """
+
+    def __init__(self, flush_interval: float = 10.0, max_entries: int = 5000):
+        self._flush_interval = flush_interval
+        self._max_entries = max(1, max_entries)
+        self._pending: dict[int, datetime] = {}
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._early_flush: asyncio.Task | None = None
+        self._stats = {'recorded': 0, 'flushed': 0, 'flushes': 0, 'dropped': 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, user_id: int) -> None:
+        """Remembers a user's activity (without touching the database)."""
+        self._stats['recorded'] += 1
+        if user_id in self._pending or len(self._pending) < self._max_entries:
+            self._pending[user_id] = datetime.now()
+        else:
+            self._stats['dropped'] += 1
+        if len(self._pending) >= self._max_entries and self.is_running:
+            if self._early_flush is None or self._early_flush.done():
+                self._early_flush = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Writes the accumulated marks to the database. Returns the number of users updated."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                await db_queries.update_users_activity_batch(batch.items())
+            except Exception as e:
+                # Put the marks back into the buffer without overwriting fresher ones
+                for user_id, seen_at in batch.items():
+                    if user_id in self._pending:
+                        continue
+                    if len(self._pending) < self._max_entries:
+                        self._pending[user_id] = seen_at
+                    else:
+                        self._stats['dropped'] += 1
+                logger.error(f"Не вдалося записати активність {len(batch)} користувачів: {e}")
+                return 0
+            self._stats['flushed'] += len(batch)
+            self._stats['flushes'] += 1
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run(), name="activity-buffer")
+
+    async def stop(self) -> None:
+        """Stops the periodic flush and writes what is left in the buffer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Буфер активності користувачів зупинено. Статистика: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {**self._stats, 'pending': len(self._pending)}
+
+
+# The single buffer of the application. Started in init_db(), flushed and stopped in close_db().
+activity_buffer = ActivityBuffer(ACTIVITY_FLUSH_INTERVAL, ACTIVITY_BUFFER_MAX_ENTRIES)
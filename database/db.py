@@ -2,6 +2,16 @@ import aiosqlite
 import asyncio
 from config.config import DB_PATH
 from loguru import logger
+from database.pool import db_pool, apply_pragmas, get_storage_pragmas
+from database.write_queue import write_queue
+from database.queries import rebuild_driver_state, save_driver_locations_batch, role_cache, ACTIVE_ORDERS
+from database.live_locations import live_locations
+from database.activity_buffer import activity_buffer
+from database.geocode_cache import geocode_cache
+from database.pagination import page_cache
+from database.stats_counters import stats_counters_script
+from database.kpi_rollups import kpi_rollups_script
+from database.timestamp_migration import timestamp_migration, TIMESTAMPS_SCHEMA_VERSION
 
 async def _execute_script(cursor, script):
     """Executes a multi-statement SQL script."""
@@ -33,7 +43,14 @@ async def init_db():
     """
     try:
         async with aiosqlite.connect(DB_PATH) as db:
+            # The journal mode (WAL) is stored in the database file itself, so it is enabled here
+            # while there are no other connections yet
+            pragmas = get_storage_pragmas()
+            await apply_pragmas(db, pragmas)
+            logger.info(f"Профіль сховища SQLite: {pragmas}")
             cursor = await db.cursor()
+            await cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders'")
+            is_new_database = await cursor.fetchone() is None
 
             # --- Table Creation Script ---
             # This script will only create tables that do not already exist.
@@ -50,8 +67,8 @@ async def init_db():
                     cancel_applic INTEGER DEFAULT 0,
                     rating REAL DEFAULT 0,
                     rating_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity TIMESTAMP
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                    last_activity INTEGER
                 );
 
                 CREATE TABLE IF NOT EXISTS users (
@@ -66,8 +83,8 @@ async def init_db():
                     cancel_applic INTEGER DEFAULT 0,
                     rating REAL DEFAULT 0,
                     rating_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity TIMESTAMP
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                    last_activity INTEGER
                 );
 
                 CREATE TABLE IF NOT EXISTS drivers (
@@ -82,9 +99,9 @@ async def init_db():
                     cancelled_count INTEGER DEFAULT 0,
                     latitude REAL,
                     longitude REAL,
-                    last_location_update TIMESTAMP,
-                    shift_started_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_location_update INTEGER,
+                    shift_started_at INTEGER,
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
                     is_available INTEGER DEFAULT 0
                 );
 
@@ -102,16 +119,16 @@ async def init_db():
                     is_rated INTEGER DEFAULT 0,
                     rating_score INTEGER,
                     rating_comment TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                    completed_at INTEGER,
                     order_type TEXT DEFAULT 'taxi',
                     order_details TEXT,
-                    scheduled_at TIMESTAMP,
+                    scheduled_at INTEGER,
                     reminder_sent INTEGER DEFAULT 0,
-                    pending_dispatch_at TIMESTAMP,
+                    pending_dispatch_at INTEGER,
                     dispatch_driver_ids TEXT,
                     dispatch_current_driver_index INTEGER,
-                    dispatch_offer_sent_at TIMESTAMP
+                    dispatch_offer_sent_at INTEGER
                 ); 
 
                 CREATE TABLE IF NOT EXISTS favorite_addresses (
@@ -131,14 +148,14 @@ async def init_db():
                     driver_id INTEGER,
                     score INTEGER,
                     comment TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
                 );
 
                 CREATE TABLE IF NOT EXISTS driver_rejections (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     order_id INTEGER,
                     driver_id INTEGER,
-                    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    rejected_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
                     UNIQUE(order_id, driver_id)
                 );
 
@@ -147,17 +164,79 @@ async def init_db():
                     FOREIGN KEY(user_id) REFERENCES users(user_id)
                 );
 
+                CREATE TABLE IF NOT EXISTS dispatch_offers (
+                    order_id INTEGER NOT NULL,
+                    driver_id INTEGER NOT NULL,
+                    wave INTEGER NOT NULL DEFAULT 0,
+                    message_id INTEGER,
+                    location_message_id INTEGER,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    sent_at INTEGER,
+                    PRIMARY KEY (order_id, driver_id),
+                    FOREIGN KEY(order_id) REFERENCES orders(id)
+                );
+
+                CREATE TABLE IF NOT EXISTS fsm_storage (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT,
+                    updated_at REAL NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    query TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS reverse_geocode_cache (
+                    lat_key REAL NOT NULL,
+                    lon_key REAL NOT NULL,
+                    address TEXT NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (lat_key, lon_key)
+                );
+
+                CREATE TABLE IF NOT EXISTS newsletter_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    audience TEXT NOT NULL,
+                    from_chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    status_chat_id INTEGER,
+                    status_message_id INTEGER,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    cursor INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                    finished_at INTEGER
+                );
+
+                CREATE TABLE IF NOT EXISTS newsletter_deliveries (
+                    job_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    PRIMARY KEY (job_id, user_id),
+                    FOREIGN KEY(job_id) REFERENCES newsletter_jobs(id)
+                ) WITHOUT ROWID;
+
                 CREATE TABLE IF NOT EXISTS dispatch_queue (
                     order_id INTEGER PRIMARY KEY,
                     driver_ids_json TEXT,
                     current_driver_index INTEGER,
                     payload_json TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_offer_sent_at TIMESTAMP,
+                    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                    last_offer_sent_at INTEGER,
                     FOREIGN KEY(order_id) REFERENCES orders(id)
                 );
             """
             await _execute_script(cursor, create_tables_script)
+            if is_new_database:
+                # A new database writes times as Unix seconds from the start; there is nothing to convert
+                await cursor.execute(f"PRAGMA user_version = {TIMESTAMPS_SCHEMA_VERSION}")
             
             # --- Schema Migrations ---
             # Here we add new columns to existing tables if they are missing.
@@ -166,8 +245,8 @@ async def init_db():
             await _check_and_add_column(cursor, 'orders', 'dispatch_payload', 'TEXT') # Эта строка уже была, но я оставляю ее для ясности
             await _check_and_add_column(cursor, 'orders', 'begin_address_voice_id', 'TEXT')
             await _check_and_add_column(cursor, 'orders', 'finish_address_voice_id', 'TEXT')
-            await _check_and_add_column(cursor, 'users', 'last_activity', 'TIMESTAMP')
-            await _check_and_add_column(cursor, 'clients', 'last_activity', 'TIMESTAMP')
+            await _check_and_add_column(cursor, 'users', 'last_activity', 'INTEGER')
+            await _check_and_add_column(cursor, 'clients', 'last_activity', 'INTEGER')
             await _check_and_add_column(cursor, 'drivers', 'is_available', 'INTEGER DEFAULT 0')
             
             await db.commit()
@@ -175,20 +254,73 @@ async def init_db():
 
             # --- Index Creation ---
             logger.info("Створення/перевірка індексів...")
-            index_script = """
-                CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
-                CREATE INDEX IF NOT EXISTS idx_orders_driver_id ON orders(driver_id);
-                CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id);
+            # Composite indexes match the filters and sort orders of the queries in queries.py
+            # (checked by benchmarks/query_plans.py); single-column indexes that became their
+            # prefixes are dropped.
+            # Partial indexes hold only active orders (ACTIVE_ORDERS), so the scheduler and
+            # dispatch queries do not depend on the size of the order history.
+            index_script = f"""
+                CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_orders_active_scheduled ON orders(status, scheduled_at) WHERE {ACTIVE_ORDERS};
+                CREATE INDEX IF NOT EXISTS idx_orders_active_driver ON orders(driver_id, scheduled_at) WHERE {ACTIVE_ORDERS};
+                CREATE INDEX IF NOT EXISTS idx_orders_driver_status_completed ON orders(driver_id, status, completed_at);
+                CREATE INDEX IF NOT EXISTS idx_orders_client_status_created ON orders(client_id, status, created_at);
                 CREATE INDEX IF NOT EXISTS idx_drivers_isWorking ON drivers(isWorking);
-                CREATE INDEX IF NOT EXISTS idx_orders_scheduled_at ON orders(scheduled_at);
+                CREATE INDEX IF NOT EXISTS idx_users_last_activity_epoch ON users(COALESCE(last_activity, 0));
+                CREATE INDEX IF NOT EXISTS idx_driver_rejections_driver ON driver_rejections(driver_id, rejected_at);
+                CREATE INDEX IF NOT EXISTS idx_client_reviews_client ON client_reviews(client_id, created_at);
+                CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at ON fsm_storage(updated_at);
+                CREATE INDEX IF NOT EXISTS idx_geocode_cache_created_at ON geocode_cache(created_at);
+                CREATE INDEX IF NOT EXISTS idx_reverse_geocode_cache_created_at ON reverse_geocode_cache(created_at);
+                DROP INDEX IF EXISTS idx_orders_status;
+                DROP INDEX IF EXISTS idx_orders_driver_id;
+                DROP INDEX IF EXISTS idx_orders_client_id;
+                DROP INDEX IF EXISTS idx_orders_scheduled_at;
+                DROP INDEX IF EXISTS idx_users_last_activity;
+                DROP INDEX IF EXISTS idx_orders_status_scheduled;
             """
             await _execute_script(cursor, index_script)
             await db.commit()
             logger.info("Індекси успішно створені/перевірені.")
 
+            # --- Admin panel counters ---
+            # The table and the triggers that keep it current in the same transaction as the data changes
+            await _execute_script(cursor, stats_counters_script())
+            # Hourly and daily KPI rollups for analytics
+            await _execute_script(cursor, kpi_rollups_script())
+            await db.commit()
+
+        # Open the shared connection pool used by every function in queries.py,
+        # and the queue that all writes go through
+        await db_pool.open(DB_PATH)
+        await write_queue.start()
+        # Old string dates are converted to Unix seconds in the background, in batches through the write queue
+        timestamp_migration.start()
+        # Table versions live only in memory, so the page cache from a previous database is invalid
+        page_cache.clear()
+        # Build the geo index of available drivers and load their last locations
+        await rebuild_driver_state()
+        await geocode_cache.restore()
+        live_locations.start(flush=save_driver_locations_batch)
+        activity_buffer.start()
+
     except aiosqlite.Error as e:
         logger.critical(f"Critical database initialization error: {e}")
         raise
 
+async def close_db():
+    """
+    Flushes buffered activity and the write queue, then closes the shared connection pool.
+    Called from graceful_shutdown.
+    """
+    await timestamp_migration.stop()
+    await activity_buffer.stop()
+    await live_locations.stop()
+    await write_queue.stop()
+    await db_pool.close()
+    logger.info(f"Кеш перевірок ролей: {role_cache.stats()}")
+    logger.info(f"Кеш геокодування: {geocode_cache.stats()}")
+    logger.info(f"Кеш сторінок списків: {page_cache.stats()}")
+
 if __name__ == '__main__':
     asyncio.run(init_db())
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from typing import Any, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from loguru import logger
+
+from config.config import FSM_STATE_TTL_HOURS, FSM_FLUSH_INTERVAL
+from database import queries as db_queries
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state: str | None = None, data: dict | None = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    aiogram FSM storage persisted to the fsm_storage table of our database.
+
+    Reads and writes go to an in-memory dict, so the storage is as fast as
+    MemoryStorage. Changed keys are written to the database in one transaction
+    every flush_interval seconds (and on close()), and at startup all live
+    records are loaded back, so unfinished orders survive a bot restart.
+    States that have not changed for longer than ttl seconds are considered
+    abandoned and deleted.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, flush_interval: float = 2.0):
+        self._ttl = ttl
+        self._flush_interval = flush_interval
+        self._records: dict[str, _Record] = {}
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ':'.join(str(part) if part is not None else '' for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+
+    def _get(self, key: StorageKey) -> _Record | None:
+        storage_key = self._key(key)
+        record = self._records.get(storage_key)
+        if record is not None and record.updated_at < time.time() - self._ttl:
+            # Abandoned state: forget it and delete it from the database on the next flush
+            del self._records[storage_key]
+            self._dirty.add(storage_key)
+            return None
+        return record
+
+    def _touch(self, key: StorageKey) -> _Record:
+        storage_key = self._key(key)
+        record = self._get(key)
+        if record is None:
+            record = self._records[storage_key] = _Record()
+        record.updated_at = time.time()
+        self._dirty.add(storage_key)
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._touch(key).state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        self._touch(key).data = data.copy()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self._get(key)
+        return record.data.copy() if record else {}
+
+    async def load(self) -> None:
+        """Loads all non-abandoned records from the database and deletes the expired ones."""
+        threshold = time.time() - self._ttl
+        await db_queries.delete_expired_fsm_records(threshold)
+        for storage_key, state, data, updated_at in await db_queries.get_fsm_records(threshold):
+            self._records[storage_key] = _Record(state, json.loads(data) if data else {}, updated_at)
+        logger.info(f"FSM-сховище: відновлено {len(self._records)} станів користувачів.")
+
+    async def flush(self) -> int:
+        """Writes the changed keys to the database. Returns the number of keys written."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for storage_key in dirty:
+                record = self._records.get(storage_key)
+                if record is None or record.is_empty:
+                    self._records.pop(storage_key, None)
+                    deletes.append(storage_key)
+                    continue
+                try:
+                    data = json.dumps(record.data, ensure_ascii=False)
+                except (TypeError, ValueError) as e:
+                    # The key stays dirty and is written once its data can be serialized again
+                    self._dirty.add(storage_key)
+                    logger.error(f"FSM-стан {storage_key} не серіалізується в JSON, пропущено: {e}")
+                    continue
+                upserts.append((storage_key, record.state, data, record.updated_at))
+            if not upserts and not deletes:
+                return 0
+            try:
+                await db_queries.save_fsm_records(upserts, deletes)
+            except Exception as e:
+                self._dirty |= {storage_key for storage_key, *_ in upserts} | set(deletes)
+                logger.error(f"Не вдалося зберегти FSM-стани ({len(upserts) + len(deletes)}): {e}")
+                return 0
+            return len(upserts) + len(deletes)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # One failed flush must not stop the states from being persisted
+                logger.error(f"Помилка періодичного збереження FSM-станів: {e}")
+
+    async def start(self) -> None:
+        """Loads the saved states and starts the periodic flush. Called after init_db()."""
+        await self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="fsm-storage")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# The application's FSM storage, passed to the Dispatcher in main.py.
+fsm_storage = SQLiteStorage(ttl=FSM_STATE_TTL_HOURS * 3600, flush_interval=FSM_FLUSH_INTERVAL)
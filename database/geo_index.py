@@ -0,0 +1,158 @@
+import math
+from typing import Iterable
+
+from config.config import GEO_INDEX_CELL_KM
+
+EARTH_RADIUS_KM = 6371.0
+# Length of one degree of latitude in kilometres
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+class DriverGeoIndex:
+    """
+    In-memory spatial index of available drivers (a uniform grid).
+
+    The coordinates of all known drivers are kept in `_positions`, while only
+    drivers who are on shift and free for orders go into the grid cells.
+    A nearest search walks rings of cells around the order point and stops as
+    soon as the nearest possible point of the next ring is farther than the
+    search radius or the k-th driver found, so the cost depends on the density
+    of drivers near the order, not on the size of the whole fleet.
+
+    The source of truth is the drivers table: the index is filled in init_db()
+    and kept current by the write functions in queries.py.
+    """
+
+    def __init__(self, cell_km: float = 1.0):
+        self._cell_deg = max(cell_km, 0.05) / KM_PER_DEG_LAT
+        self._positions: dict[int, tuple[float, float]] = {}
+        self._available: set[int] = set()
+        self._cells: dict[tuple[int, int], set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._available)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return int(math.floor(lat / self._cell_deg)), int(math.floor(lon / self._cell_deg))
+
+    def _grid_add(self, driver_id: int) -> None:
+        position = self._positions.get(driver_id)
+        if position is not None:
+            self._cells.setdefault(self._cell(*position), set()).add(driver_id)
+
+    def _grid_discard(self, driver_id: int) -> None:
+        position = self._positions.get(driver_id)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self) -> None:
+        self._positions.clear()
+        self._available.clear()
+        self._cells.clear()
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Rebuilds the index from (user_id, latitude, longitude, is_available) rows."""
+        self.clear()
+        for driver_id, lat, lon, is_available in rows:
+            if lat is not None and lon is not None:
+                self._positions[driver_id] = (lat, lon)
+            if is_available:
+                self._available.add(driver_id)
+                self._grid_add(driver_id)
+
+    def update_location(self, driver_id: int, lat: float, lon: float) -> None:
+        """Updates the driver's coordinates (and cell, if the driver is available)."""
+        is_available = driver_id in self._available
+        if is_available:
+            self._grid_discard(driver_id)
+        self._positions[driver_id] = (lat, lon)
+        if is_available:
+            self._grid_add(driver_id)
+
+    def set_available(self, driver_id: int, is_available: bool) -> None:
+        """Includes the driver in the search or excludes them from it."""
+        if is_available and driver_id not in self._available:
+            self._available.add(driver_id)
+            self._grid_add(driver_id)
+        elif not is_available and driver_id in self._available:
+            self._grid_discard(driver_id)
+            self._available.discard(driver_id)
+
+    def remove(self, driver_id: int) -> None:
+        """Removes the driver from the index completely."""
+        self.set_available(driver_id, False)
+        self._positions.pop(driver_id, None)
+
+    def available_ids(self) -> set[int]:
+        return set(self._available)
+
+    def unlocated_ids(self) -> list[int]:
+        """Available drivers whose coordinates are unknown."""
+        return [driver_id for driver_id in self._available if driver_id not in self._positions]
+
+    def nearest(self, lat: float, lon: float, k: int, radius_km: float,
+                exclude: set[int] | None = None) -> list[tuple[int, float]]:
+        """
+        Returns up to k nearest available drivers within radius_km.
+
+        Returns:
+            A list of (driver_id, distance in km) pairs sorted by distance.
+        """
+        if k <= 0 or not self._cells:
+            return []
+        exclude = exclude or set()
+        center_row, center_col = self._cell(lat, lon)
+
+        # Cell width shrinks towards the poles; take the narrowest one within the radius
+        # so that the distance estimate to a ring stays a lower bound
+        edge_lat = min(abs(lat) + radius_km / KM_PER_DEG_LAT, 89.0)
+        cell_km = self._cell_deg * KM_PER_DEG_LAT * math.cos(math.radians(edge_lat))
+        max_ring = int(radius_km / cell_km) + 1
+
+        found: list[tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            # Any point of ring `ring` is at least (ring - 1) full cells away
+            ring_min_km = (ring - 1) * cell_km
+            if ring_min_km > radius_km or (len(found) >= k and ring_min_km > found[k - 1][0]):
+                break
+            for row, col in self._ring_cells(center_row, center_col, ring):
+                for driver_id in self._cells.get((row, col), ()):
+                    if driver_id in exclude:
+                        continue
+                    d_lat, d_lon = self._positions[driver_id]
+                    distance = haversine_km(lat, lon, d_lat, d_lon)
+                    if distance <= radius_km:
+                        found.append((distance, driver_id))
+            found.sort()
+        return [(driver_id, distance) for distance, driver_id in found[:k]]
+
+    @staticmethod
+    def _ring_cells(center_row: int, center_col: int, ring: int):
+        if ring == 0:
+            yield center_row, center_col
+            return
+        for col in range(center_col - ring, center_col + ring + 1):
+            yield center_row - ring, col
+            yield center_row + ring, col
+        for row in range(center_row - ring + 1, center_row + ring):
+            yield row, center_col - ring
+            yield row, center_col + ring
+
+
+# The single index of the application. Filled in init_db() through rebuild_driver_state().
+driver_geo_index = DriverGeoIndex(cell_km=GEO_INDEX_CELL_KM)
@@ -0,0 +1,259 @@
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple
+
+from loguru import logger
+
+from config.config import (
+    GEOCODE_CACHE_TTL_DAYS, GEOCODE_FUZZY_THRESHOLD, GEOCODE_REVERSE_PRECISION, GEOCODE_CACHE_MAX_ENTRIES
+)
+from database import queries as db_queries
+from utils.geo_providers import viewbox_bounds
+
+# Apostrophe variants users type in Ukrainian names
+_APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'", "‘": "'", "´": "'"})
+_NON_WORD = re.compile(r"[^\w'/]+")
+# A token with a digit is a house/building number ("12", "12а", "5/2")
+_NUMBER_TOKEN = re.compile(r"\d")
+
+
+class CachedLocation(NamedTuple):
+    """A geocoding result from the cache; field-compatible with geopy.Location."""
+    address: str
+    latitude: float
+    longitude: float
+
+
+def normalize_query(text: str) -> str:
+    """Turns address text into a cache key: lower case, one apostrophe, no punctuation."""
+    text = text.lower().translate(_APOSTROPHES).replace('ё', 'е')
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def search_scope(viewbox=None, bounded: bool = False, language: str | None = None) -> str:
+    """
+    Describes the search area and language of a forward lookup.
+
+    The same text searched inside a bounded viewbox and without one (or in another
+    language) may resolve to different places, so the scope is part of the cache key.
+    """
+    bounds = viewbox_bounds(viewbox)
+    box = ','.join(f"{value:g}" for value in bounds) if bounds else ''
+    return f"{language or ''};{box};{int(bool(viewbox) and bounded)}"
+
+
+def trigrams(normalized: str) -> set[str]:
+    """Word trigrams in the pg_trgm style: each word is padded with two spaces on the left and one on the right."""
+    result = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _numbers(normalized: str) -> tuple[str, ...]:
+    return tuple(sorted(token for token in normalized.split() if _NUMBER_TOKEN.search(token)))
+
+
+class GeocodeCache:
+    """
+    In-memory cache of geocoding results, persisted to the database.
+
+    Forward geocoding is looked up by the normalized query text first, then
+    fuzzily by trigram similarity to previously resolved queries (through an
+    inverted trigram -> keys index). House numbers must match exactly in a
+    fuzzy match: "Шевченка 5" and "Шевченка 15" are close by trigrams but
+    are different addresses. Reverse geocoding is looked up by coordinates
+    rounded to reverse_precision digits.
+
+    All lookups touch only in-memory dicts; only new provider results are
+    written to the database, and live entries are loaded back at startup.
+
+    Forward entries are keyed by (search_scope(), normalized text) and hold the
+    full candidate list as returned by the provider; callers slice it to their
+    own limit. Fuzzy matches never cross scopes. Entries expire after `ttl`
+    seconds, and each map keeps at most `max_entries` of the most recently
+    used entries.
+    """
+
+    def __init__(self, ttl: float = 30 * 86400, fuzzy_threshold: float = 0.8, reverse_precision: int = 4,
+                 max_entries: int = 20000):
+        self._ttl = ttl
+        self._fuzzy_threshold = fuzzy_threshold
+        self._reverse_precision = reverse_precision
+        self._max_entries = max(1, max_entries)
+        # (scope, normalized query) -> (created_at, locations)
+        self._forward: OrderedDict[tuple[str, str], tuple[float, list[CachedLocation]]] = OrderedDict()
+        self._forward_trigrams: dict[tuple[str, str], set[str]] = {}
+        self._trigram_index: dict[str, set[tuple[str, str]]] = {}
+        self._reverse: OrderedDict[tuple[float, float], tuple[float, CachedLocation]] = OrderedDict()
+        self._stats = {'hits': 0, 'fuzzy_hits': 0, 'misses': 0, 'reverse_hits': 0, 'reverse_misses': 0,
+                       'expired': 0, 'evictions': 0}
+
+    def clear(self) -> None:
+        self._forward.clear()
+        self._forward_trigrams.clear()
+        self._trigram_index.clear()
+        self._reverse.clear()
+
+    def reverse_key(self, lat: float, lon: float) -> tuple[float, float]:
+        return round(lat, self._reverse_precision), round(lon, self._reverse_precision)
+
+    @staticmethod
+    def _storage_key(scope: str, key: str) -> str:
+        # The normalized text has no '|', so the scope is everything before the last one
+        return f"{scope}|{key}"
+
+    def _is_fresh(self, created_at: float) -> bool:
+        return created_at >= time.time() - self._ttl
+
+    def _put_forward(self, entry_key: tuple[str, str], locations: list[CachedLocation], created_at: float) -> None:
+        if entry_key not in self._forward:
+            grams = trigrams(entry_key[1])
+            self._forward_trigrams[entry_key] = grams
+            for gram in grams:
+                self._trigram_index.setdefault(gram, set()).add(entry_key)
+        self._forward[entry_key] = (created_at, locations)
+        self._forward.move_to_end(entry_key)
+        while len(self._forward) > self._max_entries:
+            self._drop_forward(next(iter(self._forward)))
+            self._stats['evictions'] += 1
+
+    def _drop_forward(self, entry_key: tuple[str, str]) -> None:
+        self._forward.pop(entry_key, None)
+        for gram in self._forward_trigrams.pop(entry_key, ()):
+            keys = self._trigram_index.get(gram)
+            if keys is not None:
+                keys.discard(entry_key)
+                if not keys:
+                    del self._trigram_index[gram]
+
+    def _put_reverse(self, point: tuple[float, float], location: CachedLocation, created_at: float) -> None:
+        self._reverse[point] = (created_at, location)
+        self._reverse.move_to_end(point)
+        while len(self._reverse) > self._max_entries:
+            self._reverse.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def load(self, forward_rows: Iterable[tuple], reverse_rows: Iterable[tuple]) -> None:
+        """
+        Fills the cache from (query, results_json, created_at) and
+        (lat_key, lon_key, address, latitude, longitude, created_at) rows, oldest first.
+
+        Rows written before the key carried a search scope have no '|' and are skipped:
+        their candidate lists may have been cut to one result.
+        """
+        self.clear()
+        for storage_key, results, created_at in forward_rows:
+            scope, separator, key = storage_key.rpartition('|')
+            if separator:
+                self._put_forward((scope, key), [CachedLocation(*item) for item in json.loads(results)], created_at)
+        for lat_key, lon_key, address, lat, lon, created_at in reverse_rows:
+            self._put_reverse((lat_key, lon_key), CachedLocation(address, lat, lon), created_at)
+
+    def get(self, query: str, scope: str = '') -> list[CachedLocation] | None:
+        """Looks up forward geocoding results: exact key match first, then a fuzzy one."""
+        entry_key = (scope, normalize_query(query))
+        entry = self._forward.get(entry_key)
+        if entry is not None and not self._is_fresh(entry[0]):
+            self._drop_forward(entry_key)
+            self._stats['expired'] += 1
+            entry = None
+        if entry is not None:
+            self._forward.move_to_end(entry_key)
+            self._stats['hits'] += 1
+            return entry[1]
+        match = self._fuzzy_match(entry_key)
+        if match is not None:
+            self._forward.move_to_end(match)
+            self._stats['fuzzy_hits'] += 1
+            return self._forward[match][1]
+        self._stats['misses'] += 1
+        return None
+
+    def _fuzzy_match(self, entry_key: tuple[str, str]) -> tuple[str, str] | None:
+        scope, key = entry_key
+        grams = trigrams(key)
+        if not grams:
+            return None
+        shared: dict[tuple[str, str], int] = {}
+        for gram in grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                if candidate[0] == scope:
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+        numbers = _numbers(key)
+        best_key, best_score = None, self._fuzzy_threshold
+        for candidate, common in shared.items():
+            # Jaccard similarity of the trigram sets
+            score = common / (len(grams) + len(self._forward_trigrams[candidate]) - common)
+            if (score >= best_score and _numbers(candidate[1]) == numbers
+                    and self._is_fresh(self._forward[candidate][0])):
+                best_key, best_score = candidate, score
+        return best_key
+
+    def get_reverse(self, lat: float, lon: float) -> CachedLocation | None:
+        point = self.reverse_key(lat, lon)
+        entry = self._reverse.get(point)
+        if entry is not None and not self._is_fresh(entry[0]):
+            del self._reverse[point]
+            self._stats['expired'] += 1
+            entry = None
+        if entry is not None:
+            self._reverse.move_to_end(point)
+        self._stats['reverse_hits' if entry is not None else 'reverse_misses'] += 1
+        return entry[1] if entry is not None else None
+
+    async def store(self, query: str, locations: list, scope: str = '') -> list[CachedLocation]:
+        """
+        Remembers forward geocoding results (objects with address/latitude/longitude).
+
+        `locations` must be the full candidate list for the query in this scope, not a
+        caller-sized slice of it: later lookups with a larger limit are served from it.
+        """
+        cached = [CachedLocation(loc.address, loc.latitude, loc.longitude) for loc in locations]
+        key = normalize_query(query)
+        if not key or not cached:
+            return cached
+        created_at = time.time()
+        self._put_forward((scope, key), cached, created_at)
+        storage_key = self._storage_key(scope, key)
+        try:
+            await db_queries.save_geocode_result(storage_key, json.dumps(cached, ensure_ascii=False), created_at)
+        except Exception as e:
+            logger.error(f"Не вдалося зберегти результат геокодування '{storage_key}' в кеш: {e}")
+        return cached
+
+    async def store_reverse(self, lat: float, lon: float, location) -> CachedLocation:
+        """Remembers a reverse geocoding result for rounded coordinates."""
+        cached = CachedLocation(location.address, location.latitude, location.longitude)
+        lat_key, lon_key = self.reverse_key(lat, lon)
+        created_at = time.time()
+        self._put_reverse((lat_key, lon_key), cached, created_at)
+        try:
+            await db_queries.save_reverse_geocode_result(lat_key, lon_key, *cached, created_at)
+        except Exception as e:
+            logger.error(f"Не вдалося зберегти результат зворотного геокодування ({lat_key}, {lon_key}) в кеш: {e}")
+        return cached
+
+    async def restore(self) -> None:
+        """Deletes expired entries from the database and loads the rest. Called from init_db()."""
+        threshold = time.time() - self._ttl
+        await db_queries.delete_expired_geocode_results(threshold)
+        forward_rows, reverse_rows = await db_queries.get_geocode_cache_entries(threshold)
+        self.load(forward_rows, reverse_rows)
+        logger.info(f"Кеш геокодування: завантажено {len(self._forward)} адрес і {len(self._reverse)} точок.")
+
+    def stats(self) -> dict:
+        return {**self._stats, 'queries': len(self._forward), 'points': len(self._reverse)}
+
+
+# The single cache of the application. Loaded in init_db(), used in utils/geocoder.py.
+geocode_cache = GeocodeCache(
+    ttl=GEOCODE_CACHE_TTL_DAYS * 86400,
+    fuzzy_threshold=GEOCODE_FUZZY_THRESHOLD,
+    reverse_precision=GEOCODE_REVERSE_PRECISION,
+    max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+)
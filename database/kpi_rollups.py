@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+# Incremental KPI rollups for the admin panel analytics.
+#
+# kpi_hourly and kpi_daily hold one row per (hour or day, driver); driver_id = 0 is the total for all drivers.
+# Rows are updated by triggers in the same transaction as the order event (creation, acceptance,
+# completion, cancellation, rating, driver rejection), and shift time is added by stop_driver_shift(),
+# which splits the shift by hour. A report for a period sums a few dozen rows instead of
+# a full pass over orders and driver_rejections.
+
+GLOBAL_DRIVER_ID = 0
+
+METRICS = ('created', 'accepted', 'rejected', 'completed', 'cancelled', 'rating_sum', 'rating_count', 'online_seconds')
+
+# Rollup table -> format of its bucket (strftime)
+ROLLUPS = {
+    'kpi_hourly': '%Y-%m-%d %H:00',
+    'kpi_daily': '%Y-%m-%d',
+}
+
+# Events: trigger name -> (when it fires, WHEN condition, driver, (table, event time, condition)
+# for backfilling from history, contribution to the metrics). A trigger fires at the moment of the event,
+# so its bucket is taken from the current time.
+_EVENTS = {
+    'kpi_order_created': (
+        "AFTER INSERT ON orders", "1", "NULL", ("orders", "created_at", "1"), {'created': '1'},
+    ),
+    'kpi_order_accepted': (
+        "AFTER UPDATE OF status ON orders",
+        "NEW.status IN ('accepted', 'accepted_preorder') AND OLD.status IS NOT NEW.status", "NEW.driver_id",
+        ("orders", "created_at", "status IN ('accepted', 'accepted_preorder', 'completed')"), {'accepted': '1'},
+    ),
+    'kpi_order_completed': (
+        "AFTER UPDATE OF status ON orders", "NEW.status = 'completed' AND OLD.status IS NOT 'completed'", "NEW.driver_id",
+        ("orders", "completed_at", "status = 'completed'"), {'completed': '1'},
+    ),
+    'kpi_order_cancelled': (
+        "AFTER UPDATE OF status ON orders",
+        "NEW.status LIKE 'cancelled%' AND COALESCE(OLD.status, '') NOT LIKE 'cancelled%'", "NEW.driver_id",
+        ("orders", "created_at", "status LIKE 'cancelled%'"), {'cancelled': '1'},
+    ),
+    'kpi_order_rated': (
+        "AFTER UPDATE OF rating_score ON orders", "OLD.rating_score IS NULL AND NEW.rating_score IS NOT NULL", "NEW.driver_id",
+        ("orders", "COALESCE(completed_at, created_at)", "rating_score IS NOT NULL"),
+        {'rating_sum': 'NEW.rating_score', 'rating_count': '1'},
+    ),
+    'kpi_driver_rejection': (
+        "AFTER INSERT ON driver_rejections", "1", "NEW.driver_id", ("driver_rejections", "rejected_at", "1"), {'rejected': '1'},
+    ),
+}
+
+
+def _upsert(table: str, bucket: str, driver: str, values: dict[str, str], condition: str = "1") -> str:
+    """INSERT ... SELECT ... ON CONFLICT that adds values to the (bucket, driver) row."""
+    columns = ", ".join(values)
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in values)
+    if driver.startswith('NEW.'):
+        # An order without a driver is counted only in the overall total
+        condition = f"{driver} IS NOT NULL AND ({condition})"
+    return (
+        f"INSERT INTO {table} (bucket, driver_id, {columns}) "
+        f"SELECT {bucket}, {driver}, {', '.join(values.values())} WHERE {condition} "
+        f"ON CONFLICT(bucket, driver_id) DO UPDATE SET {updates};"
+    )
+
+
+def _bucket_of(fmt: str, event_time: str) -> str:
+    """Bucket of an event time: Unix seconds in local time, like the triggers; strings as they were written."""
+    return (
+        f"CASE WHEN typeof({event_time}) IN ('integer', 'real') THEN strftime('{fmt}', {event_time}, 'unixepoch', 'localtime') "
+        f"ELSE strftime('{fmt}', {event_time}) END"
+    )
+
+
+def _backfill(table: str, fmt: str) -> str:
+    """Backfills the rollups from the accumulated history (runs while the table is empty)."""
+    branches = []
+    for _, _, driver, (source, event_time, where), values in _EVENTS.values():
+        history = {column: value.replace('NEW.', '') for column, value in values.items()}
+        metrics = ", ".join(f"{history.get(metric, '0')} AS {metric}" for metric in METRICS)
+        driver_column = driver.replace('NEW.', '')
+        branches.append(
+            f"SELECT {_bucket_of(fmt, event_time)} AS bucket, {GLOBAL_DRIVER_ID} AS driver_id, {metrics} FROM {source} WHERE {where}"
+        )
+        if driver_column != "NULL":
+            branches.append(
+                f"SELECT {_bucket_of(fmt, event_time)}, {driver_column}, {metrics} FROM {source} "
+                f"WHERE ({where}) AND {driver_column} IS NOT NULL"
+            )
+    sums = ", ".join(f"SUM({metric})" for metric in METRICS)
+    return (
+        f"INSERT INTO {table} (bucket, driver_id, {', '.join(METRICS)}) "
+        f"SELECT bucket, driver_id, {sums} FROM ({' UNION ALL '.join(branches)}) "
+        f"WHERE bucket IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {table}) GROUP BY bucket, driver_id;"
+    )
+
+
+def kpi_rollups_script() -> str:
+    """
+    Script that creates the rollup tables, backfills them and creates the triggers.
+
+    The triggers are recreated on every startup so that changes to their logic
+    apply to an existing database.
+    """
+    metric_columns = ", ".join(f"{metric} INTEGER NOT NULL DEFAULT 0" for metric in METRICS)
+    parts = []
+    for table, fmt in ROLLUPS.items():
+        parts.append(
+            f"CREATE TABLE IF NOT EXISTS {table} (bucket TEXT NOT NULL, driver_id INTEGER NOT NULL, "
+            f"{metric_columns}, PRIMARY KEY (bucket, driver_id));"
+        )
+        parts.append(_backfill(table, fmt))
+    for name, (event, condition, driver, _, values) in _EVENTS.items():
+        statements = []
+        for table, fmt in ROLLUPS.items():
+            bucket = f"strftime('{fmt}', 'now', 'localtime')"
+            if driver != "NULL":
+                statements.append(_upsert(table, bucket, driver, values))
+            statements.append(_upsert(table, bucket, str(GLOBAL_DRIVER_ID), values))
+        parts.append(f"DROP TRIGGER IF EXISTS {name};")
+        parts.append(f"CREATE TRIGGER {name} {event} WHEN {condition} BEGIN {' '.join(statements)} END;")
+    return "\n".join(parts)
+
+
+def _hour_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _split_by_hour(started: datetime, ended: datetime) -> list[tuple[datetime, int]]:
+    """Splits an interval into (start of hour, seconds within that hour)."""
+    parts = []
+    moment = started
+    while moment < ended:
+        hour = _hour_start(moment)
+        boundary = min(hour + timedelta(hours=1), ended)
+        parts.append((hour, round((boundary - moment).total_seconds())))
+        moment = boundary
+    return parts
+
+
+def shift_online_ops(driver_id: int, started: datetime, ended: datetime, guard: str, guard_params: tuple) -> list[tuple]:
+    """
+    Statements that add shift time to the driver's rollups and to the overall total.
+
+    Each statement runs only if the guard condition holds (the shift is not yet
+    closed), so ending a shift twice does not double its time.
+    """
+    per_bucket: dict[tuple[str, str], int] = {}
+    for hour, seconds in _split_by_hour(started, ended):
+        for table, fmt in ROLLUPS.items():
+            key = (table, hour.strftime(fmt))
+            per_bucket[key] = per_bucket.get(key, 0) + seconds
+
+    ops = []
+    for (table, bucket), seconds in per_bucket.items():
+        for driver in (driver_id, GLOBAL_DRIVER_ID):
+            ops.append((_upsert(table, '?', '?', {'online_seconds': '?'}, guard), (bucket, driver, seconds, *guard_params)))
+    return ops
+
+
+def rollup_range(start: datetime, end: datetime) -> tuple[str, str, str]:
+    """
+    Chooses the rollup table for the period [start, end) and the bucket bounds.
+
+    Periods aligned to whole days are read from kpi_daily, the rest from
+    kpi_hourly with hour precision.
+    """
+    if start == start.replace(hour=0, minute=0, second=0, microsecond=0) and end == end.replace(hour=0, minute=0, second=0, microsecond=0):
+        table = 'kpi_daily'
+    else:
+        table = 'kpi_hourly'
+        start = _hour_start(start)
+        if end != _hour_start(end):
+            end = _hour_start(end) + timedelta(hours=1)
+    fmt = ROLLUPS[table]
+    return table, start.strftime(fmt), end.strftime(fmt)
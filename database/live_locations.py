@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable
+
+from loguru import logger
+
+from config.config import LIVE_LOCATION_STALE_SECONDS, LOCATION_FLUSH_INTERVAL
+from database.geo_index import driver_geo_index
+from database.timestamps import from_epoch
+
+# Function that writes a batch of coordinates to the database: [(driver_id, lat, lon, updated_at), ...]
+FlushCallback = Callable[[list[tuple[int, float, float, datetime]]], Awaitable[None]]
+
+
+class LiveLocationStore:
+    """
+    Current driver coordinates and the "on shift" flag in memory.
+
+    Each live location tick only updates the in-memory record and the geo
+    index; the latest position of every driver reaches the drivers table once
+    every flush_interval seconds in one transaction. A position older than
+    stale_after seconds is considered stale (the driver stopped sharing their
+    location).
+
+    The source of truth at startup is the drivers table (see rebuild_driver_state()).
+    """
+
+    def __init__(self, stale_after: float = 600, flush_interval: float = 30):
+        self._stale_after = timedelta(seconds=stale_after)
+        self._flush_interval = flush_interval
+        self._positions: dict[int, tuple[float, float, datetime]] = {}
+        self._dirty: set[int] = set()
+        self._on_shift: set[int] = set()
+        self._flush: FlushCallback | None = None
+        self._task: asyncio.Task | None = None
+        self._stats = {'updates': 0, 'flushed': 0, 'flushes': 0}
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Fills the store from (user_id, latitude, longitude, last_location_update, isWorking) rows."""
+        self._positions.clear()
+        self._dirty.clear()
+        self._on_shift.clear()
+        for driver_id, lat, lon, updated_at, is_working in rows:
+            if lat is not None and lon is not None:
+                if updated_at is not None and not isinstance(updated_at, datetime):
+                    updated_at = from_epoch(updated_at, tz=None)
+                self._positions[driver_id] = (lat, lon, updated_at or datetime.min)
+            if is_working:
+                self._on_shift.add(driver_id)
+
+    def record(self, driver_id: int, lat: float, lon: float, persisted: bool = False) -> None:
+        """
+        Remembers the driver's new position and updates the geo index.
+
+        Args:
+            persisted: True if the position is already written to the database and needs no deferred write.
+        """
+        self._positions[driver_id] = (lat, lon, datetime.now())
+        if persisted:
+            self._dirty.discard(driver_id)
+        else:
+            self._dirty.add(driver_id)
+        self._stats['updates'] += 1
+        driver_geo_index.update_location(driver_id, lat, lon)
+
+    def set_on_shift(self, driver_id: int, on_shift: bool) -> None:
+        if on_shift:
+            self._on_shift.add(driver_id)
+        else:
+            self._on_shift.discard(driver_id)
+
+    def forget(self, driver_id: int) -> None:
+        self._positions.pop(driver_id, None)
+        self._dirty.discard(driver_id)
+        self._on_shift.discard(driver_id)
+
+    def is_on_shift(self, driver_id: int) -> bool:
+        return driver_id in self._on_shift
+
+    def get(self, driver_id: int) -> tuple[float, float, datetime] | None:
+        """Last known position (lat, lon, update time) or None."""
+        return self._positions.get(driver_id)
+
+    def is_stale(self, driver_id: int) -> bool:
+        """True if there is no position or it has not been updated for longer than the staleness threshold."""
+        position = self._positions.get(driver_id)
+        return position is None or datetime.now() - position[2] > self._stale_after
+
+    async def flush(self) -> int:
+        """Writes the accumulated positions to the database. Returns the number of drivers in the batch."""
+        if not self._dirty or self._flush is None:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        batch = [(driver_id, *self._positions[driver_id]) for driver_id in dirty if driver_id in self._positions]
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            self._dirty |= dirty
+            logger.error(f"Не вдалося записати геолокацію {len(batch)} водіїв: {e}")
+            return 0
+        self._stats['flushed'] += len(batch)
+        self._stats['flushes'] += 1
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    def start(self, flush: FlushCallback) -> None:
+        """Starts writing positions periodically through the flush function."""
+        self._flush = flush
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="live-locations")
+
+    async def stop(self) -> None:
+        """Stops the periodic write and saves the unsaved positions."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Сховище геолокацій водіїв зупинено. Статистика: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {**self._stats, 'tracked': len(self._positions), 'on_shift': len(self._on_shift), 'pending': len(self._dirty)}
+
+
+# The single store of the application. Filled in init_db(), stopped in close_db().
+live_locations = LiveLocationStore(LIVE_LOCATION_STALE_SECONDS, LOCATION_FLUSH_INTERVAL)
@@ -0,0 +1,177 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+import aiosqlite
+
+from config.config import PAGE_CACHE_TTL, PAGE_CACHE_SIZE
+from database.pool import db_pool
+from utils.cache import TTLCache, MISSING
+
+# --- Table versions ---
+
+# Target of a write statement: INSERT [OR ...] INTO t, REPLACE INTO t, UPDATE [OR ...] t, DELETE FROM t.
+# "DO UPDATE SET" in an upsert does not name a table, so SET is skipped.
+_WRITE_TARGET = re.compile(
+    r'\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(?!SET\b)["`\[]?(\w+)',
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=512)
+def written_tables(sql: str) -> frozenset[str]:
+    """Returns the tables a statement changes (the bot has a finite set of SQL texts, so the result is cached)."""
+    return frozenset(match.lower() for match in _WRITE_TARGET.findall(sql))
+
+
+class TableVersions:
+    """
+    Per-table change counters.
+
+    The write queue bumps the version of every table touched by a committed
+    transaction. Versions are part of the page cache key, so any write makes
+    all cached pages and counts over that table stale at once, without
+    walking the cache.
+    """
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+
+    def bump(self, sql: str) -> None:
+        for table in written_tables(sql):
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+
+table_versions = TableVersions()
+
+# List pages and row counts. Keys include the table versions at read time.
+page_cache = TTLCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+
+# --- Keyset pagination ---
+
+# Cursor in button data: ">id" means rows after row id, "<id" means rows before it
+_CURSOR = re.compile(r'^([<>])(\d+)$')
+
+
+class KeysetQuery(NamedTuple):
+    """
+    Description of a paginated list.
+
+    source is the FROM part of the query (the table with alias `alias` and any
+    JOINs), keys are sort expressions with {t} in place of the alias; the primary
+    key pk is appended last so that the order is unambiguous. Key values must not
+    be NULL (tuple comparison with NULL fails), so columns that may be empty are
+    wrapped in COALESCE; columns with a DEFAULT or filled together with the status
+    are used as is so that the sort can use an index. tables are the tables whose
+    writes change the result.
+    """
+    columns: str
+    source: str
+    where: str
+    params: tuple
+    table: str
+    alias: str
+    pk: str
+    keys: tuple[str, ...]
+    descending: bool
+    tables: tuple[str, ...]
+
+
+class PageRows(list):
+    """Page rows and the cursors of the neighbouring pages for the navigation buttons."""
+
+    def __init__(self, rows=(), prev_cursor: str = '', next_cursor: str = ''):
+        super().__init__(rows)
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+
+def _order_by(query: KeysetQuery, descending: bool) -> str:
+    direction = 'DESC' if descending else 'ASC'
+    exprs = [key.format(t=query.alias) for key in query.keys] + [f"{query.alias}.{query.pk}"]
+    return ', '.join(f"{expr} {direction}" for expr in exprs)
+
+
+def _seek_condition(query: KeysetQuery, forward: bool) -> str:
+    """The "row after/before the cursor row" condition as a comparison of key tuples."""
+    outer = [key.format(t=query.alias) for key in query.keys] + [f"{query.alias}.{query.pk}"]
+    inner = [key.format(t='k') for key in query.keys] + [f"k.{query.pk}"]
+    op = '<' if query.descending == forward else '>'
+    return (
+        f"({', '.join(outer)}) {op} "
+        f"(SELECT {', '.join(inner)} FROM {query.table} k WHERE k.{query.pk} = ?)"
+    )
+
+
+async def _select(query: KeysetQuery, extra_where: str, params: tuple, descending: bool,
+                  limit: int, offset: int = 0) -> list[aiosqlite.Row]:
+    sql = (
+        f"SELECT {query.columns} FROM {query.source} WHERE ({query.where}){extra_where} "
+        f"ORDER BY {_order_by(query, descending)} LIMIT ? OFFSET ?"
+    )
+    async with db_pool.acquire() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(sql, (*query.params, *params, limit, offset))
+        return await cursor.fetchall()
+
+
+async def _fetch_page(query: KeysetQuery, limit: int, offset: int, cursor: str) -> list[aiosqlite.Row]:
+    """
+    Selects a page by cursor (seek), or with OFFSET when there is no cursor.
+
+    A seek query finds the start of the page through the index without walking
+    all the preceding rows, so turning pages does not get slower with the page
+    number. If the cursor row was deleted or the page came out short, the page is
+    re-read with OFFSET to match the number on the button.
+    """
+    match = _CURSOR.match(cursor or '')
+    if match and offset > 0:
+        forward = match.group(1) == '>'
+        condition = " AND " + _seek_condition(query, forward)
+        cursor_id = (int(match.group(2)),)
+        if forward:
+            rows = await _select(query, condition, cursor_id, query.descending, limit)
+            if rows:
+                return rows
+        else:
+            rows = await _select(query, condition, cursor_id, not query.descending, limit)
+            if len(rows) == limit:
+                return rows[::-1]
+    return await _select(query, '', (), query.descending, limit, offset)
+
+
+async def fetch_page(query: KeysetQuery, limit: int, offset: int, cursor: str = '') -> PageRows:
+    """
+    Returns a list page with the cursors for the "Back"/"Forward" buttons.
+
+    The result is cached until the first write to the query.tables tables.
+    """
+    key = ('page', query, limit, offset, cursor, table_versions.get(query.tables))
+    page = page_cache.get(key)
+    if page is not MISSING:
+        return page
+    rows = await _fetch_page(query, limit, offset, cursor)
+    page = PageRows(
+        rows,
+        prev_cursor=f"<{rows[0][query.pk]}" if rows and offset > 0 else '',
+        next_cursor=f">{rows[-1][query.pk]}" if rows else '',
+    )
+    page_cache.set(key, page)
+    return page
+
+
+async def count_rows(query: KeysetQuery) -> int:
+    """Returns the number of rows in the list; cached the same way as pages."""
+    key = ('count', query.source, query.where, query.params, table_versions.get(query.tables))
+    total = page_cache.get(key)
+    if total is not MISSING:
+        return total
+    async with db_pool.acquire() as db:
+        cursor = await db.execute(f"SELECT COUNT(*) FROM {query.source} WHERE {query.where}", query.params)
+        result = await cursor.fetchone()
+    total = result[0] if result else 0
+    page_cache.set(key, total)
+    return total
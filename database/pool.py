@@ -0,0 +1,210 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Callable
+
+import aiosqlite
+from loguru import logger
+
+from config.config import (
+    DB_PATH, DB_POOL_READERS, DB_STORAGE_PROFILE, DB_MMAP_SIZE, DB_CACHE_SIZE_KB, DB_BUSY_TIMEOUT_MS
+)
+
+# Storage profiles: the PRAGMAs applied to every pool connection.
+# journal_mode=WAL keeps readers from blocking the writer (and vice versa),
+# and synchronous=NORMAL in WAL mode only fsyncs at checkpoints.
+STORAGE_PROFILES = {
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,       # 16 MB (a negative value is in kilobytes)
+        'mmap_size': 134217728,     # 128 MB
+        'temp_store': 'MEMORY',
+    },
+    'wal_durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'mmap_size': 134217728,
+        'temp_store': 'MEMORY',
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+}
+
+
+def get_storage_pragmas(profile: str = DB_STORAGE_PROFILE) -> dict:
+    """Returns the PRAGMAs of the selected profile with the overrides from .env."""
+    if profile not in STORAGE_PROFILES:
+        logger.warning(f"Невідомий профіль сховища '{profile}', використовується 'wal'.")
+        profile = 'wal'
+    pragmas = dict(STORAGE_PROFILES[profile])
+    if DB_MMAP_SIZE is not None:
+        pragmas['mmap_size'] = int(DB_MMAP_SIZE)
+    if DB_CACHE_SIZE_KB is not None:
+        pragmas['cache_size'] = -int(DB_CACHE_SIZE_KB)
+    if DB_BUSY_TIMEOUT_MS is not None:
+        pragmas['busy_timeout'] = int(DB_BUSY_TIMEOUT_MS)
+    return pragmas
+
+
+async def apply_pragmas(conn: aiosqlite.Connection, pragmas: dict) -> None:
+    """Applies the PRAGMAs to a connection."""
+    for name, value in pragmas.items():
+        await conn.execute(f"PRAGMA {name} = {value}")
+
+
+class ConnectionPool:
+    """
+    Pool of long-lived aiosqlite connections: one connection for writing
+    and several for reading.
+
+    SQLite allows only one writer, so writes are serialized through an
+    asyncio.Lock, and readers are handed out from a queue of idle connections.
+    While the pool is not open (scripts, tests), every acquire opens a
+    one-shot connection, the same way `_get_db()` used to work.
+    """
+
+    def __init__(self, db_path: str | Path, readers: int = 4, pragmas: dict | None = None):
+        self._db_path = db_path
+        self._pragmas = pragmas or {}
+        self._readers_count = max(1, readers)
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._is_open = False
+        self._trace_callback: Callable[[str], None] | None = None
+        self._stats = {
+            'read': {'acquired': 0, 'waited': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+            'write': {'acquired': 0, 'waited': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self._is_open
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self._db_path)
+        await apply_pragmas(conn, self._pragmas)
+        if self._trace_callback is not None:
+            await conn.set_trace_callback(self._trace_callback)
+        return conn
+
+    async def set_trace_callback(self, callback: Callable[[str], None] | None) -> None:
+        """
+        Installs an SQL trace callback on all pool connections (None removes it).
+
+        The callback receives the text of every executed statement with its
+        parameters bound and is called in the aiosqlite connection thread.
+        """
+        self._trace_callback = callback
+        for conn in (self._writer, *self._all_readers):
+            if conn is not None:
+                await conn.set_trace_callback(callback)
+
+    async def open(self, db_path: str | Path | None = None) -> None:
+        """Opens the write connection and the read connections."""
+        if self._is_open:
+            return
+        if db_path is not None:
+            self._db_path = db_path
+        self._writer = await self._connect()
+        for _ in range(self._readers_count):
+            conn = await self._connect()
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        self._is_open = True
+        logger.info(f"Пул з'єднань з БД відкрито: 1 writer + {self._readers_count} readers.")
+
+    async def close(self) -> None:
+        """Closes all pool connections."""
+        if not self._is_open:
+            return
+        self._is_open = False
+        # Wait for the current write to finish so that its transaction is not cut off
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Помилка при закритті з'єднання читача: {e}")
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+        logger.info(f"Пул з'єднань з БД закрито. Статистика: {self.stats()}")
+
+    def _record_wait(self, kind: str, waited: float) -> None:
+        stats = self._stats[kind]
+        stats['acquired'] += 1
+        if waited > 0.001:
+            stats['waited'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+
+    @asynccontextmanager
+    async def acquire(self, write: bool = False):
+        """
+        Hands out a pool connection for the duration of an `async with` block.
+
+        Args:
+            write: True for the exclusive write connection, False for a read connection.
+        """
+        if not self._is_open:
+            async with aiosqlite.connect(self._db_path) as db:
+                yield db
+            return
+
+        started = time.monotonic()
+        if write:
+            await self._write_lock.acquire()
+            conn = self._writer
+        else:
+            conn = await self._readers.get()
+        self._record_wait('write' if write else 'read', time.monotonic() - started)
+
+        try:
+            yield conn
+        finally:
+            try:
+                # Functions may change row_factory; return the connection in its original state
+                conn.row_factory = None
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception as e:
+                logger.error(f"Не вдалося повернути з'єднання до пулу в чистому стані: {e}")
+            finally:
+                if write:
+                    self._write_lock.release()
+                else:
+                    self._readers.put_nowait(conn)
+
+    def stats(self) -> dict:
+        """Returns the pool size and connection wait statistics."""
+        result = {
+            'is_open': self._is_open,
+            'readers': self._readers_count if self._is_open else 0,
+            'idle_readers': self._readers.qsize(),
+            'writer_busy': self._write_lock.locked(),
+        }
+        for kind, stats in self._stats.items():
+            acquired = stats['acquired']
+            result[kind] = {
+                'acquired': acquired,
+                'waited': stats['waited'],
+                'avg_wait_ms': round(stats['wait_total'] / acquired * 1000, 3) if acquired else 0.0,
+                'max_wait_ms': round(stats['wait_max'] * 1000, 3),
+            }
+        return result
+
+
+# The single pool of the application. Opened in init_db(), closed in close_db().
+db_pool = ConnectionPool(DB_PATH, readers=DB_POOL_READERS, pragmas=get_storage_pragmas())
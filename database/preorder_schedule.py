@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Iterable
+
+from loguru import logger
+
+from config.config import PREORDER_REMINDER_MINUTES, TIMEZONE
+from database.timestamps import parse_timestamp
+from utils.timers import DeadlineScheduler
+
+# Pre-order due-time handler: receives the order ID
+DueCallback = Callable[[int], Awaitable[None]]
+
+
+def parse_scheduled_at(value: Any) -> datetime | None:
+    """
+    Pickup time of a pre-order as a time-zone-aware datetime.
+
+    orders.scheduled_at holds Unix seconds; strings (a time from the FSM and values not yet
+    converted by the migration) are isoformat with an offset or 'YYYY-MM-DD HH:MM:SS' in the bot's zone (TIMEZONE).
+    """
+    if value is None or value == '':
+        return None
+    moment = parse_timestamp(value, TIMEZONE)
+    if moment is None:
+        logger.warning(f"Нерозпізнаний час попереднього замовлення: {value!r}")
+    return moment
+
+
+class PreorderSchedule:
+    """
+    In-memory pre-order due times: starting the driver search and reminding the driver.
+
+    A 'scheduled' order gets a timer for its pickup time; an 'accepted_preorder' order
+    without a sent reminder gets one reminder_minutes before it. Timers live in a
+    DeadlineScheduler (a min-heap with one task sleeping until the nearest due time), so
+    every due time fires at its moment without periodic passes over the orders table.
+
+    The source of truth at startup is the orders table (load()); after that the queue is
+    updated by the queries.py functions that change a pre-order (track()). An order may
+    also be cancelled some other way, so the handlers re-check its status in the database.
+    """
+
+    def __init__(self, reminder_minutes: int = 30):
+        self._reminder = timedelta(minutes=reminder_minutes)
+        self.timers = DeadlineScheduler('preorders')
+        self._on_due: DueCallback | None = None
+        self._on_reminder: DueCallback | None = None
+
+    def start(self, on_due: DueCallback, on_reminder: DueCallback) -> None:
+        """Starts the timers: on_due(order_id) means it is time to search for a driver, on_reminder(order_id) to remind them."""
+        self._on_due = on_due
+        self._on_reminder = on_reminder
+        self.timers.start()
+
+    async def stop(self) -> None:
+        await self.timers.stop()
+
+    def load(self, rows: Iterable) -> None:
+        """Arms the due times from (id, status, scheduled_at, reminder_sent) rows of orders."""
+        for row in rows:
+            self.track(row['id'], row['status'], row['scheduled_at'], row['reminder_sent'])
+
+    def track(self, order_id: int, status: str, scheduled_at: Any, reminder_sent: int = 0) -> None:
+        """Re-arms the order's due times for its new state (other statuses only remove them)."""
+        self.forget(order_id)
+        moment = parse_scheduled_at(scheduled_at)
+        if moment is None:
+            return
+        now = time.time()
+        if status == 'scheduled':
+            # An overdue one (the bot was stopped) starts right away
+            self.timers.schedule(('due', order_id), moment.timestamp() - now, self._fire, 'due', order_id)
+        elif status == 'accepted_preorder' and not reminder_sent and moment.timestamp() > now:
+            self.timers.schedule(
+                ('reminder', order_id), (moment - self._reminder).timestamp() - now, self._fire, 'reminder', order_id
+            )
+
+    def forget(self, order_id: int) -> None:
+        self.timers.cancel(('due', order_id))
+        self.timers.cancel(('reminder', order_id))
+
+    def due_in(self, order_id: int) -> tuple[float | None, float | None]:
+        """Seconds until the start and until the reminder (None if not armed)."""
+        return self.timers.remaining(('due', order_id)), self.timers.remaining(('reminder', order_id))
+
+    async def _fire(self, kind: str, order_id: int) -> None:
+        callback = self._on_due if kind == 'due' else self._on_reminder
+        if callback is None:
+            logger.warning(f"Строк попереднього замовлення {order_id} ({kind}) настав до запуску обробників")
+            return
+        await callback(order_id)
+
+    def stats(self) -> dict:
+        return self.timers.stats()
+
+
+# The single pre-order due-time queue of the application
+preorder_schedule = PreorderSchedule(PREORDER_REMINDER_MINUTES)
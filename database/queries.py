@@ -1,73 +1,113 @@
 import aiosqlite
-from config.config import DB_PATH
+from database.pool import db_pool
+from database.write_queue import write_queue, WriteOp, WriteResult
+from database.geo_index import driver_geo_index
+from database.live_locations import live_locations
+from database.preorder_schedule import preorder_schedule, parse_scheduled_at
+from database.timestamps import to_epoch, from_epoch, now_epoch
+from database.pagination import KeysetQuery, PageRows, fetch_page, count_rows
+from database.stats_counters import COUNTER_QUERIES
+from database.kpi_rollups import METRICS, GLOBAL_DRIVER_ID, rollup_range, shift_online_ops
+from config.config import DISPATCH_SEARCH_RADIUS_KM, DISPATCH_MAX_DRIVERS, ROLE_CACHE_TTL, ROLE_CACHE_SIZE, TIMEZONE
+from utils.cache import TTLCache, MISSING
 from datetime import datetime, timedelta
 from loguru import logger
 import json
 import asyncio
+from typing import Iterable
 
 # --- Вспомогательная функция для подключения к БД ---
 def _get_db():
-    """Возвращает асинхронное подключение к базе данных."""
-    return aiosqlite.connect(DB_PATH)
+    """
+    Returns a read connection from the shared pool for the duration of an `async with` block.
+    Data changes go only through _write() / _write_many().
+    """
+    return db_pool.acquire()
+
+async def _write(sql: str, params=()) -> WriteResult:
+    """Puts a write statement on the shared write queue and waits until it is committed."""
+    return await write_queue.execute(sql, params)
+
+async def _write_many(*ops: WriteOp | tuple) -> list[WriteResult]:
+    """Runs several write statements atomically (all or none)."""
+    return await write_queue.transaction(list(ops))
 
 # --- Проверки статуса пользователя ---
 
+# Roles and bans are checked on almost every update but change rarely.
+# Keys: ('admin' | 'driver' | 'banned', user_id). Functions that change roles invalidate their keys.
+role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+
+async def _cached_role_check(kind: str, user_id: int, sql: str) -> bool:
+    """Returns a role check result from the cache, running the query on a miss."""
+    key = (kind, user_id)
+    cached = role_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    # If the role changes while the query is running, the answer may be stale and is not cached
+    generation = role_cache.generation(key)
+    async with _get_db() as db:
+        cursor = await db.execute(sql, (user_id,))
+        row = await cursor.fetchone()
+    result = row is not None and row[0] == 1
+    role_cache.set(key, result, generation)
+    return result
+
 async def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT 1 FROM admins WHERE user_id = ?", (user_id,))
-        return await cursor.fetchone() is not None
+    return await _cached_role_check('admin', user_id, "SELECT 1 FROM admins WHERE user_id = ?")
+
+async def is_user_admin(user_id: int) -> bool:
+    """Alias of is_admin() for the admin panel."""
+    return await is_admin(user_id)
 
 async def is_driver(user_id: int) -> bool:
     """Проверяет, является ли пользователь зарегистрированным водителем."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT 1 FROM drivers WHERE user_id = ?", (user_id,))
-        return await cursor.fetchone() is not None
+    return await _cached_role_check('driver', user_id, "SELECT 1 FROM drivers WHERE user_id = ?")
 
 async def is_user_banned(user_id: int) -> bool:
     """Проверяет, забанен ли пользователь."""
     # В новой схеме таблица 'blacklist' не используется, проверка идет по полю в 'users'
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT is_banned FROM users WHERE user_id = ?", (user_id,))
-        result = await cursor.fetchone()
-        return result[0] == 1 if result else False
+    return await _cached_role_check('banned', user_id, "SELECT is_banned FROM users WHERE user_id = ?")
 
 # --- Регистрация и обновление пользователей ---
 
 async def add_or_update_user(user_id: int, full_name: str, username: str | None):
     """Добавляет нового пользователя или обновляет информацию о существующем."""
-    async with _get_db() as db:
-        await db.execute(
-            """
-            INSERT INTO users (user_id, full_name, username, created_at, last_activity)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                full_name = excluded.full_name,
-                username = excluded.username,
-                last_activity = excluded.last_activity
-            """,
-            (user_id, full_name, username, datetime.now(), datetime.now())
-        )
-        await db.commit()
+    await _write(
+        """
+        INSERT INTO users (user_id, full_name, username, created_at, last_activity)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            full_name = excluded.full_name,
+            username = excluded.username,
+            last_activity = excluded.last_activity
+        """,
+        (user_id, full_name, username, now_epoch(), now_epoch())
+    )
 
 async def update_user_activity(user_id: int):
     """Обновляет временную метку последней активности пользователя."""
-    async with _get_db() as db:
-        await db.execute("UPDATE users SET last_activity = ? WHERE user_id = ?", (datetime.now(), user_id))
-        await db.commit()
+    await _write("UPDATE users SET last_activity = ? WHERE user_id = ?", (now_epoch(), user_id))
+
+async def update_users_activity_batch(activity: Iterable[tuple[int, datetime]]):
+    """Writes the last activity time for a batch of users in one transaction."""
+    await _write_many(WriteOp(
+        "UPDATE users SET last_activity = ? WHERE user_id = ?",
+        [(to_epoch(seen_at), user_id) for user_id, seen_at in activity],
+        many=True
+    ))
 
 async def update_client_phone(user_id: int, phone_number: str):
     """Обновляет номер телефона клиента."""
-    async with _get_db() as db:
-        await db.execute("UPDATE users SET phone_number = ? WHERE user_id = ?", (phone_number, user_id))
-        await db.commit()
+    await _write("UPDATE users SET phone_number = ? WHERE user_id = ?", (phone_number, user_id))
 
 # --- Регистрация и обновление водителей ---
 
 async def register_driver(user_id: int, full_name: str, username: str | None, phone_num: str, avto_num: str):
     """Регистрирует нового водителя."""
-    async with _get_db() as db:
-        await db.execute(
+    await _write_many(
+        (
             """
             INSERT INTO drivers (user_id, full_name, phone_num, avto_num, created_at, rating, isWorking, is_available)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -76,45 +116,53 @@ async def register_driver(user_id: int, full_name: str, username: str | None, ph
                 phone_num = excluded.phone_num,
                 avto_num = excluded.avto_num
             """,
-            (user_id, full_name, phone_num, avto_num, datetime.now(), 0.0, 0, 0)
-        )
+            (user_id, full_name, phone_num, avto_num, now_epoch(), 0.0, 0, 0)
+        ),
         # Также добавляем/обновляем запись в общей таблице users
-        await db.execute(
+        (
             """
-            INSERT INTO users (user_id, full_name, username, phone_number) VALUES (?, ?, ?, ?)
+            INSERT INTO users (user_id, full_name, username, phone_number, created_at) VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(user_id) DO UPDATE SET
                 full_name=excluded.full_name, username=excluded.username, phone_number=excluded.phone_number
             """,
-            (user_id, full_name, username, phone_num)
-        )
-        await db.commit()
+            (user_id, full_name, username, phone_num, now_epoch())
+        ),
+    )
+    role_cache.invalidate(('driver', user_id))
 
 async def update_driver_details(user_id: int, field: str, value: str):
     """Обновляет указанное поле в профиле водителя."""
-    async with _get_db() as db:
-        # Обновляем в таблице drivers
-        await db.execute(f"UPDATE drivers SET {field} = ? WHERE user_id = ?", (value, user_id))
-        # Обновляем в таблице users для консистентности
-        if field == 'full_name':
-            await db.execute("UPDATE users SET full_name = ? WHERE user_id = ?", (value, user_id))
-        elif field == 'phone_num':
-            await db.execute("UPDATE users SET phone_number = ? WHERE user_id = ?", (value, user_id))
-        await db.commit()
+    # Обновляем в таблице drivers
+    ops = [(f"UPDATE drivers SET {field} = ? WHERE user_id = ?", (value, user_id))]
+    # Обновляем в таблице users для консистентности
+    if field == 'full_name':
+        ops.append(("UPDATE users SET full_name = ? WHERE user_id = ?", (value, user_id)))
+    elif field == 'phone_num':
+        ops.append(("UPDATE users SET phone_number = ? WHERE user_id = ?", (value, user_id)))
+    await _write_many(*ops)
 
 async def delete_driver(user_id: int):
     """Удаляет водителя из системы."""
-    async with _get_db() as db:
-        await db.execute("DELETE FROM drivers WHERE user_id = ?", (user_id,))
-        await db.commit()
+    await _write("DELETE FROM drivers WHERE user_id = ?", (user_id,))
+    driver_geo_index.remove(user_id)
+    live_locations.forget(user_id)
+    role_cache.invalidate(('driver', user_id))
 
 async def update_driver_location(user_id: int, lat: float, lon: float):
     """Обновляет геолокацию водителя."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE drivers SET latitude = ?, longitude = ?, last_location_update = ? WHERE user_id = ?",
-            (lat, lon, datetime.now(), user_id)
-        )
-        await db.commit()
+    await _write(
+        "UPDATE drivers SET latitude = ?, longitude = ?, last_location_update = ? WHERE user_id = ?",
+        (lat, lon, now_epoch(), user_id)
+    )
+    live_locations.record(user_id, lat, lon, persisted=True)
+
+async def save_driver_locations_batch(locations: list[tuple[int, float, float, datetime]]):
+    """Writes a batch of live driver locations (driver_id, lat, lon, time) in one transaction."""
+    await _write_many(WriteOp(
+        "UPDATE drivers SET latitude = ?, longitude = ?, last_location_update = ? WHERE user_id = ?",
+        [(lat, lon, to_epoch(updated_at), driver_id) for driver_id, lat, lon, updated_at in locations],
+        many=True
+    ))
 
 async def get_driver_location(user_id: int) -> aiosqlite.Row | None:
     """Получает последнюю известную геолокацию водителя."""
@@ -127,63 +175,84 @@ async def get_driver_location(user_id: int) -> aiosqlite.Row | None:
 
 async def start_driver_shift(driver_id: int):
     """Начинает смену для водителя."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE drivers SET isWorking = 1, is_available = 1, shift_started_at = ? WHERE user_id = ?",
-            (datetime.now(), driver_id)
-        )
-        await db.commit()
+    await _write(
+        "UPDATE drivers SET isWorking = 1, is_available = 1, shift_started_at = ? WHERE user_id = ?",
+        (now_epoch(), driver_id)
+    )
+    driver_geo_index.set_available(driver_id, True)
+    live_locations.set_on_shift(driver_id, True)
 
 async def stop_driver_shift(driver_id: int):
-    """Завершает смену для водителя."""
+    """Ends the driver's shift and adds its duration to the KPI rollups."""
     async with _get_db() as db:
-        await db.execute(
-            "UPDATE drivers SET isWorking = 0, is_available = 0, shift_started_at = NULL WHERE user_id = ?",
+        cursor = await db.execute(
+            "SELECT shift_started_at FROM drivers WHERE user_id = ? AND isWorking = 1 AND shift_started_at IS NOT NULL",
             (driver_id,)
         )
-        await db.commit()
+        row = await cursor.fetchone()
+    ops = []
+    if row:
+        # The time is counted only if the shift with this start is still open, so ending it twice does not double it
+        ops = shift_online_ops(
+            driver_id, from_epoch(row[0], tz=None), datetime.now(),
+            "EXISTS (SELECT 1 FROM drivers WHERE user_id = ? AND isWorking = 1 AND shift_started_at = ?)", (driver_id, row[0])
+        )
+    await _write_many(
+        *ops,
+        ("UPDATE drivers SET isWorking = 0, is_available = 0, shift_started_at = NULL WHERE user_id = ?", (driver_id,)),
+    )
+    driver_geo_index.set_available(driver_id, False)
+    live_locations.set_on_shift(driver_id, False)
 
 async def set_driver_availability(driver_id: int, is_available: bool):
     """Устанавливает доступность водителя для приема заказов."""
-    async with _get_db() as db:
-        await db.execute("UPDATE drivers SET is_available = ? WHERE user_id = ?", (1 if is_available else 0, driver_id))
-        await db.commit()
+    await _write("UPDATE drivers SET is_available = ? WHERE user_id = ?", (1 if is_available else 0, driver_id))
+    driver_geo_index.set_available(driver_id, is_available)
 
 async def is_driver_on_shift(driver_id: int) -> bool:
-    """Проверяет, находится ли водитель на смене."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT isWorking FROM drivers WHERE user_id = ?", (driver_id,))
-        result = await cursor.fetchone()
-        return result[0] == 1 if result else False
+    """Checks whether the driver is on shift (from the in-memory state, see live_locations)."""
+    return live_locations.is_on_shift(driver_id)
 
 # --- Создание и управление заказами ---
 
+# Orders still waiting for the bot to act: driver search, pre-orders and repeated search.
+# They are a handful compared to the whole order history, so they have partial indexes (see init_db).
+# SQLite uses a partial index only if the condition from its WHERE appears verbatim in the query,
+# so queries over active orders add ACTIVE_ORDERS to their status condition.
+ACTIVE_ORDER_STATUSES = ('searching', 'scheduled', 'pending_dispatch', 'accepted_preorder')
+ACTIVE_ORDERS = f"status IN ({', '.join(repr(status) for status in ACTIVE_ORDER_STATUSES)})"
+
 async def create_order_in_db(client_id: int, data: dict, initial_status: str) -> int | None:
     """Создает новый заказ в базе данных и возвращает его ID."""
-    async with _get_db() as db:
-        cursor = await db.execute(
-            """
-            INSERT INTO orders (
-                client_id, status, begin_address, finish_address, comment, client_phone,
-                latitude, longitude, order_type, order_details, scheduled_at,
-                begin_address_voice_id, finish_address_voice_id
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                client_id, initial_status, data.get('begin_address'), data.get('finish_address'),
-                data.get('comment'), data.get('number'), data.get('latitude'), data.get('longitude'),
-                data.get('order_type', 'taxi'), data.get('order_details'), data.get('scheduled_at'),
-                data.get('begin_address_voice_id'), data.get('finish_address_voice_id')
-            )
+    # The pickup time comes from the FSM as a string (isoformat in the bot's time zone)
+    scheduled_at = to_epoch(parse_scheduled_at(data.get('scheduled_at')))
+    result = await _write(
+        """
+        INSERT INTO orders (
+            client_id, status, begin_address, finish_address, comment, client_phone,
+            latitude, longitude, order_type, order_details, scheduled_at,
+            begin_address_voice_id, finish_address_voice_id, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            client_id, initial_status, data.get('begin_address'), data.get('finish_address'),
+            data.get('comment'), data.get('number'), data.get('latitude'), data.get('longitude'),
+            data.get('order_type', 'taxi'), data.get('order_details'), scheduled_at,
+            data.get('begin_address_voice_id'), data.get('finish_address_voice_id'), now_epoch()
         )
-        await db.commit()
-        return cursor.lastrowid
+    )
+    if initial_status == 'scheduled':
+        preorder_schedule.track(result.lastrowid, initial_status, scheduled_at)
+    return result.lastrowid
 
 async def update_order_status(order_id: int, status: str):
     """Обновляет статус заказа."""
-    async with _get_db() as db:
-        await db.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
-        await db.commit()
+    await _write("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
+
+async def cancel_searching_order(order_id: int, status: str) -> bool:
+    """Moves the order to the cancelled status only if it is still searching for a driver."""
+    result = await _write("UPDATE orders SET status = ? WHERE id = ? AND status = 'searching'", (status, order_id))
+    return result.rowcount > 0
 
 async def get_order_details(order_id: int) -> aiosqlite.Row | None:
     """Получает детали заказа по ID."""
@@ -228,8 +297,12 @@ async def get_order_finish_address(order_id: int, user_id: int) -> str | None:
 
 async def get_working_driver_ids(order_id: int, order_lat: float | None, order_lon: float | None, excluded_driver_id: int | None = None) -> list[int]:
     """
-    Получает список ID работающих и доступных водителей, отсортированных по близости к заказу.
-    Исключает водителей, которые уже отказались от этого заказа.
+    Returns the IDs of working and available drivers, sorted by distance to the order.
+    Excludes drivers who have already rejected this order.
+
+    Candidates come from the geo index: up to DISPATCH_MAX_DRIVERS nearest (by haversine)
+    within DISPATCH_SEARCH_RADIUS_KM. Drivers with a stale location go after the others,
+    drivers without known coordinates go last.
     """
     async with _get_db() as db:
         # Получаем ID водителей, которые уже отказались
@@ -238,31 +311,45 @@ async def get_working_driver_ids(order_id: int, order_lat: float | None, order_l
         if excluded_driver_id:
             rejected_ids.add(excluded_driver_id)
 
-        # Основной запрос
-        query = "SELECT user_id, latitude, longitude FROM drivers WHERE isWorking = 1 AND is_available = 1"
-        params = []
-        if rejected_ids:
-            query += f" AND user_id NOT IN ({','.join('?' for _ in rejected_ids)})"
-            params.extend(list(rejected_ids))
-
-        cursor = await db.execute(query, params)
-        drivers = await cursor.fetchall()
-
-        if not drivers:
-            return []
-
-        # Сортировка по расстоянию, если есть координаты заказа
         if order_lat is not None and order_lon is not None:
-            drivers.sort(key=lambda d: (
-                (d[1] - order_lat)**2 + (d[2] - order_lon)**2) if d[1] is not None and d[2] is not None else float('inf')
+            nearest = driver_geo_index.nearest(
+                order_lat, order_lon, k=DISPATCH_MAX_DRIVERS,
+                radius_km=DISPATCH_SEARCH_RADIUS_KM, exclude=rejected_ids
             )
+            # Drivers with a stale location (live sharing stopped) go after those whose position is current
+            candidates = [driver_id for driver_id, _ in nearest if not live_locations.is_stale(driver_id)]
+            candidates += [driver_id for driver_id, _ in nearest if live_locations.is_stale(driver_id)]
+            candidates += [d for d in driver_geo_index.unlocated_ids() if d not in rejected_ids]
+        else:
+            candidates = [d for d in driver_geo_index.available_ids() if d not in rejected_ids]
+        candidates = candidates[:DISPATCH_MAX_DRIVERS]
+
+        if not candidates:
+            return []
+
+        # Check the candidates against the drivers table (by primary key), keeping the index order
+        cursor = await db.execute(
+            f"SELECT user_id FROM drivers WHERE isWorking = 1 AND is_available = 1 AND user_id IN ({','.join('?' for _ in candidates)})",
+            candidates
+        )
+        confirmed = {row[0] for row in await cursor.fetchall()}
+        return [driver_id for driver_id in candidates if driver_id in confirmed]
 
-        return [d[0] for d in drivers]
+async def rebuild_driver_state():
+    """Fills the geo index and the live location store from the drivers table (called at startup)."""
+    async with _get_db() as db:
+        cursor = await db.execute(
+            "SELECT user_id, latitude, longitude, last_location_update, isWorking, is_available FROM drivers"
+        )
+        rows = await cursor.fetchall()
+    driver_geo_index.load((user_id, lat, lon, is_working == 1 and is_available == 1) for user_id, lat, lon, _, is_working, is_available in rows)
+    live_locations.load(row[:5] for row in rows)
+    logger.info(f"Геоіндекс водіїв побудовано: {len(driver_geo_index)} доступних водіїв.")
 
 async def start_order_dispatch(order_id: int, driver_ids: list[int], payload: str):
     """Начинает процесс диспетчеризации, сохраняя очередь водителей и данные заказа."""
-    async with _get_db() as db:
-        await db.execute(
+    await _write_many(
+        (
             """
             UPDATE orders SET
                 dispatch_driver_ids = ?,
@@ -272,8 +359,10 @@ async def start_order_dispatch(order_id: int, driver_ids: list[int], payload: st
             WHERE id = ?
             """,
             (','.join(map(str, driver_ids)), payload, order_id)
-        )
-        await db.commit()
+        ),
+        # Offers from the previous search (if the order is searching for a driver again) are no longer valid
+        ("DELETE FROM dispatch_offers WHERE order_id = ?", (order_id,)),
+    )
 
 async def get_dispatch_payload(order_id: int) -> str | None:
     """Получает JSON-строку с данными для диспетчеризации."""
@@ -295,73 +384,130 @@ async def get_dispatch_info(order_id: int) -> tuple[list[int], int]:
 
 async def increment_dispatch_index(order_id: int):
     """Увеличивает индекс текущего водителя в очереди диспетчеризации."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE orders SET dispatch_current_driver_index = dispatch_current_driver_index + 1, dispatch_offer_sent_at = NULL WHERE id = ?",
-            (order_id,)
-        )
-        await db.commit()
+    await _write(
+        "UPDATE orders SET dispatch_current_driver_index = dispatch_current_driver_index + 1, dispatch_offer_sent_at = NULL WHERE id = ?",
+        (order_id,)
+    )
 
 async def mark_dispatch_offer_sent(order_id: int):
     """Отмечает время отправки предложения водителю."""
-    async with _get_db() as db:
-        await db.execute("UPDATE orders SET dispatch_offer_sent_at = ? WHERE id = ?", (datetime.now(), order_id))
-        await db.commit()
+    await _write("UPDATE orders SET dispatch_offer_sent_at = ? WHERE id = ?", (now_epoch(), order_id))
 
-async def get_stale_and_timed_out_dispatches(timeout_seconds: int) -> list[aiosqlite.Row]:
-    """Получает заказы, которые "зависли" в поиске или у которых истек таймаут предложения."""
+async def advance_dispatch_index(order_id: int, expected_index: int, step: int = 1) -> bool:
+    """
+    Advances the dispatch queue by step drivers only if the index is still
+    equal to expected_index. Protects against a double advance when a driver
+    rejects the order at the same moment as the timeout fires.
+    """
+    result = await _write(
+        """
+        UPDATE orders SET dispatch_current_driver_index = dispatch_current_driver_index + ?, dispatch_offer_sent_at = NULL
+        WHERE id = ? AND status = 'searching' AND dispatch_current_driver_index = ?
+        """,
+        (step, order_id, expected_index)
+    )
+    return result.rowcount > 0
+
+# --- Wave offers (DISPATCH_STRATEGY = 'broadcast') ---
+
+async def get_next_dispatch_wave(order_id: int) -> int:
+    """Returns the number of the next offer wave for the order."""
+    async with _get_db() as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(wave) + 1, 0) FROM dispatch_offers WHERE order_id = ?", (order_id,))
+        return (await cursor.fetchone())[0]
+
+async def add_dispatch_offers(order_id: int, wave: int, offers: list[tuple[int, int, int | None]]):
+    """Saves the sent offers of a wave: (driver_id, message_id, location_message_id)."""
+    now = now_epoch()
+    await _write_many(WriteOp(
+        """
+        INSERT OR REPLACE INTO dispatch_offers (order_id, driver_id, wave, message_id, location_message_id, status, sent_at)
+        VALUES (?, ?, ?, ?, ?, 'pending', ?)
+        """,
+        [(order_id, driver_id, wave, message_id, location_message_id, now) for driver_id, message_id, location_message_id in offers],
+        many=True
+    ))
+
+async def count_pending_dispatch_offers(order_id: int) -> int:
+    """Number of offers in the current wave that drivers have not answered yet."""
+    async with _get_db() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM dispatch_offers WHERE order_id = ? AND status = 'pending'", (order_id,))
+        return (await cursor.fetchone())[0]
+
+async def reject_dispatch_offer(order_id: int, driver_id: int) -> bool:
+    """Marks a driver's rejection of a wave offer. False if the driver has no active offer."""
+    result = await _write(
+        "UPDATE dispatch_offers SET status = 'rejected' WHERE order_id = ? AND driver_id = ? AND status = 'pending'",
+        (order_id, driver_id)
+    )
+    return result.rowcount > 0
+
+async def expire_dispatch_offers(order_id: int, wave: int) -> list[tuple]:
+    """Closes unanswered wave offers on timeout. Returns (driver_id, message_id, location_message_id)."""
+    result = await _write(
+        """
+        UPDATE dispatch_offers SET status = 'expired'
+        WHERE order_id = ? AND wave = ? AND status = 'pending'
+        RETURNING driver_id, message_id, location_message_id
+        """,
+        (order_id, wave)
+    )
+    return result.rows or []
+
+async def settle_dispatch_offers(order_id: int, winner_driver_id: int) -> list[tuple]:
+    """
+    Closes the offers once the order is accepted: 'accepted' for the winner, 'withdrawn' for the rest.
+    Returns the withdrawn offers (driver_id, message_id, location_message_id).
+    """
+    result = await _write(
+        """
+        UPDATE dispatch_offers SET status = CASE WHEN driver_id = ? THEN 'accepted' ELSE 'withdrawn' END
+        WHERE order_id = ? AND status = 'pending'
+        RETURNING driver_id, message_id, location_message_id
+        """,
+        (winner_driver_id, order_id)
+    )
+    return [row for row in result.rows or [] if row[0] != winner_driver_id]
+
+async def get_searching_dispatches() -> list[aiosqlite.Row]:
+    """Returns orders searching for a driver, to restore offer timers after startup."""
     async with _get_db() as db:
         db.row_factory = aiosqlite.Row
-        threshold = datetime.now() - timedelta(seconds=timeout_seconds)
         cursor = await db.execute(
+            f"""
+            SELECT o.id, o.dispatch_current_driver_index, o.dispatch_offer_sent_at,
+                   (SELECT MAX(d.wave) FROM dispatch_offers d WHERE d.order_id = o.id AND d.status = 'pending') AS wave,
+                   (SELECT MIN(d.sent_at) FROM dispatch_offers d WHERE d.order_id = o.id AND d.status = 'pending') AS wave_sent_at
+            FROM orders o
+            WHERE o.{ACTIVE_ORDERS} AND o.status = 'searching'
             """
-            SELECT * FROM orders
-            WHERE status = 'searching' AND (
-                (dispatch_offer_sent_at IS NOT NULL AND dispatch_offer_sent_at < ?) OR
-                (dispatch_offer_sent_at IS NULL)
-            )
-            """,
-            (threshold,)
         )
         return await cursor.fetchall()
 
 async def accept_order(order_id: int, driver_id: int) -> bool:
     """Принятие заказа водителем. Атомарная операция."""
-    async with _get_db() as db:
-        # Проверяем, что заказ все еще ищет водителя
-        cursor = await db.execute("SELECT status FROM orders WHERE id = ?", (order_id,))
-        status = (await cursor.fetchone() or [None])[0]
-        if status != 'searching':
-            return False
-
-        await db.execute(
-            "UPDATE orders SET driver_id = ?, status = 'accepted' WHERE id = ? AND status = 'searching'",
-            (driver_id, order_id)
-        )
-        await db.commit()
-        return db.total_changes > 0
+    # The status condition makes the UPDATE atomic: of several drivers, only the first gets the order
+    result = await _write(
+        "UPDATE orders SET driver_id = ?, status = 'accepted' WHERE id = ? AND status = 'searching'",
+        (driver_id, order_id)
+    )
+    return result.rowcount > 0
 
 async def revert_order_to_searching(order_id: int, driver_id: int) -> bool:
     """Возвращает заказ в поиск, если водитель отменил его после принятия."""
-    async with _get_db() as db:
-        # Атомарно обновляем статус, только если заказ был принят этим водителем
-        await db.execute(
-            "UPDATE orders SET status = 'searching', driver_id = NULL WHERE id = ? AND driver_id = ?",
-            (order_id, driver_id)
-        )
-        await db.commit()
-        # Записываем отказ
-        await record_driver_rejection(order_id, driver_id)
-        return db.total_changes > 0
+    # Atomically update the status only if this driver accepted the order, and record the rejection
+    results = await _write_many(
+        ("UPDATE orders SET status = 'searching', driver_id = NULL WHERE id = ? AND driver_id = ?", (order_id, driver_id)),
+        *_driver_rejection_ops(order_id, driver_id),
+    )
+    return results[0].rowcount > 0
 
 async def finish_order(order_id: int, driver_id: int):
     """Завершает заказ."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE orders SET status = 'completed', completed_at = ? WHERE id = ? AND driver_id = ?",
-            (datetime.now(), order_id, driver_id)
-        )
-        await db.commit()
+    await _write(
+        "UPDATE orders SET status = 'completed', completed_at = ? WHERE id = ? AND driver_id = ?",
+        (now_epoch(), order_id, driver_id)
+    )
 
 async def get_current_driver_for_order(order_id: int) -> int | None:
     """Получает ID водителя, которому сейчас предложен заказ."""
@@ -372,14 +518,15 @@ async def get_current_driver_for_order(order_id: int) -> int | None:
 
 # --- Предварительные заказы ---
 
-async def get_due_scheduled_orders() -> list[aiosqlite.Row]:
-    """Получает запланированные заказы, которые пора запускать в работу."""
+async def get_upcoming_preorders() -> list[aiosqlite.Row]:
+    """Returns pre-orders waiting to start or to remind the driver (for the due-time queue at startup)."""
     async with _get_db() as db:
         db.row_factory = aiosqlite.Row
-        now = datetime.now(TIMEZONE)
         cursor = await db.execute(
-            "SELECT * FROM orders WHERE status = 'scheduled' AND scheduled_at <= ?",
-            (now.strftime('%Y-%m-%d %H:%M:%S'),)
+            f"""
+            SELECT id, status, scheduled_at, reminder_sent FROM orders
+            WHERE {ACTIVE_ORDERS} AND (status = 'scheduled' OR (status = 'accepted_preorder' AND reminder_sent = 0))
+            """
         )
         return await cursor.fetchall()
 
@@ -387,145 +534,115 @@ async def get_pending_dispatch_orders() -> list[aiosqlite.Row]:
     """Получает заказы, ожидающие повторной попытки найти водителя."""
     async with _get_db() as db:
         db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM orders WHERE status = 'pending_dispatch'")
-        return await cursor.fetchall()
-
-async def get_preorders_for_reminder(minutes: int) -> list[aiosqlite.Row]:
-    """Получает принятые предзаказы, о которых пора напомнить водителю."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        now = datetime.now(TIMEZONE)
-        reminder_time_limit = now + timedelta(minutes=minutes)
-        cursor = await db.execute(
-            """
-            SELECT * FROM orders
-            WHERE status = 'accepted_preorder'
-            AND reminder_sent = 0
-            AND scheduled_at BETWEEN ? AND ?
-            """,
-            (now.strftime('%Y-%m-%d %H:%M:%S'), reminder_time_limit.strftime('%Y-%m-%d %H:%M:%S'))
-        )
+        cursor = await db.execute(f"SELECT * FROM orders WHERE {ACTIVE_ORDERS} AND status = 'pending_dispatch'")
         return await cursor.fetchall()
 
 async def mark_preorder_reminder_sent(order_id: int):
     """Отмечает, что напоминание о предзаказе было отправлено."""
-    async with _get_db() as db:
-        await db.execute("UPDATE orders SET reminder_sent = 1 WHERE id = ?", (order_id,))
-        await db.commit()
+    await _write("UPDATE orders SET reminder_sent = 1 WHERE id = ?", (order_id,))
 
-async def get_available_preorders_count(min_datetime: str, max_datetime: str) -> int:
+def _available_preorders_query(min_datetime: datetime, max_datetime: datetime) -> KeysetQuery:
+    return KeysetQuery(
+        columns="o.*", source="orders o",
+        where=f"o.{ACTIVE_ORDERS} AND o.status = 'scheduled' AND o.scheduled_at BETWEEN ? AND ?", params=(to_epoch(min_datetime), to_epoch(max_datetime)),
+        table="orders", alias="o", pk="id", keys=("{t}.scheduled_at",), descending=False,
+        tables=("orders",)
+    )
+
+async def get_available_preorders_count(min_datetime: datetime, max_datetime: datetime) -> int:
     """Считает количество доступных для взятия предзаказов."""
-    async with _get_db() as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM orders WHERE status = 'scheduled' AND scheduled_at BETWEEN ? AND ?",
-            (min_datetime, max_datetime)
-        )
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_available_preorders_query(min_datetime, max_datetime))
 
-async def get_available_preorders_page(limit: int, offset: int, min_datetime: str, max_datetime: str) -> list[aiosqlite.Row]:
+async def get_available_preorders_page(limit: int, offset: int, min_datetime: datetime, max_datetime: datetime, cursor: str = '') -> PageRows:
     """Получает страницу доступных для взятия предзаказов."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM orders WHERE status = 'scheduled' AND scheduled_at BETWEEN ? AND ? ORDER BY scheduled_at ASC LIMIT ? OFFSET ?",
-            (min_datetime, max_datetime, limit, offset)
-        )
-        return await cursor.fetchall()
-
-async def accept_preorder(order_id: int, driver_id: int):
-    """Водитель принимает предзаказ."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE orders SET driver_id = ?, status = 'accepted_preorder' WHERE id = ? AND status = 'scheduled'",
-            (driver_id, order_id)
-        )
-        await db.commit()
+    return await fetch_page(_available_preorders_query(min_datetime, max_datetime), limit, offset, cursor)
+
+async def accept_preorder(order_id: int, driver_id: int) -> bool:
+    """The driver takes a pre-order. Returns False if the order is no longer waiting for a driver."""
+    result = await _write(
+        """
+        UPDATE orders SET driver_id = ?, status = 'accepted_preorder' WHERE id = ? AND status = 'scheduled'
+        RETURNING scheduled_at, reminder_sent
+        """,
+        (driver_id, order_id)
+    )
+    if not result.rows:
+        return False
+    # Instead of starting a driver search at pickup time, the driver who took it gets a reminder
+    preorder_schedule.track(order_id, 'accepted_preorder', *result.rows[0])
+    return True
+
+def _my_preorders_query(driver_id: int) -> KeysetQuery:
+    return KeysetQuery(
+        columns="o.*", source="orders o",
+        where=f"o.{ACTIVE_ORDERS} AND o.driver_id = ? AND o.status = 'accepted_preorder'", params=(driver_id,),
+        table="orders", alias="o", pk="id", keys=("{t}.scheduled_at",), descending=False,
+        tables=("orders",)
+    )
 
 async def get_my_preorders_count(driver_id: int) -> int:
     """Считает количество активных предзаказов водителя."""
-    async with _get_db() as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM orders WHERE driver_id = ? AND status = 'accepted_preorder'",
-            (driver_id,)
-        )
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_my_preorders_query(driver_id))
 
-async def get_my_preorders_page(limit: int, offset: int, driver_id: int) -> list[aiosqlite.Row]:
+async def get_my_preorders_page(limit: int, offset: int, driver_id: int, cursor: str = '') -> PageRows:
     """Получает страницу активных предзаказов водителя."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM orders WHERE driver_id = ? AND status = 'accepted_preorder' ORDER BY scheduled_at ASC LIMIT ? OFFSET ?",
-            (driver_id, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_my_preorders_query(driver_id), limit, offset, cursor)
 
 async def cancel_preorder_by_driver(order_id: int, driver_id: int) -> int | None:
     """Водитель отменяет свой предзаказ. Возвращает ID клиента для уведомления."""
-    async with _get_db() as db:
-        # Получаем ID клиента до изменения
-        cursor = await db.execute("SELECT client_id FROM orders WHERE id = ? AND driver_id = ?", (order_id, driver_id))
-        client_id_row = await cursor.fetchone()
-        if not client_id_row:
-            return None
-
-        # Возвращаем заказ в статус 'scheduled'
-        await db.execute(
-            "UPDATE orders SET driver_id = NULL, status = 'scheduled' WHERE id = ? AND driver_id = ?",
-            (order_id, driver_id)
-        )
-        await db.commit()
-        return client_id_row[0] if db.total_changes > 0 else None
+    # Return the order to 'scheduled' and get the client ID for the notification in the same statement
+    result = await _write(
+        """
+        UPDATE orders SET driver_id = NULL, status = 'scheduled' WHERE id = ? AND driver_id = ?
+        RETURNING client_id, scheduled_at
+        """,
+        (order_id, driver_id)
+    )
+    if not result.rows:
+        return None
+    client_id, scheduled_at = result.rows[0]
+    preorder_schedule.track(order_id, 'scheduled', scheduled_at)
+    return client_id
 
 # --- Рейтинги и отзывы ---
 
 async def rate_order(order_id: int, score: int, comment: str | None):
     """Сохраняет оценку и комментарий для заказа (от клиента водителю)."""
-    async with _get_db() as db:
-        await db.execute(
-            "UPDATE orders SET is_rated = 1, rating_score = ?, rating_comment = ? WHERE id = ?",
-            (score, comment, order_id)
-        )
-        await db.commit()
+    await _write(
+        "UPDATE orders SET is_rated = 1, rating_score = ?, rating_comment = ? WHERE id = ?",
+        (score, comment, order_id)
+    )
 
 async def add_rating_to_driver(driver_id: int, score: int):
     """Обновляет совокупный рейтинг водителя."""
-    async with _get_db() as db:
-        await db.execute(
-            """
-            UPDATE drivers SET
-                rating = (rating * rating_count + ?) / (rating_count + 1),
-                rating_count = rating_count + 1
-            WHERE user_id = ?
-            """,
-            (score, driver_id)
-        )
-        await db.commit()
+    await _write(
+        """
+        UPDATE drivers SET
+            rating = (rating * rating_count + ?) / (rating_count + 1),
+            rating_count = rating_count + 1
+        WHERE user_id = ?
+        """,
+        (score, driver_id)
+    )
 
 async def add_client_review(order_id: int, client_id: int, driver_id: int, score: int, comment: str | None):
     """Сохраняет отзыв водителя о клиенте."""
-    async with _get_db() as db:
-        await db.execute(
-            "INSERT INTO client_reviews (order_id, client_id, driver_id, score, comment) VALUES (?, ?, ?, ?, ?)",
-            (order_id, client_id, driver_id, score, comment)
-        )
-        await db.commit()
+    await _write(
+        "INSERT INTO client_reviews (order_id, client_id, driver_id, score, comment, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (order_id, client_id, driver_id, score, comment, now_epoch())
+    )
 
 async def add_rating_to_client(client_id: int, score: int):
     """Обновляет совокупный рейтинг клиента."""
-    async with _get_db() as db:
-        await db.execute(
-            """
-            UPDATE users SET
-                rating = (rating * rating_count + ?) / (rating_count + 1),
-                rating_count = rating_count + 1
-            WHERE user_id = ?
-            """,
-            (score, client_id)
-        )
-        await db.commit()
+    await _write(
+        """
+        UPDATE users SET
+            rating = (rating * rating_count + ?) / (rating_count + 1),
+            rating_count = rating_count + 1
+        WHERE user_id = ?
+        """,
+        (score, client_id)
+    )
 
 async def get_order_for_rating(order_id: int) -> aiosqlite.Row | None:
     """Получает заказ для проверки, можно ли его оценить."""
@@ -585,62 +702,52 @@ async def get_driver_cabinet_data(driver_id: int) -> tuple[aiosqlite.Row | None,
 
         return driver_data, overall_completed
 
+def _driver_reviews_query(driver_id: int) -> KeysetQuery:
+    return KeysetQuery(
+        columns="o.id, o.completed_at, o.rating_score, o.rating_comment", source="orders o",
+        where="o.driver_id = ? AND o.rating_comment IS NOT NULL AND o.rating_comment != ''", params=(driver_id,),
+        table="orders", alias="o", pk="id", keys=("{t}.completed_at",), descending=True,
+        tables=("orders",)
+    )
+
 async def get_driver_reviews_count(driver_id: int) -> int:
     """Считает количество отзывов с комментариями для водителя."""
-    async with _get_db() as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM orders WHERE driver_id = ? AND rating_comment IS NOT NULL AND rating_comment != ''",
-            (driver_id,)
-        )
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_driver_reviews_query(driver_id))
 
-async def get_driver_reviews_page(limit: int, offset: int, driver_id: int) -> list[aiosqlite.Row]:
+async def get_driver_reviews_page(limit: int, offset: int, driver_id: int, cursor: str = '') -> PageRows:
     """Получает страницу отзывов с комментариями для водителя."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT completed_at, rating_score, rating_comment FROM orders WHERE driver_id = ? AND rating_comment IS NOT NULL AND rating_comment != '' ORDER BY completed_at DESC LIMIT ? OFFSET ?",
-            (driver_id, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_driver_reviews_query(driver_id), limit, offset, cursor)
 
 # --- История отказов и поездок водителя ---
 
 async def record_driver_rejection(order_id: int, driver_id: int):
     """Записывает отказ водителя от заказа."""
-    async with _get_db() as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO driver_rejections (order_id, driver_id) VALUES (?, ?)",
-            (order_id, driver_id)
-        )
+    await _write_many(*_driver_rejection_ops(order_id, driver_id))
+
+def _driver_rejection_ops(order_id: int, driver_id: int) -> list[tuple]:
+    """Write statements for a driver rejection (also used inside other transactions)."""
+    return [
+        ("INSERT OR IGNORE INTO driver_rejections (order_id, driver_id, rejected_at) VALUES (?, ?, ?)", (order_id, driver_id, now_epoch())),
         # Увеличиваем счетчик отмен у водителя
-        await db.execute("UPDATE drivers SET cancelled_count = cancelled_count + 1 WHERE user_id = ?", (driver_id,))
-        await db.commit()
+        ("UPDATE drivers SET cancelled_count = cancelled_count + 1 WHERE user_id = ?", (driver_id,)),
+    ]
+
+def _driver_rejections_query(driver_id: int) -> KeysetQuery:
+    return KeysetQuery(
+        columns="dr.id, dr.order_id, dr.rejected_at, u.full_name as client_name",
+        source="driver_rejections dr JOIN orders o ON dr.order_id = o.id JOIN users u ON o.client_id = u.user_id",
+        where="dr.driver_id = ?", params=(driver_id,),
+        table="driver_rejections", alias="dr", pk="id", keys=("{t}.rejected_at",), descending=True,
+        tables=("driver_rejections", "orders", "users")
+    )
 
 async def get_driver_rejections_count(driver_id: int) -> int:
     """Считает количество отказов для водителя."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM driver_rejections WHERE driver_id = ?", (driver_id,))
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_driver_rejections_query(driver_id))
 
-async def get_driver_rejections_page(limit: int, offset: int, driver_id: int) -> list[aiosqlite.Row]:
+async def get_driver_rejections_page(limit: int, offset: int, driver_id: int, cursor: str = '') -> PageRows:
     """Получает страницу истории отказов водителя."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT dr.order_id, dr.rejected_at, u.full_name as client_name
-            FROM driver_rejections dr
-            JOIN orders o ON dr.order_id = o.id
-            JOIN users u ON o.client_id = u.user_id
-            WHERE dr.driver_id = ?
-            ORDER BY dr.rejected_at DESC LIMIT ? OFFSET ?
-            """,
-            (driver_id, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_driver_rejections_query(driver_id), limit, offset, cursor)
 
 async def get_rejected_order_details_for_driver(order_id: int, driver_id: int) -> aiosqlite.Row | None:
     """Получает детали заказа, от которого отказался водитель."""
@@ -657,22 +764,22 @@ async def get_rejected_order_details_for_driver(order_id: int, driver_id: int) -
         )
         return await cursor.fetchone()
 
+def _completed_orders_query(role_column: str, user_id: int) -> KeysetQuery:
+    """Completed trips of a driver (role_column='driver_id') or a client ('client_id')."""
+    return KeysetQuery(
+        columns="o.id, o.created_at", source="orders o",
+        where=f"o.{role_column} = ? AND o.status = 'completed'", params=(user_id,),
+        table="orders", alias="o", pk="id", keys=("{t}.created_at",), descending=True,
+        tables=("orders",)
+    )
+
 async def get_driver_orders_count(driver_id: int) -> int:
     """Считает количество завершенных поездок водителя."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM orders WHERE driver_id = ? AND status = 'completed'", (driver_id,))
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_completed_orders_query('driver_id', driver_id))
 
-async def get_driver_orders_page(limit: int, offset: int, driver_id: int) -> list[aiosqlite.Row]:
+async def get_driver_orders_page(limit: int, offset: int, driver_id: int, cursor: str = '') -> PageRows:
     """Получает страницу истории поездок водителя."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT id, created_at FROM orders WHERE driver_id = ? AND status = 'completed' ORDER BY created_at DESC LIMIT ? OFFSET ?",
-            (driver_id, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_completed_orders_query('driver_id', driver_id), limit, offset, cursor)
 
 async def get_driver_trip_details(order_id: int, driver_id: int) -> aiosqlite.Row | None:
     """Получает детали завершенной поездки для водителя."""
@@ -705,23 +812,15 @@ async def get_client_stats(user_id: int) -> aiosqlite.Row | None:
 
 async def increment_client_finish_count(client_id: int):
     """Увеличивает счетчик успешных поездок клиента."""
-    async with _get_db() as db:
-        await db.execute("UPDATE users SET finish_applic = finish_applic + 1 WHERE user_id = ?", (client_id,))
-        await db.commit()
+    await _write("UPDATE users SET finish_applic = finish_applic + 1 WHERE user_id = ?", (client_id,))
 
 async def get_user_orders_count(user_id: int) -> int:
     """Считает количество завершенных поездок клиента."""
-    return await get_driver_orders_count(user_id) # Логика та же, но для client_id
+    return await count_rows(_completed_orders_query('client_id', user_id))
 
-async def get_user_orders_page(limit: int, offset: int, user_id: int) -> list[aiosqlite.Row]:
+async def get_user_orders_page(limit: int, offset: int, user_id: int, cursor: str = '') -> PageRows:
     """Получает страницу истории поездок клиента."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT id, created_at FROM orders WHERE client_id = ? AND status = 'completed' ORDER BY created_at DESC LIMIT ? OFFSET ?",
-            (user_id, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_completed_orders_query('client_id', user_id), limit, offset, cursor)
 
 async def get_trip_details(order_id: int, user_id: int) -> aiosqlite.Row | None:
     """Получает детали поездки для клиента."""
@@ -757,18 +856,14 @@ async def get_fav_address_by_name(user_id: int, name: str) -> tuple | None:
 
 async def add_fav_address(user_id: int, name: str, address: str, lat: float | None, lon: float | None):
     """Добавляет новый избранный адрес."""
-    async with _get_db() as db:
-        await db.execute(
-            "INSERT INTO favorite_addresses (user_id, name, address, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
-            (user_id, name, address, lat, lon)
-        )
-        await db.commit()
+    await _write(
+        "INSERT INTO favorite_addresses (user_id, name, address, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+        (user_id, name, address, lat, lon)
+    )
 
 async def delete_fav_address(address_id: int, user_id: int):
     """Удаляет избранный адрес."""
-    async with _get_db() as db:
-        await db.execute("DELETE FROM favorite_addresses WHERE id = ? AND user_id = ?", (address_id, user_id))
-        await db.commit()
+    await _write("DELETE FROM favorite_addresses WHERE id = ? AND user_id = ?", (address_id, user_id))
 
 # --- Админ-панель ---
 
@@ -781,74 +876,159 @@ async def get_all_admins() -> list[aiosqlite.Row]:
 
 async def add_admin(user_id: int):
     """Добавляет пользователя в администраторы."""
-    async with _get_db() as db:
-        await db.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (user_id,))
-        await db.execute("UPDATE users SET is_admin = 1 WHERE user_id = ?", (user_id,))
-        await db.commit()
+    await _write_many(
+        ("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (user_id,)),
+        ("UPDATE users SET is_admin = 1 WHERE user_id = ?", (user_id,)),
+    )
+    role_cache.invalidate(('admin', user_id))
 
 async def remove_admin(user_id: int):
     """Удаляет пользователя из администраторов."""
-    async with _get_db() as db:
-        await db.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
-        await db.execute("UPDATE users SET is_admin = 0 WHERE user_id = ?", (user_id,))
-        await db.commit()
+    await _write_many(
+        ("DELETE FROM admins WHERE user_id = ?", (user_id,)),
+        ("UPDATE users SET is_admin = 0 WHERE user_id = ?", (user_id,)),
+    )
+    role_cache.invalidate(('admin', user_id))
+
+async def set_admin_status(user_id: int, is_admin: bool):
+    """Grants or revokes admin rights."""
+    if is_admin:
+        await add_admin(user_id)
+    else:
+        await remove_admin(user_id)
 
 async def ban_user(user_id: int):
     """Блокирует пользователя."""
-    async with _get_db() as db:
-        await db.execute("UPDATE users SET is_banned = 1 WHERE user_id = ?", (user_id,))
-        await db.commit()
+    await _write("UPDATE users SET is_banned = 1 WHERE user_id = ?", (user_id,))
+    role_cache.invalidate(('banned', user_id))
 
 async def unban_user(user_id: int):
     """Разблокирует пользователя."""
-    async with _get_db() as db:
-        await db.execute("UPDATE users SET is_banned = 0 WHERE user_id = ?", (user_id,))
-        await db.commit()
+    await _write("UPDATE users SET is_banned = 0 WHERE user_id = ?", (user_id,))
+    role_cache.invalidate(('banned', user_id))
 
 async def get_main_stats() -> dict:
-    """Получает основную статистику для админ-панели."""
+    """Returns the main admin panel statistics from the counters (see database/stats_counters.py)."""
     async with _get_db() as db:
-        total_drivers_c = await db.execute("SELECT COUNT(*) FROM drivers")
-        working_drivers_c = await db.execute("SELECT COUNT(*) FROM drivers WHERE isWorking = 1")
-        total_clients_c = await db.execute("SELECT COUNT(*) FROM users")
-        active_orders_c = await db.execute("SELECT COUNT(*) FROM orders WHERE status NOT IN ('completed', 'cancelled_by_user', 'cancelled_no_drivers', 'cancelled_by_admin')")
-        completed_orders_c = await db.execute("SELECT COUNT(*) FROM orders WHERE status = 'completed'")
-        
-        return {
-            'total_drivers': (await total_drivers_c.fetchone() or [0])[0],
-            'working_drivers': (await working_drivers_c.fetchone() or [0])[0],
-            'total_clients': (await total_clients_c.fetchone() or [0])[0],
-            'active_orders': (await active_orders_c.fetchone() or [0])[0],
-            'completed_orders': (await completed_orders_c.fetchone() or [0])[0],
-        }
+        cursor = await db.execute("SELECT name, value FROM stats_counters")
+        counters = dict(await cursor.fetchall())
+    return {name: counters.get(name, 0) for name in COUNTER_QUERIES}
 
-async def get_drivers_count(is_working: bool | None = None) -> int:
-    """Считает количество водителей по статусу."""
-    query = "SELECT COUNT(*) FROM drivers"
-    params = []
-    if is_working is not None:
-        query += " WHERE isWorking = ?"
-        params.append(1 if is_working else 0)
-    
+async def reconcile_stats_counters() -> dict[str, int]:
+    """
+    Reconciles the admin panel counters with the tables and fixes any drift.
+
+    The counters and the reference COUNT(*) values are read in one read
+    transaction, i.e. from one database snapshot. The correction is applied as
+    a delta, so it does not overwrite changes committed after the snapshot.
+    Returns the corrections per counter.
+    """
     async with _get_db() as db:
-        cursor = await db.execute(query, params)
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+        await db.execute("BEGIN")
+        try:
+            cursor = await db.execute("SELECT name, value FROM stats_counters")
+            stored = dict(await cursor.fetchall())
+            actual = {}
+            for name, sql in COUNTER_QUERIES.items():
+                cursor = await db.execute(sql)
+                actual[name] = (await cursor.fetchone())[0]
+        finally:
+            await db.execute("COMMIT")
+
+    corrections = {name: value - stored.get(name, 0) for name, value in actual.items() if value != stored.get(name, 0)}
+    if corrections:
+        await _write_many(*[
+            (
+                "INSERT INTO stats_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, delta)
+            )
+            for name, delta in corrections.items()
+        ])
+        logger.warning(f"Лічильники адмін-панелі розійшлися з таблицями, виправлено: {corrections}")
+    return corrections
+
+# --- KPI and analytics ---
+
+async def _open_shift_seconds(db: aiosqlite.Connection, start: datetime, end: datetime,
+                              driver_ids: Iterable[int] | None = None) -> dict[int, int]:
+    """Time of shifts still open within the period (it reaches the rollups only when the shift ends)."""
+    cursor = await db.execute("SELECT user_id, shift_started_at FROM drivers WHERE isWorking = 1 AND shift_started_at IS NOT NULL")
+    wanted = set(driver_ids) if driver_ids is not None else None
+    until = min(end, datetime.now())
+    result = {}
+    for user_id, started_at in await cursor.fetchall():
+        if wanted is not None and user_id not in wanted:
+            continue
+        since = max(start, from_epoch(started_at, tz=None))
+        if since < until:
+            result[user_id] = round((until - since).total_seconds())
+    return result
+
+async def get_kpi_summary(start: datetime, end: datetime) -> dict:
+    """Returns the overall KPI for the period [start, end) from the rollups (see database/kpi_rollups.py)."""
+    table, first, last = rollup_range(start, end)
+    sums = ", ".join(f"COALESCE(SUM({metric}), 0) AS {metric}" for metric in METRICS)
+    async with _get_db() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"SELECT {sums} FROM {table} WHERE driver_id = ? AND bucket >= ? AND bucket < ?",
+            (GLOBAL_DRIVER_ID, first, last)
+        )
+        kpi = dict(await cursor.fetchone())
+        kpi['online_seconds'] += sum((await _open_shift_seconds(db, start, end)).values())
+    return kpi
 
-async def get_drivers_page(limit: int, offset: int, is_working: bool | None = None) -> list[aiosqlite.Row]:
-    """Получает страницу со списком водителей."""
-    query = "SELECT user_id, full_name FROM drivers"
-    params = []
-    if is_working is not None:
-        query += " WHERE isWorking = ?"
-        params.append(1 if is_working else 0)
-    query += " ORDER BY full_name LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+async def get_drivers_kpi_page(limit: int, offset: int, start: datetime, end: datetime, cursor: str = '') -> list[dict]:
+    """
+    Returns a page of driver KPI for the period [start, end), most trips first.
 
+    The sort is over the rollups, so the page is selected with OFFSET (cursor is
+    accepted for compatibility with show_paginated_list); there are orders of
+    magnitude fewer drivers than orders.
+    """
+    table, first, last = rollup_range(start, end)
+    sums = ", ".join(f"SUM({metric}) AS {metric}" for metric in METRICS)
+    columns = ", ".join(f"COALESCE(k.{metric}, 0) AS {metric}" for metric in METRICS)
     async with _get_db() as db:
         db.row_factory = aiosqlite.Row
-        cursor = await db.execute(query, params)
-        return await cursor.fetchall()
+        cursor = await db.execute(
+            f"""
+            SELECT d.user_id, d.full_name, {columns}
+            FROM drivers d
+            LEFT JOIN (
+                SELECT driver_id, {sums} FROM {table}
+                WHERE bucket >= ? AND bucket < ? AND driver_id != ?
+                GROUP BY driver_id
+            ) k ON k.driver_id = d.user_id
+            ORDER BY COALESCE(k.completed, 0) DESC, d.user_id
+            LIMIT ? OFFSET ?
+            """,
+            (first, last, GLOBAL_DRIVER_ID, limit, offset)
+        )
+        rows = [dict(row) for row in await cursor.fetchall()]
+        open_shifts = await _open_shift_seconds(db, start, end, [row['user_id'] for row in rows])
+    for row in rows:
+        row['online_seconds'] += open_shifts.get(row['user_id'], 0)
+    return rows
+
+def _drivers_query(is_working: bool | None) -> KeysetQuery:
+    where, params = "1", ()
+    if is_working is not None:
+        where, params = "d.isWorking = ?", (1 if is_working else 0,)
+    return KeysetQuery(
+        columns="d.user_id, d.full_name", source="drivers d", where=where, params=params,
+        table="drivers", alias="d", pk="user_id", keys=("COALESCE({t}.full_name, '')",), descending=False,
+        tables=("drivers",)
+    )
+
+async def get_drivers_count(is_working: bool | None = None) -> int:
+    """Считает количество водителей по статусу."""
+    return await count_rows(_drivers_query(is_working))
+
+async def get_drivers_page(limit: int, offset: int, is_working: bool | None = None, cursor: str = '') -> PageRows:
+    """Получает страницу со списком водителей."""
+    return await fetch_page(_drivers_query(is_working), limit, offset, cursor)
 
 async def get_driver_details(user_id: int) -> aiosqlite.Row | None:
     """Получает детальную информацию о водителе для админ-панели."""
@@ -865,33 +1045,25 @@ async def get_driver_details(user_id: int) -> aiosqlite.Row | None:
         )
         return await cursor.fetchone()
 
-async def get_clients_count(search_query: str | None = None) -> int:
-    """Считает количество клиентов, опционально с поиском."""
-    query = "SELECT COUNT(*) FROM users"
-    params = []
+def _clients_query(search_query: str | None) -> KeysetQuery:
+    where, params = "1", ()
     if search_query:
-        query += " WHERE full_name LIKE ? OR username LIKE ? OR phone_number LIKE ?"
-        params.extend([f'%{search_query}%'] * 3)
+        where = "u.full_name LIKE ? OR u.username LIKE ? OR u.phone_number LIKE ?"
+        params = (f'%{search_query}%',) * 3
+    return KeysetQuery(
+        columns="u.user_id, u.full_name, u.phone_number, u.finish_applic, u.cancel_applic",
+        source="users u", where=where, params=params,
+        table="users", alias="u", pk="user_id", keys=("COALESCE({t}.last_activity, 0)",), descending=True,
+        tables=("users",)
+    )
 
-    async with _get_db() as db:
-        cursor = await db.execute(query, params)
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+async def get_clients_count(search_query: str | None = None) -> int:
+    """Считает количество клиентов, опционально с поиском."""
+    return await count_rows(_clients_query(search_query))
 
-async def get_clients_page(limit: int, offset: int, search_query: str | None = None) -> list[aiosqlite.Row]:
+async def get_clients_page(limit: int, offset: int, search_query: str | None = None, cursor: str = '') -> PageRows:
     """Получает страницу со списком клиентов, опционально с поиском."""
-    query = "SELECT user_id, full_name FROM users"
-    params = []
-    if search_query:
-        query += " WHERE full_name LIKE ? OR username LIKE ? OR phone_number LIKE ?"
-        params.extend([f'%{search_query}%'] * 3)
-    query += " ORDER BY last_activity DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
-
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(query, params)
-        return await cursor.fetchall()
+    return await fetch_page(_clients_query(search_query), limit, offset, cursor)
 
 async def get_client_details(user_id: int) -> aiosqlite.Row | None:
     """Получает детальную информацию о клиенте для админ-панели."""
@@ -910,27 +1082,22 @@ async def get_client_name(user_id: int) -> str | None:
         result = await cursor.fetchone()
         return result[0] if result else None
 
+def _orders_by_status_query(status: str) -> KeysetQuery:
+    return KeysetQuery(
+        columns="o.id, o.created_at, u.full_name as client_name",
+        source="orders o JOIN users u ON o.client_id = u.user_id",
+        where="o.status = ?", params=(status,),
+        table="orders", alias="o", pk="id", keys=("{t}.created_at",), descending=True,
+        tables=("orders", "users")
+    )
+
 async def get_orders_count_by_status(status: str) -> int:
     """Считает количество заказов по статусу."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM orders WHERE status = ?", (status,))
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_orders_by_status_query(status))
 
-async def get_orders_page_by_status(status: str, limit: int, offset: int) -> list[aiosqlite.Row]:
+async def get_orders_page_by_status(status: str, limit: int, offset: int, cursor: str = '') -> PageRows:
     """Получает страницу заказов по статусу."""
-    async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT o.id, o.created_at, u.full_name as client_name
-            FROM orders o
-            JOIN users u ON o.client_id = u.user_id
-            WHERE o.status = ? ORDER BY o.created_at DESC LIMIT ? OFFSET ?
-            """,
-            (status, limit, offset)
-        )
-        return await cursor.fetchall()
+    return await fetch_page(_orders_by_status_query(status), limit, offset, cursor)
 
 async def get_driver_info_for_client(driver_id: int) -> aiosqlite.Row | None:
     """Получает информацию о водителе для показа клиенту."""
@@ -947,20 +1114,196 @@ async def get_full_user_info(user_id: int) -> tuple:
     # Эта функция-заглушка, ее нужно будет реализовать
     return f"User Info for {user_id}", False, False, False, False, False
 
+def _client_orders_query(client_id: int) -> KeysetQuery:
+    return KeysetQuery(
+        columns="o.id, o.created_at, o.status", source="orders o",
+        where="o.client_id = ?", params=(client_id,),
+        table="orders", alias="o", pk="id", keys=("{t}.created_at",), descending=True,
+        tables=("orders",)
+    )
+
 async def get_all_orders_count_by_client(client_id: int) -> int:
     """Считает все заказы клиента."""
-    async with _get_db() as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM orders WHERE client_id = ?", (client_id,))
-        result = await cursor.fetchone()
-        return result[0] if result else 0
+    return await count_rows(_client_orders_query(client_id))
 
-async def get_all_orders_page_by_client(client_id: int, limit: int, offset: int) -> list[aiosqlite.Row]:
+async def get_all_orders_page_by_client(client_id: int, limit: int, offset: int, cursor: str = '') -> PageRows:
     """Получает страницу всех заказов клиента."""
+    return await fetch_page(_client_orders_query(client_id), limit, offset, cursor)
+
+
+# --- FSM storage ---
+
+async def get_fsm_records(updated_since: float) -> list[tuple]:
+    """Returns saved FSM states (key, state, data, updated_at) changed no earlier than updated_since."""
     async with _get_db() as db:
-        db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            "SELECT id, created_at, status FROM orders WHERE client_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
-            (client_id, limit, offset)
+            "SELECT key, state, data, updated_at FROM fsm_storage WHERE updated_at >= ?",
+            (updated_since,)
         )
         return await cursor.fetchall()
 
+async def save_fsm_records(upserts: list[tuple], deletes: list[str]):
+    """Saves changed FSM states (key, state, data, updated_at) and deletes cleared ones in one transaction."""
+    ops = []
+    if upserts:
+        ops.append(WriteOp(
+            """
+            INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            """,
+            upserts, many=True
+        ))
+    if deletes:
+        ops.append(WriteOp("DELETE FROM fsm_storage WHERE key = ?", [(key,) for key in deletes], many=True))
+    if ops:
+        await _write_many(*ops)
+
+async def delete_expired_fsm_records(updated_before: float):
+    """Deletes abandoned FSM states."""
+    await _write("DELETE FROM fsm_storage WHERE updated_at < ?", (updated_before,))
+
+
+# --- Geocoding cache ---
+
+async def get_geocode_cache_entries(created_since: float) -> tuple[list[tuple], list[tuple]]:
+    """
+    Returns the unexpired geocoding cache entries.
+
+    Returns:
+        Two lists, oldest first: (query, results, created_at) for forward and
+        (lat_key, lon_key, address, latitude, longitude, created_at) for reverse geocoding.
+    """
+    async with _get_db() as db:
+        cursor = await db.execute(
+            "SELECT query, results, created_at FROM geocode_cache WHERE created_at >= ? ORDER BY created_at",
+            (created_since,)
+        )
+        forward_rows = await cursor.fetchall()
+        cursor = await db.execute(
+            """
+            SELECT lat_key, lon_key, address, latitude, longitude, created_at FROM reverse_geocode_cache
+            WHERE created_at >= ? ORDER BY created_at
+            """,
+            (created_since,)
+        )
+        return forward_rows, await cursor.fetchall()
+
+async def save_geocode_result(query: str, results: str, created_at: float):
+    """Saves forward geocoding results (a JSON list of [address, latitude, longitude])."""
+    await _write(
+        "INSERT OR REPLACE INTO geocode_cache (query, results, created_at) VALUES (?, ?, ?)",
+        (query, results, created_at)
+    )
+
+async def save_reverse_geocode_result(lat_key: float, lon_key: float, address: str, latitude: float, longitude: float, created_at: float):
+    """Saves a reverse geocoding result for rounded coordinates."""
+    await _write(
+        """
+        INSERT OR REPLACE INTO reverse_geocode_cache (lat_key, lon_key, address, latitude, longitude, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (lat_key, lon_key, address, latitude, longitude, created_at)
+    )
+
+async def delete_expired_geocode_results(created_before: float):
+    """Deletes expired geocoding cache entries."""
+    await _write_many(
+        ("DELETE FROM geocode_cache WHERE created_at < ?", (created_before,)),
+        ("DELETE FROM reverse_geocode_cache WHERE created_at < ?", (created_before,)),
+    )
+
+# --- Newsletters ---
+
+# Newsletter recipients for each audience
+_NEWSLETTER_AUDIENCES = {
+    'all': "SELECT user_id FROM users",
+    'clients': "SELECT user_id FROM users WHERE user_id NOT IN (SELECT user_id FROM drivers)",
+    'drivers': "SELECT user_id FROM drivers",
+}
+
+async def get_newsletter_audience_count(audience: str) -> int:
+    """Counts newsletter recipients for an audience ('all', 'clients' or 'drivers')."""
+    async with _get_db() as db:
+        cursor = await db.execute(f"SELECT COUNT(*) FROM ({_NEWSLETTER_AUDIENCES[audience]})")
+        return (await cursor.fetchone())[0]
+
+async def create_newsletter_job(audience: str, from_chat_id: int, message_id: int, total: int,
+                                status_chat_id: int | None = None, status_message_id: int | None = None) -> int:
+    """Creates a newsletter job (a copy of message message_id from chat from_chat_id) and returns its ID."""
+    if audience not in _NEWSLETTER_AUDIENCES:
+        raise ValueError(f"unknown newsletter audience: {audience!r}")
+    result = await _write(
+        """
+        INSERT INTO newsletter_jobs (audience, from_chat_id, message_id, total, status_chat_id, status_message_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (audience, from_chat_id, message_id, total, status_chat_id, status_message_id, now_epoch())
+    )
+    return result.lastrowid
+
+async def get_newsletter_job(job_id: int) -> aiosqlite.Row | None:
+    """Returns a newsletter job by ID."""
+    async with _get_db() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("SELECT * FROM newsletter_jobs WHERE id = ?", (job_id,))
+        return await cursor.fetchone()
+
+async def get_unfinished_newsletter_jobs() -> list[aiosqlite.Row]:
+    """Returns newsletters interrupted by a bot shutdown."""
+    async with _get_db() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("SELECT * FROM newsletter_jobs WHERE status = 'running' ORDER BY id")
+        return await cursor.fetchall()
+
+async def get_newsletter_recipients_page(job_id: int, audience: str, after_user_id: int, limit: int) -> list[int]:
+    """
+    Returns the next page of newsletter recipients by ascending user_id (keyset on after_user_id).
+    Recipients whose delivery is already recorded are skipped, so an interrupted newsletter resumes without repeats.
+    """
+    async with _get_db() as db:
+        cursor = await db.execute(
+            f"""
+            SELECT a.user_id FROM ({_NEWSLETTER_AUDIENCES[audience]}) a
+            WHERE a.user_id > ?
+              AND NOT EXISTS (SELECT 1 FROM newsletter_deliveries d WHERE d.job_id = ? AND d.user_id = a.user_id)
+            ORDER BY a.user_id
+            LIMIT ?
+            """,
+            (after_user_id, job_id, limit)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+async def record_newsletter_delivery(job_id: int, user_id: int, status: str):
+    """Records the delivery result for a recipient ('sent' or 'failed')."""
+    await _write(
+        "INSERT OR REPLACE INTO newsletter_deliveries (job_id, user_id, status) VALUES (?, ?, ?)",
+        (job_id, user_id, status)
+    )
+
+async def save_newsletter_progress(job_id: int, cursor: int, sent: int, failed: int):
+    """Advances the newsletter cursor: delivery is already recorded for all recipients with user_id <= cursor."""
+    await _write(
+        "UPDATE newsletter_jobs SET cursor = MAX(cursor, ?), sent = ?, failed = ? WHERE id = ?",
+        (cursor, sent, failed, job_id)
+    )
+
+async def finish_newsletter_job(job_id: int) -> tuple[int, int]:
+    """
+    Finishes the newsletter, recomputing the totals from the delivery records.
+
+    Returns:
+        A (delivered, failed) pair.
+    """
+    result = await _write(
+        """
+        UPDATE newsletter_jobs SET
+            status = 'done',
+            sent = (SELECT COUNT(*) FROM newsletter_deliveries WHERE job_id = ? AND status = 'sent'),
+            failed = (SELECT COUNT(*) FROM newsletter_deliveries WHERE job_id = ? AND status = 'failed'),
+            finished_at = ?
+        WHERE id = ?
+        RETURNING sent, failed
+        """,
+        (job_id, job_id, now_epoch(), job_id)
+    )
+    return tuple(result.rows[0]) if result.rows else (0, 0)
@@ -0,0 +1,94 @@
+# Counters for the admin panel (drivers, clients, orders).
+#
+# The values live in the stats_counters table and are changed by triggers on drivers, users and orders,
+# i.e. in the same transaction as the write that changes them: any function in queries.py that
+# creates a user or an order, or changes an order status or a driver's shift, updates the
+# counters without extra code. get_main_stats() reads five rows instead of COUNT(*) over the tables.
+# The reference COUNTER_QUERIES are used for the initial fill and the periodic
+# reconciliation (reconcile_stats_counters() in queries.py).
+
+# Statuses of finished orders; an order in any other status counts as active
+TERMINAL_ORDER_STATUSES = ('completed', 'cancelled_by_user', 'cancelled_no_drivers', 'cancelled_by_admin')
+
+_TERMINAL_SQL = ", ".join(f"'{status}'" for status in TERMINAL_ORDER_STATUSES)
+
+COUNTER_QUERIES = {
+    'total_drivers': "SELECT COUNT(*) FROM drivers",
+    'working_drivers': "SELECT COUNT(*) FROM drivers WHERE isWorking = 1",
+    'total_clients': "SELECT COUNT(*) FROM users",
+    'active_orders': f"SELECT COUNT(*) FROM orders WHERE status NOT IN ({_TERMINAL_SQL})",
+    'completed_orders': "SELECT COUNT(*) FROM orders WHERE status = 'completed'",
+}
+
+# Contribution of a row to a counter (0 or 1). COALESCE: for NULL the WHERE condition in COUNTER_QUERIES is false too.
+def _active(row: str) -> str:
+    return f"COALESCE({row}.status NOT IN ({_TERMINAL_SQL}), 0)"
+
+def _completed(row: str) -> str:
+    return f"COALESCE({row}.status = 'completed', 0)"
+
+def _working(row: str) -> str:
+    return f"COALESCE({row}.isWorking = 1, 0)"
+
+def _add(name: str, delta: str) -> str:
+    return f"UPDATE stats_counters SET value = value + ({delta}) WHERE name = '{name}';"
+
+_TRIGGERS = {
+    'stats_orders_insert': f"""
+        AFTER INSERT ON orders BEGIN
+            {_add('active_orders', _active('NEW'))}
+            {_add('completed_orders', _completed('NEW'))}
+        END""",
+    'stats_orders_delete': f"""
+        AFTER DELETE ON orders BEGIN
+            {_add('active_orders', '-' + _active('OLD'))}
+            {_add('completed_orders', '-' + _completed('OLD'))}
+        END""",
+    'stats_orders_status': f"""
+        AFTER UPDATE OF status ON orders WHEN OLD.status IS NOT NEW.status BEGIN
+            {_add('active_orders', f"{_active('NEW')} - {_active('OLD')}")}
+            {_add('completed_orders', f"{_completed('NEW')} - {_completed('OLD')}")}
+        END""",
+    'stats_drivers_insert': f"""
+        AFTER INSERT ON drivers BEGIN
+            {_add('total_drivers', '1')}
+            {_add('working_drivers', _working('NEW'))}
+        END""",
+    'stats_drivers_delete': f"""
+        AFTER DELETE ON drivers BEGIN
+            {_add('total_drivers', '-1')}
+            {_add('working_drivers', '-' + _working('OLD'))}
+        END""",
+    'stats_drivers_shift': f"""
+        AFTER UPDATE OF isWorking ON drivers WHEN OLD.isWorking IS NOT NEW.isWorking BEGIN
+            {_add('working_drivers', f"{_working('NEW')} - {_working('OLD')}")}
+        END""",
+    'stats_users_insert': f"""
+        AFTER INSERT ON users BEGIN
+            {_add('total_clients', '1')}
+        END""",
+    'stats_users_delete': f"""
+        AFTER DELETE ON users BEGIN
+            {_add('total_clients', '-1')}
+        END""",
+}
+
+
+def stats_counters_script() -> str:
+    """
+    Script that creates the counters table and the triggers.
+
+    The triggers are recreated on every startup so that changes to their logic
+    apply to an existing database. Missing counters are filled by the reference
+    queries (the full count runs only once).
+    """
+    parts = ["CREATE TABLE IF NOT EXISTS stats_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0);"]
+    for name, sql in COUNTER_QUERIES.items():
+        parts.append(
+            f"INSERT INTO stats_counters (name, value) SELECT '{name}', ({sql}) "
+            f"WHERE NOT EXISTS (SELECT 1 FROM stats_counters WHERE name = '{name}');"
+        )
+    for name, body in _TRIGGERS.items():
+        parts.append(f"DROP TRIGGER IF EXISTS {name};")
+        parts.append(f"CREATE TRIGGER {name} {body};")
+    return "\n".join(parts)
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import timezone, tzinfo
+
+from loguru import logger
+
+from config.config import TIMESTAMP_MIGRATION_BATCH_SIZE, TIMESTAMP_MIGRATION_PAUSE, TIMEZONE
+from database.pool import db_pool
+from database.timestamps import SERVER_LOCAL, parse_timestamp, to_epoch
+from database.write_queue import write_queue, WriteOp
+
+# Conversion of old string dates to Unix seconds (see database/timestamps.py).
+#
+# Before the switch, times were written in several forms: DEFAULT CURRENT_TIMESTAMP is a UTC string,
+# datetime.now() is a repr of the server's local time, a pre-order pickup time is an isoformat with
+# an offset or a string in the bot's time zone. Each column lists the zone its strings without an
+# offset were written in; an offset in the string itself always wins.
+
+# Table -> {column: zone of strings without an offset}
+LEGACY_TIMESTAMP_COLUMNS: dict[str, dict[str, tzinfo | None]] = {
+    # users.created_at is written by add_or_update_user (local time), while a row created by driver
+    # registration gets the DEFAULT (UTC); the former are far more common, so the column is treated as local
+    'users': {'created_at': SERVER_LOCAL, 'last_activity': SERVER_LOCAL},
+    'clients': {'created_at': timezone.utc, 'last_activity': SERVER_LOCAL},
+    'drivers': {'last_location_update': SERVER_LOCAL, 'shift_started_at': SERVER_LOCAL, 'created_at': SERVER_LOCAL},
+    'orders': {
+        'created_at': timezone.utc, 'completed_at': SERVER_LOCAL, 'scheduled_at': TIMEZONE,
+        'pending_dispatch_at': SERVER_LOCAL, 'dispatch_offer_sent_at': SERVER_LOCAL,
+    },
+    'client_reviews': {'created_at': timezone.utc},
+    'driver_rejections': {'rejected_at': timezone.utc},
+    'dispatch_offers': {'sent_at': SERVER_LOCAL},
+    'dispatch_queue': {'created_at': timezone.utc, 'last_offer_sent_at': SERVER_LOCAL},
+    'newsletter_jobs': {'created_at': timezone.utc, 'finished_at': timezone.utc},
+}
+
+# PRAGMA user_version of a database whose time columns are all in Unix seconds
+TIMESTAMPS_SCHEMA_VERSION = 1
+
+
+class TimestampMigration:
+    """
+    Background conversion of string dates to Unix seconds while the bot runs.
+
+    Tables are walked by rowid in batches of batch_size rows: a batch is read
+    from the pool and the new values are written in one transaction through the
+    shared write queue, so the migration holds no lock and interleaves with the
+    bot's regular writes. An UPDATE applies only if the value has not changed
+    since it was read, so a fresh write by the bot is never overwritten.
+    When the pass is finished, PRAGMA user_version is set on the database and
+    later startups skip the migration. Unrecognized strings are left as they
+    are and logged.
+    """
+
+    def __init__(self, batch_size: int = 500, pause: float = 0.05,
+                 columns: dict[str, dict[str, tzinfo | None]] = LEGACY_TIMESTAMP_COLUMNS):
+        self._batch_size = max(1, batch_size)
+        self._pause = pause
+        self._columns = columns
+        self._task: asyncio.Task | None = None
+        self._stats = {'scanned': 0, 'converted': 0, 'skipped': 0, 'batches': 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def is_done(self) -> bool:
+        async with db_pool.acquire() as db:
+            cursor = await db.execute("PRAGMA user_version")
+            row = await cursor.fetchone()
+        return row[0] >= TIMESTAMPS_SCHEMA_VERSION
+
+    async def _migrate_batch(self, table: str, after: int) -> int | None:
+        """Converts a batch of table rows after rowid `after`. Returns the last row's rowid, or None at the end."""
+        columns = list(self._columns[table])
+        async with db_pool.acquire() as db:
+            cursor = await db.execute(
+                f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (after, self._batch_size)
+            )
+            rows = await cursor.fetchall()
+        if not rows:
+            return None
+        ops = []
+        for position, column in enumerate(columns, start=1):
+            zone = self._columns[table][column]
+            params = []
+            for row in rows:
+                value = row[position]
+                if not isinstance(value, str):
+                    continue
+                moment = parse_timestamp(value, zone)
+                if moment is None and value.strip():
+                    self._stats['skipped'] += 1
+                    logger.warning(f"Міграція дат: нерозпізнане значення {table}.{column} (rowid {row[0]}): {value!r}")
+                    continue
+                params.append((to_epoch(moment), row[0], value))
+            if params:
+                ops.append(WriteOp(f"UPDATE {table} SET {column} = ? WHERE rowid = ? AND {column} = ?", params, many=True))
+                self._stats['converted'] += len(params)
+        if ops:
+            await write_queue.transaction(ops)
+        self._stats['scanned'] += len(rows)
+        self._stats['batches'] += 1
+        return rows[-1][0]
+
+    async def run(self) -> dict:
+        """Walks all tables and marks the database as converted. Returns the statistics."""
+        if await self.is_done():
+            return self.stats()
+        logger.info("Міграція дат у секунди Unix: старт")
+        for table in self._columns:
+            after = 0
+            while (after := await self._migrate_batch(table, after)) is not None:
+                await asyncio.sleep(self._pause)
+        await write_queue.execute(f"PRAGMA user_version = {TIMESTAMPS_SCHEMA_VERSION}")
+        logger.info(f"Міграцію дат завершено: {self.stats()}")
+        return self.stats()
+
+    async def _run_safely(self) -> None:
+        try:
+            await self.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # An unfinished migration continues on the next bot startup
+            logger.error(f"Міграція дат перервалась: {e}")
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run_safely(), name="timestamp-migration")
+
+    async def stop(self) -> None:
+        """Interrupts the migration; converted rows stay, the rest are done on the next startup."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+# The single migration of the application. Started in init_db(), stopped in close_db().
+timestamp_migration = TimestampMigration(TIMESTAMP_MIGRATION_BATCH_SIZE, TIMESTAMP_MIGRATION_PAUSE)
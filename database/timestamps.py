@@ -0,0 +1,76 @@
+import time
+from datetime import datetime, timezone, tzinfo
+from typing import Any
+
+from dateutil import parser
+
+from config.config import TIMEZONE
+
+# Times are stored in the database as integer Unix seconds (UTC): such values compare and
+# sort as numbers, so ranges (BETWEEN, >=) use indexes and do not depend on the string
+# format or the time zone the time was written in.
+#
+# The functions below are the only place that converts between datetime and the stored value:
+# writes use to_epoch(), reads use from_epoch().
+
+# Zone of old strings without an offset written from Python (datetime.now()): the server's local time
+SERVER_LOCAL = None
+
+
+def now_epoch() -> int:
+    """Current time for writing to the database."""
+    return int(time.time())
+
+
+def to_epoch(moment: datetime | int | float | None) -> int | None:
+    """
+    Converts a time to Unix seconds for a database write or a query parameter.
+
+    A datetime without a time zone is taken as the server's local time (as from datetime.now());
+    numbers are taken as Unix seconds already.
+    """
+    if moment is None:
+        return None
+    if isinstance(moment, datetime):
+        return int(moment.timestamp())
+    return int(moment)
+
+
+def parse_timestamp(value: Any, naive_zone: tzinfo | None = SERVER_LOCAL) -> datetime | None:
+    """
+    Parses a stored time value into a time-zone-aware datetime.
+
+    Numbers are Unix seconds. Strings (values written before the switch to Unix seconds)
+    are ISO format or a datetime repr; an offset in the string is honoured, and a string
+    without one is taken as time in naive_zone (SERVER_LOCAL is the server's local time).
+    An unrecognized value gives None.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    else:
+        try:
+            moment = parser.parse(str(value))
+        except (ValueError, OverflowError):
+            return None
+    if moment.tzinfo is not None:
+        return moment
+    return moment.astimezone() if naive_zone is SERVER_LOCAL else moment.replace(tzinfo=naive_zone)
+
+
+def from_epoch(value: Any, tz: tzinfo | None = TIMEZONE) -> datetime | None:
+    """
+    A time from the database as a datetime in zone tz (by default the bot's zone, for showing to users).
+
+    tz=None returns a naive server-local time, the one KPI rollups and analytics periods
+    are computed in. While the migration runs, old string values are understood too.
+    """
+    moment = parse_timestamp(value)
+    if moment is None:
+        return None
+    if tz is None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment.astimezone(tz)
@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, Iterable, NamedTuple
+
+import aiosqlite
+from loguru import logger
+
+from config.config import DB_WRITE_BATCH_SIZE
+from database.pagination import table_versions
+from database.pool import ConnectionPool, db_pool
+
+
+class WriteResult(NamedTuple):
+    """Result of one write statement."""
+    rowcount: int
+    lastrowid: int | None
+    rows: list | None = None
+
+
+class WriteOp(NamedTuple):
+    """One write statement. With many=True, params is a sequence of parameter sets."""
+    sql: str
+    params: Any = ()
+    many: bool = False
+
+
+class WriteQueue:
+    """
+    Single asynchronous write queue for SQLite.
+
+    All data changes are queued and run by one background worker over the
+    pool's write connection. The worker takes every unit of work that has
+    piled up (up to DB_WRITE_BATCH_SIZE) and runs them in one transaction
+    ("group commit"), so a batch of small UPDATEs costs one fsync. Each
+    unit of work is wrapped in a SAVEPOINT: an error in one of them rolls
+    back only that unit, the rest are committed.
+
+    While the queue is not running (scripts, tests), a unit of work runs
+    immediately in its own transaction.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 50):
+        self._pool = pool
+        self._max_batch = max(1, max_batch)
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._stats = {'units': 0, 'batches': 0, 'failed_units': 0, 'max_batch': 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        """Starts the background queue worker."""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run(), name="db-write-queue")
+        logger.info(f"Черга запису в БД запущена (пакет до {self._max_batch} операцій).")
+
+    async def stop(self) -> None:
+        """Waits for the already queued writes to finish and stops the worker."""
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+        self._queue = None
+        logger.info(f"Черга запису в БД зупинена. Статистика: {self.stats()}")
+
+    async def execute(self, sql: str, params: Any = ()) -> WriteResult:
+        """Runs one write statement."""
+        return (await self.transaction([WriteOp(sql, params)]))[0]
+
+    async def executemany(self, sql: str, seq_of_params: Iterable) -> WriteResult:
+        """Runs one statement over a set of parameters (executemany)."""
+        return (await self.transaction([WriteOp(sql, list(seq_of_params), many=True)]))[0]
+
+    async def transaction(self, ops: list[WriteOp | tuple]) -> list[WriteResult]:
+        """
+        Runs several statements atomically: either all of them or none.
+
+        Returns:
+            A list of WriteResult in statement order.
+        """
+        unit = [op if isinstance(op, WriteOp) else WriteOp(*op) for op in ops]
+        future = asyncio.get_running_loop().create_future()
+        if self.is_running:
+            await self._queue.put((unit, future))
+        else:
+            try:
+                await self._run_batch([(unit, future)])
+            except Exception:
+                # The error is already set on the future; it is raised once, by the await below
+                pass
+        return await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Take everything that piled up while the previous batch was running
+            while len(batch) < self._max_batch and not self._queue.empty():
+                next_item = self._queue.get_nowait()
+                if next_item is None:
+                    stopping = True
+                    break
+                batch.append(next_item)
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                # _run_batch hands errors to the waiters itself; this is reached only on a connection failure
+                logger.error(f"Помилка черги запису в БД: {e}")
+
+    async def _run_batch(self, batch: list[tuple[list[WriteOp], asyncio.Future]]) -> None:
+        results: list[tuple[asyncio.Future, list[WriteResult] | None, Exception | None]] = []
+        try:
+            async with self._pool.acquire(write=True) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                for unit, future in batch:
+                    await db.execute("SAVEPOINT write_unit")
+                    try:
+                        unit_results = [await self._execute_op(db, op) for op in unit]
+                        await db.execute("RELEASE write_unit")
+                        results.append((future, unit_results, None))
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO write_unit")
+                        await db.execute("RELEASE write_unit")
+                        results.append((future, None, e))
+                await db.commit()
+        except Exception as e:
+            # The whole transaction was not committed: report the error to every unit in the batch
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self._stats['failed_units'] += len(batch)
+            raise
+
+        self._stats['batches'] += 1
+        self._stats['units'] += len(batch)
+        self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+        # Invalidate the page cache for the changed tables before the writers get their results
+        for (unit, _), (_, _, error) in zip(batch, results):
+            if error is None:
+                for op in unit:
+                    table_versions.bump(op.sql)
+        for future, unit_results, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                self._stats['failed_units'] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(unit_results)
+
+    @staticmethod
+    async def _execute_op(db: aiosqlite.Connection, op: WriteOp) -> WriteResult:
+        if op.many:
+            cursor = await db.executemany(op.sql, op.params)
+            return WriteResult(cursor.rowcount, cursor.lastrowid)
+        cursor = await db.execute(op.sql, op.params)
+        rows = await cursor.fetchall() if cursor.description else None
+        return WriteResult(cursor.rowcount, cursor.lastrowid, rows)
+
+    def stats(self) -> dict:
+        """Returns the write batching statistics."""
+        batches = self._stats['batches']
+        return {
+            **self._stats,
+            'pending': self._queue.qsize() if self._queue else 0,
+            'avg_batch': round(self._stats['units'] / batches, 2) if batches else 0.0,
+        }
+
+
+# The single write queue of the application. Started in init_db(), stopped in close_db().
+write_queue = WriteQueue(db_pool, max_batch=DB_WRITE_BATCH_SIZE)
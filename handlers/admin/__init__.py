@@ -5,6 +5,7 @@ from .fsm_newsletter import router as newsletter_router
 from .fsm_order_management import router as order_management_router
 from .fsm_user_management import router as user_management_router
 from .fsm_admin_management import router as admin_management_router
+from .fsm_analytics import router as analytics_router
 
 admin_router = Router()
 
@@ -14,4 +15,5 @@ admin_router.include_routers(
     order_management_router,
     user_management_router,
     admin_management_router,
+    analytics_router,
 )
\ No newline at end of file
@@ -6,6 +6,7 @@ from aiogram import Bot
 from aiogram.types import BotCommand, BotCommandScopeChat
 
 from database import queries as db_queries
+from database.timestamps import from_epoch
 from ..common.paginator import show_paginated_list
 from ..common.helpers import safe_edit_or_send
 from keyboards.admin_keyboards import get_client_history_keyboard, get_admin_order_keyboard, get_clients_list_keyboard
@@ -52,7 +53,7 @@ def _format_client(client: dict) -> str:
         f"  - Поїздки: ✅ {client['finish_applic']} / ❌ {client['cancel_applic']}\n\n"
     )
 
-async def show_clients_page(target: types.CallbackQuery | types.Message, page: int, search_query: str | None = None) -> None:
+async def show_clients_page(target: types.CallbackQuery | types.Message, page: int, search_query: str | None = None, cursor: str = '') -> None:
     """
     Displays a paginated list of clients, with an optional search query.
     """
@@ -66,6 +67,7 @@ async def show_clients_page(target: types.CallbackQuery | types.Message, page: i
     await show_paginated_list(
         target=target,
         page=page,
+        cursor=cursor,
         count_func=db_queries.get_clients_count,
         page_func=db_queries.get_clients_page,
         keyboard_func=get_clients_list_keyboard,
@@ -80,7 +82,7 @@ async def show_clients_page(target: types.CallbackQuery | types.Message, page: i
         items_list_kwarg_name='clients'
     )
 
-async def show_client_history_page(target: types.CallbackQuery | types.Message, user_id: int, page: int) -> None:
+async def show_client_history_page(target: types.CallbackQuery | types.Message, user_id: int, page: int, cursor: str = '') -> None:
     """
     Displays a paginated history of a specific client's orders.
 
@@ -88,11 +90,13 @@ async def show_client_history_page(target: types.CallbackQuery | types.Message,
         target: The message or callback query to respond to.
         user_id: The ID of the client whose history to show.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     client_name = await db_queries.get_client_name(user_id) or f"ID: {user_id}"
     await show_paginated_list(
         target=target,
         page=page,
+        cursor=cursor,
         count_func=db_queries.get_all_orders_count_by_client,
         page_func=db_queries.get_all_orders_page_by_client,
         keyboard_func=get_client_history_keyboard,
@@ -137,7 +141,7 @@ async def show_admin_order_details(target: types.Message | types.CallbackQuery,
     text = (
         f"<b>Деталі замовлення №{order_id}</b>\n\n"
         f"<b>Статус:</b> {order['status']}\n"
-        f"<b>Створено:</b> {order['created_at']}\n"
+        f"<b>Створено:</b> {from_epoch(order['created_at']).strftime('%d.%m.%Y %H:%M')}\n"
         f"<b>Звідки:</b> {html.escape(order['begin_address'])}\n"
         f"<b>Куди:</b> {html.escape(order['finish_address'])}\n"
         f"<b>Оцінка водію:</b> {rating_text}\n\n"
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+import html
+
+from aiogram import types, F, Router
+from aiogram.fsm.context import FSMContext
+
+from states.fsm_states import AdminState
+from database import queries as db_queries
+from keyboards.common import Navigate
+from keyboards.reply_keyboards import fsm_cancel_keyboard
+from keyboards.admin_keyboards import get_analytics_keyboard, get_analytics_period_keyboard, get_drivers_kpi_keyboard
+from utils.callback_factories import KpiPaginator
+from ..common.helpers import safe_edit_or_send
+from ..common.paginator import show_paginated_list
+
+router = Router()
+
+DRIVERS_KPI_PER_PAGE = 5
+# Number of days (including today) in each preset period
+PERIOD_DAYS = {'today': 1, 'week': 7, 'month': 30}
+
+
+def _period_bounds(days: int) -> tuple[datetime, datetime]:
+    """Returns [start, end) covering the last `days` calendar days including today."""
+    tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return tomorrow - timedelta(days=days), tomorrow
+
+
+def _parse_date_range(text: str) -> tuple[datetime, datetime] | None:
+    """Parses 'DD.MM.YYYY - DD.MM.YYYY' (both days inclusive) into [start, end)."""
+    parts = [part.strip() for part in text.split('-')]
+    if len(parts) != 2:
+        return None
+    try:
+        start, last = (datetime.strptime(part, '%d.%m.%Y') for part in parts)
+    except ValueError:
+        return None
+    if last < start:
+        return None
+    return start, last + timedelta(days=1)
+
+
+def _period_title(start: datetime, end: datetime) -> str:
+    last = end - timedelta(days=1)
+    if last.date() == start.date():
+        return start.strftime('%d.%m.%Y')
+    return f"{start.strftime('%d.%m.%Y')} – {last.strftime('%d.%m.%Y')}"
+
+
+def _percent(part: int, total: int) -> str:
+    return f"{part / total:.0%}" if total else "—"
+
+
+def _average_rating(kpi: dict) -> str:
+    return f"{kpi['rating_sum'] / kpi['rating_count']:.1f}" if kpi['rating_count'] else "—"
+
+
+def _format_driver_kpi(row: dict) -> str:
+    """Formats one driver's KPI line for the paginated list."""
+    return (
+        f"👤 <b>{html.escape(row['full_name'] or str(row['user_id']))}</b>\n"
+        f"  ✅ {row['completed']} поїздок · прийняття {_percent(row['accepted'], row['accepted'] + row['rejected'])}"
+        f" · ❌ {row['cancelled']} скас. · ⭐ {_average_rating(row)}"
+        f" · ⏱ {row['online_seconds'] / 3600:.1f} год\n\n"
+    )
+
+
+async def show_general_stats(target: types.Message | types.CallbackQuery, start: datetime, end: datetime) -> None:
+    """Displays the overall KPIs for the period."""
+    kpi = await db_queries.get_kpi_summary(start, end)
+    text = (
+        f"<b>📊 Загальна статистика</b>\n"
+        f"Період: {_period_title(start, end)}\n\n"
+        f"Створено замовлень: {kpi['created']}\n"
+        f"Прийнято водіями: {kpi['accepted']}\n"
+        f"Виконано: {kpi['completed']}\n"
+        f"Скасовано: {kpi['cancelled']}\n"
+        f"Відмов водіїв: {kpi['rejected']}\n"
+        f"Рівень прийняття: {_percent(kpi['accepted'], kpi['accepted'] + kpi['rejected'])}\n"
+        f"Середня оцінка: {_average_rating(kpi)} ({kpi['rating_count']} оцінок)\n"
+        f"Годин на зміні (всі водії): {kpi['online_seconds'] / 3600:.1f}"
+    )
+    await safe_edit_or_send(target, text, reply_markup=get_analytics_period_keyboard())
+
+
+async def show_drivers_kpi_page(target: types.Message | types.CallbackQuery, page: int,
+                                start: datetime, end: datetime, cursor: str = '') -> None:
+    """Displays a paginated list of per-driver KPIs for the period."""
+    title = f"📈 Продуктивність водіїв ({_period_title(start, end)})"
+    await show_paginated_list(
+        target=target,
+        page=page,
+        cursor=cursor,
+        count_func=db_queries.get_drivers_count,
+        page_func=db_queries.get_drivers_kpi_page,
+        keyboard_func=lambda page, total_pages, items: get_drivers_kpi_keyboard(page, total_pages),
+        title=title,
+        items_per_page=DRIVERS_KPI_PER_PAGE,
+        no_items_text=f"<b>{title}</b>\n\nНемає зареєстрованих водіїв.",
+        no_items_keyboard=get_analytics_keyboard(),
+        item_formatter=_format_driver_kpi,
+        page_func_kwargs={'start': start, 'end': end},
+    )
+
+
+async def _show_period(target: types.Message | types.CallbackQuery, state: FSMContext,
+                       start: datetime, end: datetime) -> None:
+    """Remembers the chosen period and shows the view selected in the analytics menu."""
+    await state.update_data(kpi_start=start.isoformat(), kpi_end=end.isoformat())
+    data = await state.get_data()
+    if data.get('analytics_view') == 'drivers':
+        await show_drivers_kpi_page(target, 0, start, end)
+    else:
+        await show_general_stats(target, start, end)
+
+
+@router.callback_query(Navigate.filter(F.to == 'analytics_menu'))
+async def analytics_menu(call: types.CallbackQuery, state: FSMContext):
+    """Shows the analytics menu."""
+    await state.set_state(None)
+    await safe_edit_or_send(call, "<b>📊 Статистика та Аналітика</b>", reply_markup=get_analytics_keyboard())
+
+
+@router.callback_query(Navigate.filter(F.to.in_({'general_stats', 'drivers_kpi'})))
+async def choose_analytics_period(call: types.CallbackQuery, callback_data: Navigate, state: FSMContext):
+    """Remembers the selected report and asks for the period."""
+    view = 'drivers' if callback_data.to == 'drivers_kpi' else 'general'
+    await state.update_data(analytics_view=view)
+    await safe_edit_or_send(call, "<b>Оберіть період:</b>", reply_markup=get_analytics_period_keyboard())
+
+
+@router.callback_query(Navigate.filter(F.to.in_({f'stats_period_{name}' for name in PERIOD_DAYS})))
+async def show_preset_period(call: types.CallbackQuery, callback_data: Navigate, state: FSMContext):
+    """Shows the selected report for today, the last week or the last month."""
+    start, end = _period_bounds(PERIOD_DAYS[callback_data.to.removeprefix('stats_period_')])
+    await _show_period(call, state, start, end)
+
+
+@router.callback_query(Navigate.filter(F.to == 'stats_period_custom'))
+async def ask_custom_period(call: types.CallbackQuery, state: FSMContext):
+    """Starts the FSM to enter a custom date range."""
+    await state.set_state(AdminState.get_custom_date_range)
+    await call.message.answer(
+        "<b>🗓️ Вкажіть період</b>\n\nВведіть дати у форматі <code>ДД.ММ.РРРР - ДД.ММ.РРРР</code>.",
+        reply_markup=fsm_cancel_keyboard
+    )
+    await call.answer()
+
+
+@router.message(AdminState.get_custom_date_range)
+async def process_custom_period(message: types.Message, state: FSMContext):
+    """Processes the custom date range and shows the selected report."""
+    period = _parse_date_range(message.text or '')
+    if period is None:
+        await message.answer(
+            "Не вдалося розпізнати період. Приклад: <code>01.05.2024 - 31.05.2024</code>",
+            reply_markup=fsm_cancel_keyboard
+        )
+        return
+    await state.set_state(None)
+    await message.answer("⏳ Формую звіт...", reply_markup=types.ReplyKeyboardRemove())
+    await _show_period(message, state, *period)
+
+
+@router.callback_query(KpiPaginator.filter())
+async def paginate_drivers_kpi(call: types.CallbackQuery, callback_data: KpiPaginator, state: FSMContext):
+    """Handles pagination for the drivers KPI list; the period comes from the FSM data."""
+    data = await state.get_data()
+    if 'kpi_start' in data and 'kpi_end' in data:
+        start, end = datetime.fromisoformat(data['kpi_start']), datetime.fromisoformat(data['kpi_end'])
+    else:
+        start, end = _period_bounds(PERIOD_DAYS['month'])
+    await show_drivers_kpi_page(call, callback_data.page, start, end, cursor=callback_data.cursor)
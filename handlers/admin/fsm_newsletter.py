@@ -1,6 +1,5 @@
 from aiogram import types, F, Router, Bot
 from aiogram.fsm.context import FSMContext
-import asyncio
 from aiogram.exceptions import TelegramBadRequest
 from loguru import logger
 
@@ -9,7 +8,7 @@ from database import queries as db_queries
 from keyboards.reply_keyboards import fsm_cancel_keyboard
 from keyboards.admin_keyboards import get_newsletter_audience_keyboard, get_newsletter_confirm_keyboard
 from keyboards.common import Navigate
-from utils.batch_sender import broadcast_messages
+from utils.newsletter_jobs import start_newsletter_job
 
 router = Router()
 
@@ -19,13 +18,7 @@ async def start_newsletter(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(AdminState.newsletter_audience)
 
     # Fetch user counts for each category
-    total_users_count = await db_queries.get_clients_count()
-    total_drivers_count = await db_queries.get_total_drivers_count()
-    counts = {
-        'all': total_users_count,
-        'drivers': total_drivers_count,
-        'clients': total_users_count - total_drivers_count
-    }
+    counts = {audience: await db_queries.get_newsletter_audience_count(audience) for audience in ('all', 'drivers', 'clients')}
 
     await call.message.edit_caption(
         "<b>📣 Розсилка повідомлень</b>\n\n"
@@ -61,26 +54,18 @@ async def process_newsletter_message(message: types.Message, state: FSMContext):
     data = await state.get_data()
     audience = data.get('audience')
 
-    user_ids_tuples = []
-    if audience == 'all':
-        user_ids_tuples = await db_queries.get_all_users_id()
-    elif audience == 'clients':
-        user_ids_tuples = await db_queries.get_clients_only_ids()
-    elif audience == 'drivers':
-        user_ids_tuples = await db_queries.get_all_drivers_id()
-    
-    user_ids = [item[0] for item in user_ids_tuples]
+    recipients_count = await db_queries.get_newsletter_audience_count(audience) if audience else 0
 
-    if not user_ids:
+    if not recipients_count:
         await message.answer("Не знайдено користувачів для цієї аудиторії.")
         await state.clear()
         return
-    
-    # Save message details and user IDs to the state
+
+    # Save message details to the state; recipients are read from the database when the newsletter is sent
     await state.update_data(
         message_to_send_id=message.message_id,
         chat_to_send_from_id=message.chat.id,
-        user_ids=user_ids
+        recipients_count=recipients_count
     )
     await state.set_state(AdminState.newsletter_confirm)
 
@@ -89,7 +74,7 @@ async def process_newsletter_message(message: types.Message, state: FSMContext):
     
     await message.answer(
         f"<b>Крок 3: Підтвердження</b>\n\n"
-        f"Ви збираєтеся надіслати це повідомлення <b>{len(user_ids)}</b> користувачам.\n\n"
+        f"Ви збираєтеся надіслати це повідомлення <b>{recipients_count}</b> користувачам.\n\n"
         "<b>Все вірно?</b>",
         reply_markup=get_newsletter_confirm_keyboard()
     )
@@ -97,14 +82,14 @@ async def process_newsletter_message(message: types.Message, state: FSMContext):
 @router.callback_query(Navigate.filter(F.to == "nl_confirm_send"), AdminState.newsletter_confirm)
 async def confirm_and_send_newsletter(call: types.CallbackQuery, state: FSMContext, bot: Bot):
     """
-    Confirms and starts the broadcasting task.
+    Confirms and starts the newsletter job.
     """
     data = await state.get_data()
-    user_ids = data.get('user_ids', [])
+    audience = data.get('audience')
     message_id = data.get('message_to_send_id')
     chat_id = data.get('chat_to_send_from_id')
 
-    if not all([user_ids, message_id, chat_id]):
+    if not all([audience, message_id, chat_id]):
         await call.message.edit_text("❌ Помилка: дані для розсилки втрачено. Спробуйте знову.")
         await state.clear()
         return
@@ -114,26 +99,16 @@ async def confirm_and_send_newsletter(call: types.CallbackQuery, state: FSMConte
 
     # Edit the confirmation message to show progress
     status_message = await call.message.edit_text(
-        f"✅ Починаю розсилку для <b>{len(user_ids)}</b> користувачів. "
+        f"✅ Починаю розсилку для <b>{data.get('recipients_count', 0)}</b> користувачів. "
         "Я повідомлю вас про завершення."
     )
 
-    # Define the specific send function for this broadcast
-    async def send_copy(user_id: int):
-        await bot.copy_message(chat_id=user_id, from_chat_id=chat_id, message_id=message_id)
-
-    # Run the broadcasting in the background
-    async def run_broadcast():
-        logger.info(f"Starting newsletter for {len(user_ids)} users.")
-        success, failed = await broadcast_messages(bot, user_ids, send_copy, status_message)
-        logger.info(f"Newsletter finished. Success: {success}, Failed: {failed}.")
-        # Send the final report to the admin
-        await bot.send_message(
-            chat_id,
-            f"✅ <b>Розсилку завершено!</b>\n\nУспішно надіслано: {success}\nПомилок: {failed}"
-        )
-
-    asyncio.create_task(run_broadcast())
+    # The job is stored in the database and sent in the background; it survives a restart of the bot
+    job_id = await start_newsletter_job(
+        bot, audience, chat_id, message_id,
+        status_chat_id=status_message.chat.id, status_message_id=status_message.message_id
+    )
+    logger.info(f"Newsletter job #{job_id} started for audience '{audience}'.")
     await call.answer()
 
 @router.callback_query(Navigate.filter(F.to == "nl_change_message"), AdminState.newsletter_confirm)
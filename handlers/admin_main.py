@@ -2,11 +2,12 @@ from aiogram import types, F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command, StateFilter, BaseFilter
 import html
-from dateutil import parser
+from database.timestamps import from_epoch
 
 from states.fsm_states import AdminState
 from database import queries as db_queries
 from keyboards.common import Navigate
+from utils.callback_factories import AdminDriverList, AdminOrderList
 from keyboards.reply_keyboards import main_menu_keyboard
 from .common.paginator import show_paginated_list
 from config.config import BASE_DIR
@@ -67,37 +68,32 @@ router.include_router(admin_router)
 
 # --- Driver Management ---
 
-async def show_drivers_list(call: types.CallbackQuery, page: int, list_type: str):
+async def show_drivers_list(call: types.CallbackQuery, page: int, list_type: str, cursor: str = ''):
     """Helper to show a paginated list of drivers."""
     title_map = {
         'all': "Список всіх водіїв",
         'working': "Водії на зміні",
         'not_working': "Водії не на зміні"
     }
-    count_func_map = {
-        'all': db_queries.get_drivers_count,
-        'working': lambda: db_queries.get_drivers_count(is_working=True),
-        'not_working': lambda: db_queries.get_drivers_count(is_working=False)
-    }
-    page_func_map = {
-        'all': db_queries.get_drivers_page,
-        'working': lambda limit, offset: db_queries.get_drivers_page(limit=limit, offset=offset, is_working=True),
-        'not_working': lambda limit, offset: db_queries.get_drivers_page(limit=limit, offset=offset, is_working=False)
-    }
+    is_working = {'all': None, 'working': True, 'not_working': False}[list_type]
 
     from keyboards.admin_keyboards import get_drivers_list_keyboard, get_back_to_drivers_menu_keyboard
     await show_paginated_list(
         target=call,
         page=page,
-        count_func=count_func_map[list_type],
-        page_func=page_func_map[list_type],
-        keyboard_func=lambda page, total_pages, items: get_drivers_list_keyboard(page, total_pages, items, list_type),
+        cursor=cursor,
+        count_func=db_queries.get_drivers_count,
+        page_func=db_queries.get_drivers_page,
+        keyboard_func=get_drivers_list_keyboard,
         title=title_map[list_type],
         items_per_page=DRIVERS_PER_PAGE,
         no_items_text=f"<b>{title_map[list_type]}</b>\n\nНемає водіїв, що відповідають критерію.",
         no_items_keyboard=get_back_to_drivers_menu_keyboard(),
         item_list_title="Оберіть водія для перегляду профілю:",
-        items_list_kwarg_name='items'
+        items_list_kwarg_name='drivers',
+        count_func_kwargs={'is_working': is_working},
+        page_func_kwargs={'is_working': is_working},
+        keyboard_func_kwargs={'list_type': list_type}
     )
 
 @router.callback_query(Navigate.filter(F.to == "manage_drivers"))
@@ -106,12 +102,10 @@ async def manage_drivers_menu(call: types.CallbackQuery):
     await call.message.edit_text("<b>Керування водіями</b>", reply_markup=get_driver_management_keyboard())
     await call.answer()
 
-@router.callback_query(F.data.startswith("admin_drv_list:"))
-async def drivers_list_paginator(call: types.CallbackQuery):
+@router.callback_query(AdminDriverList.filter())
+async def drivers_list_paginator(call: types.CallbackQuery, callback_data: AdminDriverList):
     """Handles pagination for driver lists."""
-    from utils.callback_factories import AdminDriverList
-    callback_data = AdminDriverList.unpack(call.data)
-    await show_drivers_list(call, callback_data.page, callback_data.list_type)
+    await show_drivers_list(call, callback_data.page, callback_data.list_type, callback_data.cursor)
 
 @router.callback_query(F.data.startswith("adm_drv:view:"))
 async def show_driver_profile(call: types.CallbackQuery):
@@ -221,7 +215,7 @@ async def remove_admin(call: types.CallbackQuery):
 
 # --- Order Management ---
 
-async def show_orders_list(call: types.CallbackQuery, page: int, status: str):
+async def show_orders_list(call: types.CallbackQuery, page: int, status: str, cursor: str = ''):
     """Helper to show a paginated list of orders by status."""
     title_map = {
         'searching': "Активні замовлення (в пошуку)",
@@ -235,18 +229,22 @@ async def show_orders_list(call: types.CallbackQuery, page: int, status: str):
     await show_paginated_list(
         target=call,
         page=page,
-        count_func=lambda: db_queries.get_orders_count_by_status(status),
-        page_func=lambda limit, offset: db_queries.get_orders_page_by_status(status, limit, offset),
-        keyboard_func=lambda page, total_pages, items: get_orders_list_keyboard(page, total_pages, items, status),
+        cursor=cursor,
+        count_func=db_queries.get_orders_count_by_status,
+        page_func=db_queries.get_orders_page_by_status,
+        keyboard_func=get_orders_list_keyboard,
         title=title_map.get(status, "Список замовлень"),
         items_per_page=ORDERS_PER_PAGE,
         no_items_text=f"<b>{title_map.get(status, 'Список замовлень')}</b>\n\nНемає замовлень з таким статусом.",
         no_items_keyboard=get_back_to_orders_menu_keyboard(),
         item_formatter=lambda item: (
-            f"<b>№{item['id']}</b> від {parser.parse(item['created_at']).strftime('%d.%m %H:%M')} "
+            f"<b>№{item['id']}</b> від {from_epoch(item['created_at']).strftime('%d.%m %H:%M')} "
             f"(Клієнт: {html.escape(item['client_name'])})\n"
         ),
-        items_list_kwarg_name='items'
+        items_list_kwarg_name='items',
+        count_func_kwargs={'status': status},
+        page_func_kwargs={'status': status},
+        keyboard_func_kwargs={'status': status}
     )
 
 @router.callback_query(Navigate.filter(F.to == "manage_orders"))
@@ -255,12 +253,10 @@ async def manage_orders_menu(call: types.CallbackQuery):
     await call.message.edit_text("<b>Керування замовленнями</b>", reply_markup=get_order_management_keyboard())
     await call.answer()
 
-@router.callback_query(F.data.startswith("admin_ord_list:"))
-async def orders_list_paginator(call: types.CallbackQuery):
+@router.callback_query(AdminOrderList.filter())
+async def orders_list_paginator(call: types.CallbackQuery, callback_data: AdminOrderList):
     """Handles pagination for order lists."""
-    from utils.callback_factories import AdminOrderList
-    callback_data = AdminOrderList.unpack(call.data)
-    await show_orders_list(call, callback_data.page, callback_data.status)
+    await show_orders_list(call, callback_data.page, callback_data.status, callback_data.cursor)
 
 @router.callback_query(F.data.startswith("adm_ord:view:"))
 async def show_order_details_admin(call: types.CallbackQuery):
@@ -273,7 +269,7 @@ async def show_order_details_admin(call: types.CallbackQuery):
         await call.answer("Замовлення не знайдено", show_alert=True)
         return
 
-    created_at = parser.parse(order['created_at']).strftime('%d.%m.%Y %H:%M')
+    created_at = from_epoch(order['created_at']).strftime('%d.%m.%Y %H:%M')
     
     text = (
         f"<b>Деталі замовлення №{order_id}</b>\n\n"
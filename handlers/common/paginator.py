@@ -1,8 +1,29 @@
 from aiogram import types
 from typing import Callable, Any
+from loguru import logger
+from keyboards.common import PagePosition
 from .helpers import safe_edit_or_send
+import asyncio
 import math
 
+# Background prefetches of the next page; references are kept so the tasks are not garbage-collected.
+_prefetch_tasks: set[asyncio.Task] = set()
+
+def _prefetch_page(page_func: Callable, **kwargs) -> None:
+    """
+    Loads a page in the background so it is already in the page cache
+    when the user presses the button.
+    """
+    async def prefetch():
+        try:
+            await page_func(**kwargs)
+        except Exception as e:
+            logger.debug(f"Page prefetch failed: {e}")
+
+    task = asyncio.create_task(prefetch())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
 async def show_paginated_list(
     target: types.Message | types.CallbackQuery,
     page: int,
@@ -19,7 +40,8 @@ async def show_paginated_list(
     items_list_kwarg_name: str = 'items',
     count_func_kwargs: dict | None = None,
     page_func_kwargs: dict | None = None,
-    keyboard_func_kwargs: dict | None = None
+    keyboard_func_kwargs: dict | None = None,
+    cursor: str = ''
 ) -> None:
     """
     A generic helper to display a paginated list of items.
@@ -41,6 +63,11 @@ async def show_paginated_list(
         count_func_kwargs: Keyword arguments for the count function.
         page_func_kwargs: Keyword arguments for the page function.
         keyboard_func_kwargs: Keyword arguments for the keyboard function.
+        cursor: The keyset cursor from the paginator callback ('' for the first page or old buttons).
+
+    page_func is called as page_func(limit=..., offset=..., cursor=..., **page_func_kwargs).
+    If it returns PageRows, the keyboard receives a PagePosition with the cursors of the
+    neighbouring pages, and the next page is prefetched into the page cache.
     """
     count_kwargs = count_func_kwargs or {}
     page_kwargs = page_func_kwargs or {}
@@ -57,7 +84,12 @@ async def show_paginated_list(
     total_pages = math.ceil(total_items / items_per_page)
     offset = page * items_per_page
     
-    items = await page_func(limit=items_per_page, offset=offset, **page_kwargs)
+    items = await page_func(limit=items_per_page, offset=offset, cursor=cursor, **page_kwargs)
+    position = PagePosition(
+        page,
+        prev_cursor=getattr(items, 'prev_cursor', ''),
+        next_cursor=getattr(items, 'next_cursor', '')
+    )
     
     response_text = f"<b>{title}</b>\n\n"
     if prefix_text:
@@ -70,8 +102,13 @@ async def show_paginated_list(
 
     # Pass the fetched items to the keyboard function
     kb_kwargs[items_list_kwarg_name] = items
-    keyboard = keyboard_func(page=page, total_pages=total_pages, **kb_kwargs)
+    keyboard = keyboard_func(page=position, total_pages=total_pages, **kb_kwargs)
     
     await safe_edit_or_send(target, response_text, reply_markup=keyboard)
+    if position.next_cursor and page + 1 < total_pages:
+        _prefetch_page(
+            page_func, limit=items_per_page, offset=offset + items_per_page,
+            cursor=position.next_cursor, **page_kwargs
+        )
     if isinstance(target, types.CallbackQuery):
         await target.answer()
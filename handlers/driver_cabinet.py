@@ -15,11 +15,12 @@ from utils.callback_factories import (
     DriverRejectionPaginator, DriverRejectionDetails, DriverHistoryPaginator,
     TripDetailsCallbackData, MyPreordersPaginator, MyPreorderAction
 )
-from dateutil import parser
+from database.timestamps import from_epoch
 import html
 from datetime import datetime, timedelta
 from loguru import logger
 from database import queries as db_queries
+from database.live_locations import live_locations
 from states.fsm_states import DriverState
 from handlers.shared_state import location_requests
 from handlers.common.helpers import send_message_with_photo
@@ -54,7 +55,7 @@ def _format_driver_reviews(reviews: list[dict[str, Any]]) -> str:
     """
     text = ""
     for review in reviews:
-        date_str = parser.parse(review['completed_at']).strftime('%d.%m.%Y')
+        date_str = from_epoch(review['completed_at']).strftime('%d.%m.%Y')
         text += (
             f"<b>{date_str} | {'⭐' * review['rating_score']}</b>\n"
             f"<i>«{html.escape(review['rating_comment'])}»</i>\n---\n"
@@ -227,9 +228,10 @@ async def unified_location_update_handler(message: types.Message) -> None:
         return # Stop further processing
 
     # Case 2: This is a regular live location update from an on-shift driver
-    if message.location and message.location.live_period and await db_queries.is_driver_on_shift(driver_id):
-        await db_queries.update_driver_location(driver_id, message.location.latitude, message.location.longitude)
-        logger.info(f"Live location for driver {driver_id} updated.")
+    # Positions are kept in memory and written to the DB in periodic batches.
+    if message.location and message.location.live_period and live_locations.is_on_shift(driver_id):
+        live_locations.record(driver_id, message.location.latitude, message.location.longitude)
+        logger.debug(f"Live location for driver {driver_id} updated.")
         # No need to send a message back to the driver, it would be spammy.
 
 @router.message(F.text == '⛔️ Завершити зміну')
@@ -271,13 +273,14 @@ async def set_available_handler(message: types.Message) -> None:
 
 REVIEWS_PER_PAGE = 5
 
-async def show_driver_reviews_page(target: types.Message | types.CallbackQuery, page: int) -> None:
+async def show_driver_reviews_page(target: types.Message | types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated list of the driver's reviews.
 
     Args:
         target: The message or callback object to answer to.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     driver_id = target.from_user.id
     
@@ -302,7 +305,7 @@ async def show_driver_reviews_page(target: types.Message | types.CallbackQuery,
     ])
 
     await show_paginated_list(
-        target=target, page=page,
+        target=target, page=page, cursor=cursor,
         count_func=db_queries.get_driver_reviews_count, page_func=db_queries.get_driver_reviews_page,
         keyboard_func=get_driver_reviews_keyboard, title="Відгуки", items_per_page=REVIEWS_PER_PAGE,
         no_items_text=header_text + '\nУ вас ще немає відгуків з коментарями.',
@@ -330,19 +333,20 @@ async def paginate_driver_reviews(call: types.CallbackQuery, callback_data: Driv
         call: The callback query from pagination buttons.
         callback_data: The paginator callback data.
     """
-    await show_driver_reviews_page(call, page=callback_data.page)
+    await show_driver_reviews_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 # --- Driver Rejections History Handlers ---
 
 REJECTIONS_PER_PAGE = 5
 
-async def show_driver_rejections_page(target: types.Message | types.CallbackQuery, page: int) -> None:
+async def show_driver_rejections_page(target: types.Message | types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated list of the driver's order rejections.
 
     Args:
         target: The message or callback object to answer to.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     driver_id = target.from_user.id
     no_items_kb = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -350,7 +354,7 @@ async def show_driver_rejections_page(target: types.Message | types.CallbackQuer
     ])
 
     await show_paginated_list(
-        target=target, page=page,
+        target=target, page=page, cursor=cursor,
         count_func=db_queries.get_driver_rejections_count,
         page_func=db_queries.get_driver_rejections_page,
         keyboard_func=get_driver_rejections_keyboard,
@@ -381,7 +385,7 @@ async def paginate_driver_rejections(call: types.CallbackQuery, callback_data: D
         call: The callback query from pagination buttons.
         callback_data: The paginator callback data.
     """
-    await show_driver_rejections_page(call, page=callback_data.page)
+    await show_driver_rejections_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 @router.callback_query(DriverRejectionDetails.filter())
 async def show_driver_rejection_details(call: types.CallbackQuery, callback_data: DriverRejectionDetails) -> None:
@@ -402,7 +406,7 @@ async def show_driver_rejection_details(call: types.CallbackQuery, callback_data
     client_name = await db_queries.get_client_name(client_id)
     client_stats = await db_queries.get_client_stats(client_id)
 
-    date_str = parser.parse(order_data['created_at']).strftime('%d.%m.%Y о %H:%M')
+    date_str = from_epoch(order_data['created_at']).strftime('%d.%m.%Y о %H:%M')
 
     details_text = (
         f"<b>Деталі замовлення №{order_id} (від якого ви відмовились)</b>\n\n"
@@ -433,13 +437,14 @@ async def driver_rejections_history_msg_handler(call: types.CallbackQuery) -> No
 
 PREORDERS_PER_PAGE = 5
 
-async def show_preorder_list_page(target: types.Message | types.CallbackQuery, page: int) -> None:
+async def show_preorder_list_page(target: types.Message | types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated list of available pre-orders for drivers to accept.
 
     Args:
         target: The message or callback object to answer to.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     no_items_kb = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="↩️ До кабінету водія", callback_data="back_to_driver_cabinet")]
@@ -448,15 +453,15 @@ async def show_preorder_list_page(target: types.Message | types.CallbackQuery, p
     # Встановлюємо часові рамки для показу замовлень:
     # - Не раніше поточного моменту (щоб не показувати минулі)
     # - Не пізніше, ніж через 48 годин (щоб не захаращувати список)
-    now = datetime.now(TIMEZONE)
+    # The window is rounded down to the minute: the bounds are part of the page cache key,
+    # so they must stay the same between page turns for the cached count and prefetched page to hit
+    now = datetime.now(TIMEZONE).replace(second=0, microsecond=0)
     time_limit = now + timedelta(hours=48)
-    
-    min_time_str = now.strftime('%Y-%m-%d %H:%M:%S')
-    max_time_str = time_limit.strftime('%Y-%m-%d %H:%M:%S')
 
     await show_paginated_list(
         target=target,
         page=page,
+        cursor=cursor,
         count_func=db_queries.get_available_preorders_count,
         page_func=db_queries.get_available_preorders_page,
         keyboard_func=get_preorder_list_keyboard,
@@ -466,8 +471,8 @@ async def show_preorder_list_page(target: types.Message | types.CallbackQuery, p
         no_items_keyboard=no_items_kb,
         item_list_title="Оберіть замовлення, щоб подивитись деталі:",
         items_list_kwarg_name='orders',
-        count_func_kwargs={'min_datetime': min_time_str, 'max_datetime': max_time_str},
-        page_func_kwargs={'min_datetime': min_time_str, 'max_datetime': max_time_str}
+        count_func_kwargs={'min_datetime': now, 'max_datetime': time_limit},
+        page_func_kwargs={'min_datetime': now, 'max_datetime': time_limit}
     )
 
 @router.message(F.text == '🗓️ Доступні заплановані')
@@ -499,7 +504,7 @@ async def paginate_preorder_list(call: types.CallbackQuery, callback_data: PreOr
         call: The callback query from pagination buttons.
         callback_data: The paginator callback data.
     """
-    await show_preorder_list_page(call, page=callback_data.page)
+    await show_preorder_list_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 @router.callback_query(PreOrderDetails.filter())
 async def show_preorder_details(call: types.CallbackQuery, callback_data: PreOrderDetails) -> None:
@@ -516,7 +521,7 @@ async def show_preorder_details(call: types.CallbackQuery, callback_data: PreOrd
         await show_preorder_list_page(call, page=0)
         return
 
-    time_str = parser.parse(order['scheduled_at']).strftime('%d.%m.%Y о %H:%M')
+    time_str = from_epoch(order['scheduled_at']).strftime('%d.%m.%Y о %H:%M')
     details_text = (
         f"<b>Деталі запланованого замовлення №{order['id']}</b>\n\n"
         f"<b>Час подачі:</b> {time_str}\n"
@@ -541,7 +546,9 @@ async def accept_preorder_handler(call: types.CallbackQuery, callback_data: PreO
     order_id = callback_data.order_id
     driver_id = call.from_user.id
 
-    await db_queries.accept_preorder(order_id, driver_id)
+    if not await db_queries.accept_preorder(order_id, driver_id):
+        await call.answer("❌ Це замовлення вже взяв інший водій або його скасовано.", show_alert=True)
+        return
     order = await db_queries.get_order_details(order_id)
 
     await call.answer("✅ Ви взяли це замовлення!", show_alert=True)
@@ -555,7 +562,7 @@ async def accept_preorder_handler(call: types.CallbackQuery, callback_data: PreO
 
 MY_PREORDERS_PER_PAGE = 5
 
-async def show_my_preorders_page(target: types.Message | types.CallbackQuery, page: int) -> None:
+async def show_my_preorders_page(target: types.Message | types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated list of the driver's own active pre-orders.
     """
@@ -567,6 +574,7 @@ async def show_my_preorders_page(target: types.Message | types.CallbackQuery, pa
     await show_paginated_list(
         target=target,
         page=page,
+        cursor=cursor,
         count_func=db_queries.get_my_preorders_count,
         page_func=db_queries.get_my_preorders_page,
         keyboard_func=get_my_preorders_keyboard,
@@ -599,7 +607,7 @@ async def paginate_my_preorders(call: types.CallbackQuery, callback_data: MyPreo
     """
     Handles pagination for the driver's own pre-orders list.
     """
-    await show_my_preorders_page(call, page=callback_data.page)
+    await show_my_preorders_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 @router.callback_query(MyPreorderAction.filter(F.action == 'details'))
 async def show_my_preorder_details(call: types.CallbackQuery, callback_data: MyPreorderAction) -> None:
@@ -612,7 +620,7 @@ async def show_my_preorder_details(call: types.CallbackQuery, callback_data: MyP
         await show_my_preorders_page(call, page=0)
         return
 
-    time_str = parser.parse(order['scheduled_at']).strftime('%d.%m.%Y о %H:%M')
+    time_str = from_epoch(order['scheduled_at']).strftime('%d.%m.%Y о %H:%M')
     details_text = (
         f"<b>Деталі вашого замовлення №{order['id']}</b>\n\n"
         f"<b>Час подачі:</b> {time_str}\n"
@@ -644,13 +652,14 @@ async def cancel_my_preorder_handler(call: types.CallbackQuery, callback_data: M
 
 DRIVER_HISTORY_PER_PAGE = 5
 
-async def show_driver_history_page(target: types.Message | types.CallbackQuery, page: int) -> None:
+async def show_driver_history_page(target: types.Message | types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated list of the driver's completed trip history.
 
     Args:
         target: The message or callback object to answer to.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     driver_id = target.from_user.id
     no_items_kb = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -658,7 +667,7 @@ async def show_driver_history_page(target: types.Message | types.CallbackQuery,
     ])
 
     await show_paginated_list(
-        target=target, page=page,
+        target=target, page=page, cursor=cursor,
         count_func=db_queries.get_driver_orders_count,
         page_func=db_queries.get_driver_orders_page,
         keyboard_func=get_driver_history_keyboard,
@@ -689,7 +698,7 @@ async def paginate_driver_history(call: types.CallbackQuery, callback_data: Driv
         call: The callback query from pagination buttons.
         callback_data: The paginator callback data.
     """
-    await show_driver_history_page(call, page=callback_data.page)
+    await show_driver_history_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 @router.callback_query(TripDetailsCallbackData.filter(), IsDriver())
 async def show_driver_trip_details(call: types.CallbackQuery, callback_data: TripDetailsCallbackData) -> None:
@@ -706,7 +715,7 @@ async def show_driver_trip_details(call: types.CallbackQuery, callback_data: Tri
         await call.answer("Не вдалося знайти інформацію про цю поїздку.", show_alert=True)
         return
 
-    created_at_str = order_data['created_at'].split('.')[0]
+    created_at_str = from_epoch(order_data['created_at']).strftime('%d.%m.%Y %H:%M')
     rating_text = f"{order_data['rating_score']} ⭐" if order_data['is_rated'] and order_data['rating_score'] else "Не оцінено"
 
     details_text = (
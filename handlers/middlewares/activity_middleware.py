@@ -1,9 +1,8 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-import asyncio
 
-from database import queries as db_queries
+from database.activity_buffer import activity_buffer
 
 class ActivityMiddleware(BaseMiddleware):
     """
@@ -18,7 +17,7 @@ class ActivityMiddleware(BaseMiddleware):
     ) -> Any:
         user = data.get('event_from_user')
         if user:
-            # Запускаем обновление в фоне, чтобы не замедлять обработку
-            asyncio.create_task(db_queries.update_user_activity(user.id))
+            # The mark goes into the buffer and is written to the DB in a batch every few seconds
+            activity_buffer.record(user.id)
         
         return await handler(event, data)
\ No newline at end of file
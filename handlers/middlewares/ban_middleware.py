@@ -1,8 +1,8 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
+from loguru import logger
 from aiogram.types import TelegramObject, Message, CallbackQuery
-import aiosqlite
-from config.config import DB_PATH
+from database import queries as db_queries
 
 class BanMiddleware(BaseMiddleware):
     async def __call__(
@@ -15,12 +15,9 @@ class BanMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute("SELECT is_banned FROM clients WHERE user_id = ?", (user.id,))
-            result = await cursor.fetchone()
-
-        if result and result[0] == 1:
-            print(f"Ignoring update from banned user {user.id}")
+        # The answer comes from the role cache, which ban_user/unban_user invalidate
+        if await db_queries.is_user_banned(user.id):
+            logger.info(f"Ignoring update from banned user {user.id}")
             return
 
         return await handler(event, data)
@@ -34,8 +34,8 @@ async def save_address_start(callback: types.CallbackQuery, callback_data: SaveA
         address_data['address'] = finish_address
         # Спробуємо отримати координати для збереженої адреси
         try:
-            from utils.geocoder import geocode, SUMY_OBLAST_VIEWBOX
-            location = await geocode(f"{finish_address}, Глухів", language='uk', timeout=10, viewbox=SUMY_OBLAST_VIEWBOX, bounded=True)
+            from utils.geocoder import geocode, SUMY_OBLAST_VIEWBOX, LANE_BACKGROUND
+            location = await geocode(f"{finish_address}, Глухів", lane=LANE_BACKGROUND, language='uk', timeout=10, viewbox=SUMY_OBLAST_VIEWBOX, bounded=True)
             address_data['latitude'] = location.latitude if location else None
             address_data['longitude'] = location.longitude if location else None
             geocoded_successfully = location is not None
@@ -15,7 +15,7 @@ import html
 from states.fsm_states import FavAddressState
 from database import queries as db_queries
 from ..common.paginator import show_paginated_list
-from dateutil import parser
+from database.timestamps import from_epoch
 
 # Bounding box для Сумської області, щоб пріоритезувати результати пошуку
 # ((south_latitude, west_longitude), (north_latitude, east_longitude))
@@ -51,13 +51,14 @@ async def get_cabinet_text_and_keyboard(user_id: int) -> tuple[str, types.Inline
     
     return response_text, get_cabinet_keyboard()
 
-async def show_history_page(call: types.CallbackQuery, page: int) -> None:
+async def show_history_page(call: types.CallbackQuery, page: int, cursor: str = '') -> None:
     """
     Displays a paginated history of the user's completed trips.
 
     Args:
         call: The callback query that triggered this view.
         page: The page number to display.
+        cursor: The keyset cursor from the paginator button.
     """
     user_id = call.from_user.id
     no_items_kb = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -67,6 +68,7 @@ async def show_history_page(call: types.CallbackQuery, page: int) -> None:
     await show_paginated_list(
         target=call,
         page=page,
+        cursor=cursor,
         count_func=db_queries.get_user_orders_count,
         page_func=db_queries.get_user_orders_page,
         keyboard_func=get_user_history_keyboard,
@@ -113,7 +115,7 @@ async def paginate_history(call: types.CallbackQuery, callback_data: HistoryPagi
         call: The callback query from pagination buttons.
         callback_data: The paginator callback data.
     """
-    await show_history_page(call, page=callback_data.page)
+    await show_history_page(call, page=callback_data.page, cursor=callback_data.cursor)
 
 @router.callback_query(TripDetailsCallbackData.filter())
 async def show_trip_details(call: types.CallbackQuery, callback_data: TripDetailsCallbackData) -> None:
@@ -130,7 +132,7 @@ async def show_trip_details(call: types.CallbackQuery, callback_data: TripDetail
         await call.answer("Не вдалося знайти інформацію про цю поїздку.", show_alert=True)
         return
 
-    created_at_str = parser.parse(order_data['created_at']).strftime('%d.%m.%Y %H:%M')
+    created_at_str = from_epoch(order_data['created_at']).strftime('%d.%m.%Y %H:%M')
     
     rating_status = "Ні"
     if order_data['is_rated'] == 1:
@@ -7,7 +7,10 @@ import asyncio
 from loguru import logger
 from database import queries as db_queries
 from utils.callback_factories import OrderCallbackData
-from .order_dispatch import dispatch_order_to_drivers, _process_next_driver_in_dispatch
+from .order_dispatch import (
+    dispatch_order_to_drivers, _process_next_driver_in_dispatch, dispatch_timers,
+    withdraw_competing_offers, handle_wave_offer_rejected
+)
 from ..common.helpers import safe_edit_or_send, _display_driver_profile
 from .rating import start_driver_rating_process, request_rating_from_driver_for_client
 
@@ -28,6 +31,9 @@ async def accept_order(callback: types.CallbackQuery, callback_data: OrderCallba
         await safe_edit_or_send(callback, f"Замовлення №{order_id} вже неактуальне.")
         return
 
+    dispatch_timers.cancel(order_id)
+    # In broadcast mode other drivers may still hold this offer - take it back from them
+    asyncio.create_task(withdraw_competing_offers(callback.bot, order_id, driver_id))
 
     # Fetch order details to get coordinates for the navigation button
     order_details = await db_queries.get_order_details(order_id)
@@ -87,9 +93,22 @@ async def reject_by_driver(callback: types.CallbackQuery, callback_data: OrderCa
     order_id = callback_data.order_id
     driver_id = callback.from_user.id
 
-    # Check if the order is still in 'searching' state and offered to this driver
-    current_driver_id_in_db = await db_queries.get_current_driver_for_order(order_id)
-    if current_driver_id_in_db != driver_id:
+    # Broadcast mode: the driver declines their offer from the current wave
+    if await db_queries.reject_dispatch_offer(order_id, driver_id):
+        await db_queries.record_driver_rejection(order_id, driver_id)
+        await callback.answer("Ви відмовились від замовлення.", show_alert=True)
+        try:
+            await safe_edit_or_send(callback, f"❌ Ви відмовились від замовлення №{order_id}.")
+        except TelegramBadRequest:
+            pass
+        asyncio.create_task(handle_wave_offer_rejected(bot, order_id))
+        return
+
+    # Check if the order is still in 'searching' state and offered to this driver.
+    # The conditional advance loses to a concurrent timeout, so the queue never skips a driver.
+    driver_ids, current_index = await db_queries.get_dispatch_info(order_id)
+    is_current = current_index < len(driver_ids) and driver_ids[current_index] == driver_id
+    if not is_current or not await db_queries.advance_dispatch_index(order_id, current_index):
         await callback.answer("Це замовлення вже неактуальне для вас.", show_alert=True)
         try:
             await safe_edit_or_send(callback, f"Замовлення №{order_id} вже неактуальне.")
@@ -97,7 +116,7 @@ async def reject_by_driver(callback: types.CallbackQuery, callback_data: OrderCa
             pass # Message might have been deleted, ignore
         return
 
-    await db_queries.increment_dispatch_index(order_id)
+    dispatch_timers.cancel(order_id)
     await db_queries.record_driver_rejection(order_id, driver_id)
     
     await callback.answer("Ви відмовились від замовлення.", show_alert=True)
@@ -5,9 +5,17 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from loguru import logger
 import html
 from database import queries as db_queries
+from database.timestamps import from_epoch
 from keyboards.reply_keyboards import main_menu_keyboard
-from config.config import DRIVER_ACCEPT_TIMEOUT
+from config.config import DRIVER_ACCEPT_TIMEOUT, DISPATCH_STRATEGY, DISPATCH_WAVE_SIZE, DISPATCH_WAVE_GROWTH, TIMEZONE
 from utils.callback_factories import OrderCallbackData
+from utils.timers import DeadlineScheduler
+from utils.outbound import send_priority, PRIORITY_DISPATCH
+from datetime import datetime
+
+# One pending deadline per order: the offer currently shown to a driver.
+# Armed when the offer is sent, cancelled on accept/reject, restored from the DB on startup.
+dispatch_timers = DeadlineScheduler('dispatch')
 
 async def _format_and_build_for_driver(order_id: int, order_data: dict, client_user: types.User) -> tuple[str, types.InlineKeyboardMarkup]:
     """Helper to format the message and build the keyboard for the driver."""
@@ -76,13 +84,12 @@ async def _process_next_driver_in_dispatch(bot: Bot, order_id: int) -> None:
 
     driver_ids, current_index = await db_queries.get_dispatch_info(order_id)
 
+    if DISPATCH_STRATEGY == 'broadcast':
+        await _send_offer_wave(bot, order_id, order_data, client_user, driver_ids, current_index)
+        return
+
     if not driver_ids or current_index >= len(driver_ids):
-        logger.info(f"No more drivers in queue for order {order_id}. Cancelling.")
-        try:
-            await bot.send_message(client_user.id, 'На жаль, ніхто з водіїв не прийняв ваше замовлення. Спробуйте створити нове замовлення пізніше.', reply_markup=main_menu_keyboard)
-        except Exception as e:
-            logger.warning(f"Failed to send cancellation notice to client {client_user.id} for order {order_id}: {e}")
-        await db_queries.update_order_status(order_id, 'cancelled_no_drivers')
+        await _cancel_no_drivers_left(bot, order_id, client_user.id)
         return
 
     current_driver_id = driver_ids[current_index]
@@ -90,25 +97,174 @@ async def _process_next_driver_in_dispatch(bot: Bot, order_id: int) -> None:
     try:
         text_for_driver, keyboard_for_driver = await _format_and_build_for_driver(order_id, order_data, client_user)
 
-        # First, send the text message with order details and buttons
-        await bot.send_message(current_driver_id, text_for_driver, reply_markup=keyboard_for_driver)
+        with send_priority(PRIORITY_DISPATCH):
+            # First, send the text message with order details and buttons
+            await bot.send_message(current_driver_id, text_for_driver, reply_markup=keyboard_for_driver)
 
-        # Then, if coordinates are available, send the location separately
-        lat, lon = order_data.get('latitude'), order_data.get('longitude')
-        if lat and lon:
-            await bot.send_location(
-                chat_id=current_driver_id,
-                latitude=lat,
-                longitude=lon
-            )
+            # Then, if coordinates are available, send the location separately
+            lat, lon = order_data.get('latitude'), order_data.get('longitude')
+            if lat and lon:
+                await bot.send_location(
+                    chat_id=current_driver_id,
+                    latitude=lat,
+                    longitude=lon
+                )
         
         logger.info(f"Замовлення {order_id} запропоновано водію {current_driver_id}.")
         await db_queries.mark_dispatch_offer_sent(order_id)
+        dispatch_timers.schedule(order_id, DRIVER_ACCEPT_TIMEOUT, _handle_offer_timeout, bot, order_id, current_index)
     except Exception as e:
         logger.warning(f"Failed to send order to driver {current_driver_id}, skipping. Error: {e}")
         await db_queries.increment_dispatch_index(order_id)
         asyncio.create_task(_process_next_driver_in_dispatch(bot, order_id))
 
+async def _cancel_no_drivers_left(bot: Bot, order_id: int, client_id: int) -> None:
+    """Cancels the order once every driver in the queue has declined or ignored it."""
+    # Conditional update: an order accepted a moment ago must not be cancelled
+    if not await db_queries.cancel_searching_order(order_id, 'cancelled_no_drivers'):
+        return
+    logger.info(f"No more drivers in queue for order {order_id}. Cancelling.")
+    try:
+        await bot.send_message(client_id, 'На жаль, ніхто з водіїв не прийняв ваше замовлення. Спробуйте створити нове замовлення пізніше.', reply_markup=main_menu_keyboard)
+    except Exception as e:
+        logger.warning(f"Failed to send cancellation notice to client {client_id} for order {order_id}: {e}")
+
+async def _send_single_offer(bot: Bot, driver_id: int, text: str, keyboard: types.InlineKeyboardMarkup, lat, lon) -> tuple[int, int, int | None]:
+    """Sends one offer (text with buttons, then the pickup location) and returns its message ids."""
+    with send_priority(PRIORITY_DISPATCH):
+        message = await bot.send_message(driver_id, text, reply_markup=keyboard)
+        location_message_id = None
+        if lat and lon:
+            location = await bot.send_location(chat_id=driver_id, latitude=lat, longitude=lon)
+            location_message_id = location.message_id
+    return driver_id, message.message_id, location_message_id
+
+async def _send_offer_wave(bot: Bot, order_id: int, order_data: dict, client_user: types.User, driver_ids: list[int], current_index: int) -> None:
+    """
+    Broadcast strategy: offers the order to the next wave of nearest drivers at once.
+
+    Waves start at DISPATCH_WAVE_SIZE drivers and grow by DISPATCH_WAVE_GROWTH.
+    The first driver to accept wins (accept_order is a conditional UPDATE); the others'
+    offers are withdrawn. The next wave goes out when the whole wave has declined or
+    DRIVER_ACCEPT_TIMEOUT expires.
+    """
+    wave = await db_queries.get_next_dispatch_wave(order_id)
+    batch = driver_ids[current_index:current_index + DISPATCH_WAVE_SIZE * DISPATCH_WAVE_GROWTH ** wave]
+    if not batch:
+        if await db_queries.count_pending_dispatch_offers(order_id) == 0:
+            await _cancel_no_drivers_left(bot, order_id, client_user.id)
+        return
+
+    # Claim the slice of the queue first, so a concurrent timeout/rejection cannot send the same wave twice
+    if not await db_queries.advance_dispatch_index(order_id, current_index, step=len(batch)):
+        return
+
+    text_for_driver, keyboard_for_driver = await _format_and_build_for_driver(order_id, order_data, client_user)
+    lat, lon = order_data.get('latitude'), order_data.get('longitude')
+    results = await asyncio.gather(
+        *(_send_single_offer(bot, driver_id, text_for_driver, keyboard_for_driver, lat, lon) for driver_id in batch),
+        return_exceptions=True
+    )
+    sent = []
+    for driver_id, result in zip(batch, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to send order {order_id} to driver {driver_id}, skipping. Error: {result}")
+        else:
+            sent.append(result)
+
+    if not sent:
+        # Nobody in this wave could be reached - move straight on to the next one
+        asyncio.create_task(_process_next_driver_in_dispatch(bot, order_id))
+        return
+
+    await db_queries.add_dispatch_offers(order_id, wave, sent)
+    await db_queries.mark_dispatch_offer_sent(order_id)
+    dispatch_timers.schedule(order_id, DRIVER_ACCEPT_TIMEOUT, _handle_wave_timeout, bot, order_id, wave)
+    logger.info(f"Замовлення {order_id} запропоновано хвилі {wave} з {len(sent)} водіїв.")
+
+async def _withdraw_offer_messages(bot: Bot, offers: list[tuple], text: str) -> None:
+    """Replaces offer messages with `text` (removing the buttons) and deletes their location messages."""
+    async def _withdraw(driver_id: int, message_id: int | None, location_message_id: int | None):
+        if message_id:
+            await bot.edit_message_text(text, chat_id=driver_id, message_id=message_id)
+        if location_message_id:
+            await bot.delete_message(driver_id, location_message_id)
+
+    # A stale offer must disappear before the driver presses it, so it shares the offers' priority
+    with send_priority(PRIORITY_DISPATCH):
+        results = await asyncio.gather(*(_withdraw(*offer) for offer in offers), return_exceptions=True)
+    for offer, result in zip(offers, results):
+        if isinstance(result, Exception):
+            logger.debug(f"Could not withdraw offer message for driver {offer[0]}: {result}")
+
+async def withdraw_competing_offers(bot: Bot, order_id: int, winner_driver_id: int) -> None:
+    """Withdraws the offers other drivers still hold after `winner_driver_id` accepted the order."""
+    withdrawn = await db_queries.settle_dispatch_offers(order_id, winner_driver_id)
+    if withdrawn:
+        await _withdraw_offer_messages(bot, withdrawn, f"Замовлення №{order_id} вже прийнято іншим водієм.")
+        logger.info(f"Withdrew {len(withdrawn)} competing offer(s) for order {order_id}.")
+
+async def handle_wave_offer_rejected(bot: Bot, order_id: int) -> None:
+    """Sends the next wave as soon as every driver of the current wave has declined."""
+    if await db_queries.count_pending_dispatch_offers(order_id) == 0:
+        dispatch_timers.cancel(order_id)
+        await _process_next_driver_in_dispatch(bot, order_id)
+
+async def _handle_wave_timeout(bot: Bot, order_id: int, wave: int) -> None:
+    """Expires the unanswered offers of a wave and moves on to the next wave."""
+    expired = await db_queries.expire_dispatch_offers(order_id, wave)
+    if not expired:
+        return
+    await _withdraw_offer_messages(bot, expired, f"⌛️ Час на прийняття замовлення №{order_id} вичерпано.")
+    logger.info(f"Offer wave {wave} for order {order_id} has timed out. Sending the next wave.")
+    await _process_next_driver_in_dispatch(bot, order_id)
+
+async def _handle_offer_timeout(bot: Bot, order_id: int, offered_index: int) -> None:
+    """
+    Fires when a driver did not answer an offer in time and passes the order to the next driver.
+    Does nothing if the order was accepted, cancelled or already moved on in the meantime.
+    """
+    driver_ids, _ = await db_queries.get_dispatch_info(order_id)
+    if not await db_queries.advance_dispatch_index(order_id, offered_index):
+        return
+
+    if offered_index < len(driver_ids):
+        previous_driver_id = driver_ids[offered_index]
+        try:
+            await bot.send_message(previous_driver_id, f"⌛️ Час на прийняття замовлення №{order_id} вичерпано.")
+        except Exception as e:
+            logger.warning(f"Could not send timeout message to driver {previous_driver_id}: {e}")
+
+    logger.info(f"Dispatch for order {order_id} has timed out. Advancing to next driver.")
+    await _process_next_driver_in_dispatch(bot, order_id)
+
+async def restore_dispatch_timers(bot: Bot) -> None:
+    """
+    Re-arms offer timeouts for orders that were in 'searching' when the bot stopped.
+    Orders whose offer was never sent (stopped mid-dispatch) are offered to the current driver again.
+    """
+    orders = await db_queries.get_searching_dispatches()
+    now = datetime.now(TIMEZONE)
+    for order in orders:
+        order_id = order['id']
+        sent_at = order['dispatch_offer_sent_at']
+        if order['wave_sent_at']:
+            elapsed = (now - from_epoch(order['wave_sent_at'])).total_seconds()
+            dispatch_timers.schedule(
+                order_id, DRIVER_ACCEPT_TIMEOUT - elapsed, _handle_wave_timeout, bot, order_id, order['wave']
+            )
+        elif sent_at:
+            elapsed = (now - from_epoch(sent_at)).total_seconds()
+            dispatch_timers.schedule(
+                order_id, DRIVER_ACCEPT_TIMEOUT - elapsed, _handle_offer_timeout,
+                bot, order_id, order['dispatch_current_driver_index'] or 0
+            )
+        else:
+            logger.info(f"Found stale searching order {order_id}. Restarting dispatch process.")
+            asyncio.create_task(_process_next_driver_in_dispatch(bot, order_id))
+    if orders:
+        logger.info(f"Restored dispatch timers for {len(orders)} searching order(s).")
+
 def _format_order_for_driver(order_id: int, order_data: dict, client_user: types.User, client_rating_text: str, reviews_text: str) -> str:
     """
     Formats the order details into a text message for the driver based on the order type.
@@ -1,14 +1,13 @@
 from aiogram import types, F, Router
 from aiogram.fsm.context import FSMContext
-import asyncio
 import json
 from aiogram.filters import StateFilter, or_f
 
 from states.fsm_states import UserState, PreOrderState, DeliveryState
 from keyboards.reply_keyboards import main_menu_keyboard
 from database import queries as db_queries
-from utils.callback_factories import ConfirmUnfoundAddress, OrderCallbackData
-from .order_dispatch import dispatch_order_to_drivers, _process_next_driver_in_dispatch
+from utils.callback_factories import ConfirmUnfoundAddress
+from .order_dispatch import dispatch_order_to_drivers
 from .order_helpers import format_confirmation_text, validate_order_data, _go_to_phone_number_step, _go_to_finish_address_step, _go_to_begin_address_step
 
 router = Router()
@@ -98,28 +97,3 @@ async def retry_unfound_address(call: types.CallbackQuery, state: FSMContext):
     else: # finish or unknown, default to finish
         # This is the old behavior, which is correct for the finish address.
         await _go_to_finish_address_step(call, state)
-
-@router.callback_query(OrderCallbackData.filter(F.action == 'reject_by_driver'))
-async def reject_order_by_driver(call: types.CallbackQuery, callback_data: OrderCallbackData):
-    """
-    Handles a driver rejecting an order.
-    It increments the dispatch index and offers the order to the next driver.
-    """
-    order_id = callback_data.order_id
-    driver_id = call.from_user.id
-
-    # Check if this driver is the one the order was offered to
-    is_correct_driver = await db_queries.check_if_driver_is_current_for_order(order_id, driver_id)
-    if not is_correct_driver:
-        await call.answer("Це замовлення вже не актуальне для вас.", show_alert=True)
-        return
-
-    await call.answer("Ви відмовились від замовлення.")
-    await call.message.edit_text(f"Ви відмовились від замовлення №{order_id}.")
-    await db_queries.record_driver_rejection(order_id, driver_id)
-
-    # Increment index and proceed to the next driver
-    await db_queries.increment_dispatch_index(order_id)
-
-    # The self-sufficient function will handle fetching data and sending the order.
-    asyncio.create_task(_process_next_driver_in_dispatch(call.bot, order_id))
\ No newline at end of file
@@ -83,7 +83,7 @@ async def process_minute(call: types.CallbackQuery, state: FSMContext) -> None:
     try:
         full_datetime_str = f"{data['selected_date']} {data['selected_hour']}:{selected_minute}"
         scheduled_at = parser.parse(full_datetime_str)
-        scheduled_at = TIMEZONE.localize(scheduled_at)
+        scheduled_at = scheduled_at.replace(tzinfo=TIMEZONE)
     except (KeyError, ValueError):
         await call.answer("Сталася помилка. Будь ласка, почніть заново.", show_alert=True)
         await call.message.answer("Помилка даних. Повернення в головне меню.", reply_markup=main_menu_keyboard)
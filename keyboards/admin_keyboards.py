@@ -1,6 +1,6 @@
 from aiogram import types
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from dateutil import parser
+from database.timestamps import from_epoch
 from utils.callback_factories import *
 from .common import Navigate, _add_pagination_buttons
 import html
@@ -109,8 +109,8 @@ def get_user_management_keyboard() -> types.InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
-def get_drivers_list_keyboard(page: int, total_pages: int, drivers: list) -> types.InlineKeyboardMarkup:
-    """Генерує клавіатуру для пагінації списку водіїв."""
+def get_drivers_list_keyboard(page: int, total_pages: int, drivers: list, list_type: str | None = None) -> types.InlineKeyboardMarkup:
+    """Builds the pagination keyboard for the drivers list (list_type is the list filter from the driver management menu)."""
     builder = InlineKeyboardBuilder()
     for driver in drivers:
         builder.button(
@@ -118,7 +118,10 @@ def get_drivers_list_keyboard(page: int, total_pages: int, drivers: list) -> typ
             callback_data=DriverProfile(user_id=driver['user_id'])
         )
     
-    pagination_row_size = _add_pagination_buttons(builder, page, total_pages, Paginator)
+    if list_type:
+        pagination_row_size = _add_pagination_buttons(builder, page, total_pages, AdminDriverList, list_type=list_type)
+    else:
+        pagination_row_size = _add_pagination_buttons(builder, page, total_pages, Paginator)
     builder.button(text='➕ Додати водія', callback_data=Navigate(to='add_driver_start'))
     builder.button(text='↩️ До адмін-панелі', callback_data=Navigate(to='admin_panel'))
 
@@ -128,6 +131,11 @@ def get_drivers_list_keyboard(page: int, total_pages: int, drivers: list) -> typ
     builder.adjust(*layout)
     return builder.as_markup()
 
+def get_back_to_drivers_menu_keyboard() -> types.InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text='↩️ До керування водіями', callback_data=Navigate(to='manage_drivers'))
+    return builder.as_markup()
+
 def get_working_drivers_keyboard(page: int, total_pages: int, drivers: list) -> types.InlineKeyboardMarkup:
     """Генерує клавіатуру для пагінації списку водіїв на зміні."""
     builder = InlineKeyboardBuilder()
@@ -204,7 +212,7 @@ def get_client_history_keyboard(page: int, total_pages: int, orders: list, clien
     }
     for order in orders:
         emoji = status_emoji.get(order['status'], '❓')
-        date_str = parser.parse(order['created_at']).strftime('%d.%m %H:%M')
+        date_str = from_epoch(order['created_at']).strftime('%d.%m %H:%M')
         builder.button(
             text=f"{emoji} №{order['id']} від {date_str}",
             callback_data=AdminOrderDetails(order_id=order['id'])
@@ -281,7 +289,7 @@ def get_active_orders_keyboard(page: int, total_pages: int, orders_on_page: list
     }
     for order in orders_on_page:
         emoji = status_emoji.get(order['status'], '❓')
-        date_str = parser.parse(order['created_at']).strftime('%d.%m %H:%M')
+        date_str = from_epoch(order['created_at']).strftime('%d.%m %H:%M')
         builder.button(
             text=f"{emoji} №{order['id']} від {date_str}",
             callback_data=AdminOrderDetails(order_id=order['id'])
@@ -324,7 +332,7 @@ def get_all_orders_keyboard(page: int, total_pages: int, orders: list) -> types.
     }
     for order in orders:
         emoji = status_emoji.get(order['status'], '❓')
-        date_str = parser.parse(order['created_at']).strftime('%d.%m %H:%M')
+        date_str = from_epoch(order['created_at']).strftime('%d.%m %H:%M')
         builder.button(
             text=f"{emoji} №{order['id']} від {date_str}",
             callback_data=AdminOrderDetails(order_id=order['id'])
@@ -339,6 +347,26 @@ def get_all_orders_keyboard(page: int, total_pages: int, orders: list) -> types.
     builder.adjust(*layout)
     return builder.as_markup()
 
+def get_orders_list_keyboard(page: int, total_pages: int, items: list, status: str) -> types.InlineKeyboardMarkup:
+    """Builds the keyboard for a list of orders with one status (admin)."""
+    builder = InlineKeyboardBuilder()
+    for order in items:
+        builder.button(text=f"№{order['id']}", callback_data=AdminOrderDetails(order_id=order['id']))
+
+    pagination_row_size = _add_pagination_buttons(builder, page, total_pages, AdminOrderList, status=status)
+    builder.button(text="↩️ До керування замовленнями", callback_data=Navigate(to="manage_orders"))
+
+    layout = [1] * len(items)
+    if pagination_row_size > 0: layout.append(pagination_row_size)
+    layout.append(1)
+    builder.adjust(*layout)
+    return builder.as_markup()
+
+def get_back_to_orders_menu_keyboard() -> types.InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="↩️ До керування замовленнями", callback_data=Navigate(to="manage_orders"))
+    return builder.as_markup()
+
 def get_confirm_delete_driver_keyboard(user_id: int) -> types.InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Так, видалити", callback_data=AdminDriverAction(action='delete_confirm', user_id=user_id))
@@ -5,6 +5,20 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 class Navigate(CallbackData, prefix="nav"):
     to: str
 
+class PagePosition(int):
+    """
+    A page number that also carries the keyset cursors of the neighbouring pages.
+
+    Behaves as a plain int everywhere; _add_pagination_buttons puts the cursors
+    into the paginator callbacks so the next page is fetched by seek, not OFFSET.
+    """
+
+    def __new__(cls, page: int, prev_cursor: str = '', next_cursor: str = ''):
+        position = super().__new__(cls, page)
+        position.prev_cursor = prev_cursor
+        position.next_cursor = next_cursor
+        return position
+
 def _add_pagination_buttons(builder: InlineKeyboardBuilder, page: int, total_pages: int, paginator_callback: type[CallbackData], **kwargs) -> int:
     """
     Adds pagination buttons to an InlineKeyboardBuilder.
@@ -16,14 +30,21 @@ def _add_pagination_buttons(builder: InlineKeyboardBuilder, page: int, total_pag
         paginator_callback: The CallbackData class to use for pagination.
         **kwargs: Additional arguments to pass to the paginator callback.
 
+    If `page` is a PagePosition, its cursors are added to the callbacks
+    (the paginator callback must then have a `cursor` field).
+
     Returns:
         The number of buttons added to the pagination row (0, 1, or 2).
     """
+    prev_cursor = getattr(page, 'prev_cursor', '')
+    next_cursor = getattr(page, 'next_cursor', '')
     pagination_row_size = 0
     if page > 0:
-        builder.button(text="⬅️ Назад", callback_data=paginator_callback(page=page - 1, **kwargs))
+        cursor_kwargs = {'cursor': prev_cursor} if prev_cursor else {}
+        builder.button(text="⬅️ Назад", callback_data=paginator_callback(page=page - 1, **cursor_kwargs, **kwargs))
         pagination_row_size += 1
     if page < total_pages - 1:
-        builder.button(text="Вперед ➡️", callback_data=paginator_callback(page=page + 1, **kwargs))
+        cursor_kwargs = {'cursor': next_cursor} if next_cursor else {}
+        builder.button(text="Вперед ➡️", callback_data=paginator_callback(page=page + 1, **cursor_kwargs, **kwargs))
         pagination_row_size += 1
     return pagination_row_size
\ No newline at end of file
@@ -1,6 +1,6 @@
 from aiogram import types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from dateutil import parser
+from database.timestamps import from_epoch
 from utils.callback_factories import *
 from .common import Navigate, _add_pagination_buttons
 import html
@@ -32,7 +32,7 @@ def get_driver_rejections_keyboard(page: int, total_pages: int, rejections: list
     """Генерує клавіатуру для історії відмов водія."""
     builder = InlineKeyboardBuilder()
     for rejection in rejections:
-        date_str = parser.parse(rejection['rejected_at']).strftime('%d.%m.%Y')
+        date_str = from_epoch(rejection['rejected_at']).strftime('%d.%m.%Y')
         button_text = f"↪️ №{rejection['order_id']} від {date_str} (Клієнт: {html.escape(rejection['client_name'])})"
         builder.button(
             text=button_text,
@@ -52,7 +52,7 @@ def get_preorder_list_keyboard(page: int, total_pages: int, orders: list) -> typ
     """Generates a keyboard for the list of available pre-orders."""
     builder = InlineKeyboardBuilder()
     for order in orders:
-        time_str = parser.parse(order['scheduled_at']).strftime('%d.%m %H:%M')
+        time_str = from_epoch(order['scheduled_at']).strftime('%d.%m %H:%M')
         route_str = f"{html.escape(order['begin_address'])} -> {html.escape(order['finish_address'])}"
         builder.button(
             text=f"🗓️ №{order['id']} на {time_str} - {route_str}",
@@ -83,7 +83,7 @@ def get_my_preorders_keyboard(page: int, total_pages: int, orders: list) -> type
     """Generates a keyboard for the list of driver's own active pre-orders."""
     builder = InlineKeyboardBuilder()
     for order in orders:
-        time_str = parser.parse(order['scheduled_at']).strftime('%d.%m %H:%M')
+        time_str = from_epoch(order['scheduled_at']).strftime('%d.%m %H:%M')
         builder.button(
             text=f"🗓️ №{order['id']} на {time_str} - {html.escape(order['begin_address'])}",
             callback_data=MyPreorderAction(action='details', order_id=order['id'])
@@ -112,7 +112,7 @@ def get_driver_history_keyboard(page: int, total_pages: int, orders_on_page: lis
     """Генерує клавіатуру для історії поїздок водія."""
     builder = InlineKeyboardBuilder()
     for order in orders_on_page:
-        date_str = parser.parse(order['created_at']).strftime('%d.%m.%Y')
+        date_str = from_epoch(order['created_at']).strftime('%d.%m.%Y')
         builder.button(
             text=f"Поїздка №{order['id']} від {date_str}",
             callback_data=TripDetailsCallbackData(order_id=order['id'])
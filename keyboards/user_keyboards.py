@@ -1,6 +1,6 @@
 from aiogram import types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from dateutil import parser
+from database.timestamps import from_epoch
 from utils.callback_factories import *
 from .common import Navigate, _add_pagination_buttons
 from datetime import datetime, timedelta
@@ -21,7 +21,7 @@ def get_user_history_keyboard(page: int, total_pages: int, orders: list) -> type
     """Generates a keyboard for the user's trip history with pagination."""
     builder = InlineKeyboardBuilder()
     for order in orders:
-        date_str = parser.parse(order['created_at']).strftime('%d.%m.%Y')
+        date_str = from_epoch(order['created_at']).strftime('%d.%m.%Y')
         builder.button(
             text=f"Поїздка №{order['id']} від {date_str}",
             callback_data=TripDetailsCallbackData(order_id=order['id'])
@@ -9,18 +9,25 @@ from aiogram.types import BotCommand, BotCommandScopeDefault, BotCommandScopeCha
 from loguru import logger
 from bot_manager import safe_bot_start
 from aiogram.exceptions import TelegramConflictError
-from config.config import TOKEN, ADMIN_IDS
+from config.config import TOKEN, ADMIN_IDS, STATS_RECONCILE_INTERVAL_MINUTES
 from config.logging_config import setup_logging
 
 # --- Підключення роутерів ---
-from database.db import init_db
+from database.db import init_db, close_db
+from database.fsm_storage import fsm_storage
+from database.preorder_schedule import preorder_schedule
 from database import queries as db_queries
+from utils.gazetteer import gazetteer
+from utils.geocoder import geocoder
+from utils.outbound import outbound_scheduler
 from handlers.middlewares.logging_middleware import LoggingMiddleware
 from handlers.middlewares.activity_middleware import ActivityMiddleware
 from handlers.middlewares.ban_middleware import BanMiddleware
 from handlers import setup_routers
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from handlers.user.scheduler import check_scheduled_orders, check_dispatch_timeouts, check_preorder_reminders, check_pending_dispatch_orders
+from handlers.user.scheduler import check_pending_dispatch_orders, restore_preorder_schedule
+from handlers.user.order_dispatch import dispatch_timers, restore_dispatch_timers
+from utils.newsletter_jobs import resume_newsletter_jobs, stop_newsletter_jobs
 
 # Глобальные переменные для корректного завершения
 bot = None
@@ -68,6 +75,24 @@ async def graceful_shutdown(dp: Dispatcher):
             logger.info("Планувальник зупинено")
         except Exception as e:
             logger.error(f"Помилка при зупинці планувальника: {e}")
+
+    try:
+        await dispatch_timers.stop()
+        logger.info("Таймери диспетчеризації зупинено")
+    except Exception as e:
+        logger.error(f"Помилка при зупинці таймерів диспетчеризації: {e}")
+
+    try:
+        await preorder_schedule.stop()
+        logger.info("Таймери попередніх замовлень зупинено")
+    except Exception as e:
+        logger.error(f"Помилка при зупинці таймерів попередніх замовлень: {e}")
+
+    try:
+        await stop_newsletter_jobs()
+        logger.info("Розсилки призупинено, вони продовжаться після запуску")
+    except Exception as e:
+        logger.error(f"Помилка при зупинці розсилок: {e}")
     
     if dp:
         try:
@@ -82,6 +107,17 @@ async def graceful_shutdown(dp: Dispatcher):
         except Exception as e:
             logger.error(f"Помилка при закритті FSM сховища: {e}")
     
+    try:
+        await close_db()
+        logger.info("З'єднання з базою даних закрито")
+    except Exception as e:
+        logger.error(f"Помилка при закритті з'єднань з базою даних: {e}")
+
+    gazetteer.close()
+    await geocoder.close()
+    logger.info(f"Геокодер: {geocoder.stats()}")
+    logger.info(f"Вихідні повідомлення: {outbound_scheduler.stats()}")
+
     if bot:
         try:
             await bot.close()
@@ -95,6 +131,8 @@ async def start_bot(dp: Dispatcher):
     global bot, scheduler
     
     bot = Bot(TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # All outgoing messages go through the scheduler: priorities, Telegram limits, retries after 429
+    bot.session.middleware(outbound_scheduler)
     bot_info = await bot.get_me()
 
     # Спробуємо видалити вебхук перед запуском, щоб уникнути конфліктів
@@ -109,6 +147,22 @@ async def start_bot(dp: Dispatcher):
     await init_db()
     logger.info("Базу даних ініціалізовано.")
 
+    # Restore unfinished user dialogs (FSM) from the database
+    await fsm_storage.start()
+
+    # The region's offline gazetteer: addresses found in it need no Nominatim requests
+    gazetteer.open()
+
+    # Driver offer timeouts: start the timers and restore them for orders still searching
+    dispatch_timers.start()
+    await restore_dispatch_timers(bot)
+
+    # Pre-orders: start the driver search and remind the driver exactly on time
+    await restore_preorder_schedule(bot)
+
+    # Newsletters interrupted by a bot shutdown resume where they stopped
+    await resume_newsletter_jobs(bot)
+
     # Додаємо обробники сигналів для граційного завершення
     # Це більш надійний спосіб для asyncio, ніж signal.signal
     loop = asyncio.get_running_loop()
@@ -120,10 +174,8 @@ async def start_bot(dp: Dispatcher):
             pass
 
     scheduler = AsyncIOScheduler(timezone="Europe/Kiev")
-    scheduler.add_job(check_scheduled_orders, trigger='interval', seconds=60, kwargs={'bot': bot})
-    scheduler.add_job(check_dispatch_timeouts, trigger='interval', seconds=5, kwargs={'bot': bot})
     scheduler.add_job(check_pending_dispatch_orders, trigger='interval', seconds=60, kwargs={'bot': bot})
-    scheduler.add_job(check_preorder_reminders, trigger='interval', minutes=1, kwargs={'bot': bot})
+    scheduler.add_job(db_queries.reconcile_stats_counters, trigger='interval', minutes=STATS_RECONCILE_INTERVAL_MINUTES)
     scheduler.start()
     
     await set_bot_commands(bot)
@@ -148,8 +200,9 @@ async def start_bot(dp: Dispatcher):
         raise e
 
 async def main():
-    # Инициализируем Dispatcher здесь, а не глобально
-    dp = Dispatcher()
+    # Initialize the Dispatcher here rather than globally.
+    # FSM states are stored in the database, so unfinished orders survive a restart.
+    dp = Dispatcher(storage=fsm_storage)
 
     # Настраиваем роутеры
     main_router, admin_router, errors_router = setup_routers()
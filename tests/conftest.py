@@ -0,0 +1,15 @@
+import pytest_asyncio
+
+import database.db as db_module
+from database.pool import db_pool
+
+
+@pytest_asyncio.fixture
+async def temp_db(tmp_path, monkeypatch):
+    """Initializes a temporary database and opens the shared pool and write queue on it."""
+    db_path = tmp_path / "test_taxi_bot.db"
+    monkeypatch.setattr(db_module, 'DB_PATH', db_path)
+    monkeypatch.setattr(db_pool, '_db_path', db_path)
+    await db_module.init_db()
+    yield db_path
+    await db_module.close_db()
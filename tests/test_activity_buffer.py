@@ -0,0 +1,48 @@
+import pytest
+
+from database.activity_buffer import ActivityBuffer
+from database.pool import db_pool
+from database import queries as db_queries
+
+
+@pytest.mark.asyncio
+async def test_activity_is_coalesced_per_user_and_flushed_in_one_batch(temp_db):
+    """
+    Repeated marks of one user collapse into one, and the whole buffer is written in one flush.
+    """
+    for user_id in (1, 2, 3):
+        await db_queries.add_or_update_user(user_id, f"User {user_id}", None)
+    # Flush the marks set during registration
+    await db_queries.update_users_activity_batch([(user_id, None) for user_id in (1, 2, 3)])
+
+    buffer = ActivityBuffer(flush_interval=3600, max_entries=100)
+    for _ in range(50):
+        buffer.record(1)
+    buffer.record(2)
+
+    assert buffer.stats()['pending'] == 2
+    assert await buffer.flush() == 2
+    assert await buffer.flush() == 0
+
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT user_id FROM users WHERE last_activity IS NOT NULL ORDER BY user_id")
+        assert [row[0] for row in await cursor.fetchall()] == [1, 2]
+
+    assert buffer.stats() == {'recorded': 51, 'flushed': 2, 'flushes': 1, 'dropped': 0, 'pending': 0}
+
+
+@pytest.mark.asyncio
+async def test_buffer_size_is_bounded_when_it_cannot_flush(mocker):
+    """Without a working flush the buffer stops growing at max_entries and counts the dropped marks."""
+    update = mocker.patch.object(db_queries, 'update_users_activity_batch', mocker.AsyncMock(side_effect=RuntimeError("db is down")))
+    buffer = ActivityBuffer(flush_interval=3600, max_entries=3)
+    for user_id in range(1, 6):
+        buffer.record(user_id)
+    buffer.record(1)
+    assert buffer.stats()['pending'] == 3 and buffer.stats()['dropped'] == 2
+
+    # A failed flush returns the batch without exceeding the bound
+    assert await buffer.flush() == 0
+    buffer.record(6)
+    assert buffer.stats()['pending'] == 3 and buffer.stats()['dropped'] == 3
+    assert update.await_count == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.bench_queries import Regression, compare, run_benchmarks, summarize
+from benchmarks.synthetic_data import Scale, populate
+
+
+def test_summarize_percentiles():
+    stats = summarize([i / 1000 for i in range(1, 101)])
+
+    assert stats['n'] == 100
+    assert (stats['p50'], stats['p90'], stats['p99'], stats['max']) == (50, 90, 99, 100)
+    assert stats['mean'] == pytest.approx(50.5)
+
+
+def test_compare_ignores_noise_and_flags_regressions():
+    baseline = {
+        'fast': {'p50': 0.1, 'p90': 0.2},
+        'slow': {'p50': 10.0, 'p90': 12.0},
+        'removed': {'p50': 1.0, 'p90': 1.0},
+    }
+    results = {
+        'fast': {'p50': 0.3, 'p90': 0.5},  # three times slower, but within the noise
+        'slow': {'p50': 11.0, 'p90': 20.0},
+        'new': {'p50': 100.0, 'p90': 100.0},
+    }
+
+    assert compare(results, baseline, tolerance=0.3, min_delta_ms=0.5) == [Regression('slow', 'p90', 12.0, 20.0)]
+
+
+@pytest.mark.asyncio
+async def test_benchmarks_run_on_synthetic_database(temp_db):
+    populate(temp_db, Scale(clients=200, drivers=20, orders=2000, days=10))
+
+    results = await run_benchmarks(temp_db, iterations=2, warmup=1)
+
+    assert 'get_working_driver_ids' in results and 'get_driver_cabinet_data' in results
+    assert all(stats['n'] == 2 and stats['max'] >= stats['p50'] > 0 for stats in results.values())
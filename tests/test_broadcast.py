@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.batch_sender import BroadcastEngine, broadcast_messages
+
+
+def _retry_after(user_id: int, seconds: float = 0.05) -> TelegramRetryAfter:
+    return TelegramRetryAfter(method=SendMessage(chat_id=user_id, text='x'), message="Too Many Requests", retry_after=seconds)
+
+
+class FakeStatusMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+
+
+@pytest.mark.asyncio
+async def test_throttled_recipients_are_retried_and_rate_backs_off():
+    delivered = []
+    throttled = set()
+
+    async def send(user_id):
+        # The API answers after 50 ms: all five messages get out before the first 429
+        await asyncio.sleep(0.05)
+        if user_id not in throttled:
+            throttled.add(user_id)
+            raise _retry_after(user_id, 0.2)
+        delivered.append(user_id)
+
+    engine = BroadcastEngine(rate=1000, min_rate=10, progress_interval=60)
+    result = await engine.run(list(range(5)), send)
+
+    assert sorted(delivered) == list(range(5))
+    assert (result.sent, result.failed, result.throttled) == (5, 0, 5)
+    # All 429s came during one pause - the rate is lowered once
+    assert engine.rate == 500
+    assert result.elapsed >= 0.2
+    assert result.per_second > 0
+
+
+@pytest.mark.asyncio
+async def test_recipients_fail_after_retry_limit_and_on_api_errors():
+    async def send(user_id):
+        if user_id == 1:
+            raise _retry_after(user_id, 0)
+        if user_id == 2:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=user_id, text='x'), message="Forbidden: bot was blocked by the user")
+
+    engine = BroadcastEngine(rate=1000, min_rate=1, max_retries=2, progress_interval=60)
+    result = await engine.run([1, 2, 3], send)
+
+    assert (result.sent, result.failed, result.throttled) == (1, 2, 3)
+
+
+@pytest.mark.asyncio
+async def test_progress_edits_are_throttled():
+    async def send(user_id):
+        pass
+
+    status = FakeStatusMessage()
+    started = time.monotonic()
+    result = await broadcast_messages(None, list(range(30)), send, status)
+
+    # 30 messages at 25/s take over a second, but progress is updated at most once per 5 s
+    assert result.sent == 30
+    assert time.monotonic() - started >= 1
+    assert status.edits == []
+
+
+@pytest.mark.asyncio
+async def test_rate_recovers_after_clean_sends():
+    async def send(user_id):
+        pass
+
+    engine = BroadcastEngine(rate=100, min_rate=1, increase=10, progress_interval=60)
+    engine.bucket.set_rate(20)
+    await engine.run(list(range(40)), send)
+    # 20 successful sends at 20/s raise the rate to 30; the next 20 are not enough for 40
+    assert engine.rate == 30
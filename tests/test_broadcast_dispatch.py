@@ -0,0 +1,83 @@
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from aiogram import Bot
+from aiogram.types import User
+
+from database import queries as db_queries
+from handlers.user import order_dispatch
+
+
+@pytest.fixture
+def bot() -> AsyncMock:
+    """A bot mock that returns messages with unique message_id values."""
+    bot_mock = AsyncMock(spec=Bot)
+    counter = iter(range(1000, 2000))
+    bot_mock.send_message = AsyncMock(side_effect=lambda *a, **kw: SimpleNamespace(message_id=next(counter)))
+    bot_mock.send_location = AsyncMock(side_effect=lambda *a, **kw: SimpleNamespace(message_id=next(counter)))
+    return bot_mock
+
+
+@pytest.fixture
+def broadcast_mode(monkeypatch):
+    monkeypatch.setattr(order_dispatch, 'DISPATCH_STRATEGY', 'broadcast')
+    monkeypatch.setattr(order_dispatch, 'DISPATCH_WAVE_SIZE', 3)
+    monkeypatch.setattr(order_dispatch, 'DISPATCH_WAVE_GROWTH', 2)
+    yield
+    order_dispatch.dispatch_timers._entries.clear()
+
+
+async def _start_search(driver_ids: list[int]) -> int:
+    client = User(id=500, is_bot=False, first_name="Client")
+    order_data = {'begin_address': 'A', 'finish_address': 'B', 'latitude': 50.9, 'longitude': 34.8}
+    order_id = await db_queries.create_order_in_db(client.id, order_data, 'searching')
+    payload = {'order_data': order_data, 'client_user': client.model_dump()}
+    await db_queries.start_order_dispatch(order_id, driver_ids, json.dumps(payload))
+    return order_id
+
+
+@pytest.mark.asyncio
+async def test_first_accept_wins_and_competing_offers_are_withdrawn(temp_db, bot, broadcast_mode):
+    """
+    The order goes to three drivers at once; only the first accepts, the offer is withdrawn from the rest.
+    """
+    order_id = await _start_search([1, 2, 3, 4, 5])
+
+    await order_dispatch._process_next_driver_in_dispatch(bot, order_id)
+
+    offered = sorted(call.args[0] for call in bot.send_message.await_args_list)
+    assert offered == [1, 2, 3]
+    assert await db_queries.count_pending_dispatch_offers(order_id) == 3
+    assert order_id in order_dispatch.dispatch_timers
+
+    assert await db_queries.accept_order(order_id, 2) is True
+    assert await db_queries.accept_order(order_id, 3) is False
+
+    await order_dispatch.withdraw_competing_offers(bot, order_id, 2)
+
+    withdrawn_chats = sorted(call.kwargs['chat_id'] for call in bot.edit_message_text.await_args_list)
+    assert withdrawn_chats == [1, 3]
+    assert bot.delete_message.await_count == 2
+    assert await db_queries.count_pending_dispatch_offers(order_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_next_wider_wave_goes_out_when_whole_wave_rejects(temp_db, bot, broadcast_mode):
+    """When every driver of a wave has declined, the next (twice as large) wave is sent at once."""
+    order_id = await _start_search(list(range(1, 11)))
+    await order_dispatch._process_next_driver_in_dispatch(bot, order_id)
+
+    for driver_id in (1, 2):
+        assert await db_queries.reject_dispatch_offer(order_id, driver_id) is True
+        await order_dispatch.handle_wave_offer_rejected(bot, order_id)
+    assert bot.send_message.await_count == 3
+
+    assert await db_queries.reject_dispatch_offer(order_id, 3) is True
+    assert await db_queries.reject_dispatch_offer(order_id, 3) is False
+    await order_dispatch.handle_wave_offer_rejected(bot, order_id)
+
+    offered = [call.args[0] for call in bot.send_message.await_args_list]
+    assert sorted(offered[3:]) == [4, 5, 6, 7, 8, 9]
+    assert await db_queries.get_dispatch_info(order_id) == (list(range(1, 11)), 9)
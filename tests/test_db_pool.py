@@ -0,0 +1,145 @@
+import asyncio
+import gc
+
+import aiosqlite
+import pytest
+
+from database.pool import ConnectionPool
+from database.write_queue import WriteQueue, WriteOp
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path to a temporary database for the pool tests."""
+    return tmp_path / "pool_test.db"
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections_and_reports_stats(db_path):
+    """
+    The pool must hand out the same long-lived connections and count the acquisitions.
+    """
+    pool = ConnectionPool(db_path, readers=2)
+    await pool.open()
+    try:
+        async with pool.acquire(write=True) as db:
+            await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            await db.executemany("INSERT INTO items (name) VALUES (?)", [("a",), ("b",), ("c",)])
+            await db.commit()
+
+        async def read_count():
+            async with pool.acquire() as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM items")
+                return (await cursor.fetchone())[0]
+
+        results = await asyncio.gather(*(read_count() for _ in range(10)))
+        assert results == [3] * 10
+
+        stats = pool.stats()
+        assert stats['readers'] == 2
+        assert stats['idle_readers'] == 2
+        assert stats['read']['acquired'] == 10
+        assert stats['write']['acquired'] == 1
+    finally:
+        await pool.close()
+
+    assert not pool.is_open
+
+
+@pytest.mark.asyncio
+async def test_pool_returns_connections_in_clean_state(db_path):
+    """
+    On return to the pool, row_factory is reset and an unfinished transaction is rolled back.
+    """
+    pool = ConnectionPool(db_path, readers=1)
+    await pool.open()
+    try:
+        async with pool.acquire(write=True) as db:
+            await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            await db.commit()
+
+        async with pool.acquire(write=True) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute("INSERT INTO items (name) VALUES ('uncommitted')")
+            # commit() is deliberately not called
+
+        async with pool.acquire(write=True) as db:
+            assert db.row_factory is None
+            cursor = await db.execute("SELECT COUNT(*) FROM items")
+            assert (await cursor.fetchone())[0] == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_pool_falls_back_to_one_shot_connections(db_path):
+    """While the pool is not open, queries run on one-off connections."""
+    pool = ConnectionPool(db_path, readers=1)
+
+    async with pool.acquire(write=True) as db:
+        await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+        await db.commit()
+
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM items")
+        assert (await cursor.fetchone())[0] == 0
+
+    assert pool.stats()['read']['acquired'] == 0
+
+
+@pytest.mark.asyncio
+async def test_write_queue_groups_writes_and_isolates_failures(db_path):
+    """
+    The write queue merges concurrent writes into one transaction,
+    and an error in one unit of work does not roll back the others.
+    """
+    pool = ConnectionPool(db_path, readers=1)
+    await pool.open()
+    queue = WriteQueue(pool, max_batch=100)
+    await queue.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    await queue.start()
+    try:
+        results = await asyncio.gather(
+            *(queue.execute("INSERT INTO items (name) VALUES (?)", (f"item{i}",)) for i in range(20)),
+            queue.transaction([
+                WriteOp("INSERT INTO items (name) VALUES ('partial')"),
+                WriteOp("INSERT INTO items (name) VALUES (NULL)"),
+            ]),
+            return_exceptions=True,
+        )
+        assert all(r.rowcount == 1 for r in results[:20])
+        assert isinstance(results[20], aiosqlite.IntegrityError)
+
+        returned = await queue.execute("DELETE FROM items WHERE name = 'item0' RETURNING id")
+        assert returned.rows == [(results[0].lastrowid,)]
+
+        stats = queue.stats()
+        assert stats['batches'] < stats['units']
+        assert stats['failed_units'] == 1
+    finally:
+        await queue.stop()
+        await pool.close()
+
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT COUNT(*), SUM(name = 'partial') FROM items")
+        assert tuple(await cursor.fetchone()) == (19, 0)
+
+
+@pytest.mark.asyncio
+async def test_direct_write_failure_is_raised_once():
+    """Without a running queue a failed write raises to the caller and leaves no unretrieved future."""
+    class BrokenPool:
+        def acquire(self, write: bool = False):
+            raise aiosqlite.OperationalError("disk I/O error")
+
+    loop = asyncio.get_running_loop()
+    unhandled = []
+    loop.set_exception_handler(lambda _, context: unhandled.append(context))
+    try:
+        with pytest.raises(aiosqlite.OperationalError):
+            await WriteQueue(BrokenPool()).execute("INSERT INTO items (name) VALUES ('x')")
+        gc.collect()
+        await asyncio.sleep(0)
+    finally:
+        loop.set_exception_handler(None)
+    assert unhandled == []
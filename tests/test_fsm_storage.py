@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from database.fsm_storage import SQLiteStorage
+from states.fsm_states import UserState
+
+
+@pytest.mark.asyncio
+async def test_states_survive_restart_and_cleared_states_are_removed(temp_db):
+    """
+    A dialog's state and data are restored by a new storage instance after a flush to the DB.
+    """
+    key = StorageKey(bot_id=1, chat_id=100, user_id=100)
+    other = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+    storage = SQLiteStorage(ttl=3600)
+    await storage.set_state(key, UserState.begin_address)
+    await storage.update_data(key, {'begin_address': 'вул. Соборна, 1', 'latitude': 50.9})
+    await storage.set_state(other, UserState.begin_address)
+    await storage.set_state(other, None)
+    assert await storage.flush() == 2
+    await storage.close()
+
+    restored = SQLiteStorage(ttl=3600)
+    await restored.load()
+    assert await restored.get_state(key) == UserState.begin_address.state
+    assert await restored.get_data(key) == {'begin_address': 'вул. Соборна, 1', 'latitude': 50.9}
+    assert await restored.get_state(other) is None
+
+    await restored.set_state(key, None)
+    await restored.set_data(key, {})
+    await restored.close()
+
+    empty = SQLiteStorage(ttl=3600)
+    await empty.load()
+    assert await empty.get_data(key) == {}
+
+
+@pytest.mark.asyncio
+async def test_abandoned_states_expire(temp_db, monkeypatch):
+    """States unchanged for longer than the TTL are treated as abandoned."""
+    now = [1_000_000.0]
+    monkeypatch.setattr('database.fsm_storage.time.time', lambda: now[0])
+    key = StorageKey(bot_id=1, chat_id=100, user_id=100)
+
+    storage = SQLiteStorage(ttl=60)
+    await storage.set_state(key, UserState.begin_address)
+    await storage.flush()
+
+    now[0] += 61
+    assert await storage.get_state(key) is None
+
+    reloaded = SQLiteStorage(ttl=60)
+    await reloaded.load()
+    assert await reloaded.get_state(key) is None
+
+
+@pytest.mark.asyncio
+async def test_unserializable_state_does_not_block_others(temp_db):
+    good = StorageKey(bot_id=1, chat_id=100, user_id=100)
+    bad = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+    storage = SQLiteStorage(ttl=3600)
+    await storage.set_state(good, UserState.begin_address)
+    await storage.update_data(good, {'begin_address': 'вул. Соборна, 1'})
+    await storage.update_data(bad, {'scheduled_at': datetime(2026, 10, 17, 9, 30)})
+    assert await storage.flush() == 1
+
+    # A broken key stays unsaved and is written once the data is fixed
+    await storage.update_data(bad, {'scheduled_at': '2026-10-17T09:30:00'})
+    assert await storage.flush() == 1
+    await storage.close()
+
+    restored = SQLiteStorage(ttl=3600)
+    await restored.load()
+    assert await restored.get_data(good) == {'begin_address': 'вул. Соборна, 1'}
+    assert await restored.get_data(bad) == {'scheduled_at': '2026-10-17T09:30:00'}
@@ -0,0 +1,61 @@
+from utils.gazetteer import Gazetteer, build_gazetteer, normalize_street, normalize_house_number
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="51.6780" lon="33.9120"><tag k="place" v="town"/><tag k="name" v="Глухів"/></node>
+  <node id="2" lat="51.5000" lon="34.2000"><tag k="place" v="village"/><tag k="name" v="Баничі"/></node>
+  <node id="10" lat="51.6800" lon="33.9100"/>
+  <node id="11" lat="51.6810" lon="33.9140"/>
+  <node id="20" lat="51.5010" lon="34.2010"/>
+  <node id="21" lat="51.5020" lon="34.2030"/>
+  <node id="30" lat="51.6805" lon="33.9115"><tag k="addr:street" v="вулиця Тараса Шевченка"/><tag k="addr:housenumber" v="5"/></node>
+  <node id="31" lat="51.6807" lon="33.9125"><tag k="addr:street" v="вулиця Тараса Шевченка"/><tag k="addr:housenumber" v="12А"/></node>
+  <node id="32" lat="51.5015" lon="34.2020"><tag k="addr:street" v="вулиця Шевченка"/><tag k="addr:housenumber" v="5"/></node>
+  <node id="40" lat="51.6790" lon="33.9130"><tag k="amenity" v="hospital"/><tag k="name" v="Центральна районна лікарня"/></node>
+  <way id="100"><nd ref="10"/><nd ref="11"/><tag k="highway" v="residential"/><tag k="name" v="вулиця Тараса Шевченка"/></way>
+  <way id="101"><nd ref="20"/><nd ref="21"/><tag k="highway" v="residential"/><tag k="name" v="вулиця Шевченка"/></way>
+</osm>
+"""
+
+
+def test_normalization_of_street_names_and_house_numbers():
+    assert normalize_street("вул. Тараса Шевченка") == ("вулиця", "тараса шевченка")
+    assert normalize_street("пров. Лесі Українки") == ("провулок", "лесі українки")
+    assert normalize_house_number("12-A") == normalize_house_number("12 а") == "12а"
+
+
+def test_lookup_from_imported_osm_extract(tmp_path):
+    """
+    OSM extract import and search: abbreviations, typos, house number, settlement and POIs.
+    """
+    extract = tmp_path / "region.osm"
+    extract.write_text(OSM_EXTRACT, encoding="utf-8")
+    index_path = tmp_path / "gazetteer.db"
+    stats = build_gazetteer(extract, index_path)
+    assert stats['streets'] == 2 and stats['houses'] == 3 and stats['pois'] == 1
+
+    gazetteer = Gazetteer(name_threshold=0.6)
+    assert gazetteer.open(index_path)
+
+    [house] = gazetteer.lookup("вул. Шевченко 12-а, Глухів, Сумська область")
+    assert house.address == "вулиця Тараса Шевченка, 12А, Глухів"
+    assert (house.latitude, house.longitude) == (51.6807, 33.9125)
+
+    # Without a settlement - both candidates, the city before the village
+    results = gazetteer.lookup("Шевченка 5, Сумська область")
+    assert [loc.address for loc in results] == [
+        "вулиця Тараса Шевченка, 5, Глухів", "вулиця Шевченка, 5, Баничі"
+    ]
+    assert [loc.address for loc in gazetteer.lookup("с. Баничі, вул Шевченка 5")] == ["вулиця Шевченка, 5, Баничі"]
+
+    # The house is not in the extract - empty, so the geocoder asks Nominatim
+    assert gazetteer.lookup("Шевченка 99, Глухів") == []
+    assert gazetteer.lookup("вулиця Франка 5, Глухів") == []
+    assert gazetteer.lookup("районна лікарня")[0].address == "Центральна районна лікарня, Глухів"
+    gazetteer.close()
+
+
+def test_missing_index_disables_lookup(tmp_path):
+    gazetteer = Gazetteer()
+    assert not gazetteer.open(tmp_path / "missing.db")
+    assert gazetteer.lookup("вулиця Шевченка 5") == []
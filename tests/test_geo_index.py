@@ -0,0 +1,46 @@
+import random
+
+from database.geo_index import DriverGeoIndex, haversine_km
+
+
+def test_nearest_matches_brute_force_search():
+    """
+    A grid search must give the same result as a full haversine scan.
+    """
+    rng = random.Random(42)
+    index = DriverGeoIndex(cell_km=1.0)
+    drivers = {
+        driver_id: (50.9 + rng.random() * 0.2, 34.7 + rng.random() * 0.2)
+        for driver_id in range(1, 2001)
+    }
+    index.load((driver_id, lat, lon, True) for driver_id, (lat, lon) in drivers.items())
+
+    for _ in range(20):
+        lat, lon = 50.9 + rng.random() * 0.2, 34.7 + rng.random() * 0.2
+        excluded = {rng.randint(1, 2000) for _ in range(5)}
+        expected = sorted(
+            (haversine_km(lat, lon, d_lat, d_lon), driver_id)
+            for driver_id, (d_lat, d_lon) in drivers.items()
+            if driver_id not in excluded and haversine_km(lat, lon, d_lat, d_lon) <= 3.0
+        )[:10]
+
+        result = index.nearest(lat, lon, k=10, radius_km=3.0, exclude=excluded)
+
+        assert [driver_id for driver_id, _ in result] == [driver_id for _, driver_id in expected]
+
+
+def test_index_tracks_shift_availability_and_location():
+    """Drivers are found only while on shift, and moving changes their cell."""
+    index = DriverGeoIndex(cell_km=1.0)
+    index.load([(1, 50.91, 34.80, True), (2, 50.95, 34.80, False), (3, None, None, True)])
+
+    assert [d for d, _ in index.nearest(50.91, 34.80, k=5, radius_km=10)] == [1]
+    assert index.unlocated_ids() == [3]
+
+    index.set_available(2, True)
+    index.update_location(1, 51.50, 34.80)  # ~65 km, outside the radius
+    assert [d for d, _ in index.nearest(50.91, 34.80, k=5, radius_km=10)] == [2]
+
+    index.remove(2)
+    assert index.nearest(50.91, 34.80, k=5, radius_km=10) == []
+    assert index.available_ids() == {1, 3}
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.geo_providers import GeocodingClient, GeoLocation, NominatimProvider, PhotonProvider, StaticProvider
+
+SHEVCHENKA_5 = GeoLocation("5, вулиця Шевченка, Глухів", 51.6781, 33.9101)
+
+
+@pytest.mark.asyncio
+async def test_failed_provider_falls_back_to_next():
+    broken = StaticProvider(fail=True, name='broken')
+    backup = StaticProvider(forward={"Шевченка 5": [SHEVCHENKA_5]}, name='backup')
+    client = GeocodingClient([broken, backup], user_agent="test", hedge_delay=0)
+
+    assert await client.geocode("Шевченка 5") == SHEVCHENKA_5
+    assert await client.geocode("Невідома 1") is None
+    stats = client.stats()
+    assert stats['fallbacks'] == 2 and stats['failed'] == 0
+    assert stats['providers']['broken'] == {'requests': 2, 'errors': 2}
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged():
+    """
+    A slow primary provider does not delay the answer beyond hedge_delay.
+    """
+    slow = StaticProvider(forward={"Шевченка 5": [SHEVCHENKA_5]}, delay=1.0, name='slow')
+    fast = StaticProvider(forward={"Шевченка 5": [SHEVCHENKA_5._replace(address="fast")]}, name='fast')
+    client = GeocodingClient([slow, fast], user_agent="test", hedge_delay=0.05)
+
+    started = time.monotonic()
+    locations = await client.geocode("Шевченка 5", exactly_one=False, limit=5)
+    assert time.monotonic() - started < 0.5
+    assert [loc.address for loc in locations] == ["fast"]
+    assert client.stats()['hedged'] == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_nominatim_provider_over_http():
+    seen = []
+
+    async def search(request):
+        seen.append(dict(request.query))
+        return web.json_response([{'display_name': SHEVCHENKA_5.address, 'lat': '51.6781', 'lon': '33.9101'}])
+
+    async def reverse(request):
+        return web.json_response({'error': 'Unable to geocode'})
+
+    app = web.Application()
+    app.router.add_get('/search', search)
+    app.router.add_get('/reverse', reverse)
+    async with TestServer(app) as server:
+        client = GeocodingClient([NominatimProvider(str(server.make_url('')))], user_agent="test")
+        for _ in range(2):
+            [location] = await client.geocode("Шевченка 5", exactly_one=False, language='uk',
+                                              viewbox=((50.35, 33.25), (51.9, 35.25)), bounded=True)
+            assert location == SHEVCHENKA_5
+        assert await client.reverse(51.0, 34.0) is None
+        await client.close()
+
+    assert seen[0]['viewbox'] == "33.25,51.9,35.25,50.35" and seen[0]['bounded'] == '1'
+    assert seen[0]['accept-language'] == 'uk'
+
+
+@pytest.mark.asyncio
+async def test_malformed_response_falls_back_to_next():
+    """An answer of unexpected shape counts as a provider error instead of breaking the fallback chain."""
+    async def search(request):
+        # An object instead of a result list
+        return web.json_response({'error': 'Service temporarily unavailable'})
+
+    async def photon(request):
+        # Photon expects an object with 'features'
+        return web.json_response([])
+
+    app = web.Application()
+    app.router.add_get('/search', search)
+    app.router.add_get('/api', photon)
+    app.router.add_get('/reverse', photon)
+    async with TestServer(app) as server:
+        url = str(server.make_url(''))
+        backup = StaticProvider(forward={"Шевченка 5": [SHEVCHENKA_5]},
+                                reverse={(51.6781, 33.9101): SHEVCHENKA_5}, name='backup')
+        client = GeocodingClient([NominatimProvider(url), PhotonProvider(url), backup], user_agent="test")
+        assert await client.geocode("Шевченка 5") == SHEVCHENKA_5
+        assert await client.reverse(51.6781, 33.9101) == SHEVCHENKA_5
+        stats = client.stats()
+        await client.close()
+
+    # An empty list for Nominatim reverse geocoding just means "not found"
+    assert stats['providers']['nominatim'] == {'requests': 2, 'errors': 1}
+    assert stats['providers']['photon']['errors'] == 2
+    assert stats['failed'] == 0
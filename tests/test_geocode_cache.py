@@ -0,0 +1,91 @@
+import pytest
+
+from database.geocode_cache import GeocodeCache, CachedLocation, geocode_cache, search_scope
+from utils import geocoder as geocoder_module
+
+SHEVCHENKA_5 = CachedLocation("5, вулиця Шевченка, Глухів", 51.6781, 33.9101)
+SHEVCHENKA_5_SUMY = CachedLocation("5, вулиця Шевченка, Суми", 50.9077, 34.7981)
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_lookup_requires_matching_house_number(temp_db):
+    """
+    Typos and abbreviations find a stored address, but a different house number never does.
+    """
+    cache = GeocodeCache(fuzzy_threshold=0.8)
+    await cache.store("вулиця Шевченка 5, Глухів, Сумська область", [SHEVCHENKA_5])
+
+    assert cache.get("Вулиця  шевченка 5 Глухів, Сумська область") == [SHEVCHENKA_5]
+    assert cache.get("вул. Шевченко 5, Глухів, Сумська область") == [SHEVCHENKA_5]
+    assert cache.get("вулиця Шевченка 15, Глухів, Сумська область") is None
+    assert cache.get("вулиця Франка 5, Глухів, Сумська область") is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['fuzzy_hits'] == 1
+
+    # Entries survive a restart
+    restored = GeocodeCache()
+    await restored.restore()
+    assert restored.get("вулиця шевченка 5 глухів сумська область") == [SHEVCHENKA_5]
+
+
+@pytest.mark.asyncio
+async def test_repeat_lookups_bypass_rate_limited_geocoder(temp_db, mocker):
+    """
+    Repeated queries (forward and reverse) are answered from the cache; Nominatim is called once.
+    """
+    forward = mocker.patch.object(geocoder_module.geocoder, 'geocode', mocker.AsyncMock(return_value=[SHEVCHENKA_5]))
+    backward = mocker.patch.object(geocoder_module.geocoder, 'reverse', mocker.AsyncMock(return_value=SHEVCHENKA_5))
+
+    for _ in range(3):
+        locations = await geocoder_module.geocode("Шевченка 5, Глухів", exactly_one=False, limit=5)
+        assert [loc.address for loc in locations] == [SHEVCHENKA_5.address]
+    assert (await geocoder_module.geocode("шевченка 5 глухів")).latitude == SHEVCHENKA_5.latitude
+    assert forward.await_count == 1
+
+    # Points within ~10 m round to one key
+    assert (await geocoder_module.reverse("51.67812, 33.91014")).address == SHEVCHENKA_5.address
+    assert (await geocoder_module.reverse((51.67808, 33.91006))).address == SHEVCHENKA_5.address
+    assert backward.await_count == 1
+    geocode_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_cached_candidates_respect_limit_and_search_scope(temp_db, mocker):
+    """
+    A single-result lookup caches the whole candidate list, and a bounded search
+    does not share entries with an unbounded one.
+    """
+    forward = mocker.patch.object(geocoder_module.geocoder, 'geocode',
+                                  mocker.AsyncMock(return_value=[SHEVCHENKA_5, SHEVCHENKA_5_SUMY]))
+    viewbox = geocoder_module.SUMY_OBLAST_VIEWBOX
+
+    assert await geocoder_module.geocode("Шевченка 5", viewbox=viewbox, bounded=True) == SHEVCHENKA_5
+    assert forward.await_args.kwargs['exactly_one'] is False
+    assert await geocoder_module.geocode("Шевченка 5", exactly_one=False, limit=5,
+                                         viewbox=viewbox, bounded=True) == [SHEVCHENKA_5, SHEVCHENKA_5_SUMY]
+    assert forward.await_count == 1
+
+    # Another scope is a separate entry, even for a fuzzy match of the same text
+    assert search_scope(viewbox, True) != search_scope(viewbox, False)
+    await geocoder_module.geocode("Шевченко 5", exactly_one=False, limit=5, viewbox=viewbox)
+    assert forward.await_count == 2
+    geocode_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_are_bounded(temp_db, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr('database.geocode_cache.time.time', lambda: now[0])
+    cache = GeocodeCache(ttl=60, max_entries=2)
+    await cache.store("вулиця Шевченка 5", [SHEVCHENKA_5])
+    await cache.store_reverse(51.6781, 33.9101, SHEVCHENKA_5)
+
+    now[0] += 61
+    assert cache.get("вулиця Шевченка 5") is None
+    assert cache.get_reverse(51.6781, 33.9101) is None
+    assert cache.stats()['expired'] == 2
+
+    for house in (1, 2, 3):
+        await cache.store(f"вулиця Шевченка {house}", [SHEVCHENKA_5])
+    assert cache.get("вулиця Шевченка 1") is None
+    assert cache.get("вулиця Шевченка 3") == [SHEVCHENKA_5]
+    assert cache.stats()['queries'] == 2 and cache.stats()['evictions'] == 1
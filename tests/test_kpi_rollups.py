@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import queries
+from database.db import init_db
+from database.kpi_rollups import GLOBAL_DRIVER_ID, rollup_range, _split_by_hour
+from database.write_queue import write_queue
+
+
+def _today() -> tuple[datetime, datetime]:
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1)
+
+
+def test_shift_is_split_by_hour_and_period_picks_rollup():
+    parts = _split_by_hour(datetime(2024, 5, 1, 9, 40), datetime(2024, 5, 1, 11, 15))
+    assert parts == [(datetime(2024, 5, 1, 9), 1200), (datetime(2024, 5, 1, 10), 3600), (datetime(2024, 5, 1, 11), 900)]
+
+    assert rollup_range(datetime(2024, 5, 1), datetime(2024, 5, 8)) == ('kpi_daily', '2024-05-01', '2024-05-08')
+    assert rollup_range(datetime(2024, 5, 1, 9, 30), datetime(2024, 5, 1, 12, 10)) == (
+        'kpi_hourly', '2024-05-01 09:00', '2024-05-01 13:00'
+    )
+
+
+@pytest.mark.asyncio
+async def test_order_events_update_rollups(temp_db):
+    await queries.register_driver(10, "Водій 1", None, "+380000000001", "AA0001AA")
+    await queries.register_driver(20, "Водій 2", None, "+380000000002", "AA0002AA")
+
+    first, second, third = [await queries.create_order_in_db(1, {}, 'searching') for _ in range(3)]
+    await queries.record_driver_rejection(first, 20)
+    assert await queries.accept_order(first, 10)
+    await queries.finish_order(first, 10)
+    await queries.rate_order(first, 5, None)
+    assert await queries.accept_order(second, 20)
+    await queries.finish_order(second, 20)
+    await queries.rate_order(second, 4, None)
+    assert await queries.cancel_searching_order(third, 'cancelled_by_user')
+
+    kpi = await queries.get_kpi_summary(*_today())
+    assert kpi == {
+        'created': 3, 'accepted': 2, 'rejected': 1, 'completed': 2, 'cancelled': 1,
+        'rating_sum': 9, 'rating_count': 2, 'online_seconds': 0,
+    }
+    # The same picture for the hourly rollups
+    now = datetime.now()
+    assert (await queries.get_kpi_summary(now - timedelta(hours=1), now + timedelta(minutes=1)))['created'] == 3
+
+    page = await queries.get_drivers_kpi_page(5, 0, *_today())
+    assert [(row['user_id'], row['completed'], row['rejected'], row['rating_sum']) for row in page] == [
+        (10, 1, 0, 5), (20, 1, 1, 4)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_backfill_matches_live_rollups(temp_db):
+    await queries.register_driver(10, "Водій", None, "+380000000001", "AA0001AA")
+    order_id = await queries.create_order_in_db(1, {}, 'searching')
+    assert await queries.accept_order(order_id, 10)
+    await queries.finish_order(order_id, 10)
+    await queries.rate_order(order_id, 5, None)
+    live = await queries.get_kpi_summary(*_today())
+
+    # Rollups rebuilt from the history match the ones accumulated by triggers
+    await write_queue.execute("DELETE FROM kpi_daily")
+    await write_queue.execute("DELETE FROM kpi_hourly")
+    await init_db()
+    assert await queries.get_kpi_summary(*_today()) == live
+
+
+@pytest.mark.asyncio
+async def test_shift_time_is_counted_once(temp_db):
+    await queries.register_driver(10, "Водій", None, "+380000000001", "AA0001AA")
+    started = datetime.now() - timedelta(minutes=90)
+    await queries.start_driver_shift(10)
+    await write_queue.execute("UPDATE drivers SET shift_started_at = ? WHERE user_id = ?", (started, 10))
+
+    # An open shift is counted before it ends
+    open_kpi = await queries.get_kpi_summary(started - timedelta(hours=1), datetime.now() + timedelta(hours=1))
+    assert 90 * 60 <= open_kpi['online_seconds'] < 91 * 60
+
+    await queries.stop_driver_shift(10)
+    await queries.stop_driver_shift(10)
+
+    kpi = await queries.get_kpi_summary(started - timedelta(hours=1), datetime.now() + timedelta(hours=1))
+    assert 90 * 60 <= kpi['online_seconds'] < 91 * 60
+    page = await queries.get_drivers_kpi_page(5, 0, started - timedelta(hours=1), datetime.now() + timedelta(hours=1))
+    assert page[0]['online_seconds'] == kpi['online_seconds']
+
+    async with queries._get_db() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM kpi_hourly WHERE driver_id = ?", (GLOBAL_DRIVER_ID,))
+        assert (await cursor.fetchone())[0] >= 2
@@ -0,0 +1,42 @@
+import pytest
+from datetime import datetime, timedelta
+
+from database import queries as db_queries
+from database.live_locations import live_locations
+from database.pool import db_pool
+
+
+@pytest.mark.asyncio
+async def test_live_ticks_stay_in_memory_until_batched_flush(temp_db):
+    """
+    Live location ticks update the position and the in-memory geo index; only the last position reaches the DB.
+    """
+    await db_queries.register_driver(7, "Driver", None, "+380000000000", "AA0000AA")
+    await db_queries.start_driver_shift(7)
+    assert await db_queries.is_driver_on_shift(7) is True
+
+    for step in range(10):
+        live_locations.record(7, 50.90 + step * 0.001, 34.80)
+
+    assert await db_queries.get_working_driver_ids(1, 50.909, 34.80) == [7]
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT latitude FROM drivers WHERE user_id = 7")
+        assert (await cursor.fetchone())[0] is None
+
+    assert await live_locations.flush() == 1
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT latitude, longitude FROM drivers WHERE user_id = 7")
+        assert tuple(await cursor.fetchone()) == (pytest.approx(50.909), 34.80)
+
+    await db_queries.stop_driver_shift(7)
+    assert await db_queries.is_driver_on_shift(7) is False
+
+
+def test_position_becomes_stale_without_updates():
+    """A position without updates for longer than the threshold is stale."""
+    live_locations.load([(8, 50.9, 34.8, datetime.now() - timedelta(hours=1), 1)])
+    assert live_locations.is_stale(8) is True
+
+    live_locations.record(8, 50.9, 34.8)
+    assert live_locations.is_stale(8) is False
+    assert live_locations.is_stale(9) is True
@@ -0,0 +1,34 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# The handlers routers are module singletons and attach to a dispatcher once per process,
+# so the simulation runs in a separate process, as from the command line
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_simulated_orders_are_matched_and_completed(tmp_path):
+    result = subprocess.run(
+        [
+            sys.executable, '-m', 'benchmarks.load_simulator', '--db', str(tmp_path / 'load.db'),
+            '--drivers', '3', '--clients', '6', '--rate', '2', '--duration', '2',
+            '--client-think', '0.01', '--driver-think', '0.01', '--pickup', '0.05', '--ride', '0.05',
+            '--reject-rate', '0', '--location-interval', '0.2', '--step-timeout', '15', '--match-timeout', '20',
+        ],
+        cwd=ROOT, env={**os.environ, 'TELEGRAM_TOKEN': '123456:TEST', 'ADMIN_IDS': '1'},
+        capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+
+    report = result.stdout
+    created, matched, completed, unmatched = map(int, re.search(
+        r"створено (\d+), призначено (\d+), завершено (\d+), без водія (\d+)", report
+    ).groups())
+    assert created > 0 and matched + unmatched == created
+    assert completed == matched > 0
+    assert "Зірвані кроки" not in report
+    for step in ('client:confirm', 'driver:accept', 'driver:finish', 'driver:live_location_update'):
+        assert step in report
+    assert re.search(r"write: отримано [1-9]", report)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import CopyMessage
+
+from database import queries
+from utils import newsletter_jobs
+from utils.newsletter_jobs import NewsletterJob, resume_newsletter_jobs, stop_newsletter_jobs
+
+
+class FakeBot:
+    """Records newsletter copies; users who blocked the bot get Forbidden, and sending hangs after `hang_after` copies."""
+
+    def __init__(self, blocked=(), hang_after: int | None = None):
+        self.copied = []
+        self.reports = []
+        self._blocked = set(blocked)
+        self._hang_after = hang_after
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        if self._hang_after is not None and len(self.copied) >= self._hang_after:
+            await asyncio.Event().wait()
+        if chat_id in self._blocked:
+            raise TelegramForbiddenError(method=CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id),
+                                         message="Forbidden: bot was blocked by the user")
+        self.copied.append(chat_id)
+
+    async def send_message(self, chat_id, text):
+        self.reports.append((chat_id, text))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        pass
+
+
+async def _add_users(user_ids):
+    for user_id in user_ids:
+        await queries.add_or_update_user(user_id, f"Клієнт {user_id}", None)
+
+
+@pytest.mark.asyncio
+async def test_job_delivers_to_audience_and_records_outcomes(temp_db):
+    await _add_users(range(1, 11))
+    await queries.register_driver(5, "Водій", None, "+380000000000", "AA0000AA")
+    assert await queries.get_newsletter_audience_count('clients') == 9
+
+    job_id = await queries.create_newsletter_job('clients', 999, 1, total=9)
+    bot = FakeBot(blocked={7})
+    result = await NewsletterJob(bot, await queries.get_newsletter_job(job_id), page_size=4).run()
+
+    assert sorted(bot.copied) == [1, 2, 3, 4, 6, 8, 9, 10]
+    assert (result.sent, result.failed) == (8, 1)
+    job = await queries.get_newsletter_job(job_id)
+    assert (job['status'], job['sent'], job['failed'], job['cursor']) == ('done', 8, 1, 10)
+    assert bot.reports and bot.reports[0][0] == 999
+    assert await queries.get_unfinished_newsletter_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_without_resending(temp_db):
+    await _add_users(range(1, 21))
+    job_id = await queries.create_newsletter_job('all', 999, 1, total=20)
+
+    first = FakeBot(hang_after=8)
+    task = newsletter_jobs._start(first, await queries.get_newsletter_job(job_id))
+    while len(first.copied) < 8:
+        await asyncio.sleep(0.01)
+    # The bot stops: the job is interrupted in the middle of a page
+    await stop_newsletter_jobs()
+    assert task.cancelled()
+    job = await queries.get_newsletter_job(job_id)
+    assert job['status'] == 'running' and job['cursor'] < 20
+
+    second = FakeBot()
+    assert await resume_newsletter_jobs(second) == 1
+    await asyncio.gather(*newsletter_jobs._running.values())
+
+    assert sorted(first.copied + second.copied) == list(range(1, 21))
+    job = await queries.get_newsletter_job(job_id)
+    assert (job['status'], job['sent'], job['failed']) == ('done', 20, 0)
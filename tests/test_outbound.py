@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from utils.outbound import OutboundScheduler, PRIORITY_DISPATCH, PRIORITY_NEWSLETTER, send_priority
+
+
+class FakeSession:
+    """Records sent messages instead of making HTTP requests; the first `fail` calls answer 429."""
+
+    def __init__(self, fail: int = 0):
+        self.sent = []
+        self._fail = fail
+
+    async def __call__(self, bot, method):
+        if self._fail:
+            self._fail -= 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        self.sent.append(getattr(method, 'text', None))
+        return True
+
+
+@pytest.mark.asyncio
+async def test_dispatch_offers_overtake_queued_newsletter():
+    scheduler = OutboundScheduler(rate=50, burst=1, chat_rate=1000, chat_burst=10)
+    session = FakeSession()
+
+    async def send(chat_id, text):
+        await scheduler(session, None, SendMessage(chat_id=chat_id, text=text))
+
+    with send_priority(PRIORITY_NEWSLETTER):
+        newsletter = [asyncio.create_task(send(chat_id, f'news{chat_id}')) for chat_id in range(3)]
+    await asyncio.sleep(0)
+    with send_priority(PRIORITY_DISPATCH):
+        offer = asyncio.create_task(send(100, 'offer'))
+    status = asyncio.create_task(send(101, 'status'))
+    await asyncio.gather(*newsletter, offer, status)
+
+    # The first newsletter message took a free token; the rest let the offer and the status go first
+    assert session.sent == ['news0', 'offer', 'status', 'news1', 'news2']
+    assert scheduler.stats()['lanes']['newsletter']['served'] == 3
+
+
+@pytest.mark.asyncio
+async def test_messages_to_one_chat_are_paced():
+    scheduler = OutboundScheduler(rate=1000, burst=10, chat_rate=20, chat_burst=1)
+    session = FakeSession()
+
+    started = time.monotonic()
+    await asyncio.gather(*(scheduler(session, None, SendMessage(chat_id=chat_id, text='x')) for chat_id in range(5)))
+    assert time.monotonic() - started < 0.04
+
+    started = time.monotonic()
+    for _ in range(3):
+        await scheduler(session, None, SendMessage(chat_id=1, text='x'))
+    # Chat 1 has already spent its token: three messages go 50 ms apart
+    assert 0.13 <= time.monotonic() - started < 0.4
+    assert scheduler.stats()['chat_waits'] == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_retried_until_limit():
+    scheduler = OutboundScheduler(rate=1000, burst=10, chat_rate=1000, chat_burst=10, max_retries=2)
+
+    session = FakeSession(fail=2)
+    assert await scheduler(session, None, SendMessage(chat_id=1, text='ok')) is True
+    assert session.sent == ['ok']
+
+    with pytest.raises(TelegramRetryAfter):
+        await scheduler(FakeSession(fail=3), None, SendMessage(chat_id=1, text='lost'))
+    stats = scheduler.stats()
+    assert (stats['sent'], stats['retry_after'], stats['failed']) == (1, 5, 1)
+
+    # The newsletter slows down and retries the recipient itself - the scheduler returns 429 to it at once
+    with send_priority(PRIORITY_NEWSLETTER), pytest.raises(TelegramRetryAfter):
+        await scheduler(FakeSession(fail=1), None, SendMessage(chat_id=2, text='news'))
+    assert scheduler.stats()['retry_after'] == 6
+
+
+@pytest.mark.asyncio
+async def test_other_api_calls_bypass_limits():
+    scheduler = OutboundScheduler(rate=0.001, burst=1, chat_rate=0.001, chat_burst=1)
+    session = FakeSession()
+
+    await scheduler(session, None, SendMessage(chat_id=1, text='x'))
+    # Tokens are exhausted, but answers to button presses are not limited
+    await asyncio.wait_for(scheduler(session, None, AnswerCallbackQuery(callback_query_id='1')), 0.1)
+    assert scheduler.stats()['sent'] == 1
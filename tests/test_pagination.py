@@ -0,0 +1,103 @@
+import pytest
+
+from database import queries
+from database.pagination import page_cache, written_tables
+from database.write_queue import write_queue
+
+CLIENT_ID = 100
+
+
+async def _add_orders(count: int, start: int = 0) -> None:
+    # Some orders share a creation time - the id sets the order
+    await write_queue.executemany(
+        "INSERT INTO orders (client_id, status, created_at) VALUES (?, 'completed', ?)",
+        [(CLIENT_ID, f"2024-05-{1 + (start + i) // 3:02d} 10:00:00") for i in range(count)]
+    )
+
+
+async def _offset_page(limit: int, offset: int) -> list[int]:
+    async with queries._get_db() as db:
+        cursor = await db.execute(
+            "SELECT id FROM orders WHERE client_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (CLIENT_ID, limit, offset)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+def test_written_tables_are_parsed_from_sql():
+    assert written_tables("INSERT OR IGNORE INTO driver_rejections (order_id) VALUES (?)") == {'driver_rejections'}
+    assert written_tables(
+        "INSERT INTO users (user_id) VALUES (?) ON CONFLICT(user_id) DO UPDATE SET full_name = excluded.full_name"
+    ) == {'users'}
+    assert written_tables("SELECT * FROM orders") == frozenset()
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_match_offset_pages_in_both_directions(temp_db):
+    await _add_orders(23)
+    limit = 5
+
+    pages, cursor = [], ''
+    for page in range(5):
+        rows = await queries.get_all_orders_page_by_client(CLIENT_ID, limit, page * limit, cursor)
+        assert [row['id'] for row in rows] == await _offset_page(limit, page * limit)
+        pages.append(rows)
+        cursor = rows.next_cursor
+
+    # Back by the previous page's cursor
+    for page in range(4, 0, -1):
+        rows = await queries.get_all_orders_page_by_client(CLIENT_ID, limit, (page - 1) * limit, pages[page].prev_cursor)
+        assert [row['id'] for row in rows] == [row['id'] for row in pages[page - 1]]
+
+    # The cursor row was deleted or the cursor is corrupt - the page is read with OFFSET
+    await write_queue.execute("DELETE FROM orders WHERE id = ?", (pages[1][-1]['id'],))
+    rows = await queries.get_all_orders_page_by_client(CLIENT_ID, limit, 2 * limit, pages[1].next_cursor)
+    assert [row['id'] for row in rows] == await _offset_page(limit, 2 * limit)
+    rows = await queries.get_all_orders_page_by_client(CLIENT_ID, limit, limit, 'garbage')
+    assert [row['id'] for row in rows] == await _offset_page(limit, limit)
+
+
+@pytest.mark.asyncio
+async def test_counts_and_pages_are_cached_until_a_write(temp_db):
+    await _add_orders(7)
+    assert await queries.get_all_orders_count_by_client(CLIENT_ID) == 7
+    first = await queries.get_all_orders_page_by_client(CLIENT_ID, 5, 0)
+    hits = page_cache.stats()['hits']
+
+    assert await queries.get_all_orders_count_by_client(CLIENT_ID) == 7
+    assert await queries.get_all_orders_page_by_client(CLIENT_ID, 5, 0) is first
+    assert page_cache.stats()['hits'] == hits + 2
+
+    # A write to orders makes the cached values stale
+    await _add_orders(1, start=7)
+    assert await queries.get_all_orders_count_by_client(CLIENT_ID) == 8
+    assert await queries.get_all_orders_page_by_client(CLIENT_ID, 5, 0) is not first
+
+
+@pytest.mark.asyncio
+async def test_admin_order_list_turns_pages_by_cursor(temp_db, mocker):
+    from handlers import admin_main
+    from keyboards.common import PagePosition
+    from utils.callback_factories import AdminOrderList
+
+    await queries.add_or_update_user(CLIENT_ID, "Клієнт", None)
+    await _add_orders(12)
+    first = await queries.get_orders_page_by_status('completed', 5, 0)
+    show = mocker.patch.object(admin_main, 'show_paginated_list', mocker.AsyncMock())
+    await admin_main.orders_list_paginator(
+        mocker.Mock(), AdminOrderList(status='completed', page=1, cursor=first.next_cursor)
+    )
+
+    kwargs = show.await_args.kwargs
+    assert kwargs['cursor'] == first.next_cursor
+    rows = await kwargs['page_func'](limit=5, offset=5, cursor=kwargs['cursor'], **kwargs['page_func_kwargs'])
+    assert [row['id'] for row in rows] == await _offset_page(5, 5)
+
+    # Navigation buttons carry the cursors of the neighbouring pages
+    keyboard = kwargs['keyboard_func'](
+        page=PagePosition(1, rows.prev_cursor, rows.next_cursor), total_pages=3,
+        items=rows, **kwargs['keyboard_func_kwargs']
+    )
+    callbacks = {button.callback_data for row in keyboard.inline_keyboard for button in row}
+    assert AdminOrderList(status='completed', page=2, cursor=rows.next_cursor).pack() in callbacks
+    assert AdminOrderList(status='completed', page=0, cursor=rows.prev_cursor).pack() in callbacks
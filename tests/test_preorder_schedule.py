@@ -0,0 +1,81 @@
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.config import TIMEZONE
+from database import queries
+from database.preorder_schedule import parse_scheduled_at, preorder_schedule
+
+
+def test_scheduled_at_formats_are_parsed_to_the_same_instant():
+    local = datetime(2026, 10, 17, 9, 30, tzinfo=TIMEZONE)
+    assert parse_scheduled_at(local.isoformat()) == local
+    assert parse_scheduled_at('2026-10-17 09:30:00') == local
+    assert parse_scheduled_at(local.astimezone(timezone.utc).isoformat()) == local
+    assert parse_scheduled_at(None) is None
+    assert parse_scheduled_at('не дата') is None
+
+
+@pytest.mark.asyncio
+async def test_preorder_deadlines_follow_order_changes(temp_db):
+    fired = []
+
+    async def on_due(order_id):
+        fired.append(('due', order_id, time.monotonic()))
+
+    async def on_reminder(order_id):
+        fired.append(('reminder', order_id, time.monotonic()))
+
+    await queries.add_or_update_user(1, "Клієнт", None)
+    await queries.register_driver(10, "Водій", None, "+380000000000", "AA0000AA")
+    preorder_schedule.start(on_due, on_reminder)
+    try:
+        # The database stores time to the second - the due time is taken on a second boundary
+        due_at = datetime.fromtimestamp(math.ceil(time.time()) + 1, TIMEZONE)
+        started = time.monotonic()
+        delay = due_at.timestamp() - time.time()
+        order_id = await queries.create_order_in_db(1, {'scheduled_at': due_at.isoformat()}, 'scheduled')
+        due_in, remind_in = preorder_schedule.due_in(order_id)
+        assert abs(due_in - delay) < 0.1 and remind_in is None
+
+        # An accepted pre-order does not start but reminds the driver; under 30 minutes to pickup - at once
+        assert await queries.accept_preorder(order_id, 10)
+        assert not await queries.accept_preorder(order_id, 11)
+        await asyncio.sleep(0.05)
+        assert [(kind, oid) for kind, oid, _ in fired] == [('reminder', order_id)]
+        assert preorder_schedule.due_in(order_id) == (None, None)
+
+        # The driver declined - the order waits for its time again
+        assert await queries.cancel_preorder_by_driver(order_id, 10) == 1
+        assert preorder_schedule.due_in(order_id)[0] is not None
+        await asyncio.sleep(delay - (time.monotonic() - started) + 0.2)
+        assert [(kind, oid) for kind, oid, _ in fired] == [('reminder', order_id), ('due', order_id)]
+        # Fires at the pickup moment, not at the next polling minute
+        assert abs(fired[-1][2] - started - delay) < 0.1
+    finally:
+        await preorder_schedule.stop()
+
+
+@pytest.mark.asyncio
+async def test_schedule_is_restored_from_orders(temp_db):
+    await queries.add_or_update_user(1, "Клієнт", None)
+    await queries.register_driver(10, "Водій", None, "+380000000000", "AA0000AA")
+    later = datetime.now(TIMEZONE) + timedelta(hours=2)
+    scheduled = await queries.create_order_in_db(1, {'scheduled_at': later.strftime('%Y-%m-%d %H:%M:%S')}, 'scheduled')
+    accepted = await queries.create_order_in_db(1, {'scheduled_at': later.isoformat()}, 'scheduled')
+    await queries.accept_preorder(accepted, 10)
+    await queries.create_order_in_db(1, {}, 'searching')
+    await preorder_schedule.stop()
+
+    preorder_schedule.load(await queries.get_upcoming_preorders())
+    try:
+        assert preorder_schedule.stats()['armed'] == 2
+        due_in, _ = preorder_schedule.due_in(scheduled)
+        _, remind_in = preorder_schedule.due_in(accepted)
+        assert abs(due_in - 7200) < 2
+        assert abs(remind_in - 5400) < 2
+    finally:
+        await preorder_schedule.stop()
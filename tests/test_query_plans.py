@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.query_plans import NO_SQL, Samples, _calls, collect_plans, format_report, query_functions
+from benchmarks.synthetic_data import TEST_SCALE, populate
+
+
+def test_every_query_function_is_exercised():
+    covered = set(_calls(Samples(0, 0, 0, 0, 0, 0))) | NO_SQL
+    assert query_functions() - covered == set(), "добавьте вызов новой функции в benchmarks/query_plans.py"
+    assert covered - query_functions() == set()
+
+
+@pytest.mark.asyncio
+async def test_queries_use_indexes_on_large_database(temp_db):
+    populate(temp_db, TEST_SCALE)
+    report = await collect_plans(temp_db)
+
+    assert report.errors == {}
+    assert report.unexpected_scans == [], format_report(report)
+    assert report.unused_indexes == [], format_report(report)
+    # The statements of every function that touches the DB are checked
+    assert set(report.statements) == query_functions() - NO_SQL
+    assert all(report.statements.values())
+    # The scheduler and dispatch read orders through the partial indexes of active orders
+    conn = sqlite3.connect(temp_db)
+    try:
+        for function in ('get_searching_dispatches', 'get_upcoming_preorders', 'get_pending_dispatch_orders',
+                         'get_available_preorders_page', 'get_my_preorders_page'):
+            for sql in report.statements[function]:
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                assert any('idx_orders_active_' in detail for detail in plan), (function, plan)
+                assert not any(detail.startswith('USE TEMP B-TREE') for detail in plan), (function, plan)
+    finally:
+        conn.close()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.rate_limit import PriorityLanes, SingleFlight, TokenBucket
+from utils.geo_providers import (
+    GeocodingClient, GeoLocation, StaticProvider, LANE_BACKGROUND, LANE_INTERACTIVE_REVERSE
+)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_requests_after_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # Two tokens from the burst, two more at 50 ms each
+    assert 0.08 <= time.monotonic() - started < 0.3
+
+
+@pytest.mark.asyncio
+async def test_higher_lane_overtakes_queued_lower_lanes():
+    lanes = PriorityLanes(TokenBucket(rate=50, capacity=1), ['reverse', 'forward', 'background'])
+    order = []
+
+    async def request(lane, name):
+        await lanes.acquire(lane)
+        order.append(name)
+
+    tasks = [asyncio.create_task(request('background', f'bg{i}')) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request('forward', 'fwd')))
+    tasks.append(asyncio.create_task(request('reverse', 'rev')))
+    await asyncio.gather(*tasks)
+
+    # The first background one took a free token, the rest are overtaken by interactive ones
+    assert order == ['bg0', 'rev', 'fwd', 'bg1', 'bg2']
+    stats = lanes.stats()
+    assert stats['background']['served'] == 3 and stats['background']['queued'] == 0
+    assert stats['background']['max_wait'] > stats['reverse']['max_wait']
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_call_and_survives_caller_cancellation():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 'result'
+
+    first = asyncio.create_task(flights.do('key', work))
+    await asyncio.sleep(0)
+    others = [asyncio.create_task(flights.do('key', work)) for _ in range(4)]
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await asyncio.gather(*others) == ['result'] * 4
+    assert calls == 1 and flights.coalesced == 4 and len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_geocoder_coalesces_identical_queries_and_prioritises_reverse():
+    provider = StaticProvider(
+        forward={"Шевченка 5": [GeoLocation("Шевченка 5", 51.67, 33.91)], "Франка 1": [GeoLocation("Франка 1", 51.68, 33.92)]},
+        reverse={(51.67, 33.91): GeoLocation("Шевченка 5", 51.67, 33.91)},
+        rate=20,
+    )
+    geocoder = GeocodingClient([provider], user_agent="test")
+
+    forward = [asyncio.create_task(geocoder.geocode("Шевченка 5", lane=LANE_BACKGROUND, language='uk')) for _ in range(5)]
+    other = asyncio.create_task(geocoder.geocode("Франка 1", lane=LANE_BACKGROUND))
+    await asyncio.sleep(0)
+    reverse = asyncio.create_task(geocoder.reverse(51.67, 33.91, lane=LANE_INTERACTIVE_REVERSE))
+    results = await asyncio.gather(*forward, other, reverse)
+
+    assert [loc.address for loc in results[:5]] == ["Шевченка 5"] * 5
+    assert provider.queries == ["Шевченка 5", (51.67, 33.91), "Франка 1"]
+    stats = geocoder.stats()
+    assert stats['upstream_calls'] == 3 and stats['coalesced'] == 4
+    await geocoder.close()
@@ -0,0 +1,86 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from database import queries as db_queries
+from utils.cache import TTLCache, MISSING
+
+
+def test_ttl_cache_expires_evicts_and_counts(monkeypatch):
+    """Entries expire by TTL, extra ones are evicted by LRU, and hits and misses are counted."""
+    now = [1000.0]
+    monkeypatch.setattr('utils.cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+
+    cache.set('a', False)
+    cache.set('b', True)
+    assert cache.get('a') is False      # 'a' becomes the most recent
+    cache.set('c', True)                # evicts 'b'
+    assert cache.get('b') is MISSING
+
+    now[0] += 11
+    assert cache.get('a') is MISSING
+
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 2, 'evictions': 1, 'hit_rate': 0.333}
+
+
+def test_ttl_cache_skips_set_after_invalidation():
+    """A value read before invalidate() or clear() does not get into the cache."""
+    cache = TTLCache()
+    generation = cache.generation('a')
+    cache.invalidate('a')
+    cache.set('a', False, generation)
+    assert cache.get('a') is MISSING
+
+    generation = cache.generation('a')
+    cache.clear()
+    cache.set('a', False, generation)
+    assert cache.get('a') is MISSING
+
+    cache.set('a', True, cache.generation('a'))
+    assert cache.get('a') is True
+
+
+@pytest.mark.asyncio
+async def test_role_checks_are_cached_and_invalidated_on_change(temp_db):
+    """Repeated role checks are served from the cache, and role changes are visible at once."""
+    db_queries.role_cache.clear()
+    await db_queries.add_or_update_user(42, "Test User", None)
+
+    assert await db_queries.is_user_banned(42) is False
+    assert await db_queries.is_admin(42) is False
+    hits_before = db_queries.role_cache.stats()['hits']
+    assert await db_queries.is_user_banned(42) is False
+    assert db_queries.role_cache.stats()['hits'] == hits_before + 1
+
+    await db_queries.ban_user(42)
+    await db_queries.set_admin_status(42, is_admin=True)
+    assert await db_queries.is_user_banned(42) is True
+    assert await db_queries.is_admin(42) is True
+
+    await db_queries.unban_user(42)
+    await db_queries.register_driver(42, "Test User", None, "+380000000000", "AA0000AA")
+    assert await db_queries.is_user_banned(42) is False
+    assert await db_queries.is_driver(42) is True
+
+
+@pytest.mark.asyncio
+async def test_role_check_racing_with_ban_does_not_cache_stale_answer(temp_db, monkeypatch):
+    """A ban made while a role is being read is not overridden by a stale value from that read."""
+    db_queries.role_cache.clear()
+    await db_queries.add_or_update_user(42, "Test User", None)
+    original_get_db = db_queries._get_db
+
+    @asynccontextmanager
+    async def get_db_with_concurrent_ban():
+        async with original_get_db() as db:
+            yield db
+        # The ban lands after the read but before the check writes its result to the cache
+        await db_queries.ban_user(42)
+
+    monkeypatch.setattr(db_queries, '_get_db', get_db_with_concurrent_ban)
+    assert await db_queries.is_user_banned(42) is False
+    monkeypatch.setattr(db_queries, '_get_db', original_get_db)
+
+    assert db_queries.role_cache.get(('banned', 42)) is MISSING
+    assert await db_queries.is_user_banned(42) is True
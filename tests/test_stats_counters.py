@@ -0,0 +1,50 @@
+import pytest
+
+from database import queries
+from database.stats_counters import COUNTER_QUERIES
+from database.write_queue import write_queue
+
+
+async def _counted() -> dict:
+    result = {}
+    async with queries._get_db() as db:
+        for name, sql in COUNTER_QUERIES.items():
+            cursor = await db.execute(sql)
+            result[name] = (await cursor.fetchone())[0]
+    return result
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_writes_of_query_functions(temp_db):
+    for user_id in (1, 2, 3):
+        await queries.add_or_update_user(user_id, f"Клієнт {user_id}", None)
+    await queries.add_or_update_user(1, "Клієнт 1", "client1")  # an upsert of an existing user is not counted
+    await queries.register_driver(10, "Водій", None, "+380000000000", "AA0000AA")
+    await queries.start_driver_shift(10)
+
+    order_ids = [await queries.create_order_in_db(1, {}, 'searching') for _ in range(3)]
+    await queries.update_order_status(order_ids[0], 'completed')
+    assert await queries.cancel_searching_order(order_ids[1], 'cancelled_by_user')
+    assert not await queries.cancel_searching_order(order_ids[1], 'cancelled_by_user')
+
+    stats = await queries.get_main_stats()
+    assert stats == await _counted()
+    assert stats == {
+        'total_drivers': 1, 'working_drivers': 1, 'total_clients': 4,
+        'active_orders': 1, 'completed_orders': 1,
+    }
+
+    await queries.stop_driver_shift(10)
+    await queries.delete_driver(10)
+    stats = await queries.get_main_stats()
+    assert stats['total_drivers'] == 0 and stats['working_drivers'] == 0
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_repairs_drifted_counters(temp_db):
+    await queries.create_order_in_db(1, {}, 'searching')
+    assert await queries.reconcile_stats_counters() == {}
+
+    await write_queue.execute("UPDATE stats_counters SET value = value + 5 WHERE name = 'active_orders'")
+    assert await queries.reconcile_stats_counters() == {'active_orders': -5}
+    assert (await queries.get_main_stats())['active_orders'] == 1
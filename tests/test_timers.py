@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+
+from utils.timers import DeadlineScheduler
+
+
+@pytest.mark.asyncio
+async def test_deadlines_fire_in_order_and_can_be_cancelled_or_rearmed():
+    """
+    Deadlines fire in deadline order; cancelled keys never fire and re-armed keys fire once, at the new time.
+    """
+    fired = []
+
+    async def on_fire(key):
+        fired.append(key)
+
+    timers = DeadlineScheduler('test')
+    timers.start()
+    try:
+        timers.schedule('late', 0.15, on_fire, 'late')
+        timers.schedule('early', 0.05, on_fire, 'early')
+        timers.schedule('cancelled', 0.02, on_fire, 'cancelled')
+        timers.schedule('rearmed', 0.01, on_fire, 'rearmed')
+        timers.schedule('rearmed', 0.10, on_fire, 'rearmed')
+        assert timers.cancel('cancelled') is True
+        assert timers.cancel('missing') is False
+
+        await asyncio.sleep(0.3)
+
+        assert fired == ['early', 'rearmed', 'late']
+        assert len(timers) == 0
+        assert timers.stats()['fired'] == 3
+    finally:
+        await timers.stop()
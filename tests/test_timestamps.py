@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.config import TIMEZONE
+from database import queries
+from database.pool import db_pool
+from database.timestamp_migration import TimestampMigration, TIMESTAMPS_SCHEMA_VERSION
+from database.timestamps import from_epoch, parse_timestamp, to_epoch
+from database.write_queue import write_queue
+
+
+def test_epoch_round_trip():
+    moment = datetime(2026, 3, 29, 2, 30, tzinfo=timezone.utc)
+    assert to_epoch(moment) == 1774751400
+    assert from_epoch(1774751400) == moment
+    # Display is in the bot's zone (summer time already in effect)
+    assert from_epoch(1774751400).strftime('%d.%m %H:%M') == '29.03 05:30'
+    # A naive time is the server's local time, as with datetime.now()
+    naive = datetime(2026, 10, 17, 9, 30)
+    assert from_epoch(to_epoch(naive), tz=None) == naive
+    assert to_epoch(None) is None and from_epoch(None) is None
+
+
+def test_legacy_strings_are_read_in_their_zone():
+    utc = datetime(2026, 10, 17, 6, 30, tzinfo=timezone.utc)
+    assert parse_timestamp('2026-10-17 06:30:00', timezone.utc) == utc
+    assert parse_timestamp('2026-10-17 09:30:00', TIMEZONE) == utc
+    # The offset in the string wins over the column's zone
+    assert parse_timestamp('2026-10-17T09:30:00+03:00', timezone.utc) == utc
+    assert parse_timestamp(str(datetime(2026, 10, 17, 9, 30, 0, 500))) == datetime(2026, 10, 17, 9, 30, 0, 500).astimezone()
+    assert parse_timestamp('не дата') is None
+
+
+@pytest.mark.asyncio
+async def test_migration_converts_legacy_rows_in_batches(temp_db):
+    await queries.add_or_update_user(1, "Клієнт", None)
+    await queries.register_driver(10, "Водій", None, "+380000000000", "AA0000AA")
+    now = datetime.now(TIMEZONE).replace(microsecond=0)
+    scheduled = now + timedelta(hours=3)
+    # Strings in the formats the bot wrote before switching to Unix seconds
+    for _ in range(3):
+        await write_queue.execute(
+            "INSERT INTO orders (client_id, status, created_at, scheduled_at) VALUES (1, 'scheduled', ?, ?)",
+            (now.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), scheduled.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+    await write_queue.execute(
+        "INSERT INTO orders (client_id, driver_id, status, created_at, completed_at) VALUES (1, 10, 'completed', ?, ?)",
+        (now.astimezone(timezone.utc).isoformat(), str(now.astimezone().replace(tzinfo=None)))
+    )
+    await write_queue.execute("UPDATE drivers SET shift_started_at = ? WHERE user_id = 10", ('вчора',))
+    await write_queue.execute("PRAGMA user_version = 0")
+
+    migration = TimestampMigration(batch_size=2, pause=0)
+    stats = await migration.run()
+
+    assert stats['converted'] == 3 * 2 + 2 and stats['skipped'] == 1
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT DISTINCT typeof(created_at), created_at FROM orders")
+        assert await cursor.fetchall() == [('integer', to_epoch(now))]
+        cursor = await db.execute("SELECT scheduled_at FROM orders WHERE status = 'scheduled'")
+        assert {row[0] for row in await cursor.fetchall()} == {to_epoch(scheduled)}
+        cursor = await db.execute("SELECT completed_at FROM orders WHERE status = 'completed'")
+        assert (await cursor.fetchone())[0] == to_epoch(now)
+        # An unrecognized value is not lost
+        cursor = await db.execute("SELECT shift_started_at FROM drivers WHERE user_id = 10")
+        assert (await cursor.fetchone())[0] == 'вчора'
+        cursor = await db.execute("PRAGMA user_version")
+        assert (await cursor.fetchone())[0] == TIMESTAMPS_SCHEMA_VERSION
+
+    # The pickup-time range is numeric now
+    assert await queries.get_available_preorders_count(now, now + timedelta(hours=4)) == 3
+    assert await queries.get_available_preorders_count(now, now + timedelta(hours=2)) == 0
+    # A second run does nothing
+    assert (await TimestampMigration().run())['scanned'] == 0
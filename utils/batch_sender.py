@@ -1,19 +1,217 @@
 import asyncio
 import logging
-from typing import Callable, Coroutine, Any
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterable, Awaitable, Iterable
+from typing import Callable, Coroutine, Any, NamedTuple
 from aiogram import Bot
 from aiogram.types import Message
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from config.config import (
+    BROADCAST_RATE_PER_SEC, BROADCAST_MIN_RATE_PER_SEC, BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL
+)
+from utils.outbound import send_priority, PRIORITY_NEWSLETTER
+from utils.rate_limit import TokenBucket
 logger = logging.getLogger(__name__)
 
+
+class BroadcastResult(NamedTuple):
+    sent: int
+    failed: int
+    throttled: int  # 429 (RetryAfter) responses during the broadcast
+    elapsed: float  # seconds
+
+    @property
+    def per_second(self) -> float:
+        """Achieved delivery rate, messages per second."""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def progress_text(sent: int, failed: int, total: int, rate: float) -> str:
+    """Text of the admin's broadcast progress message."""
+    return (
+        f"⏳ <b>Триває розсилка...</b>\n\n"
+        f"Надіслано: {sent}/{total}\n"
+        f"Помилок: {failed}\n"
+        f"Швидкість: {rate:.1f} повідомл./с"
+    )
+
+
+class BroadcastEngine:
+    """
+    Sends a message to many recipients as fast as Telegram accepts it.
+
+    Sends are paced by a token bucket that starts at `rate` messages per second
+    and adapts AIMD-style: a RetryAfter halves the rate (never below `min_rate`)
+    and pauses every worker for the delay Telegram asked for, while each
+    second's worth of successful sends adds `increase` back, up to `rate`.
+    Throttled recipients go back to the queue and are retried up to
+    `max_retries` times; any other error fails the recipient at once. Progress
+    is reported at most once per `progress_interval` seconds.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE_PER_SEC, min_rate: float = BROADCAST_MIN_RATE_PER_SEC,
+                 increase: float = 1.0, decrease: float = 0.5, max_retries: int = BROADCAST_MAX_RETRIES,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.bucket = TokenBucket(rate, 1)
+        self._increase = increase
+        self._decrease = decrease
+        self._max_retries = max_retries
+        self._progress_interval = progress_interval
+        self._resume_at = 0.0
+        self._clean_sends = 0
+        self._progress_at = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def _on_success(self) -> None:
+        self.sent += 1
+        self._clean_sends += 1
+        if self._clean_sends >= self.rate and self.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.rate + self._increase))
+            self._clean_sends = 0
+
+    def _on_retry_after(self, retry_after: float) -> None:
+        self.throttled += 1
+        now = time.monotonic()
+        # Messages sent before a pause get their 429s in a burst, so the rate is lowered once per pause
+        if now >= self._resume_at:
+            self.bucket.set_rate(max(self.min_rate, self.rate * self._decrease))
+            logger.warning(f"Broadcast throttled by Telegram: pausing {retry_after}s, rate lowered to {self.rate:.1f} msg/s")
+        self._resume_at = max(self._resume_at, now + retry_after)
+        self._clean_sends = 0
+
+    async def _wait_for_resume(self) -> None:
+        while (pause := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+    async def _acquire(self) -> None:
+        while True:
+            await self._wait_for_resume()
+            await self.bucket.acquire()
+            # A token acquired before the pause is not used: after it the workers queue up at the bucket
+            # again instead of all sending at once
+            if time.monotonic() >= self._resume_at:
+                return
+
+    async def _produce(self, recipients: Iterable[int] | AsyncIterable[int], queue: asyncio.Queue, workers: int) -> None:
+        try:
+            if isinstance(recipients, AsyncIterable):
+                async for user_id in recipients:
+                    await queue.put((user_id, 0))
+            else:
+                for user_id in recipients:
+                    await queue.put((user_id, 0))
+        finally:
+            # One end marker per worker
+            for _ in range(workers):
+                await queue.put(None)
+
+    async def _worker(self, queue: asyncio.Queue, retries: deque, send_function: Callable[[int], Coroutine[Any, Any, Any]],
+                      progress: Callable[['BroadcastEngine'], Awaitable[Any]] | None,
+                      on_result: Callable[[int, bool], Awaitable[Any]] | None) -> None:
+        while True:
+            # Retries after 429 go before new recipients; the worker that put a recipient back for a retry
+            # picks it up itself, so retries are never left without a worker
+            if retries:
+                user_id, attempt = retries.popleft()
+            else:
+                item = await queue.get()
+                if item is None:
+                    return
+                user_id, attempt = item
+            await self._acquire()
+            delivered = False
+            try:
+                # The broadcast runs at the lowest priority: order offers and status updates overtake it
+                with send_priority(PRIORITY_NEWSLETTER):
+                    await send_function(user_id)
+            except TelegramRetryAfter as e:
+                self._on_retry_after(e.retry_after)
+                if attempt < self._max_retries:
+                    retries.append((user_id, attempt + 1))
+                    continue
+                self.failed += 1
+                logger.warning(f"Broadcast failed for user {user_id}: still throttled after {attempt} retries.")
+            except TelegramAPIError as e:
+                self.failed += 1
+                # Log the specific API error
+                if "bot was blocked" in str(e) or e.message.startswith("Forbidden:"):
+                    logger.info(f"Broadcast failed for user {user_id}: Bot was blocked.")
+                else:
+                    logger.warning(f"Broadcast failed for user {user_id} with TelegramAPIError: {e}")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Broadcast failed for user {user_id} with an unexpected error: {e}")
+            else:
+                delivered = True
+                self._on_success()
+            if on_result:
+                try:
+                    await on_result(user_id, delivered)
+                except Exception as e:
+                    logger.error(f"Could not record broadcast result for user {user_id}: {e}")
+            await self._report_progress(progress)
+
+    async def _report_progress(self, progress: Callable[['BroadcastEngine'], Awaitable[Any]] | None) -> None:
+        now = time.monotonic()
+        if progress is None or now - self._progress_at < self._progress_interval:
+            return
+        self._progress_at = now
+        try:
+            await progress(self)
+        except TelegramAPIError as e:
+            logger.warning(f"Could not update broadcast progress message: {e}")
+
+    async def run(self, recipients: Iterable[int] | AsyncIterable[int],
+                  send_function: Callable[[int], Coroutine[Any, Any, Any]],
+                  progress: Callable[['BroadcastEngine'], Awaitable[Any]] | None = None,
+                  on_result: Callable[[int, bool], Awaitable[Any]] | None = None) -> BroadcastResult:
+        """
+        Sends to every recipient and returns the delivery totals.
+
+        Args:
+            recipients: User IDs, a list or an async iterator. They are read only as
+                fast as they are sent, so memory does not grow with the audience.
+            send_function: An awaitable function that takes a user_id and sends the message.
+            progress: Awaited with the engine at most once per progress_interval.
+            on_result: Awaited with (user_id, delivered) once a recipient's outcome is final.
+        """
+        started = time.monotonic()
+        # The first progress update comes progress_interval after the start
+        self._progress_at = started
+        # Enough workers to keep the pace when the API takes up to a second to respond
+        workers = max(1, math.ceil(self.max_rate))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        retries: deque = deque()
+        producer = asyncio.create_task(self._produce(recipients, queue, workers))
+        try:
+            await asyncio.gather(*(
+                self._worker(queue, retries, send_function, progress, on_result) for _ in range(workers)
+            ))
+            # An error reading the recipients (for example, from the database) is raised to the caller
+            await producer
+        finally:
+            producer.cancel()
+        return BroadcastResult(self.sent, self.failed, self.throttled, time.monotonic() - started)
+
+
 async def broadcast_messages(
     bot: Bot,
     user_ids: list[int],
     send_function: Callable[[int], Coroutine[Any, Any, Any]],
     status_message: Message | None = None
-) -> tuple[int, int]:
+) -> BroadcastResult:
     """
-    Sends messages to a list of users in batches to avoid hitting Telegram's rate limits.
+    Sends messages to a list of users at the highest rate Telegram allows (see BroadcastEngine).
 
     Args:
         bot: The Bot instance.
@@ -22,49 +220,19 @@ async def broadcast_messages(
         status_message: An optional message to edit with the progress of the broadcast.
 
     Returns:
-        A tuple of (success_count, fail_count).
+        A BroadcastResult with the sent and failed counts and the achieved rate.
     """
-    total_users = len(user_ids)
-    if total_users == 0:
-        return 0, 0
-
-    success_count = 0
-    fail_count = 0
-    batch_size = 25  # Send 25 messages per batch
-    delay_between_batches = 1.1  # Wait just over 1 second between batches
-
-    for i in range(0, total_users, batch_size):
-        batch = user_ids[i:i + batch_size]
-
-        # Создаем задачи для параллельной отправки сообщений в пакете
-        tasks = [send_function(user_id) for user_id in batch]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Обрабатываем результаты
-        for j, result in enumerate(results):
-            user_id = batch[j]
-            if isinstance(result, Exception):
-                fail_count += 1
-                # Логируем конкретную ошибку, если это ошибка API
-                if isinstance(result, TelegramAPIError):
-                     if "bot was blocked" in str(result) or result.message.startswith("Forbidden:"):
-                         logger.info(f"Broadcast failed for user {user_id}: Bot was blocked.")
-                     else:
-                         logger.warning(f"Broadcast failed for user {user_id} with TelegramAPIError: {result}")
-                else:
-                    logger.error(f"Broadcast failed for user {user_id} with an unexpected error: {result}")
-            else:
-                success_count += 1
-
-        if status_message:
-            progress_text = (
-                f"⏳ <b>Триває розсилка...</b>\n\n"
-                f"Надіслано: {success_count}/{total_users}\n"
-                f"Помилок: {fail_count}"
-            )
-            await status_message.edit_text(progress_text)
+    if not user_ids:
+        return BroadcastResult(0, 0, 0, 0.0)
 
-        if i + batch_size < total_users:
-            await asyncio.sleep(delay_between_batches)
+    progress = None
+    if status_message:
+        async def progress(engine: BroadcastEngine):
+            await status_message.edit_text(progress_text(engine.sent, engine.failed, len(user_ids), engine.rate))
 
-    return success_count, fail_count
\ No newline at end of file
+    result = await BroadcastEngine().run(user_ids, send_function, progress)
+    logger.info(
+        f"Broadcast to {len(user_ids)} users: sent {result.sent}, failed {result.failed}, "
+        f"throttled {result.throttled} times, {result.per_second:.1f} msg/s."
+    )
+    return result
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# Returned by TTLCache.get() on a miss, so that None/False can be cached as regular values.
+MISSING = object()
+
+
+class TTLCache:
+    """
+    A small in-process LRU cache whose entries expire after `ttl` seconds.
+
+    Used for answers that are read on almost every update but change rarely
+    (user roles, bans). Writers are expected to call invalidate() right after
+    changing the underlying data; the TTL only bounds staleness for changes
+    made outside the bot (scripts, manual SQL).
+
+    Each key also has a generation counter bumped by invalidate(). A reader that
+    fills the cache after an awaited query takes generation() before the query
+    and passes it to set(): if the key was invalidated meanwhile, the possibly
+    stale answer is not stored.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self._maxsize = max(1, maxsize)
+        self._ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._generations: dict[Hashable, int] = {}
+        self._clears = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value or MISSING if the key is absent or expired."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self._misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def generation(self, key: Hashable) -> int:
+        """Returns the key's invalidation counter, to be passed to set() after a slow read."""
+        # Both counters only grow, so their sum changes on invalidate() and clear()
+        return self._generations.get(key, 0) + self._clears
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """Stores the value; skipped if `generation` is given and the key was invalidated since."""
+        if generation is not None and generation != self.generation(key):
+            return
+        self._data[key] = (time.monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._clears += 1
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            'size': len(self._data),
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+        }
@@ -4,15 +4,18 @@ from typing import Optional
 # --- Admin Panel Callbacks ---
 class KpiPaginator(CallbackData, prefix="kpi_page"):
     page: int
+    cursor: str = ''
 
 class Paginator(CallbackData, prefix="driver_page"):
     page: int
+    cursor: str = ''
 
 class DriverProfile(CallbackData, prefix="driver_profile"):
     user_id: int
 
 class WorkingDriversPaginator(CallbackData, prefix="wd_page"):
     page: int
+    cursor: str = ''
 
 class WorkingDriverProfile(CallbackData, prefix="wd_profile"):
     user_id: int
@@ -23,6 +26,7 @@ class AdminDriverAction(CallbackData, prefix="admin_driver"):
 
 class ClientPaginator(CallbackData, prefix="client_page"):
     page: int
+    cursor: str = ''
 
 class ClientProfile(CallbackData, prefix="client_profile"):
     user_id: int
@@ -37,9 +41,11 @@ class ClientHistory(CallbackData, prefix="client_history"):
 class ClientHistoryPaginator(CallbackData, prefix="client_hist_page"):
     page: int
     user_id: int
+    cursor: str = ''
 
 class BannedClientPaginator(CallbackData, prefix="banned_page"):
     page: int
+    cursor: str = ''
 
 class AdminRequestLocation(CallbackData, prefix="admin_req_loc"):
     user_id: int
@@ -49,6 +55,7 @@ class AdminShowLocation(CallbackData, prefix="admin_show_loc"):
 
 class AdminOrderPaginator(CallbackData, prefix="admin_ord_page"):
     page: int
+    cursor: str = ''
 
 class AdminOrderDetails(CallbackData, prefix="admin_ord_details"):
     order_id: int
@@ -63,6 +70,18 @@ class AdminAction(CallbackData, prefix="admin_action"):
 
 class AllOrdersPaginator(CallbackData, prefix="all_ord_page"):
     page: int
+    cursor: str = ''
+
+class AdminDriverList(CallbackData, prefix="admin_drv_list"):
+    list_type: str
+    page: int
+    action: str = 'view'
+    cursor: str = ''
+
+class AdminOrderList(CallbackData, prefix="admin_ord_list"):
+    status: str
+    page: int
+    cursor: str = ''
 
 # --- User Order/Application Callbacks ---
 class OrderCallbackData(CallbackData, prefix="order"):
@@ -89,6 +108,7 @@ class TimePickerCallback(CallbackData, prefix="time_pick"):
 # --- User Cabinet Callbacks ---
 class HistoryPaginator(CallbackData, prefix="hist_page"):
     page: int
+    cursor: str = ''
 
 class TripDetailsCallbackData(CallbackData, prefix="trip_details"):
     order_id: int
@@ -106,6 +126,7 @@ class FavAddressManage(CallbackData, prefix="fav_addr_mng"):
 # --- Driver Cabinet Callbacks ---
 class PreOrderListPaginator(CallbackData, prefix="preorder_list_page"):
     page: int
+    cursor: str = ''
 
 class PreOrderDetails(CallbackData, prefix="preorder_details"):
     order_id: int
@@ -116,6 +137,7 @@ class PreOrderAction(CallbackData, prefix="preorder_action"):
 
 class MyPreordersPaginator(CallbackData, prefix="my_preorder_page"):
     page: int
+    cursor: str = ''
 
 class MyPreorderAction(CallbackData, prefix="my_preorder_action"):
     action: str # 'details' or 'cancel'
@@ -123,15 +145,18 @@ class MyPreorderAction(CallbackData, prefix="my_preorder_action"):
 
 class DriverReviewsPaginator(CallbackData, prefix="drv_rev_page"):
     page: int
+    cursor: str = ''
 
 class DriverRejectionPaginator(CallbackData, prefix="drv_rej_page"):
     page: int
+    cursor: str = ''
 
 class DriverRejectionDetails(CallbackData, prefix="drv_rej_details"):
     order_id: int
 
 class DriverHistoryPaginator(CallbackData, prefix="drv_hist_page"):
     page: int
+    cursor: str = ''
 
 # --- FSM Address Logic Callbacks ---
 class AddressCallbackData(CallbackData, prefix="addr_action"):
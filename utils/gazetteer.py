@@ -0,0 +1,537 @@
+"""
+Offline gazetteer of the service area: streets, houses and points of interest (POI) from an OSM extract.
+
+Forward geocoding of addresses in our region is done locally in
+milliseconds; Nominatim stays the fallback for whatever is missing from
+the extract. The index is kept in a separate SQLite file (GAZETTEER_PATH)
+and is built with:
+
+    python -m utils.gazetteer build sumy-oblast.osm.bz2
+
+OSM XML (.osm, .osm.bz2, .osm.gz) is supported; convert PBF first, e.g.: osmium cat region.osm.pbf -o region.osm.bz2
+"""
+import argparse
+import bz2
+import gzip
+import os
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import NamedTuple
+
+from loguru import logger
+
+from config.config import GAZETTEER_PATH, GAZETTEER_NAME_THRESHOLD
+from database.geo_index import haversine_km
+from database.geocode_cache import trigrams
+
+# Area to import (south, west, north, east): the union of SUMY_OBLAST_VIEWBOX
+# from utils/geocoder.py and handlers/user/fsm_address_logic.py - the first one cuts off the oblast's north with Hlukhiv
+SERVICE_AREA_BBOX = (50.20, 33.25, 51.90, 35.75)
+
+# Street type: every spelling (Ukrainian/Russian, abbreviations) -> canonical name
+STREET_TYPES = {
+    'вулиця': 'вулиця', 'вул': 'вулиця', 'ул': 'вулиця', 'улица': 'вулиця',
+    'провулок': 'провулок', 'пров': 'провулок', 'пер': 'провулок', 'переулок': 'провулок',
+    'проспект': 'проспект', 'просп': 'проспект', 'пр-т': 'проспект',
+    'площа': 'площа', 'пл': 'площа', 'площадь': 'площа',
+    'бульвар': 'бульвар', 'бульв': 'бульвар', 'б-р': 'бульвар',
+    'тупик': 'тупик', 'туп': 'тупик',
+    'набережна': 'набережна', 'наб': 'набережна', 'набережная': 'набережна',
+    'шосе': 'шосе', 'шоссе': 'шосе',
+    'майдан': 'майдан',
+    'узвіз': 'узвіз', 'спуск': 'узвіз',
+    'проїзд': 'проїзд', 'проезд': 'проїзд',
+    'мікрорайон': 'мікрорайон', 'мкр': 'мікрорайон', 'микрорайон': 'мікрорайон',
+}
+# Words that say nothing about a place inside a settlement
+NOISE_WORDS = {
+    'м', 'місто', 'город', 'с', 'село', 'смт', 'селище', 'україна', 'украина',
+    'ім', 'імені', 'им', 'имени', 'буд', 'будинок', 'дом', 'д',
+}
+# Administrative parts ("Сумська область", "Шосткинський район") are dropped entirely
+_ADMIN_PART = re.compile(r"\b[\w'-]+\s+(область|обл|район|р-н|громада)\b\.?")
+_APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'", "‘": "'", "´": "'"})
+_TOKEN = re.compile(r"[\w'/-]+")
+# Latin letters typed instead of Cyrillic ones in house numbers
+_HOUSE_LETTERS = str.maketrans({'a': 'а', 'b': 'б', 'c': 'с', 'e': 'е', 'v': 'в'})
+
+PLACE_RANKS = {'city': 0, 'town': 1, 'village': 2, 'hamlet': 3, 'suburb': 2, 'neighbourhood': 3}
+# Approximate settlement radius by rank, km - for binding a street to the nearest settlement
+PLACE_RADIUS_KM = {0: 15.0, 1: 8.0, 2: 3.0, 3: 1.5}
+POI_KEYS = ('amenity', 'shop', 'tourism', 'office', 'leisure', 'healthcare', 'historic', 'railway', 'public_transport')
+IGNORED_HIGHWAYS = {'bus_stop', 'footway', 'path', 'cycleway', 'steps', 'track', 'platform', 'crossing', 'bridleway'}
+
+
+class GazetteerLocation(NamedTuple):
+    """A found address; its fields are compatible with geopy.Location."""
+    address: str
+    latitude: float
+    longitude: float
+
+
+def _tokens(text: str) -> list[str]:
+    text = text.lower().translate(_APOSTROPHES).replace('ё', 'е')
+    return [token.strip("-'") for token in _TOKEN.findall(text) if token.strip("-'")]
+
+
+def normalize_street(name: str) -> tuple[str | None, str]:
+    """
+    Splits a street name into its canonical type and normalized name.
+
+    "вул. Тараса Шевченка" -> ("вулиця", "тараса шевченка")
+    """
+    street_type, words = None, []
+    for token in _tokens(name):
+        if token in STREET_TYPES and street_type is None:
+            street_type = STREET_TYPES[token]
+        elif token not in NOISE_WORDS:
+            words.append(token)
+    return street_type, ' '.join(words)
+
+
+def normalize_house_number(number: str) -> str:
+    """Normalizes a house number into a key: "12-А" -> "12а", "5 / 2" -> "5/2"."""
+    return re.sub(r"[\s\-.]", '', number.lower().translate(_HOUSE_LETTERS))
+
+
+class ParsedAddress(NamedTuple):
+    street_type: str | None
+    name: str
+    house: str | None
+    city: str | None
+
+
+def _token_similarity(query_token: str, name_tokens: list[str], grams_cache: dict) -> float:
+    best = 0.0
+    query_grams = grams_cache.setdefault(query_token, trigrams(query_token))
+    for token in name_tokens:
+        if token == query_token:
+            return 1.0
+        grams = grams_cache.setdefault(token, trigrams(token))
+        common = len(query_grams & grams)
+        best = max(best, common / (len(query_grams) + len(grams) - common))
+    return best
+
+
+class _NameIndex:
+    """Fuzzy search of names (streets or POIs) by words and their trigrams."""
+
+    def __init__(self, threshold: float):
+        self._threshold = threshold
+        self._names: dict[int, list[str]] = {}
+        self._by_name: dict[str, list[int]] = {}
+        self._trigram_index: dict[str, set[int]] = {}
+        self._grams: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, item_id: int, norm: str) -> None:
+        if not norm:
+            return
+        self._names[item_id] = norm.split()
+        self._by_name.setdefault(norm, []).append(item_id)
+        for gram in trigrams(norm):
+            self._trigram_index.setdefault(gram, set()).add(item_id)
+
+    def match(self, norm: str) -> list[tuple[float, int]]:
+        """
+        Returns (score, id) pairs of matching names.
+
+        An exact match scores 1.0. Otherwise every query word must be similar
+        (by trigrams) to some word of the name: "шевченко" finds
+        "тараса шевченка", but "франка" does not.
+        """
+        query_tokens = norm.split()
+        if not query_tokens:
+            return []
+        exact = set(self._by_name.get(norm, ()))
+        candidates: set[int] = set()
+        for gram in trigrams(norm):
+            candidates |= self._trigram_index.get(gram, set())
+
+        matches = [(1.0, item_id) for item_id in exact]
+        for item_id in candidates - exact:
+            name_tokens = self._names[item_id]
+            similarities = [_token_similarity(token, name_tokens, self._grams) for token in query_tokens]
+            if min(similarities) < self._threshold:
+                continue
+            coverage = min(1.0, len(query_tokens) / len(name_tokens))
+            matches.append((0.8 * sum(similarities) / len(similarities) + 0.15 * coverage, item_id))
+        return matches
+
+
+class Gazetteer:
+    """
+    Local address search over an index built from an OSM extract.
+
+    Street, POI and settlement names are kept in memory (there are
+    thousands of them); house numbers are read from the index file by primary key.
+    Without an index, lookup() always returns an empty list.
+    """
+
+    def __init__(self, name_threshold: float = 0.6):
+        self._name_threshold = name_threshold
+        self._conn: sqlite3.Connection | None = None
+        self._streets: dict[int, tuple] = {}
+        self._pois: dict[int, tuple] = {}
+        self._places: dict[str, tuple[str, int]] = {}
+        self._street_names = _NameIndex(name_threshold)
+        self._poi_names = _NameIndex(name_threshold)
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._conn is not None
+
+    def open(self, path: Path | str = GAZETTEER_PATH) -> bool:
+        """Opens the index (read-only) and loads the names into memory. False if the file does not exist."""
+        path = Path(path)
+        if not path.exists():
+            logger.info(f"Газетир не знайдено ({path}); адреси шукаються лише через Nominatim.")
+            return False
+        self.close()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self._streets = {row[0]: row[1:] for row in self._conn.execute(
+            "SELECT id, name, street_type, norm, city, city_rank, latitude, longitude FROM streets"
+        )}
+        self._pois = {row[0]: row[1:] for row in self._conn.execute(
+            "SELECT id, name, norm, city, city_rank, latitude, longitude FROM pois"
+        )}
+        self._places = {norm: (name, rank) for name, norm, rank in self._conn.execute(
+            "SELECT name, norm, rank FROM places"
+        )}
+        self._street_names = _NameIndex(self._name_threshold)
+        self._poi_names = _NameIndex(self._name_threshold)
+        for street_id, (_, _, norm, *_rest) in self._streets.items():
+            self._street_names.add(street_id, norm)
+        for poi_id, (_, norm, *_rest) in self._pois.items():
+            self._poi_names.add(poi_id, norm)
+        logger.info(
+            f"Газетир завантажено: {len(self._streets)} вулиць, {len(self._pois)} об'єктів, "
+            f"{len(self._places)} населених пунктів."
+        )
+        return True
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def parse(self, text: str) -> ParsedAddress:
+        """Extracts the street type, name, house number and settlement from the entered text."""
+        text = _ADMIN_PART.sub(' ', text.lower())
+        tokens = _tokens(text)
+
+        city = None
+        # A settlement name may consist of several words; look for the longest one
+        for length in (3, 2, 1):
+            for start in range(len(tokens) - length + 1):
+                candidate = ' '.join(tokens[start:start + length])
+                if candidate in self._places and len(tokens) > length:
+                    city = self._places[candidate][0]
+                    del tokens[start:start + length]
+                    break
+            if city:
+                break
+
+        street_type, house, words = None, None, []
+        for i, token in enumerate(tokens):
+            if token in STREET_TYPES and street_type is None:
+                street_type = STREET_TYPES[token]
+            elif re.search(r"\d", token) and house is None:
+                house = token
+                # "5 а" -> "5а"
+                if i + 1 < len(tokens) and len(tokens[i + 1]) == 1 and tokens[i + 1].isalpha() and tokens[i + 1] not in NOISE_WORDS:
+                    house += tokens[i + 1]
+                    tokens[i + 1] = ''
+            elif token and token not in NOISE_WORDS:
+                words.append(token)
+        return ParsedAddress(street_type, ' '.join(words), normalize_house_number(house) if house else None, city)
+
+    def lookup(self, text: str, limit: int = 5) -> list[GazetteerLocation]:
+        """
+        Looks an address up in the local index.
+
+        Returns:
+            Up to limit candidates, best first. An empty list if the index is not loaded,
+            the street is not found or the found streets have no such house.
+        """
+        if self._conn is None:
+            return []
+        parsed = self.parse(text)
+        results = self._lookup_street(parsed, limit) if parsed.name else []
+        if not results and parsed.name and parsed.house is None:
+            results = self._lookup_poi(parsed, limit)
+        self._stats['hits' if results else 'misses'] += 1
+        return results
+
+    def _lookup_street(self, parsed: ParsedAddress, limit: int) -> list[GazetteerLocation]:
+        ranked = []
+        for score, street_id in self._street_names.match(parsed.name):
+            name, street_type, _, city, city_rank, lat, lon = self._streets[street_id]
+            if parsed.city and city != parsed.city:
+                continue
+            if parsed.street_type and street_type == parsed.street_type:
+                score += 0.05
+            ranked.append((city_rank, -score, street_id))
+        # Larger settlements first: same-named streets in villages are fallbacks
+        ranked.sort()
+
+        results = []
+        for _, _, street_id in ranked:
+            name, _, _, city, _, lat, lon = self._streets[street_id]
+            if parsed.house:
+                row = self._conn.execute(
+                    "SELECT number, latitude, longitude FROM houses WHERE street_id = ? AND number_norm = ?",
+                    (street_id, parsed.house)
+                ).fetchone()
+                if row is None:
+                    continue
+                number, lat, lon = row
+                address = ', '.join(part for part in (name, number, city) if part)
+            else:
+                address = ', '.join(part for part in (name, city) if part)
+            results.append(GazetteerLocation(address, lat, lon))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _lookup_poi(self, parsed: ParsedAddress, limit: int) -> list[GazetteerLocation]:
+        ranked = []
+        for score, poi_id in self._poi_names.match(parsed.name):
+            name, _, city, city_rank, lat, lon = self._pois[poi_id]
+            if not parsed.city or city == parsed.city:
+                ranked.append((city_rank, -score, poi_id))
+        ranked.sort()
+        results = []
+        for _, _, poi_id in ranked[:limit]:
+            name, _, city, _, lat, lon = self._pois[poi_id]
+            results.append(GazetteerLocation(', '.join(part for part in (name, city) if part), lat, lon))
+        return results
+
+    def stats(self) -> dict:
+        return {**self._stats, 'streets': len(self._streets), 'pois': len(self._pois)}
+
+
+# --- OSM extract import ---
+
+SCHEMA = """
+    CREATE TABLE places (
+        name TEXT NOT NULL,
+        norm TEXT PRIMARY KEY,
+        rank INTEGER NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL
+    );
+    CREATE TABLE streets (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        street_type TEXT,
+        norm TEXT NOT NULL,
+        city TEXT NOT NULL,
+        city_rank INTEGER NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL
+    );
+    CREATE TABLE houses (
+        street_id INTEGER NOT NULL,
+        number_norm TEXT NOT NULL,
+        number TEXT NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        PRIMARY KEY (street_id, number_norm)
+    ) WITHOUT ROWID;
+    CREATE TABLE pois (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        norm TEXT NOT NULL,
+        city TEXT NOT NULL,
+        city_rank INTEGER NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL
+    );
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _open_extract(path: Path):
+    if path.suffix == '.bz2':
+        return bz2.open(path, 'rb')
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _iter_elements(path: Path, tags: set[str]):
+    """Streams the elements of OSM XML, freeing memory after each one."""
+    with _open_extract(path) as source:
+        for _, element in ET.iterparse(source, events=('end',)):
+            if element.tag in tags:
+                yield element
+                element.clear()
+            elif element.tag in ('node', 'way', 'relation'):
+                element.clear()
+
+
+def _tags(element) -> dict[str, str]:
+    return {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+
+
+def _in_area(lat: float, lon: float) -> bool:
+    south, west, north, east = SERVICE_AREA_BBOX
+    return south <= lat <= north and west <= lon <= east
+
+
+def _is_poi(tags: dict) -> bool:
+    return 'name' in tags and any(key in tags for key in POI_KEYS)
+
+
+def build_gazetteer(extract: Path, output: Path = GAZETTEER_PATH) -> dict:
+    """
+    Builds the gazetteer index from an OSM XML extract.
+
+    The first pass reads ways (streets, addressed buildings, POIs) and remembers
+    the nodes they need, the second reads those nodes' coordinates and point POIs.
+    The index is written to a temporary file that atomically replaces the old one.
+    """
+    started = time.monotonic()
+    ways = []
+    needed_nodes: set[int] = set()
+    for way in _iter_elements(extract, {'way'}):
+        tags = _tags(way)
+        is_street = 'name' in tags and ('highway' in tags and tags['highway'] not in IGNORED_HIGHWAYS or tags.get('place') == 'square')
+        is_house = 'addr:street' in tags and 'addr:housenumber' in tags
+        if is_street or is_house or _is_poi(tags):
+            refs = [int(nd.get('ref')) for nd in way.iter('nd')]
+            needed_nodes.update(refs)
+            ways.append((tags, refs))
+
+    coords: dict[int, tuple[float, float]] = {}
+    features = []  # (tags, lat, lon)
+    places = {}
+    for node in _iter_elements(extract, {'node'}):
+        node_id = int(node.get('id'))
+        lat, lon = float(node.get('lat')), float(node.get('lon'))
+        if node_id in needed_nodes:
+            coords[node_id] = (lat, lon)
+        tags = _tags(node)
+        if not tags or not _in_area(lat, lon):
+            continue
+        if tags.get('place') in PLACE_RANKS and 'name' in tags:
+            norm = ' '.join(_tokens(tags['name']))
+            rank = PLACE_RANKS[tags['place']]
+            if norm not in places or places[norm][1] > rank:
+                places[norm] = (tags['name'], rank, lat, lon)
+        if ('addr:street' in tags and 'addr:housenumber' in tags) or _is_poi(tags):
+            features.append((tags, lat, lon))
+
+    for tags, refs in ways:
+        points = [coords[ref] for ref in refs if ref in coords]
+        if points:
+            lat = sum(p[0] for p in points) / len(points)
+            lon = sum(p[1] for p in points) / len(points)
+            if _in_area(lat, lon):
+                features.append((tags, lat, lon))
+
+    place_list = list(places.values())
+
+    def nearest_place(lat: float, lon: float) -> tuple[str, int]:
+        best, best_score = ('', 4), 1.0
+        for name, rank, p_lat, p_lon in place_list:
+            score = haversine_km(lat, lon, p_lat, p_lon) / PLACE_RADIUS_KM.get(rank, 1.5)
+            if score < best_score:
+                best, best_score = (name, rank), score
+        return best
+
+    place_ranks = {name: rank for name, rank, _, _ in place_list}
+    streets: dict[tuple[str, str], dict] = {}
+    houses: dict[tuple[tuple[str, str], str], tuple] = {}
+    pois = []
+
+    def street_entry(name: str, city: str, rank: int) -> tuple[str, str] | None:
+        street_type, norm = normalize_street(name)
+        if not norm:
+            return None
+        key = (norm, city)
+        streets.setdefault(key, {'name': name, 'type': street_type, 'rank': rank, 'points': []})
+        return key
+
+    for tags, lat, lon in features:
+        if 'addr:street' in tags and 'addr:housenumber' in tags:
+            city = tags.get('addr:city')
+            city, rank = (city, place_ranks.get(city, 4)) if city else nearest_place(lat, lon)
+            key = street_entry(tags['addr:street'], city, rank)
+            if key is not None:
+                number = tags['addr:housenumber'].strip()
+                houses.setdefault((key, normalize_house_number(number)), (number, lat, lon))
+        elif 'highway' in tags or tags.get('place') == 'square':
+            city, rank = nearest_place(lat, lon)
+            key = street_entry(tags['name'], city, rank)
+            if key is not None:
+                streets[key]['points'].append((lat, lon))
+        if _is_poi(tags):
+            city, rank = nearest_place(lat, lon)
+            pois.append((tags['name'], ' '.join(_tokens(tags['name'])), city, rank, lat, lon))
+
+    # A street without geometry (known only from house addresses) - the centre of its houses
+    house_points: dict[tuple[str, str], list] = {}
+    for (key, _), (_, lat, lon) in houses.items():
+        if not streets[key]['points']:
+            house_points.setdefault(key, []).append((lat, lon))
+    for key, points in house_points.items():
+        streets[key]['points'] = points
+
+    tmp_path = Path(f"{output}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO places (name, norm, rank, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+            [(name, norm, rank, lat, lon) for norm, (name, rank, lat, lon) in places.items()]
+        )
+        street_ids = {}
+        for street_id, (key, entry) in enumerate(streets.items(), start=1):
+            points = entry['points']
+            street_ids[key] = street_id
+            conn.execute(
+                "INSERT INTO streets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (street_id, entry['name'], entry['type'], key[0], key[1], entry['rank'],
+                 sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+            )
+        conn.executemany(
+            "INSERT INTO houses VALUES (?, ?, ?, ?, ?)",
+            [(street_ids[key], number_norm, number, lat, lon) for (key, number_norm), (number, lat, lon) in houses.items()]
+        )
+        conn.executemany(
+            "INSERT INTO pois (name, norm, city, city_rank, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)", pois
+        )
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [('source', extract.name), ('built_at', str(int(time.time())))])
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, output)
+
+    stats = {'places': len(places), 'streets': len(streets), 'houses': len(houses), 'pois': len(pois),
+             'seconds': round(time.monotonic() - started, 1)}
+    logger.info(f"Газетир зібрано у {output}: {stats}")
+    return stats
+
+
+# The single gazetteer of the application. Opened at bot startup, used in utils/geocoder.py.
+gazetteer = Gazetteer(name_threshold=GAZETTEER_NAME_THRESHOLD)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Офлайн-газетир зони обслуговування")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Зібрати індекс з вивантаження OSM XML")
+    build_parser.add_argument('extract', type=Path, help="Файл .osm, .osm.bz2 або .osm.gz")
+    build_parser.add_argument('--output', type=Path, default=GAZETTEER_PATH, help="Файл індексу")
+    args = parser.parse_args()
+    build_gazetteer(args.extract, args.output)
@@ -0,0 +1,307 @@
+import asyncio
+from typing import NamedTuple, Sequence
+
+import aiohttp
+from loguru import logger
+
+from utils.rate_limit import PriorityLanes, SingleFlight, TokenBucket
+
+# Lanes in priority order; every rate-limited provider queues requests by them.
+LANE_INTERACTIVE_REVERSE = 'interactive_reverse'
+LANE_INTERACTIVE_FORWARD = 'interactive_forward'
+LANE_BACKGROUND = 'background'
+LANES = (LANE_INTERACTIVE_REVERSE, LANE_INTERACTIVE_FORWARD, LANE_BACKGROUND)
+
+
+class GeoLocation(NamedTuple):
+    """A geocoding result; field-compatible with geopy.Location."""
+    address: str
+    latitude: float
+    longitude: float
+
+
+def viewbox_bounds(viewbox) -> tuple[float, float, float, float] | None:
+    """
+    Normalizes a viewbox to (south, west, north, east).
+
+    Accepts both forms used in the bot: two (lat, lon) corners or a flat
+    [lat1, lon1, lat2, lon2] list.
+    """
+    if not viewbox:
+        return None
+    if len(viewbox) == 2:
+        (lat1, lon1), (lat2, lon2) = viewbox
+    else:
+        lat1, lon1, lat2, lon2 = viewbox
+    return min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)
+
+
+class GeocodingError(Exception):
+    """An upstream provider failed (network error, timeout, bad response)."""
+
+
+class GeocodingProvider:
+    """
+    Base class for an upstream geocoding service.
+
+    Every provider has its own concurrency limit and, if `rate` is set, its own
+    token bucket with priority lanes (public Nominatim allows 1 request/s;
+    a self-hosted instance needs no rate limit). Subclasses implement
+    _geocode()/_reverse() on top of the shared aiohttp session.
+    """
+
+    def __init__(self, name: str, rate: float | None = None, burst: float = 1,
+                 concurrency: int = 4, timeout: float = 10):
+        self.name = name
+        self.lanes = PriorityLanes(TokenBucket(rate, burst), LANES) if rate else None
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._stats = {'requests': 0, 'errors': 0}
+
+    async def _call(self, lane: str, coro_factory):
+        if self.lanes is not None:
+            await self.lanes.acquire(lane)
+        async with self._semaphore:
+            self._stats['requests'] += 1
+            try:
+                return await coro_factory()
+            except Exception as e:
+                # An unexpected body shape surfaces as TypeError/AttributeError and must
+                # trigger the fallback too; CancelledError is not an Exception
+                self._stats['errors'] += 1
+                raise GeocodingError(f"{self.name}: {e!r}") from e
+
+    async def _get_json(self, session: aiohttp.ClientSession, url: str, params: dict):
+        async with session.get(url, params=params, timeout=self._timeout) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def geocode(self, session: aiohttp.ClientSession, query: str, lane: str, *, limit: int = 1,
+                      language: str | None = None, viewbox=None, bounded: bool = False) -> list[GeoLocation]:
+        return await self._call(lane, lambda: self._geocode(session, query, limit, language, viewbox_bounds(viewbox), bounded))
+
+    async def reverse(self, session: aiohttp.ClientSession, lat: float, lon: float, lane: str, *,
+                      language: str | None = None) -> GeoLocation | None:
+        return await self._call(lane, lambda: self._reverse(session, lat, lon, language))
+
+    async def _geocode(self, session, query, limit, language, bounds, bounded) -> list[GeoLocation]:
+        raise NotImplementedError
+
+    async def _reverse(self, session, lat, lon, language) -> GeoLocation | None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        if self.lanes is not None:
+            stats['lanes'] = self.lanes.stats()
+        return stats
+
+
+class NominatimProvider(GeocodingProvider):
+    """Nominatim JSON API: the public instance (rate limited) or a self-hosted one."""
+
+    def __init__(self, base_url: str = "https://nominatim.openstreetmap.org", **kwargs):
+        super().__init__(kwargs.pop('name', 'nominatim'), **kwargs)
+        self._base_url = base_url.rstrip('/')
+
+    @staticmethod
+    def _location(item: dict) -> GeoLocation:
+        return GeoLocation(item['display_name'], float(item['lat']), float(item['lon']))
+
+    async def _geocode(self, session, query, limit, language, bounds, bounded):
+        params = {'q': query, 'format': 'jsonv2', 'limit': limit}
+        if language:
+            params['accept-language'] = language
+        if bounds:
+            south, west, north, east = bounds
+            params['viewbox'] = f"{west},{north},{east},{south}"
+            if bounded:
+                params['bounded'] = 1
+        data = await self._get_json(session, f"{self._base_url}/search", params)
+        return [self._location(item) for item in data]
+
+    async def _reverse(self, session, lat, lon, language):
+        params = {'lat': lat, 'lon': lon, 'format': 'jsonv2'}
+        if language:
+            params['accept-language'] = language
+        data = await self._get_json(session, f"{self._base_url}/reverse", params)
+        return self._location(data) if data and 'error' not in data else None
+
+
+class PhotonProvider(GeocodingProvider):
+    """Photon (komoot) API, usually a self-hosted instance without a rate limit."""
+
+    # Photon returns address parts separately; assemble them in Nominatim's order
+    _ADDRESS_PARTS = ('housenumber', 'street', 'name', 'city', 'district', 'county', 'state', 'country')
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(kwargs.pop('name', 'photon'), **kwargs)
+        self._base_url = base_url.rstrip('/')
+
+    @classmethod
+    def _location(cls, feature: dict) -> GeoLocation:
+        properties = feature['properties']
+        parts = []
+        for key in cls._ADDRESS_PARTS:
+            value = properties.get(key)
+            if value and value not in parts:
+                parts.append(value)
+        lon, lat = feature['geometry']['coordinates']
+        return GeoLocation(', '.join(parts), float(lat), float(lon))
+
+    async def _geocode(self, session, query, limit, language, bounds, bounded):
+        params = {'q': query, 'limit': limit}
+        if bounds:
+            south, west, north, east = bounds
+            params['bbox'] = f"{west},{south},{east},{north}"
+        data = await self._get_json(session, f"{self._base_url}/api", params)
+        return [self._location(feature) for feature in data.get('features', [])]
+
+    async def _reverse(self, session, lat, lon, language):
+        data = await self._get_json(session, f"{self._base_url}/reverse", {'lat': lat, 'lon': lon})
+        features = data.get('features', [])
+        return self._location(features[0]) if features else None
+
+
+class StaticProvider(GeocodingProvider):
+    """
+    In-process stand-in for tests and local development.
+
+    Answers from fixed dictionaries (query -> locations, (lat, lon) -> location)
+    after an optional delay, and can be told to fail.
+    """
+
+    def __init__(self, forward: dict[str, list[GeoLocation]] | None = None,
+                 reverse: dict[tuple[float, float], GeoLocation] | None = None,
+                 delay: float = 0.0, fail: bool = False, **kwargs):
+        super().__init__(kwargs.pop('name', 'static'), **kwargs)
+        self.forward = forward or {}
+        self.reverse_points = reverse or {}
+        self.delay = delay
+        self.fail = fail
+        self.queries: list = []
+
+    async def _answer(self, query, result):
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise aiohttp.ClientConnectionError("static provider configured to fail")
+        return result
+
+    async def _geocode(self, session, query, limit, language, bounds, bounded):
+        return await self._answer(query, self.forward.get(query, [])[:limit])
+
+    async def _reverse(self, session, lat, lon, language):
+        return await self._answer((lat, lon), self.reverse_points.get((lat, lon)))
+
+
+class GeocodingClient:
+    """
+    Native asyncio geocoding client over one or more providers.
+
+    Identical requests that arrive while one is in flight share its result
+    (single-flight), so they cost one upstream call.
+
+    All providers share one aiohttp session with a keep-alive connection pool.
+    Providers are tried in order: if the current one fails, the next starts
+    immediately (fallback); if it has not answered within `hedge_delay`
+    seconds, the next one is started in parallel (hedging) and the first
+    non-empty answer wins, the rest are cancelled. This bounds the tail
+    latency of address resolution by roughly hedge_delay plus the fastest
+    healthy provider. hedge_delay=0 disables hedging.
+    """
+
+    def __init__(self, providers: Sequence[GeocodingProvider], user_agent: str,
+                 hedge_delay: float = 0.0, pool_size: int = 10):
+        if not providers:
+            raise ValueError("at least one geocoding provider is required")
+        self.providers = list(providers)
+        self._user_agent = user_agent
+        self._hedge_delay = hedge_delay
+        self._pool_size = pool_size
+        self._session: aiohttp.ClientSession | None = None
+        self._flights = SingleFlight()
+        self._stats = {'hedged': 0, 'fallbacks': 0, 'failed': 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': self._user_agent})
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _race(self, call):
+        """Runs call(provider, session) over the providers with fallback and hedging."""
+        session = self._get_session()
+        pending: set[asyncio.Task] = set()
+        remaining = iter(self.providers)
+        answered = False
+
+        def start_next() -> bool:
+            provider = next(remaining, None)
+            if provider is None:
+                return False
+            pending.add(asyncio.create_task(call(provider, session), name=f"geocode-{provider.name}"))
+            return True
+
+        start_next()
+        try:
+            while pending:
+                timeout = self._hedge_delay if self._hedge_delay > 0 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if start_next():
+                        self._stats['hedged'] += 1
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        result = task.result()
+                    except GeocodingError as e:
+                        logger.warning(f"Геокодер: {e}")
+                        continue
+                    answered = True
+                    if result:
+                        return result
+                # Every started provider failed or found nothing: move on to the next one
+                if not pending and start_next():
+                    self._stats['fallbacks'] += 1
+            if not answered:
+                self._stats['failed'] += 1
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def geocode(self, query: str, lane: str = LANE_INTERACTIVE_FORWARD, exactly_one: bool = True,
+                      limit: int | None = None, language: str | None = None, viewbox=None,
+                      bounded: bool = False, **_ignored):
+        """Same result shape as geopy: a location (exactly_one) or a list; None if nothing was found."""
+        limit = 1 if exactly_one else (limit or 5)
+        key = ('geocode', query, limit, language, repr(viewbox), bounded)
+        locations = await self._flights.do(key, lambda: self._race(lambda provider, session: provider.geocode(
+            session, query, lane, limit=limit, language=language, viewbox=viewbox, bounded=bounded
+        )))
+        if not locations:
+            return None
+        return locations[0] if exactly_one else locations
+
+    async def reverse(self, lat: float, lon: float, lane: str = LANE_INTERACTIVE_REVERSE,
+                      language: str | None = None, **_ignored) -> GeoLocation | None:
+        key = ('reverse', lat, lon, language)
+        return await self._flights.do(key, lambda: self._race(
+            lambda provider, session: provider.reverse(session, lat, lon, lane, language=language)
+        ))
+
+    def stats(self) -> dict:
+        """Hedging/fallback counters, coalesced requests and per-provider request and lane statistics."""
+        return {
+            **self._stats,
+            'upstream_calls': self._flights.calls,
+            'coalesced': self._flights.coalesced,
+            'providers': {provider.name: provider.stats() for provider in self.providers},
+        }
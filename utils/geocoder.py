@@ -1,61 +1,99 @@
-from geopy.geocoders import Nominatim
-import asyncio
 from loguru import logger
-import time
+
+from config.config import (
+    GEOCODER_PROVIDERS, GEOCODER_USER_AGENT, GEOCODER_TIMEOUT, GEOCODER_CONCURRENCY, GEOCODER_HEDGE_DELAY,
+    GEOCODER_RATE_PER_SEC, GEOCODER_BURST, NOMINATIM_URL, PHOTON_URL, PHOTON_RATE_PER_SEC
+)
+from database.geocode_cache import geocode_cache, search_scope
+from utils.gazetteer import gazetteer
+from utils.geo_providers import (
+    GeocodingClient, GeocodingProvider, NominatimProvider, PhotonProvider,
+    LANE_INTERACTIVE_REVERSE, LANE_INTERACTIVE_FORWARD, LANE_BACKGROUND
+)
 
 # Константа для ограничения области поиска геокодера (Сумская область)
 # Координаты [юго-запад, северо-восток]
 SUMY_OBLAST_VIEWBOX = [50.20, 33.35, 51.65, 35.75]
 
+# How many candidates a forward lookup fetches and caches, whatever the caller's limit
+CACHED_CANDIDATES = 5
+
+
+def _build_providers() -> list[GeocodingProvider]:
+    """Creates the geocoding providers in the order given by GEOCODER_PROVIDERS."""
+    providers = []
+    for name in GEOCODER_PROVIDERS:
+        if name == 'nominatim':
+            providers.append(NominatimProvider(
+                NOMINATIM_URL, rate=GEOCODER_RATE_PER_SEC or None, burst=GEOCODER_BURST,
+                concurrency=GEOCODER_CONCURRENCY, timeout=GEOCODER_TIMEOUT
+            ))
+        elif name == 'photon' and PHOTON_URL:
+            providers.append(PhotonProvider(
+                PHOTON_URL, rate=PHOTON_RATE_PER_SEC or None,
+                concurrency=GEOCODER_CONCURRENCY, timeout=GEOCODER_TIMEOUT
+            ))
+        else:
+            logger.warning(f"Невідомий або не налаштований провайдер геокодування: '{name}'")
+    return providers or [NominatimProvider(rate=GEOCODER_RATE_PER_SEC or None, timeout=GEOCODER_TIMEOUT)]
+
+# The single geocoding client: the keep-alive connection pool is shared by all providers.
+# The session is created on the first request and closed in graceful_shutdown
+geocoder = GeocodingClient(_build_providers(), user_agent=GEOCODER_USER_AGENT, hedge_delay=GEOCODER_HEDGE_DELAY)
+
 
-# Ініціалізуємо геокодер з унікальним user_agent, як того вимагає політика Nominatim
-# geolocator_nominatim = Nominatim(user_agent="nubira_taxi_bot/1.0", timeout=10)
-class RateLimitedGeocoder:
+def _parse_point(query) -> tuple[float, float] | None:
+    """Returns (lat, lon) from a reverse geocoding query: a "lat, lon" string or a pair of numbers."""
+    try:
+        if isinstance(query, str):
+            lat, lon = (float(part) for part in query.split(','))
+        else:
+            lat, lon = float(query[0]), float(query[1])
+    except (TypeError, ValueError, IndexError):
+        return None
+    return lat, lon
+
+async def geocode(query: str, lane: str = LANE_INTERACTIVE_FORWARD, **kwargs):
     """
-    Асинхронная обертка для geopy.Nominatim, обеспечивающая соблюдение
-    ограничения по частоте запросов (1 запрос в секунду) без блокировки
-    всего приложения с помощью asyncio.sleep().
+    Asynchronously calls the geocoder to turn an address into coordinates.
+
+    Looks in the geocoding cache first (exact or fuzzy match), then in the
+    region's offline gazetteer; such addresses are returned at once, without
+    queueing for the providers. Results have address/latitude/longitude fields
+    (like geopy.Location).
+
+    The provider is always asked for at least CACHED_CANDIDATES results and the
+    whole list is cached under the query's search scope, so a later call with
+    exactly_one=False and a larger limit is not served a truncated list.
     """
-    def __init__(self, user_agent: str, timeout: int = 10):
-        self._geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
-        self._lock = asyncio.Lock()
-        self._last_request_time = 0
-        self._delay = 1.1  # Задержка чуть больше 1 секунды
-
-    async def _execute_request(self, func, *args, **kwargs):
-        async with self._lock:
-            # Проверяем, сколько времени прошло с последнего запроса
-            time_since_last_request = time.monotonic() - self._last_request_time
-            if time_since_last_request < self._delay:
-                # Если времени прошло недостаточно, асинхронно ждем оставшееся время
-                await asyncio.sleep(self._delay - time_since_last_request)
-
-            try:
-                # Выполняем блокирующий сетевой запрос в отдельном потоке
-                location = await asyncio.to_thread(func, *args, **kwargs)
-                return location
-            except Exception as e:
-                logger.error(f"Geocoding request failed for query '{args[0]}': {e}")
-                return None
-            finally:
-                # Обновляем время последнего запроса
-                self._last_request_time = time.monotonic()
-
-    async def geocode(self, query: str, **kwargs):
-        """Асинхронно вызывает геокодер для преобразования адреса в координаты."""
-        return await self._execute_request(self._geolocator.geocode, query, **kwargs)
-
-    async def reverse(self, query, **kwargs):
-        """Асинхронно вызывает геокодер для преобразования координат в адрес."""
-        return await self._execute_request(self._geolocator.reverse, query, **kwargs)
-
-# Создаем единственный экземпляр нашего нового геокодера
-geocoder = RateLimitedGeocoder(user_agent="nubira_taxi_bot/1.0", timeout=10)
-
-async def geocode(query: str, **kwargs):
-    """Асинхронно викликає геокодер для перетворення адреси в координати."""
-    return await geocoder.geocode(query, **kwargs)
-
-async def reverse(query, **kwargs):
-    """Асинхронно викликає геокодер для перетворення координат в адресу."""
-    return await geocoder.reverse(query, **kwargs)
+    exactly_one = kwargs.pop('exactly_one', True)
+    requested = kwargs.pop('limit', None)
+    limit = 1 if exactly_one else requested or CACHED_CANDIDATES
+    scope = search_scope(kwargs.get('viewbox'), kwargs.get('bounded', False), kwargs.get('language'))
+    cached = geocode_cache.get(query, scope)
+    # A list shorter than CACHED_CANDIDATES is everything the provider found; a full one may be cut short
+    if cached is not None and len(cached) < limit and len(cached) >= CACHED_CANDIDATES:
+        cached = None
+    if cached is None:
+        cached = gazetteer.lookup(query, limit=limit) or None
+    if cached is None:
+        result = await geocoder.geocode(query, lane=lane, exactly_one=False,
+                                        limit=max(limit, CACHED_CANDIDATES), **kwargs)
+        if not result:
+            return result
+        cached = await geocode_cache.store(query, result, scope)
+    return cached[0] if exactly_one else cached[:limit]
+
+async def reverse(query, lane: str = LANE_INTERACTIVE_REVERSE, **kwargs):
+    """Asynchronously calls the geocoder to turn coordinates into an address (cached by rounded coordinates)."""
+    point = _parse_point(query)
+    if point is None:
+        logger.warning(f"Некоректні координати для зворотного геокодування: {query!r}")
+        return None
+    cached = geocode_cache.get_reverse(*point)
+    if cached is not None:
+        return cached
+    location = await geocoder.reverse(*point, lane=lane, **kwargs)
+    if location is None:
+        return None
+    return await geocode_cache.store_reverse(*point, location)
@@ -0,0 +1,140 @@
+import asyncio
+from collections import deque
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from loguru import logger
+
+from config.config import NEWSLETTER_PAGE_SIZE
+from database import queries as db_queries
+from utils.batch_sender import BroadcastEngine, BroadcastResult, progress_text
+
+# Newsletters are jobs in the database (newsletter_jobs), with the result per recipient in newsletter_deliveries.
+# Recipients are read in pages by user_id, so memory does not depend on the audience size,
+# and unfinished jobs resume where they stopped after a bot restart.
+
+
+class NewsletterJob:
+    """
+    Runs one newsletter job until every recipient has a recorded outcome.
+
+    Recipients are streamed in pages of `page_size` ordered by user_id, skipping
+    those whose delivery is already recorded. Each outcome is written as soon as
+    it is known, and the job's cursor moves past a page once all of its
+    recipients have one, so a restart resumes at the first unfinished page and
+    re-sends at most the messages whose outcome was not yet written.
+    """
+
+    def __init__(self, bot: Bot, job: aiosqlite.Row, page_size: int = NEWSLETTER_PAGE_SIZE):
+        self.bot = bot
+        self.id = job['id']
+        self.job = job
+        self.sent = job['sent']
+        self.failed = job['failed']
+        self._page_size = page_size
+        # Pages in progress: [last user_id of the page, recipients without a result]
+        self._pages: deque[list[int]] = deque()
+        self._page_of: dict[int, list[int]] = {}
+
+    async def _recipients(self):
+        after = self.job['cursor']
+        while True:
+            page = await db_queries.get_newsletter_recipients_page(self.id, self.job['audience'], after, self._page_size)
+            if not page:
+                return
+            entry = [page[-1], len(page)]
+            self._pages.append(entry)
+            for user_id in page:
+                self._page_of[user_id] = entry
+                yield user_id
+            after = page[-1]
+
+    async def _send(self, user_id: int):
+        await self.bot.copy_message(chat_id=user_id, from_chat_id=self.job['from_chat_id'], message_id=self.job['message_id'])
+
+    async def _on_result(self, user_id: int, delivered: bool):
+        if delivered:
+            self.sent += 1
+        else:
+            self.failed += 1
+        await db_queries.record_newsletter_delivery(self.id, user_id, 'sent' if delivered else 'failed')
+        self._page_of.pop(user_id)[1] -= 1
+        cursor = None
+        while self._pages and self._pages[0][1] == 0:
+            cursor = self._pages.popleft()[0]
+        if cursor is not None:
+            await db_queries.save_newsletter_progress(self.id, cursor, self.sent, self.failed)
+
+    async def _show_progress(self, engine: BroadcastEngine):
+        await self.bot.edit_message_text(
+            progress_text(self.sent, self.failed, self.job['total'], engine.rate),
+            chat_id=self.job['status_chat_id'], message_id=self.job['status_message_id']
+        )
+
+    async def run(self) -> BroadcastResult:
+        """Sends the newsletter to the remaining recipients, marks the job done and reports to the admin."""
+        logger.info(f"Розсилка #{self.id} ({self.job['audience']}): старт з user_id > {self.job['cursor']}, "
+                    f"вже надіслано {self.sent}, помилок {self.failed}")
+        progress = self._show_progress if self.job['status_message_id'] else None
+        result = await BroadcastEngine().run(self._recipients(), self._send, progress, self._on_result)
+        sent, failed = await db_queries.finish_newsletter_job(self.id)
+        logger.info(f"Розсилку #{self.id} завершено: надіслано {sent}, помилок {failed}, {result.per_second:.1f} повідомл./с")
+        try:
+            await self.bot.send_message(
+                self.job['from_chat_id'],
+                f"✅ <b>Розсилку завершено!</b>\n\nУспішно надіслано: {sent}\nПомилок: {failed}\n"
+                f"Швидкість: {result.per_second:.1f} повідомл./с"
+            )
+        except TelegramAPIError as e:
+            logger.warning(f"Не вдалося надіслати звіт про розсилку #{self.id}: {e}")
+        return result
+
+
+# Jobs running in this process: job_id -> task
+_running: dict[int, asyncio.Task] = {}
+
+
+def _on_job_done(job_id: int, task: asyncio.Task) -> None:
+    _running.pop(job_id, None)
+    if not task.cancelled() and task.exception():
+        logger.opt(exception=task.exception()).error(f"Розсилка #{job_id} перервалась з помилкою")
+
+
+def _start(bot: Bot, job: aiosqlite.Row) -> asyncio.Task:
+    task = asyncio.create_task(NewsletterJob(bot, job).run(), name=f"newsletter-{job['id']}")
+    _running[job['id']] = task
+    task.add_done_callback(lambda t: _on_job_done(job['id'], t))
+    return task
+
+
+async def start_newsletter_job(bot: Bot, audience: str, from_chat_id: int, message_id: int,
+                               status_chat_id: int | None = None, status_message_id: int | None = None) -> int:
+    """
+    Creates a newsletter job for the audience and starts sending it in the background.
+
+    Returns:
+        The job ID.
+    """
+    total = await db_queries.get_newsletter_audience_count(audience)
+    job_id = await db_queries.create_newsletter_job(audience, from_chat_id, message_id, total, status_chat_id, status_message_id)
+    _start(bot, await db_queries.get_newsletter_job(job_id))
+    return job_id
+
+
+async def resume_newsletter_jobs(bot: Bot) -> int:
+    """Restarts the jobs interrupted by a shutdown. Returns how many were resumed."""
+    jobs = [job for job in await db_queries.get_unfinished_newsletter_jobs() if job['id'] not in _running]
+    for job in jobs:
+        _start(bot, job)
+    if jobs:
+        logger.info(f"Відновлено розсилок: {len(jobs)}")
+    return len(jobs)
+
+
+async def stop_newsletter_jobs() -> None:
+    """Cancels running jobs; their progress stays in the database and they resume on the next start."""
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+from collections.abc import Iterable
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
+
+from config.config import (
+    OUTBOUND_RATE_PER_SEC, OUTBOUND_BURST, OUTBOUND_CHAT_RATE_PER_SEC, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+)
+from utils.rate_limit import PriorityLanes, TokenBucket
+
+# Priority classes of outgoing messages, highest first
+PRIORITY_DISPATCH = 'dispatch'
+PRIORITY_ORDER_STATUS = 'order_status'
+PRIORITY_REMINDER = 'reminder'
+PRIORITY_NEWSLETTER = 'newsletter'
+PRIORITIES = (PRIORITY_DISPATCH, PRIORITY_ORDER_STATUS, PRIORITY_REMINDER, PRIORITY_NEWSLETTER)
+
+# Bot API methods that deliver or change a message in a chat and count against Telegram's limits
+OUTBOUND_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendLocation', 'sendVoice', 'sendAudio', 'sendDocument', 'sendVideo',
+    'sendAnimation', 'sendContact', 'sendMediaGroup', 'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageLiveLocation',
+})
+
+# Everything sent without an explicit class (replies in handlers) is an order status update
+_current_priority: ContextVar[str] = ContextVar('outbound_priority', default=PRIORITY_ORDER_STATUS)
+
+
+@contextmanager
+def send_priority(priority: str):
+    """
+    Sends made inside the block (and in tasks created inside it) use this priority class.
+
+    Usage:
+        with send_priority(PRIORITY_DISPATCH):
+            await bot.send_message(driver_id, text)
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"unknown priority class: {priority!r}")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Bot session middleware that every outgoing message passes through.
+
+    A message first waits for its chat's token bucket (about one message per
+    second with a small burst), then for a token from the global bucket, which
+    is handed out in strict priority order: dispatch offers overtake order
+    status updates, reminders and newsletters queued before them. A 429
+    response (TelegramRetryAfter) is retried after the delay Telegram asked
+    for, up to `max_retries` times, for the classes in `retry_priorities`;
+    for the others (newsletters by default) it is raised at once, so the
+    broadcast engine can slow down and reschedule the recipient itself.
+    Other API calls (getUpdates, answerCallbackQuery, ...) are passed through
+    untouched.
+    """
+
+    def __init__(self, rate: float, burst: float = 1, chat_rate: float = 1.0, chat_burst: float = 1,
+                 max_retries: int = 3, max_chats: int = 10_000,
+                 retry_priorities: Iterable[str] = (PRIORITY_DISPATCH, PRIORITY_ORDER_STATUS, PRIORITY_REMINDER)):
+        self.lanes = PriorityLanes(TokenBucket(rate, burst), PRIORITIES)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._max_chats = max_chats
+        self._max_retries = max_retries
+        self._retry_priorities = frozenset(retry_priorities)
+        self._stats = {'sent': 0, 'chat_waits': 0, 'retry_after': 0, 'retry_after_total': 0.0, 'failed': 0}
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._max_chats:
+                self._prune_chats()
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    def _prune_chats(self) -> None:
+        # A bucket that has refilled completely carries no state and is recreated on demand
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.delay(bucket.capacity) == 0]:
+            del self._chats[chat_id]
+
+    async def __call__(self, make_request, bot, method):
+        if method.__api_method__ not in OUTBOUND_METHODS:
+            return await make_request(bot, method)
+
+        priority = _current_priority.get()
+        chat_id = getattr(method, 'chat_id', None)
+        for attempt in itertools.count():
+            if chat_id is not None:
+                bucket = self._chat_bucket(chat_id)
+                if bucket.delay() > 0:
+                    self._stats['chat_waits'] += 1
+                await bucket.acquire()
+            await self.lanes.acquire(priority)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self._stats['retry_after'] += 1
+                self._stats['retry_after_total'] += e.retry_after
+                if priority not in self._retry_priorities:
+                    raise
+                if attempt >= self._max_retries:
+                    self._stats['failed'] += 1
+                    raise
+                logger.warning(f"Telegram обмежив надсилання ({method.__api_method__} у чат {chat_id}): повтор через {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+                continue
+            self._stats['sent'] += 1
+            return response
+
+    def stats(self) -> dict:
+        return {**self._stats, 'chats': len(self._chats), 'lanes': self.lanes.stats()}
+
+
+# Single scheduler of the application; main.py attaches it to the bot session
+outbound_scheduler = OutboundScheduler(
+    OUTBOUND_RATE_PER_SEC, OUTBOUND_BURST, OUTBOUND_CHAT_RATE_PER_SEC, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+)
@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Hashable, Sequence
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, at most `capacity` stored.
+
+    capacity=1 gives strict spacing of 1/rate seconds between acquisitions;
+    a larger capacity lets short bursts through after idle periods.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Changes the refill rate; tokens accrued so far are kept at the old rate."""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._refill()
+        self.rate = rate
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` are available (0 if they are available now)."""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def refund(self, tokens: float = 1.0) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + tokens)
+
+
+class PriorityLanes:
+    """
+    Admits callers through a token bucket in strict lane priority order.
+
+    Waiters are kept in a heap ordered by (lane index, arrival); a single pump
+    task takes a token and wakes the best waiter, so a request arriving in a
+    higher lane overtakes everything queued in lower lanes. Cancelled waiters
+    are skipped and their token returned to the bucket. Per-lane queue depth
+    and wait times are reported by stats().
+    """
+
+    def __init__(self, bucket: TokenBucket, lanes: Sequence[str]):
+        self._bucket = bucket
+        self._lanes = {lane: index for index, lane in enumerate(lanes)}
+        self._waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._pump: asyncio.Task | None = None
+        self._stats = {lane: {'queued': 0, 'served': 0, 'wait_total': 0.0, 'wait_max': 0.0} for lane in lanes}
+
+    @property
+    def lanes(self) -> list[str]:
+        return list(self._lanes)
+
+    async def acquire(self, lane: str) -> float:
+        """Waits for this lane's turn. Returns the time spent waiting in seconds."""
+        index = self._lanes[lane]
+        enqueued = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (index, next(self._counter), enqueued, future))
+        self._stats[lane]['queued'] += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            await future
+        finally:
+            self._stats[lane]['queued'] -= 1
+        waited = time.monotonic() - enqueued
+        stats = self._stats[lane]
+        stats['served'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+        return waited
+
+    def _drop_cancelled(self) -> None:
+        while self._waiters and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+
+    async def _run(self) -> None:
+        while True:
+            self._drop_cancelled()
+            if not self._waiters:
+                return
+            await self._bucket.acquire()
+            self._drop_cancelled()
+            if not self._waiters:
+                self._bucket.refund()
+                return
+            heapq.heappop(self._waiters)[3].set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            lane: {
+                'queued': s['queued'],
+                'served': s['served'],
+                'avg_wait': round(s['wait_total'] / s['served'], 3) if s['served'] else 0.0,
+                'max_wait': round(s['wait_max'], 3),
+            }
+            for lane, s in self._stats.items()
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task and get the same result (or exception).
+    The task is shielded, so one caller being cancelled does not cancel the
+    call for the others. Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
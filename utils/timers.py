@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import itertools
+from typing import Any, Callable, Coroutine, Hashable
+
+from loguru import logger
+
+
+class DeadlineScheduler:
+    """
+    In-process one-shot timers keyed by an arbitrary hashable key.
+
+    Deadlines live in a min-heap; a single background task sleeps until the
+    earliest one and runs its callback as a separate task. Scheduling a key
+    that already has a deadline replaces it, and cancelled entries are dropped
+    lazily when they reach the top of the heap, so both operations are O(log n).
+    When nothing is armed the runner just waits on an event and costs nothing.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._entries: dict[Hashable, tuple[float, int, Callable, tuple]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._fired = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._runner is not None and not self._runner.done()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def start(self) -> None:
+        """Starts the background runner. Deadlines armed before start() are kept."""
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run(), name=f"timers-{self._name}")
+
+    async def stop(self) -> None:
+        """Stops the runner and drops all pending deadlines without firing them."""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        self._heap.clear()
+        self._entries.clear()
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[..., Coroutine[Any, Any, Any]], *args: Any) -> None:
+        """Arms (or re-arms) the deadline for `key` to fire `callback(*args)` after `delay` seconds."""
+        deadline = asyncio.get_running_loop().time() + max(0.0, delay)
+        seq = next(self._counter)
+        self._entries[key] = (deadline, seq, callback, args)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if self._heap[0][1] == seq:
+            # The new deadline is now the earliest one - the runner must re-evaluate its sleep
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Disarms the deadline for `key`. Returns True if one was pending."""
+        return self._entries.pop(key, None) is not None
+
+    def remaining(self, key: Hashable) -> float | None:
+        """Seconds left until `key` fires, or None if it is not armed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - asyncio.get_running_loop().time())
+
+    def stats(self) -> dict:
+        return {'armed': len(self._entries), 'heap': len(self._heap), 'fired': self._fired}
+
+    def _pop_stale(self) -> None:
+        while self._heap:
+            _, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pop_stale()
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key = heapq.heappop(self._heap)
+            _, _, callback, args = self._entries.pop(key)
+            self._fired += 1
+            task = asyncio.create_task(self._fire(key, callback, args))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fire(self, key: Hashable, callback: Callable, args: tuple) -> None:
+        try:
+            await callback(*args)
+        except Exception as e:
+            logger.error(f"Timer '{self._name}' callback for {key!r} failed: {e}")